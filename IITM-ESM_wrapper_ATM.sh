@@ -18,6 +18,21 @@ fi
 # Source user inputs from the external file
 source ./user_inputs_atm.sh
 
+# Start of this run; products used since are kept by the retention step
+run_start=$(date +%s)
+
+# --resume restarts an interrupted run from its checkpoint journal (see journal.py)
+resume=false
+for arg in "$@"; do
+    [ "$arg" = "--resume" ] && resume=true
+done
+
+# Settings read by the processing and plotting sub-scripts
+export virtual_all_year product_store product_store_dir storage_profile_maps storage_profile_series \
+       precision_policy reduction_engine plev_source derived_variables plot_profile thumbnail_width pdf_image_width plot_dir \
+       domain_pushdown domain_margin plev_levels lat_range lon_range shard_years scratch_dir \
+       obs_cache_dir plot_jobs plot_incremental significance_alpha season plot_var
+
 # Error handling and cleanup
 function check_error {
     if [ $? -ne 0 ]; then
@@ -29,10 +44,118 @@ function check_error {
 
 function cleanup {
     echo "Cleaning up temporary files..."
-    rm -f temp_model1_*.nc temp_model2_*.nc temp_obs_*.nc model_grid_*.nc temp_*_*_data.nc 2>/dev/null || true
+    # Files of units recorded in the journal are kept for --resume
+    command python3 journal.py prune "$ATM_JOURNAL" "${scratch_dir:-./output_data/scratch}"/* \
+        temp_model1_*.nc temp_model2_*.nc temp_obs_*.nc model_grid_*.nc temp_*_*_data.nc 2>/dev/null || true
+    rm -f ./*.nc.tmp.* ./output_data/*.tmp.* 2>/dev/null || true
+    if [ "$trace" = true ] && [ -f "$ATM_TRACE_FILE" ]; then
+        echo "Trace summary:"
+        command python3 pipeline_trace.py report "$ATM_TRACE_FILE" "${ATM_TRACE_FILE%.jsonl}.json"
+    fi
 }
 trap cleanup EXIT
 
+# Structured tracing (see pipeline_trace.py): every stage, and every cdo, ncl,
+# python, ncdump and nccopy call of the sub-scripts, is recorded with its
+# script, model, variable and year. The command wrappers are exported as shell
+# functions, so the sub-scripts pick them up without changes.
+if [ "$trace" = true ]; then
+    mkdir -p ./output_data
+    export ATM_TRACE_FILE="${trace_file:-$PWD/output_data/trace_$(date +%Y%m%d_%H%M%S).jsonl}"
+    export ATM_TRACE_PID=$$
+    export ATM_TRACE_RUNNER="$PWD/pipeline_trace.py"
+    echo "Tracing to $ATM_TRACE_FILE"
+
+    function traced_command {
+        command python3 "$ATM_TRACE_RUNNER" run script="$(basename "$0")" \
+            model="${output_prefix:-${model1_prefix:-}}" var="${var:-${obs_var:-}}" year="${year:-}" -- "$@"
+    }
+    function cdo { traced_command cdo "$@"; }
+    function ncl { traced_command ncl "$@"; }
+    function python { traced_command python "$@"; }
+    function python3 { traced_command python3 "$@"; }
+    function ncdump { traced_command ncdump "$@"; }
+    function nccopy { traced_command nccopy "$@"; }
+    export -f traced_command cdo ncl python python3 ncdump nccopy
+fi
+
+# Plot manifest (see plot_manifest.py): the Python plotting scripts register the
+# figures they save, and the images an NCL script declares (pltDir/pltName) are
+# registered after each ncl call. Only plots in this run's manifest are
+# published into $plot_dir.
+mkdir -p ./output_data
+export ATM_PLOT_MANIFEST="$PWD/output_data/plot_manifest_$(date +%Y%m%d_%H%M%S).jsonl"
+export ATM_PLOT_TOOL="$PWD/plot_manifest.py"
+: > "$ATM_PLOT_MANIFEST"
+
+function ncl {
+    local since="${EPOCHREALTIME:-$(date +%s.%N)}" status
+    if declare -F traced_command > /dev/null; then
+        traced_command ncl "$@"
+    else
+        command ncl "$@"
+    fi
+    status=$?
+    local arg
+    for arg in "$@"; do
+        [[ "$arg" == *.ncl ]] && command python3 "$ATM_PLOT_TOOL" register-ncl "$since" "$arg"
+    done
+    return $status
+}
+export -f ncl
+
+# Atomic CDO outputs: each cdo call of the sub-scripts writes its output file
+# (the last of two or more .nc arguments) under a temporary name, renamed into
+# place once cdo succeeds. An interrupted run thus never leaves a partial file
+# behind for a later "file exists" check to take as finished. Calls that only
+# print (griddes, sinfo, ...) are run as they are.
+function cdo {
+    local output="${!#}" nc_args=0 arg status
+    local run=(command cdo)
+    declare -F traced_command > /dev/null && run=(traced_command cdo)
+    for arg in "$@"; do
+        [[ "$arg" == *.nc ]] && nc_args=$((nc_args + 1))
+    done
+    if [ $nc_args -lt 2 ] || [[ "$output" != *.nc ]]; then
+        "${run[@]}" "$@"
+        return
+    fi
+    local tmp_output="${output}.tmp.${BASHPID}"
+    "${run[@]}" "${@:1:$#-1}" "$tmp_output"
+    status=$?
+    if [ $status -eq 0 ]; then
+        mv -f "$tmp_output" "$output"
+        status=$?
+    fi
+    rm -f "$tmp_output"
+    return $status
+}
+export -f cdo
+
+# Checkpoint journal (see journal.py): the processing scripts record each
+# finished year and variable in output_data/journal.jsonl. With --resume a
+# recorded unit whose files are unchanged is reused, and only a variable
+# recorded as complete is skipped; otherwise the journal is started afresh.
+export ATM_JOURNAL="$PWD/output_data/journal.jsonl"
+if [ "$resume" = true ]; then
+    export ATM_RESUME=true
+    echo "Resuming from the journal $ATM_JOURNAL"
+else
+    export ATM_RESUME=false
+    : > "$ATM_JOURNAL"
+fi
+
+# Run one stage of the wrapper, recorded as a trace span when tracing is on
+function run_stage {
+    local name="$1"
+    shift
+    if [ "$trace" = true ]; then
+        command python3 "$ATM_TRACE_RUNNER" run --name "$name" --cat stage script="$(basename "$0")" -- "$@"
+    else
+        "$@"
+    fi
+}
+
 # Ensure necessary arguments are provided
 required_vars=(
     diagnostic_type plev_variables no_plev_variables plot_dir netcdf_dir_model1 start_year_model1 end_year_model1
@@ -93,32 +216,118 @@ function process_model {
     local output_prefix=$5
     
     echo "Starting processing for Model $model_num with pressure-level variables..."
-    ./process_model_data_plev.sh "${plev_variables_array[@]}" "$season" "$model_dir" "$start_year" "$end_year" "$output_prefix"
+    run_stage "Model $model_num processing (plev)" ./process_model_data_plev.sh "${plev_variables_array[@]}" "$season" "$model_dir" "$start_year" "$end_year" "$output_prefix"
     check_error "Model $model_num processing with pressure levels failed."
     echo "Model $model_num processing for pressure-level variables completed."
 
     echo "Starting processing for Model $model_num with non-pressure-level variables..."
-    ./process_model_data_no_plev.sh "${no_plev_variables_array[@]}" "$season" "$model_dir" "$start_year" "$end_year" "$output_prefix"
+    run_stage "Model $model_num processing (no_plev)" ./process_model_data_no_plev.sh "${no_plev_variables_array[@]}" "$season" "$model_dir" "$start_year" "$end_year" "$output_prefix"
     check_error "Model $model_num processing without pressure levels failed."
     echo "Model $model_num processing for non-pressure-level variables completed."
 }
 
-# Process Model 1 with its prefix
-process_model "1" "$netcdf_dir_model1" "$start_year_model1" "$end_year_model1" "$output_prefix_model1"
-
-# Process Model 2 if present, with its prefix
+# Models to process: Model 1, Model 2 if present, and the ensemble_models
+# entries ("name:dir:start_year:end_year", the name being the output prefix)
+model_entries=("1|$netcdf_dir_model1|$start_year_model1|$end_year_model1|$output_prefix_model1")
 if [ "$use_second_model" = true ]; then
-    process_model "2" "$netcdf_dir_model2" "$start_year_model2" "$end_year_model2" "$output_prefix_model2"
+    model_entries+=("2|$netcdf_dir_model2|$start_year_model2|$end_year_model2|$output_prefix_model2")
 fi
+ensemble_prefixes=("$output_prefix_model1")
+[ "$use_second_model" = true ] && ensemble_prefixes+=("$output_prefix_model2")
+IFS=',' read -r -a ensemble_models_array <<< "$ensemble_models"
+for entry in "${ensemble_models_array[@]}"; do
+    IFS=':' read -r name model_dir model_start model_end <<< "$entry"
+    if [[ -z "$name" || -z "$model_dir" || -z "$model_start" || -z "$model_end" ]]; then
+        echo "Error: Invalid ensemble_models entry '$entry', expected name:dir:start_year:end_year."
+        exit 1
+    fi
+    if [[ " ${ensemble_prefixes[*]} " =~ " $name " ]]; then
+        echo "Error: Model name '$name' is used twice."
+        exit 1
+    fi
+    model_entries+=("$name|$model_dir|$model_start|$model_end|$name")
+    ensemble_prefixes+=("$name")
+done
+
+# Sharded processing (see shard_runner.py): every model and observation
+# variable is split into blocks of shard_years years, run as independent
+# shards and merged into the usual products, in place of the sections below
+function process_sharded {
+    local shard_list="$output_dir/shards/shards.json"
+    rm -f "$shard_list"
+    for entry in "${model_entries[@]}"; do
+        IFS='|' read -r model_num model_dir model_start model_end model_prefix <<< "$entry"
+        for var in "${plev_variables_array[@]}"; do
+            python3 shard_runner.py add "$shard_list" model plev "$var" "$model_dir" "$model_start" "$model_end" "$model_prefix"
+            check_error "Planning shards of $var for $model_prefix"
+        done
+        for var in "${no_plev_variables_array[@]}"; do
+            python3 shard_runner.py add "$shard_list" model no_plev "$var" "$model_dir" "$model_start" "$model_end" "$model_prefix"
+            check_error "Planning shards of $var for $model_prefix"
+        done
+    done
+    for var in "${plev_variables_array[@]}"; do
+        python3 shard_runner.py add "$shard_list" obs plev "$var" "$obs_data_dir" "$start_year_obs" "$end_year_obs"
+        check_error "Planning observation shards of $var"
+    done
+    for var in "${no_plev_variables_array[@]}"; do
+        python3 shard_runner.py add "$shard_list" obs no_plev "$var" "$obs_data_dir" "$start_year_obs" "$end_year_obs"
+        check_error "Planning observation shards of $var"
+    done
+
+    if [ "$shard_mode" = "local" ]; then
+        run_stage "Shard processing" python3 shard_runner.py run-local "$shard_list" $shard_workers
+        check_error "Shard processing"
+    fi
+    run_stage "Shard merge" python3 shard_runner.py merge "$shard_list"
+    local status=$?
+    if [ $status -eq 2 ] && [ "$shard_mode" = "batch" ]; then
+        shard_count=$(python3 shard_runner.py list "$shard_list" | wc -l)
+        echo "Shards are listed in $shard_list. Run each of them, e.g. as a batch array job of $shard_count tasks:"
+        echo "    python3 shard_runner.py run $shard_list --index=<0..$((shard_count - 1))>"
+        echo "then run this wrapper again to merge them and plot."
+        exit 0
+    fi
+    [ $status -eq 0 ]
+    check_error "Shard merge"
+}
+
+if [ -n "$shard_mode" ]; then
+    if [ "$shard_mode" != "local" ] && [ "$shard_mode" != "batch" ]; then
+        echo "Error: Invalid shard_mode '$shard_mode', expected \"local\", \"batch\" or \"\"."
+        exit 1
+    fi
+    echo "Starting sharded processing ($shard_mode, blocks of ${shard_years:-10} years)..."
+    process_sharded
+    echo "Sharded processing completed."
+else
+
+# Process the models in parallel, at most ensemble_jobs at a time (each writes
+# only files carrying its own prefix)
+model_pids=()
+for entry in "${model_entries[@]}"; do
+    IFS='|' read -r model_num model_dir model_start model_end model_prefix <<< "$entry"
+    while [ "$(jobs -rp | wc -l)" -ge "${ensemble_jobs:-4}" ]; do
+        wait -n
+    done
+    process_model "$model_num" "$model_dir" "$model_start" "$model_end" "$model_prefix" &
+    model_pids+=($!)
+done
+for pid in "${model_pids[@]}"; do
+    wait "$pid"
+    check_error "Model processing"
+done
 
 ######################################### OBSERVATION PROCESSING ##########################################
 
 echo "Starting observation data processing..."
 # Pass plev and no_plev variables explicitly, followed by other arguments.
-./observation_data_processing_atm.sh "${plev_variables_array[@]}" "<SEP>" "${no_plev_variables_array[@]}" "$obs_data_dir" "$start_year_obs" "$end_year_obs" "$season"
+run_stage "Observation processing" ./observation_data_processing_atm.sh "${plev_variables_array[@]}" "<SEP>" "${no_plev_variables_array[@]}" "$obs_data_dir" "$start_year_obs" "$end_year_obs" "$season"
 check_error "Observation data processing failed."
 echo "Observation data processing completed."
 
+fi
+
 ######################################### PLOTTING ##########################################
 
 echo "Starting plotting functions..."
@@ -164,12 +373,12 @@ fi
 
 # Run the plotting script
 if [ "$use_second_model" = true ]; then
-    ./plotting_functions_new.sh $debug_flag \
+    run_stage "Plotting" ./plotting_functions_new.sh $debug_flag \
         "${plev_variables_array[@]}" "<SEP>" "${no_plev_variables_array[@]}" \
         "$season" "$projection" "$lat_range" "$lon_range" \
         "$output_dir/${output_prefix_model1}" "$output_dir/${output_prefix_model2}" "$output_dir/final_obs_" "$start_year" "$end_year"
 else
-    ./plotting_functions_new.sh $debug_flag \
+    run_stage "Plotting" ./plotting_functions_new.sh $debug_flag \
         "${plev_variables_array[@]}" "<SEP>" "${no_plev_variables_array[@]}" \
         "$season" "$projection" "$lat_range" "$lon_range" \
         "$output_dir/${output_prefix_model1}" "$output_dir/final_obs_"
@@ -182,69 +391,83 @@ fi
 
 
 echo "Plotting completed successfully."
+
+# Ensemble comparison (see ensemble_compare.py): all models stacked on the grid
+# of Model 1, with every model - obs bias, pairwise differences and the
+# ensemble mean and spread, for the annual and seasonal means
+if [ ${#ensemble_models_array[@]} -gt 0 ]; then
+    echo "Starting ensemble comparison of ${ensemble_prefixes[*]}..."
+    mkdir -p ./plots_ensemble
+    ensemble_pids=()
+    for var in "${plev_variables_array[@]}" "${no_plev_variables_array[@]}"; do
+        level_type="no_plev"
+        [[ " ${plev_variables_array[*]} " =~ " $var " ]] && level_type="plev"
+        for period in annual "$season"; do
+            while [ "$(jobs -rp | wc -l)" -ge "${ensemble_jobs:-4}" ]; do
+                wait -n
+            done
+            python3 ensemble_compare.py "$var" "$level_type" "$period" "$output_dir" ./plots_ensemble "$projection" \
+                "${ensemble_prefixes[@]}" --levels="$ensemble_levels" &
+            ensemble_pids+=($!)
+        done
+    done
+    for pid in "${ensemble_pids[@]}"; do
+        wait "$pid" || echo "Warning: An ensemble comparison failed (see above)."
+    done
+    echo "Ensemble comparison completed."
+fi
+
+# Skill metrics (see skill_metrics.py): bias, RMSE, pattern correlation and
+# standard deviation ratio of every model, variable, period and region, with a
+# Taylor diagram and a portrait plot for the report
+echo "Computing skill metrics of ${ensemble_prefixes[*]}..."
+mkdir -p ./plots_skill
+python3 skill_metrics.py "$output_dir" ./plots_skill "$season" "$plev_variables" "$no_plev_variables" \
+    "${ensemble_prefixes[@]}" --levels="$ensemble_levels" \
+    || echo "Warning: The skill metrics failed (see above)."
 echo "Processing and plotting completed successfully. Outputs are saved in $output_dir."
 # Load user inputs
 
 source ./user_inputs_atm.sh
 
-echo "COPYING ALL PLOTS INTO PLOT DIRECTORY: $plot_dir"
+echo "PUBLISHING THIS RUN'S PLOTS INTO PLOT DIRECTORY: $plot_dir"
 
-# Ensure the plot directory exists
-mkdir -p "$plot_dir"
-
-# Find and copy all .png and .pdf plots into $plot_dir
-find . -type f \( -iname "*.png" -o -iname "*.pdf" \) -exec cp {} "$plot_dir/" \;
+# Publish the plots registered in the run manifest; unchanged plots are skipped
+# and new ones hardlinked, reflinked or copied. The HTML image list is written
+# from the manifest as well.
+img_list_file="${plot_dir}/image_list.txt"
+python3 plot_manifest.py publish "$ATM_PLOT_MANIFEST" "$plot_dir" "$img_list_file"
+check_error "Publishing plots"
 
-echo "All plots successfully copied to $plot_dir."
+echo "All plots successfully published to $plot_dir."
 
 
 ######################## FINAL OUTPUT MANAGEMENT##############
-######################################## CLEANUP ##########################################
-
-echo "Do you want to delete all processed files? (y/n)"
-read -r user_input
-
-if [[ "$user_input" == "y" || "$user_input" == "Y" ]]; then
-    echo "Deleting all processed files..."
-
-    # Safely remove all NetCDF files except IMDIA_mask.nc in output directory
-    find "$output_dir" -type f -name "*.nc" ! -name "INDIA_mask.nc" -exec rm -f {} +
 
-    # Also remove temporary NetCDF files in the current directory
-    find . -maxdepth 1 -type f -name "*.nc" ! -name "INDIA_mask.nc" -exec rm -f {} +
-
-    # Remove additional temporary files
-    rm -f temp_var_*.nc merged_*.nc annual_mean_*.nc 2>/dev/null || true
-
-    echo "All processed files (except INDIA_mask.nc) deleted from $output_dir."
+# Retention (see retention.py): keep output_data within retention_budget by
+# evicting the products that are cheapest to recompute and least recently
+# used. Products of this run (its journal, the files of its plot tasks, and
+# files used since it started) are never evicted. Without a budget all processed files are kept.
+if [ -n "$retention_budget" ]; then
+    python3 retention.py enforce "$output_dir" "$retention_budget" --since="$run_start" --journal="$ATM_JOURNAL"
+    check_error "Enforcing the retention budget"
 else
-    echo "Cleanup skipped. Processed files are retained in $output_dir."
+    echo "No retention budget set. Processed files are retained in $output_dir."
 fi
 
 ######################################### CREATE HTML ##########################################
 
 echo "Generating HTML file with plot previews..."
 
-# Define the image details file
-img_list_file="${plot_dir}/image_list.txt"
+# The image details file (written when publishing the plots)
 output_html="${plot_dir}/plots_overview.html"
 
-# Generate the list of plots with captions
-echo "Generating image list..."
-rm -f "$img_list_file"  # Remove existing file if present
-
-# Add each plot to the image list
-for img in "$plot_dir"/*.png; do
-    echo "$img" >> "$img_list_file"  # Image file path
-    echo "$(basename "$img")" >> "$img_list_file"  # Use file name as caption
-done
-
 # Check if any images were added
 if [[ ! -s "$img_list_file" ]]; then
     echo "No images found for HTML generation."
 else
     # Run the Python script to generate the HTML
-    python create_plot_html.py "$img_list_file" "$output_html"
+    run_stage "HTML and PDF report" python create_plot_html.py "$img_list_file" "$output_html"
     if [[ $? -eq 0 ]]; then
         echo "HTML file created successfully: $output_html"
     else
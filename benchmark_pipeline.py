@@ -0,0 +1,243 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# End-to-end benchmark of the diagnostics pipeline on synthetic data.
+#
+# For every combination of grid size and year count, synthetic model and
+# observation files are generated (see synthetic_data.py) and the pipeline
+# stages are run in a scratch copy of the working directory, with the settings
+# of user_inputs_atm.sh pointed at the synthetic data:
+#   model      - process_model_data_plev.sh and process_model_data_no_plev.sh
+#   obs        - observation_data_processing_atm.sh
+#   regrid     - cdo remapbil of the observation means to the model grid
+#   bias       - cdo sub of model and regridded observation means
+#   plotting   - plotting_functions_new.sh
+#   html_pdf   - create_plot_html.py on the plots produced
+# Wall and CPU time of each stage are reported as a scaling table.
+#
+# Usage:
+#   python benchmark_pipeline.py <work_dir> [grids] [years] [stages]
+#
+#   grids   comma-separated <nlon>x<nlat> model grids (default 96x48,192x96,384x192)
+#   years   comma-separated year counts (default 1,3)
+#   stages  comma-separated subset of the stages above (default all)
+#
+# Observations are generated at twice the model resolution. Stage logs are
+# kept in <work_dir>/<case>/logs.
+#
+# ==============================================================================
+
+import sys
+import os
+import re
+import csv
+import glob
+import time
+import shutil
+import resource
+import subprocess
+
+import synthetic_data
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ["model", "obs", "regrid", "bias", "plotting", "html_pdf"]
+DEFAULT_GRIDS = ["96x48", "192x96", "384x192"]
+DEFAULT_YEARS = [1, 3]
+START_YEAR = 2001
+OBS_REFINEMENT = 2
+SEASON = "JJAS"
+MODEL_PREFIX = "model1"
+
+
+def configure_inputs(text, overrides):
+    """Replace 'name=value' settings at the start of lines in user_inputs_atm.sh."""
+    for name, value in overrides.items():
+        pattern = re.compile(rf"^(\s*){re.escape(name)}=.*$", re.MULTILINE)
+        text, count = pattern.subn(lambda m: f'{m.group(1)}{name}="{value}"', text, count=1)
+        if not count:
+            text += f'\n{name}="{value}"\n'
+    return text
+
+
+def prepare_run_dir(case_dir, model_dir, obs_dir, years):
+    """A scratch working directory: links to the scripts plus a configured user_inputs_atm.sh."""
+    run_dir = os.path.join(case_dir, "run")
+    if os.path.isdir(run_dir):
+        shutil.rmtree(run_dir)
+    os.makedirs(run_dir)
+    for name in os.listdir(REPO_DIR):
+        if name in ("user_inputs_atm.sh", "output_data", ".git", "__pycache__") or name.startswith("bench"):
+            continue
+        os.symlink(os.path.join(REPO_DIR, name), os.path.join(run_dir, name))
+
+    end_year = START_YEAR + years - 1
+    with open(os.path.join(REPO_DIR, "user_inputs_atm.sh")) as fh:
+        text = fh.read()
+    text = configure_inputs(text, {
+        "plev_variables": ",".join(synthetic_data.DEFAULT_PLEV_VARIABLES),
+        "no_plev_variables": ",".join(synthetic_data.DEFAULT_NO_PLEV_VARIABLES),
+        "plot_dir": os.path.join(case_dir, "plots"),
+        "netcdf_dir_model1": model_dir,
+        "start_year_model1": START_YEAR,
+        "end_year_model1": end_year,
+        "output_prefix_model1": MODEL_PREFIX,
+        "netcdf_dir_model2": "",
+        "start_year_model2": "",
+        "end_year_model2": "",
+        "obs_data_dir": obs_dir,
+        "start_year_obs": START_YEAR,
+        "end_year_obs": end_year,
+        "season": SEASON,
+    })
+    with open(os.path.join(run_dir, "user_inputs_atm.sh"), "w") as fh:
+        fh.write(text)
+    os.makedirs(os.path.join(run_dir, "output_data"), exist_ok=True)
+    return run_dir
+
+
+def run_stage(run_dir, log_path, commands):
+    """
+    Run shell commands in the run directory with the user inputs exported, as
+    the wrapper does. Returns (wall seconds, child CPU seconds, ok).
+    """
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    ok = True
+    with open(log_path, "w") as log:
+        for command in commands:
+            script = "set -a; source ./user_inputs_atm.sh; set +a; " + command
+            result = subprocess.run(["bash", "-c", script], cwd=run_dir, stdout=log, stderr=subprocess.STDOUT,
+                                    stdin=subprocess.DEVNULL)
+            if result.returncode != 0:
+                ok = False
+                break
+    wall = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return wall, cpu, ok
+
+
+def stage_commands(stage, run_dir, years):
+    """Shell commands making up one stage, mirroring the wrapper's calls."""
+    plev = " ".join(synthetic_data.DEFAULT_PLEV_VARIABLES)
+    no_plev = " ".join(synthetic_data.DEFAULT_NO_PLEV_VARIABLES)
+    end_year = START_YEAR + years - 1
+    if stage == "model":
+        return [
+            f'bash ./process_model_data_plev.sh {plev} {SEASON} "$netcdf_dir_model1" {START_YEAR} {end_year} {MODEL_PREFIX}',
+            f'bash ./process_model_data_no_plev.sh {no_plev} {SEASON} "$netcdf_dir_model1" {START_YEAR} {end_year} {MODEL_PREFIX}',
+        ]
+    if stage == "obs":
+        return [f'bash ./observation_data_processing_atm.sh {plev} "<SEP>" {no_plev} "$obs_data_dir" '
+                f'{START_YEAR} {end_year} {SEASON}']
+    if stage in ("regrid", "bias"):
+        commands = []
+        grid = f"output_data/{MODEL_PREFIX}_grid.txt"
+        if stage == "regrid":
+            commands.append(f"cdo griddes output_data/{MODEL_PREFIX}_annual_mean_tas_no_plev.nc > {grid}")
+        for variables, suffix in ((synthetic_data.DEFAULT_PLEV_VARIABLES, "_plev"),
+                                  (synthetic_data.DEFAULT_NO_PLEV_VARIABLES, "_no_plev")):
+            for var in variables:
+                obs_var = synthetic_data.VARIABLE_MAPPING.get(var, var)
+                for period, final in (("annual", "annual"), (SEASON, SEASON)):
+                    regridded = f"output_data/obs_{period}_mean_{obs_var}_regridded.nc"
+                    if stage == "regrid":
+                        commands.append(f"cdo -O remapbil,{grid} -selvar,{obs_var} "
+                                        f"output_data/final_obs_{final}_mean_{obs_var}.nc {regridded}")
+                    else:
+                        model = f"output_data/{MODEL_PREFIX}_{period}_mean_{var}{suffix}.nc"
+                        commands.append(f"cdo -O sub {model} -chname,{obs_var},{var} {regridded} "
+                                        f"output_data/bench_bias_{period}_{var}.nc")
+        return commands
+    if stage == "plotting":
+        return [f'bash ./plotting_functions_new.sh {plev} "<SEP>" {no_plev} {SEASON} "$projection" "$lat_range" '
+                f'"$lon_range" output_data/{MODEL_PREFIX} output_data/final_obs_']
+    if stage == "html_pdf":
+        plots = os.path.join(os.path.dirname(run_dir), "plots")
+        return [f'mkdir -p "{plots}" && find . -maxdepth 2 -name "*.png" -exec cp {{}} "{plots}/" \\; && '
+                f'for img in "{plots}"/*.png; do echo "$img"; basename "$img"; done > "{plots}/image_list.txt" && '
+                f'python3 create_plot_html.py "{plots}/image_list.txt" "{plots}/plots_overview.html"']
+    raise ValueError(f"Unknown stage '{stage}'")
+
+
+def benchmark_case(work_dir, grid, years, stages):
+    nlon, nlat = synthetic_data.parse_grid(grid)
+    case = f"{grid}_{years}y"
+    case_dir = os.path.abspath(os.path.join(work_dir, case))
+    model_dir = os.path.join(case_dir, "model")
+    obs_dir = os.path.join(case_dir, "obs")
+    log_dir = os.path.join(case_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    end_year = START_YEAR + years - 1
+    if not glob.glob(os.path.join(model_dir, "*.nc")):
+        print(f"[{case}] Generating synthetic model data...")
+        synthetic_data.generate_model(model_dir, START_YEAR, end_year, nlon, nlat)
+    if not glob.glob(os.path.join(obs_dir, "*.nc")):
+        print(f"[{case}] Generating synthetic observation data...")
+        synthetic_data.generate_obs(obs_dir, START_YEAR, end_year, nlon * OBS_REFINEMENT, nlat * OBS_REFINEMENT)
+
+    run_dir = prepare_run_dir(case_dir, model_dir, obs_dir, years)
+    row = {"grid": grid, "years": years}
+    for stage in stages:
+        wall, cpu, ok = run_stage(run_dir, os.path.join(log_dir, f"{stage}.log"),
+                                  stage_commands(stage, run_dir, years))
+        row[f"{stage}_s"] = wall
+        row[f"{stage}_cpu_s"] = cpu
+        row[f"{stage}_ok"] = ok
+        status = "ok" if ok else f"FAILED (see {log_dir}/{stage}.log)"
+        print(f"[{case}] {stage:10s} {wall:9.2f} s wall {cpu:9.2f} s cpu  {status}")
+    return row
+
+
+def print_table(rows, stages):
+    header = f"{'grid':>10s} {'years':>5s}" + "".join(f" {stage:>10s}" for stage in stages) + f" {'total':>10s}"
+    print(header)
+    for row in rows:
+        cells = []
+        total = 0.0
+        for stage in stages:
+            total += row[f"{stage}_s"]
+            mark = "" if row[f"{stage}_ok"] else "!"
+            cells.append(f" {row[f'{stage}_s']:9.2f}{mark or ' '}")
+        print(f"{row['grid']:>10s} {row['years']:5d}" + "".join(cells) + f" {total:10.2f}")
+    print("Times in seconds of wall time; '!' marks a stage that failed.")
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("Usage: python benchmark_pipeline.py <work_dir> [grids] [years] [stages]")
+        return 1
+
+    work_dir = argv[1]
+    grids = argv[2].split(",") if len(argv) > 2 and argv[2] else DEFAULT_GRIDS
+    years = [int(y) for y in argv[3].split(",")] if len(argv) > 3 and argv[3] else DEFAULT_YEARS
+    stages = argv[4].split(",") if len(argv) > 4 and argv[4] else STAGES
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        print(f"Error: Unknown stage(s) {', '.join(unknown)}. Available: {', '.join(STAGES)}")
+        return 1
+
+    os.makedirs(work_dir, exist_ok=True)
+    rows = [benchmark_case(work_dir, grid, count, stages) for grid in grids for count in years]
+
+    print_table(rows, stages)
+    csv_path = os.path.join(work_dir, "benchmark_pipeline.csv")
+    with open(csv_path, "w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Results written to {csv_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
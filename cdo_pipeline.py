@@ -0,0 +1,82 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Fusing consecutive CDO steps into one chained cdo call.
+#
+# A pipeline lists CDO operators in the order they are applied. Operators that
+# read several inputs (mergetime, cat, merge, ...) split it: the steps before
+# the first of them are applied to each input on its own, the steps after it
+# to the combined stream. The fused arguments are those of a single call,
+#
+#   cdo [options] <last> -<...> -<combine> -<first> <input1> -<first> <input2> ... <output>
+#
+# so no intermediate file is written between the steps. The processing
+# scripts use it in place of per-file selvar/sellevel temporaries.
+#
+# Usage:
+#   python cdo_pipeline.py chain <operator> [<operator> ...] -- <input> [<input> ...]
+#     prints the fused arguments one per line (read with mapfile), to be run as
+#     cdo [options] "${args[@]}" <output>
+#
+# ==============================================================================
+
+import sys
+
+# Operators that read any number of inputs
+COMBINING_OPERATORS = ("mergetime", "cat", "merge", "copy", "ensmean", "ensstd", "ensmin", "ensmax")
+
+
+def operator_name(op):
+    return op.lstrip("-").split(",", 1)[0]
+
+
+def fuse(operators, inputs):
+    """Arguments of one cdo call applying operators (in order) to inputs."""
+    ops = [op.lstrip("-") for op in operators if op.lstrip("-")]
+    if not ops:
+        raise ValueError("A pipeline needs at least one operator")
+    if not inputs:
+        raise ValueError("A pipeline needs at least one input")
+    split = next((i for i, op in enumerate(ops) if operator_name(op) in COMBINING_OPERATORS), None)
+    if split is None:
+        if len(inputs) != 1:
+            raise ValueError("Several inputs need a combining operator ("
+                             + ", ".join(COMBINING_OPERATORS) + ")")
+        each, combined = ops, []
+    else:
+        each, combined = ops[:split], ops[split:]
+
+    args = list(reversed(combined))
+    for path in inputs:
+        args.extend(reversed(each))
+        args.append(path)
+        if not combined:
+            break
+    # Every operator but the outermost is chained with a leading "-"
+    return [arg if i == 0 or arg in inputs else "-" + arg for i, arg in enumerate(args)]
+
+
+def main(argv):
+    if len(argv) >= 5 and argv[1] == "chain" and "--" in argv[2:]:
+        split = argv.index("--", 2)
+        try:
+            args = fuse(argv[2:split], argv[split + 1:])
+        except ValueError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        print("\n".join(args))
+        return 0
+    print("Usage: python cdo_pipeline.py chain <operator> [<operator> ...] -- <input> [<input> ...]")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
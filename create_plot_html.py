@@ -11,7 +11,10 @@
 
 import sys
 import os
-from weasyprint import HTML, CSS
+from html import escape
+import plot_profiling
+import report_thumbnails
+import report_pdf
 
 if len(sys.argv) != 3:
     print("Usage: python create_plot_html.py <image_details_file> <output_html_file>")
@@ -22,8 +25,50 @@ imglistfile = sys.argv[1]
 outhtmlfile = sys.argv[2]
 outpdf_file = outhtmlfile.replace(".html", ".pdf")  # Generate PDF filename
 
+plot_profiling.phase_start("html")
+plot_profiling.add_output(outhtmlfile)
+
 #============================================================
 # HTML Generation with Captions
+# Lazy-loaded thumbnails (cached by image hash) linking to the full plots,
+# grouped by variable and season. Only entries whose image changed are rebuilt.
+thumbnail_width = int(os.environ.get("thumbnail_width") or report_thumbnails.DEFAULT_WIDTH)
+html_dir = os.path.dirname(os.path.abspath(outhtmlfile))
+thumb_dir = os.path.splitext(os.path.abspath(outhtmlfile))[0] + "_thumbnails"
+
+# Read image details file
+with open(imglistfile, 'r') as file:
+    lines = file.readlines()
+
+entries = []
+for i in range(0, len(lines) - 1, 2):
+    entries.append((lines[i].strip(), lines[i + 1].strip()))
+
+cached = report_thumbnails.load_index(thumb_dir)
+info, regenerated = report_thumbnails.update_thumbnails([img for img, _ in entries], thumb_dir,
+                                                        thumbnail_width, cached)
+
+groups = {}
+rebuilt = 0
+for img_file, caption in entries:
+    entry = info.get(img_file)
+    if entry is None:
+        continue
+    key = [entry["hash"], caption, entry.get("thumb")]
+    if entry.get("fragment_key") != key:
+        if entry.get("thumb"):
+            thumb = os.path.relpath(os.path.join(thumb_dir, entry["thumb"]), html_dir)
+            size = f' width="{entry["width"]}" height="{entry["height"]}"'
+        else:
+            thumb, size = img_file, ""
+        entry["fragment"] = (f'  <li><a href="{escape(img_file)}"><img src="{escape(thumb)}"{size} loading="lazy" '
+                             f'decoding="async" alt="{escape(caption)}"></a> '
+                             f'<a href="{escape(img_file)}" class="caption">{escape(caption)}</a></li>\n')
+        entry["fragment_key"] = key
+        rebuilt += 1
+    variable, season = report_thumbnails.classify(img_file)
+    groups.setdefault(variable, {}).setdefault(season, []).append(entry["fragment"])
+
 html_content = """<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -46,6 +91,7 @@ html_content = """<!DOCTYPE html>
         img {
             max-width: 600px;
             max-height: 600px;
+            height: auto;
             margin-right: 20px;
         }
         .caption {
@@ -53,93 +99,54 @@ html_content = """<!DOCTYPE html>
             color: #333;
             text-decoration: none;
         }
+        nav a {
+            margin-right: 12px;
+        }
     </style>
 </head>
 <body>
     <h1>Plots</h1>
-    <ul>
 """
 
-# Read image details file
-with open(imglistfile, 'r') as file:
-    lines = file.readlines()
-
-# Process images for HTML (Pairs: Image File + Caption)
-for i in range(0, len(lines) - 1, 2):
-    img_file = lines[i].strip()
-    caption = lines[i + 1].strip()
-
-    html_content += f'  <li><a href="{img_file}"><img src="{img_file}" alt="{caption}"></a> <a href="{img_file}" class="caption">{caption}</a></li>\n'
+variables = sorted(groups, key=lambda name: (name == "other", name))
+html_content += "    <nav>" + "".join(f'<a href="#var-{escape(name)}">{escape(name)}</a>' for name in variables) + "</nav>\n"
+for variable in variables:
+    html_content += f'    <h2 id="var-{escape(variable)}">{escape(variable)}</h2>\n'
+    seasons = sorted(groups[variable], key=lambda name: (name != "annual", name))
+    for season in seasons:
+        if season:
+            html_content += f"    <h3>{escape(season)}</h3>\n"
+        html_content += "    <ul>\n" + "".join(groups[variable][season]) + "    </ul>\n"
 
 html_content += """
-    </ul>
 </body>
 </html>
 """
 
 # Save HTML output with captions
-with open(outhtmlfile, 'w') as file:
+tmp_html = f"{outhtmlfile}.tmp.{os.getpid()}"
+with open(tmp_html, 'w') as file:
     file.write(html_content)
+os.replace(tmp_html, outhtmlfile)
+
+report_thumbnails.save_index(thumb_dir, info)
+report_thumbnails.prune_thumbnails(thumb_dir, {entry["thumb"] for entry in info.values() if entry.get("thumb")})
 
-print(f"✅ HTML file created: {outhtmlfile}")
+print(f"✅ HTML file created: {outhtmlfile} ({regenerated} thumbnails and {rebuilt} entries regenerated)")
 
 #============================================================
 # PDF Generation (One Image Per A4 Page, Caption from Filename)
 #============================================================
-pdf_html_content = """<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <title>Plots (PDF Version)</title>
-    <style>
-        @page {
-            size: A4 portrait;
-            margin: 20px;
-        }
-        body {
-            font-family: Arial, sans-serif;
-            text-align: center;
-        }
-        .caption {
-            font-size: 16px;
-            font-weight: bold;
-            margin-bottom: 10px;
-        }
-        img {
-            max-width: 100%;
-            max-height: 100%;
-            display: block;
-            margin: auto;
-        }
-    </style>
-</head>
-<body>
-"""
-
-# Process images for PDF (one per page, caption from filename without extension)
-for i in range(0, len(lines) - 1, 2):
-    img_file = lines[i].strip()
-    img_filename = os.path.splitext(os.path.basename(img_file))[0]  # **Fix: Remove file extension**
-
-    pdf_html_content += f'<div style="page-break-after: always;">'
-    pdf_html_content += f'<div class="caption">{img_filename}</div>'  # Caption without extension
-    pdf_html_content += f'<img src="{img_file}" alt="Plot"></div>\n'
-
-pdf_html_content += """
-</body>
-</html>
-"""
-
-# Temporary HTML file for PDF generation
-temp_pdf_html = "temp_pdf_generation.html"
-with open(temp_pdf_html, 'w') as file:
-    file.write(pdf_html_content)
-
-# Convert temporary HTML to PDF
+# Pages are rendered in parallel and cached by image hash (see report_pdf.py);
+# only pages of plots that changed are rendered again.
+plot_profiling.phase_start("pdf_conversion")
+pdf_image_width = int(os.environ.get("pdf_image_width") or 0) or None
+page_dir = os.path.splitext(os.path.abspath(outpdf_file))[0] + "_pages"
+pdf_pages = [(img_file, report_pdf.caption_for(img_file), info[img_file]["hash"])
+             for img_file, _ in entries if img_file in info]
 try:
-    HTML(temp_pdf_html).write_pdf(outpdf_file)
-    print(f"✅ PDF file created (each image on a separate page with filename as caption): {outpdf_file}")
-    os.remove(temp_pdf_html)  # Clean up temporary HTML file
+    rendered = report_pdf.build_pdf(pdf_pages, outpdf_file, page_dir, pdf_image_width)
+    print(f"✅ PDF file created (each image on a separate page with filename as caption): {outpdf_file} "
+          f"({rendered} of {len(pdf_pages)} pages rendered)")
 except Exception as e:
     print(f"❌ Error generating PDF: {e}")
-
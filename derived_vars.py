@@ -0,0 +1,201 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Derived variables, declared as expressions of the model variables.
+#
+# A derived variable is reduced by reduce_atm.py in the same pass as its source
+# variables: each monthly field of the sources is read once, and the expression
+# is evaluated on it in memory before it is summed into the derived variable's
+# products (<prefix>_annual_mean_rnet_no_plev.nc, ...). No processed product is
+# read again to derive it.
+#
+# derived_variables in user_inputs_atm.sh lists the derived variables of a run,
+# separated by ";": names from DERIVED below, or new declarations
+# "<name>=<expression>". Expressions combine source variables of the same
+# monthly files with + - * / **, numbers and the functions
+#
+#   hypot(x, y), sqrt(x), abs(x), exp(x), log(x), maximum(x, y), minimum(x, y)
+#   level(x, hPa)   the field of source variable x at one pressure level
+#
+# e.g. "rnet=rsdt - rsut - rlut" or "shear=level(ua, 200) - level(ua, 850)".
+# Missing points of any source are missing in the result. A derived variable
+# is reduced by the processing script of its sources (plev or no_plev), and
+# only with reduction_engine="python".
+#
+# Usage:
+#   python derived_vars.py select <variable> [<variable> ...]
+#   python derived_vars.py list
+#
+# ==============================================================================
+
+import sys
+import os
+import ast
+import numpy as np
+
+# name: (expression, attributes of the product)
+DERIVED = {
+    "rnet": ("rsdt - rsut - rlut",
+             {"long_name": "Net downward radiation at the top of the atmosphere", "units": "W m-2"}),
+    "speed": ("hypot(ua, va)", {"long_name": "Wind speed", "units": "m s-1"}),
+    "shear": ("hypot(level(ua, 200) - level(ua, 850), level(va, 200) - level(va, 850))",
+              {"long_name": "Magnitude of the 200-850 hPa vertical wind shear", "units": "m s-1"}),
+}
+
+FUNCTIONS = {
+    "hypot": np.hypot,
+    "sqrt": np.sqrt,
+    "abs": np.abs,
+    "exp": np.exp,
+    "log": np.log,
+    "maximum": np.maximum,
+    "minimum": np.minimum,
+}
+OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+    ast.Pow: np.power,
+}
+
+
+class Expression:
+    """A parsed derived-variable expression."""
+
+    def __init__(self, name, text, attrs=None):
+        self.name = name
+        self.text = text
+        self.attrs = dict(attrs or {"long_name": text})
+        try:
+            self.tree = ast.parse(text, mode="eval").body
+        except SyntaxError as exc:
+            raise ValueError(f"Invalid expression for {name}: {text} ({exc.msg})")
+        self.sources = []
+        # Whether a source is used whole (keeping its level axis) or only at levels
+        self.keeps_levels = False
+        self._check(self.tree)
+        if not self.sources:
+            raise ValueError(f"The expression of {name} uses no variable: {text}")
+
+    def _source(self, name):
+        if name not in self.sources:
+            self.sources.append(name)
+
+    def _check(self, node, whole=True):
+        if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            self._check(node.left)
+            self._check(node.right)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            self._check(node.operand)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            pass
+        elif isinstance(node, ast.Name):
+            self._source(node.id)
+            self.keeps_levels = self.keeps_levels or whole
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            if node.func.id == "level":
+                if len(node.args) != 2 or not isinstance(node.args[0], ast.Name) \
+                        or not isinstance(node.args[1], ast.Constant):
+                    raise ValueError(f"level() takes a variable and a level in hPa, in {self.text}")
+                self._source(node.args[0].id)
+            elif node.func.id in FUNCTIONS:
+                for arg in node.args:
+                    self._check(arg)
+            else:
+                raise ValueError(f"Unknown function {node.func.id}() in {self.text}")
+        else:
+            raise ValueError(f"Unsupported syntax in the expression of {self.name}: {self.text}")
+
+    def evaluate(self, fields, level_axis=None, level_values=None):
+        """
+        The derived field from the source fields (name: float64 array, NaN
+        where missing). level() selects along level_axis by level_values
+        (Pa or hPa, see domain.level_indices).
+        """
+        import domain
+
+        def walk(node):
+            if isinstance(node, ast.BinOp):
+                return OPERATORS[type(node.op)](walk(node.left), walk(node.right))
+            if isinstance(node, ast.UnaryOp):
+                value = walk(node.operand)
+                return -value if isinstance(node.op, ast.USub) else value
+            if isinstance(node, ast.Constant):
+                return float(node.value)
+            if isinstance(node, ast.Name):
+                return fields[node.id]
+            if node.func.id == "level":
+                if level_axis is None:
+                    raise ValueError(f"{node.args[0].id} has no pressure levels for level() in {self.name}")
+                index = domain.level_indices(level_values, (float(node.args[1].value),))[0]
+                return np.take(fields[node.args[0].id], index, axis=level_axis)
+            return FUNCTIONS[node.func.id](*(walk(arg) for arg in node.args))
+
+        with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+            result = np.asarray(walk(self.tree), dtype=np.float64)
+        result[~np.isfinite(result)] = np.nan
+        return result
+
+
+def declared():
+    """The derived variables of the run (derived_variables), as {name: Expression}."""
+    expressions = {}
+    for entry in os.environ.get("derived_variables", "").split(";"):
+        entry = entry.strip()
+        if not entry:
+            continue
+        if "=" in entry:
+            name, text = (part.strip() for part in entry.split("=", 1))
+            expressions[name] = Expression(name, text)
+        elif entry in DERIVED:
+            expressions[entry] = Expression(entry, *DERIVED[entry])
+        else:
+            raise ValueError(f"Unknown derived variable '{entry}' (known: {', '.join(DERIVED)})")
+    return expressions
+
+
+def expression(name):
+    """The Expression of a derived variable, or None for a source variable."""
+    expressions = declared()
+    if name in expressions:
+        return expressions[name]
+    if name in DERIVED:
+        return Expression(name, *DERIVED[name])
+    return None
+
+
+def select(variables):
+    """The declared derived variables whose sources are all among variables."""
+    return [name for name, expr in declared().items()
+            if name not in variables and all(source in variables for source in expr.sources)]
+
+
+def main(argv):
+    try:
+        if len(argv) >= 2 and argv[1] == "select":
+            print(" ".join(select(argv[2:])))
+            return 0
+        if len(argv) == 2 and argv[1] == "list":
+            for name, expr in {**{name: Expression(name, *DERIVED[name]) for name in DERIVED},
+                               **declared()}.items():
+                print(f"{name} = {expr.text}\t({', '.join(expr.sources)})")
+            return 0
+    except ValueError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+    print("Usage: python derived_vars.py select <variable> [<variable> ...]\n"
+          "       python derived_vars.py list")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,252 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Domain and pressure-level push-down for regional runs.
+#
+# With domain_pushdown=true in user_inputs_atm.sh, every input is cut to the
+# configured lat_range/lon_range, widened by domain_margin degrees so
+# regridding and contouring still see the points around the edges, at its
+# first read. Pressure-level variables are also cut to the levels the
+# diagnostics use (plev_levels, or the defaults below). Processing, regridding
+# and bias computation then only ever handle the box and levels a run needs.
+#
+# The selection is given to CDO as operators chained in front of the first
+# read, and applied by reduce_atm.py and virtual_dataset.py as index slices.
+#
+# Usage:
+#   python domain.py cdo-ops <variable> <plev|no_plev> [<sample_input.nc>]
+#   python domain.py grid-ops <cdo_grid_description>
+#
+# ==============================================================================
+
+import sys
+import os
+import numpy as np
+
+LAT_NAMES = ("lat", "latitude", "LATITUDE")
+LON_NAMES = ("lon", "longitude", "LONGITUDE")
+LEVEL_NAMES = ("plev", "lev", "level", "pressure_level")
+DEFAULT_MARGIN = 5.0
+
+# Pressure levels (hPa) the diagnostics of a variable use; variables not
+# listed need all levels (vertical profiles and level-latitude sections).
+REQUIRED_LEVELS = {
+    "hght": (850, 200),
+}
+
+
+def pushdown_enabled():
+    return os.environ.get("domain_pushdown", "false") == "true"
+
+
+def _range(text, name):
+    try:
+        low, high = (float(value) for value in text.split(","))
+    except ValueError:
+        raise ValueError(f"Invalid {name} '{text}', expected '<min>,<max>'")
+    return low, high
+
+
+def domain_box(margin=None):
+    """
+    (lon_min, lon_max, lat_min, lat_max) of lat_range/lon_range plus the
+    margin, or None for a global domain or when push-down is off.
+    """
+    if not pushdown_enabled():
+        return None
+    if margin is None:
+        margin = float(os.environ.get("domain_margin") or DEFAULT_MARGIN)
+    lat_min, lat_max = _range(os.environ.get("lat_range", "-90,90"), "lat_range")
+    lon_min, lon_max = _range(os.environ.get("lon_range", "0,360"), "lon_range")
+    if lon_max < lon_min:
+        lon_max += 360.0  # a range across the dateline/meridian, e.g. "350,40"
+    lat_min, lat_max = max(lat_min - margin, -90.0), min(lat_max + margin, 90.0)
+    if lon_max - lon_min + 2 * margin >= 360.0:
+        lon_min, lon_max = 0.0, 360.0
+    else:
+        lon_min, lon_max = lon_min - margin, lon_max + margin
+    if lat_min <= -90.0 and lat_max >= 90.0 and lon_max - lon_min >= 360.0:
+        return None
+    return lon_min, lon_max, lat_min, lat_max
+
+
+def required_levels(variable):
+    """Pressure levels (hPa) to keep for a variable, or None for all."""
+    if not pushdown_enabled():
+        return None
+    configured = os.environ.get("plev_levels", "")
+    if configured:
+        return tuple(float(level) for level in configured.split(","))
+    return REQUIRED_LEVELS.get(variable)
+
+
+def _number(value):
+    return f"{value:g}"
+
+
+def level_scale(path):
+    """100 when the pressure levels of a file are in Pa, 1 when in hPa."""
+    from netCDF4 import Dataset
+    with Dataset(path) as nc:
+        for name in LEVEL_NAMES:
+            if name in nc.variables:
+                values = np.asarray(nc.variables[name][:], dtype=np.float64)
+                return 100.0 if values.size and np.nanmax(np.abs(values)) > 2000.0 else 1.0
+    return 1.0
+
+
+def cdo_ops(variable, level_type, sample=None):
+    """
+    CDO operators that cut an input to the domain and levels of a variable.
+    Levels are given to sellevel in the units of the sample input (Pa or hPa).
+    """
+    ops = []
+    box = domain_box()
+    if box is not None:
+        ops.append("-sellonlatbox," + ",".join(_number(value) for value in box))
+    levels = required_levels(variable) if level_type == "plev" else None
+    if levels:
+        scale = level_scale(sample) if sample else 1.0
+        ops.append("-sellevel," + ",".join(_number(level * scale) for level in levels))
+    return ops
+
+
+def parse_cdo_ops(ops):
+    """(box, levels) of operators produced by cdo_ops."""
+    box, levels = None, None
+    for op in ops:
+        name, _, args = op.lstrip("-").partition(",")
+        values = tuple(float(value) for value in args.split(","))
+        if name == "sellonlatbox":
+            box = values
+        elif name == "sellevel":
+            # Back to hPa when given in Pa (level_indices recognises either)
+            levels = tuple(value / 100.0 if value > 2000.0 else value for value in values)
+    return box, levels
+
+
+def grid_box(path, margin=None):
+    """(lon_min, lon_max, lat_min, lat_max) of a CDO lonlat grid description plus a margin."""
+    settings = {}
+    with open(path) as fh:
+        for line in fh:
+            key, sep, value = line.partition("=")
+            if sep:
+                settings[key.strip()] = value.strip().strip('"')
+    margin = DEFAULT_MARGIN if margin is None else margin
+    try:
+        xfirst, xinc, xsize = float(settings["xfirst"]), float(settings["xinc"]), int(settings["xsize"])
+        yfirst, yinc, ysize = float(settings["yfirst"]), float(settings["yinc"]), int(settings["ysize"])
+    except KeyError as exc:
+        raise ValueError(f"{path} has no regular lonlat grid ({exc.args[0]} missing)")
+    xlast, ylast = xfirst + xinc * (xsize - 1), yfirst + yinc * (ysize - 1)
+    return (min(xfirst, xlast) - margin, max(xfirst, xlast) + margin,
+            max(min(yfirst, ylast) - margin, -90.0), min(max(yfirst, ylast) + margin, 90.0))
+
+
+# ------------------------------------------------------------------------------
+# Index selection for Python readers
+# ------------------------------------------------------------------------------
+
+def _as_index(indices):
+    """A slice when the indices are contiguous and increasing, else the index array."""
+    if len(indices) and np.all(np.diff(indices) == 1):
+        return slice(int(indices[0]), int(indices[-1]) + 1)
+    return np.asarray(indices)
+
+
+def lon_indices(lon, lon_min, lon_max):
+    """Indices of longitudes inside [lon_min, lon_max] (any convention), west to east."""
+    span = lon_max - lon_min
+    if span >= 360.0:
+        return np.arange(len(lon))
+    offset = np.mod(np.asarray(lon, dtype=np.float64) - lon_min, 360.0)
+    inside = np.nonzero(offset <= span)[0]
+    return inside[np.argsort(offset[inside], kind="stable")]
+
+
+def lat_indices(lat, lat_min, lat_max):
+    lat = np.asarray(lat, dtype=np.float64)
+    return np.nonzero((lat >= lat_min) & (lat <= lat_max))[0]
+
+
+def level_indices(plev, levels_hpa):
+    """Indices of the requested levels; level coordinates in Pa are recognised."""
+    plev = np.asarray(plev, dtype=np.float64)
+    scale = 100.0 if plev.size and np.nanmax(np.abs(plev)) > 2000.0 else 1.0
+    wanted = np.asarray(levels_hpa, dtype=np.float64) * scale
+    found = np.nonzero(np.isclose(plev[:, np.newaxis], wanted[np.newaxis, :]).any(axis=1))[0]
+    if len(found) < len(wanted):
+        missing = [level for level in levels_hpa if not np.isclose(plev, level * scale).any()]
+        raise ValueError(f"Pressure level(s) {', '.join(_number(m) for m in missing)} hPa not in the input")
+    return found
+
+
+def selection(dims, coords, box=None, levels=None):
+    """
+    {dimension: index} cutting the named dimensions to a box and levels.
+
+    coords maps dimension names to coordinate values; dimensions without a
+    coordinate, or not recognised as lat/lon/level, are left whole.
+    """
+    chosen = {}
+    for dim in dims:
+        values = coords.get(dim)
+        if values is None:
+            continue
+        if box is not None and dim in LON_NAMES:
+            chosen[dim] = _as_index(lon_indices(values, box[0], box[1]))
+        elif box is not None and dim in LAT_NAMES:
+            chosen[dim] = _as_index(lat_indices(values, box[2], box[3]))
+        elif levels and dim in LEVEL_NAMES:
+            chosen[dim] = _as_index(level_indices(values, levels))
+    for dim, index in chosen.items():
+        if not isinstance(index, slice) and index.size == 0:
+            raise ValueError(f"The domain selects no points along '{dim}'")
+    return chosen
+
+
+def apply(data, dims, chosen):
+    """
+    data cut along the chosen dimensions. Slices keep memmap inputs as views;
+    index arrays (a box across the dateline, scattered levels) copy.
+    """
+    for axis, dim in enumerate(dims):
+        index = chosen.get(dim)
+        if index is not None:
+            key = (slice(None),) * axis + (index,)
+            data = data[key]
+    return data
+
+
+def main(argv):
+    if len(argv) in (4, 5) and argv[1] == "cdo-ops":
+        try:
+            print(" ".join(cdo_ops(argv[2], argv[3], argv[4] if len(argv) == 5 else None)))
+        except (OSError, ValueError) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        return 0
+    if len(argv) == 3 and argv[1] == "grid-ops":
+        try:
+            box = grid_box(argv[2])
+        except (OSError, ValueError) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        print("-sellonlatbox," + ",".join(_number(value) for value in box))
+        return 0
+    print("Usage: python domain.py cdo-ops <variable> <plev|no_plev> [<sample_input.nc>]\n"
+          "       python domain.py grid-ops <cdo_grid_description>")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,354 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Comparison of any number of models (ensemble_models in user_inputs_atm.sh)
+# against the observations.
+#
+# The annual or seasonal mean of each model is regridded to the grid of the
+# first model, the observations included. Bilinear weights are computed once
+# per source grid and shared by every field on that grid. The fields are
+# stacked along a "model" dimension, so every model - obs bias, every pairwise
+# difference and the ensemble mean and spread are single array operations.
+#
+# Writes output_data/ensemble_<var>_<period>.nc (the stacked fields and all
+# statistics) and, for each pressure level or for the single-level variable,
+# an overview figure (obs, ensemble mean and spread, each model and its bias)
+# and a pairwise-difference figure, laid out for the number of models.
+#
+# Usage:
+#   python ensemble_compare.py <variable> <plev|no_plev> <annual|season> <output_dir> <plot_dir> <projection> <model_prefix> [<model_prefix> ...] [--levels=850,200]
+#
+# ==============================================================================
+
+import sys
+import os
+import math
+import itertools
+import numpy as np
+import xarray as xr
+
+import domain
+import plot_profiling
+import plot_manifest
+from precision import to_storage
+from product_store import open_product
+from reduce_atm import OBS_NAMES, SEASON_MONTHS, model_products, obs_products
+
+# Unit conversions applied by the special_plot_*.sh scripts
+MODEL_SCALE = {"pr": 86400.0, "evspsbl": 86400.0}
+OBS_SCALE = {"evspsbl": -1000.0, "hght": 1.0 / 9.80665, "slp": 0.01}
+
+MEAN_CMAP = {"pr": "YlGnBu", "evspsbl": "YlGnBu"}
+BIAS_CMAP = {"pr": "BrBG", "evspsbl": "BrBG"}
+DEFAULT_LEVELS = (850, 200)
+
+
+# ------------------------------------------------------------------------------
+# Regridding
+# ------------------------------------------------------------------------------
+
+def _coord_name(ds_or_da, names):
+    for name in names:
+        if name in ds_or_da.coords or name in ds_or_da.dims:
+            return name
+    raise ValueError(f"No coordinate among {', '.join(names)}")
+
+
+def _axis_weights(source, target, periodic):
+    """
+    (i0, i1, w) such that target = (1 - w) * source[i0] + w * source[i1].
+    Targets outside a non-periodic source axis get w = NaN.
+    """
+    source = np.asarray(source, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    order = np.argsort(source)
+    ordered = source[order]
+    n = len(ordered)
+    if periodic:
+        base = ordered[0]
+        extended = np.append(ordered, ordered[0] + 360.0)
+        x = base + np.mod(target - base, 360.0)
+        j = np.clip(np.searchsorted(extended, x, side="right") - 1, 0, n - 1)
+        w = (x - extended[j]) / (extended[j + 1] - extended[j])
+        return order[j], order[(j + 1) % n], w
+    j = np.clip(np.searchsorted(ordered, target, side="right") - 1, 0, max(n - 2, 0))
+    j1 = np.minimum(j + 1, n - 1)
+    span = ordered[j1] - ordered[j]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.where(span > 0, (target - ordered[j]) / span, 0.0)
+    outside = (target < ordered[0] - 1e-6) | (target > ordered[-1] + 1e-6)
+    w = np.where(outside, np.nan, np.clip(w, 0.0, 1.0))
+    return order[j], order[j1], w
+
+
+def _is_periodic(lon):
+    lon = np.sort(np.asarray(lon, dtype=np.float64))
+    if len(lon) < 2:
+        return False
+    step = np.median(np.diff(lon))
+    return abs(lon[-1] - lon[0] + step - 360.0) < step / 2
+
+
+class Regridder:
+    """Bilinear regridding of rectilinear lat/lon fields, with weights cached per source grid."""
+
+    def __init__(self, target_lat, target_lon):
+        self.target_lat = np.asarray(target_lat)
+        self.target_lon = np.asarray(target_lon)
+        self.weights = {}
+
+    def weights_for(self, lat, lon):
+        lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+        key = (lat.tobytes(), lon.tobytes())
+        if key not in self.weights:
+            self.weights[key] = (_axis_weights(lat, self.target_lat, False),
+                                 _axis_weights(lon, self.target_lon, _is_periodic(lon)))
+        return self.weights[key]
+
+    def __call__(self, data, lat, lon):
+        """Regrid data (..., lat, lon) given on the lat/lon axes to the target grid."""
+        (y0, y1, wy), (x0, x1, wx) = self.weights_for(lat, lon)
+        data = np.asarray(data, dtype=np.float64)
+        rows = data[..., y0, :] * (1.0 - wy)[:, np.newaxis] + data[..., y1, :] * wy[:, np.newaxis]
+        return rows[..., x0] * (1.0 - wx) + rows[..., x1] * wx
+
+
+# ------------------------------------------------------------------------------
+# Loading and stacking
+# ------------------------------------------------------------------------------
+
+def load_field(path, variable, levels=None):
+    """(values (..., lat, lon), lat, lon, level values or None) of a mean product."""
+    ds = open_product(path)
+    if variable not in ds:
+        raise ValueError(f"{variable} not in {path}")
+    da = ds[variable]
+    for dim in da.dims:
+        if dim in ("time", "valid_time") or (dim not in da.coords and da.sizes[dim] == 1):
+            da = da.isel({dim: 0})
+    lat_name, lon_name = _coord_name(da, domain.LAT_NAMES), _coord_name(da, domain.LON_NAMES)
+    level_name = next((name for name in domain.LEVEL_NAMES if name in da.dims), None)
+    level_values = None
+    if level_name is not None:
+        if levels:
+            # In the requested order, labelled in hPa whatever the units of the input
+            index = [int(domain.level_indices(da[level_name].values, (level,))[0]) for level in levels]
+            da = da.isel({level_name: index})
+            level_values = np.asarray(levels, dtype=np.float64)
+        else:
+            level_values = da[level_name].values
+        da = da.transpose(level_name, lat_name, lon_name)
+    else:
+        da = da.transpose(lat_name, lon_name)
+    return da.values, da[lat_name].values, da[lon_name].values, level_values
+
+
+def compare(variable, models, obs_path, levels=None):
+    """
+    The stacked comparison Dataset of models ({name: mean product path})
+    against the observation product, on the grid of the first model.
+    """
+    names = list(models)
+    fields = {name: load_field(path, variable, levels) for name, path in models.items()}
+    _, target_lat, target_lon, level_values = fields[names[0]]
+    regrid = Regridder(target_lat, target_lon)
+
+    # Models on the same grid are regridded together with one set of weights
+    groups = {}
+    for name in names:
+        _, lat, lon, _ = fields[name]
+        groups.setdefault((np.asarray(lat).tobytes(), np.asarray(lon).tobytes()), []).append(name)
+    regridded = {}
+    for members in groups.values():
+        _, lat, lon, _ = fields[members[0]]
+        stacked = regrid(np.stack([fields[name][0] for name in members]), lat, lon)
+        regridded.update(zip(members, stacked))
+    stack = np.stack([regridded[name] for name in names]) * MODEL_SCALE.get(variable, 1.0)
+
+    obs_values, obs_lat, obs_lon, _ = load_field(obs_path, OBS_NAMES.get(variable, variable), levels)
+    obs = regrid(obs_values, obs_lat, obs_lon) * OBS_SCALE.get(variable, 1.0)
+
+    pairs = list(itertools.combinations(range(len(names)), 2))
+    first, second = (np.array([pair[i] for pair in pairs], dtype=int) for i in (0, 1))
+    with np.errstate(invalid="ignore"):
+        ensemble_mean = np.nanmean(stack, axis=0)
+        spread = np.nanstd(stack, axis=0, ddof=1) if len(names) > 1 else np.zeros_like(ensemble_mean)
+
+    grid_dims = ("lat", "lon") if level_values is None else ("plev", "lat", "lon")
+    coords = {"model": names, "lat": target_lat, "lon": target_lon,
+              "pair": [f"{names[i]} - {names[j]}" for i, j in pairs]}
+    if level_values is not None:
+        coords["plev"] = level_values
+    ds = xr.Dataset(
+        {
+            "mean": (("model",) + grid_dims, stack),
+            "obs": (grid_dims, obs),
+            "bias": (("model",) + grid_dims, stack - obs),
+            "pairwise_difference": (("pair",) + grid_dims, stack[first] - stack[second]),
+            "ensemble_mean": (grid_dims, ensemble_mean),
+            "ensemble_spread": (grid_dims, spread),
+            "ensemble_mean_bias": (grid_dims, ensemble_mean - obs),
+        },
+        coords=coords,
+        attrs={"variable": variable, "regrid_target": names[0]},
+    )
+    return to_storage(ds)
+
+
+def write_dataset(ds, path):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    ds.to_netcdf(tmp_path)
+    os.replace(tmp_path, path)
+
+
+# ------------------------------------------------------------------------------
+# Plotting
+# ------------------------------------------------------------------------------
+
+def grid_shape(count, max_columns=3):
+    """(rows, columns) of a figure with count panels."""
+    columns = min(max_columns, max(count, 1))
+    return math.ceil(count / columns), columns
+
+
+def contour_levels(arrays, symmetric=False, count=17):
+    values = np.concatenate([np.ravel(a) for a in arrays])
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return None
+    if symmetric:
+        limit = np.percentile(np.abs(values), 98) or 1.0
+        return np.linspace(-limit, limit, count)
+    low, high = np.percentile(values, (2, 98))
+    if high <= low:
+        high = low + 1.0
+    return np.linspace(low, high, count)
+
+
+def plot_panels(panels, lat, lon, projection, output_file, title):
+    """
+    One map per (title, data, levels, cmap) panel, in an automatic grid.
+    Panels sharing a levels array share a colour scale.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import cartopy.crs as ccrs
+
+    proj = getattr(ccrs, projection)()
+    rows, columns = grid_shape(len(panels), 2 if len(panels) > 4 else 3)
+    fig, axes = plt.subplots(rows, columns, figsize=(6 * columns, 4.2 * rows),
+                             subplot_kw={"projection": proj}, squeeze=False)
+    for ax, (panel_title, data, levels, cmap) in zip(axes.flat, panels):
+        contour = ax.contourf(lon, lat, data, levels=levels, cmap=cmap, extend="both",
+                              transform=ccrs.PlateCarree())
+        ax.coastlines()
+        ax.set_title(panel_title)
+        colorbar = fig.colorbar(contour, ax=ax, orientation="horizontal", pad=0.05, fraction=0.05, shrink=0.8)
+        if levels is not None:
+            colorbar.set_ticks(levels[::4])
+            colorbar.ax.set_xticklabels([f"{tick:.3g}" for tick in levels[::4]])
+    for ax in list(axes.flat)[len(panels):]:
+        ax.set_visible(False)
+    fig.suptitle(title)
+    plt.savefig(output_file)
+    plot_manifest.register(output_file)
+    print(f"Plot saved to {output_file}")
+    plt.close(fig)
+
+
+def plot_comparison(ds, variable, period_label, plot_dir, projection):
+    """Overview and pairwise figures of a comparison, for every level."""
+    names = [str(name) for name in ds["model"].values]
+    mean_cmap = MEAN_CMAP.get(variable, "RdYlBu_r")
+    bias_cmap = BIAS_CMAP.get(variable, "RdBu_r")
+    slices = [(None, {})] if "plev" not in ds.dims else \
+        [(level, {"plev": i}) for i, level in enumerate(ds["plev"].values)]
+    outputs = []
+    for level, index in slices:
+        part = ds.isel(index)
+        suffix = "" if level is None else f"_{level:g}hPa"
+        mean_levels = contour_levels([part["obs"].values, part["mean"].values])
+        bias_levels = contour_levels([part["bias"].values], symmetric=True)
+        panels = [("Observation", part["obs"].values, mean_levels, mean_cmap),
+                  ("Ensemble mean", part["ensemble_mean"].values, mean_levels, mean_cmap),
+                  ("Ensemble mean - Obs", part["ensemble_mean_bias"].values, bias_levels, bias_cmap),
+                  ("Ensemble spread", part["ensemble_spread"].values,
+                   contour_levels([part["ensemble_spread"].values]), "viridis")]
+        for i, name in enumerate(names):
+            panels.append((f"{name}", part["mean"].values[i], mean_levels, mean_cmap))
+            panels.append((f"{name} - Obs", part["bias"].values[i], bias_levels, bias_cmap))
+        stem, tail = period_label
+        output_file = os.path.join(plot_dir, f"{variable}_{stem}_comparison_ensemble{suffix}_{projection}{tail}.png")
+        plot_panels(panels, part["lat"].values, part["lon"].values, projection, output_file,
+                    f"{variable}{suffix.replace('_', ' ')} {stem} mean, {len(names)} models")
+        outputs.append(output_file)
+
+        if part.sizes["pair"]:
+            pair_levels = contour_levels([part["pairwise_difference"].values], symmetric=True)
+            panels = [(str(pair), part["pairwise_difference"].values[i], pair_levels, bias_cmap)
+                      for i, pair in enumerate(part["pair"].values)]
+            output_file = os.path.join(
+                plot_dir, f"{variable}_{stem}_comparison_ensemble_pairwise{suffix}_{projection}{tail}.png")
+            plot_panels(panels, part["lat"].values, part["lon"].values, projection, output_file,
+                        f"{variable}{suffix.replace('_', ' ')} {stem} mean, model differences")
+            outputs.append(output_file)
+    return outputs
+
+
+def main(argv):
+    levels = None
+    for arg in argv[1:]:
+        if arg.startswith("--levels="):
+            levels = tuple(float(level) for level in arg.split("=", 1)[1].split(",") if level)
+    argv = [arg for arg in argv if not arg.startswith("--levels=")]
+    if len(argv) < 8:
+        print("Usage: python ensemble_compare.py <variable> <plev|no_plev> <annual|season> <output_dir> "
+              "<plot_dir> <projection> <model_prefix> [<model_prefix> ...] [--levels=850,200]")
+        return 1
+    variable, level_type, period, output_dir, plot_dir, projection = argv[1:7]
+    prefixes = argv[7:]
+    if period != "annual" and period not in SEASON_MONTHS:
+        print(f"Error: Invalid period {period}")
+        return 1
+    if level_type == "plev" and levels is None:
+        levels = DEFAULT_LEVELS
+
+    plot_profiling.phase_start("load")
+    models = {}
+    for prefix in prefixes:
+        path = model_products(output_dir, prefix, variable, level_type)[f"{period}_mean"]
+        if os.path.exists(path):
+            models[prefix] = path
+        else:
+            print(f"Warning: {path} not found, {prefix} left out of the {variable} comparison.")
+    obs_path = obs_products(output_dir, OBS_NAMES.get(variable, variable))[f"{period}_mean"]
+    if not models or not os.path.exists(obs_path):
+        print(f"Error: Nothing to compare for {variable} ({period}).")
+        return 1
+
+    plot_profiling.phase_start("transform")
+    try:
+        ds = compare(variable, models, obs_path, levels if level_type == "plev" else None)
+    except ValueError as exc:
+        print(f"Error: {exc}")
+        return 1
+    write_dataset(ds, os.path.join(output_dir, f"ensemble_{variable}_{period}.nc"))
+
+    plot_profiling.phase_start("render")
+    os.makedirs(plot_dir, exist_ok=True)
+    period_label = ("annual", "") if period == "annual" else ("season", f"_{period}")
+    plot_comparison(ds, variable, period_label, plot_dir, projection)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,174 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Checkpoint journal of a run, for restarting it with --resume.
+#
+# The processing scripts record each unit of work once it is complete: one
+# year of a variable of a dataset (model prefix or "obs"), and the whole
+# variable ("all") once its products are written. An entry holds the size and
+# modification time of the unit's output files and of the inputs it read, and
+# the settings it was made with (period, domain, precision...).
+# The files are flushed to disk before the entry is appended, and an entry cut
+# short by a crash is ignored, so only finished work is ever recorded.
+#
+# A unit is reused on --resume only when its last entry exists, all its files
+# are still there, unchanged, and it was made with the same settings and, when
+# the check lists them, from the same inputs. Anything else, such as a file
+# left by an interrupted step, a changed or added input or a new period, is
+# computed again.
+#
+# The wrapper sets ATM_JOURNAL to output_data/journal.jsonl (JSON lines), and
+# ATM_RESUME=true with --resume; otherwise the journal is started afresh.
+#
+# Usage:
+#   python journal.py record <journal> <dataset> <variable> <unit> <output> [...] [--input=<file> ...] [--setting=<name>=<value> ...]
+#   python journal.py check <journal> <dataset> <variable> <unit> [<output> ...] [--input=<file> ...] [--setting=<name>=<value> ...]
+#   python journal.py prune <journal> <file> [<file> ...]
+#
+# ==============================================================================
+
+import sys
+import os
+import json
+import time
+
+
+def file_state(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def flush(path):
+    """Push a file's data to disk, so a recorded unit survives a power or drive loss."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def record(journal, dataset, variable, unit, outputs, inputs=(), settings=None):
+    """Append a completed unit; its outputs must all exist."""
+    for path in outputs:
+        flush(path)
+    entry = {
+        "dataset": dataset,
+        "variable": variable,
+        "unit": unit,
+        "outputs": {os.path.abspath(path): file_state(path) for path in outputs},
+        "inputs": {os.path.abspath(path): file_state(path) for path in inputs},
+        "settings": settings or {},
+        "time": time.time(),
+    }
+    # One write per entry with O_APPEND, so concurrent model runs do not interleave
+    fd = os.open(journal, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, (json.dumps(entry) + "\n").encode())
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_journal(journal):
+    """Last entry of each (dataset, variable, unit)."""
+    entries = {}
+    try:
+        with open(journal) as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[(entry["dataset"], entry["variable"], entry["unit"])] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def unchanged(files):
+    for path, state in files.items():
+        try:
+            if file_state(path) != state:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def reusable(journal, dataset, variable, unit, outputs=(), inputs=None, settings=None):
+    """
+    The recorded entry of a unit when it can be reused: all its files are
+    unchanged, it covers the given outputs, was made with the given settings
+    and, if inputs are given, read exactly those. None otherwise.
+    """
+    entry = read_journal(journal).get((dataset, variable, unit))
+    if entry is None:
+        return None
+    if any(os.path.abspath(path) not in entry["outputs"] for path in outputs):
+        return None
+    if entry.get("settings", {}) != (settings or {}):
+        return None
+    if inputs is not None and {os.path.abspath(path) for path in inputs} != set(entry["inputs"]):
+        return None
+    if not unchanged(entry["outputs"]) or not unchanged(entry["inputs"]):
+        return None
+    return entry
+
+
+def recorded_files(journal):
+    """Output files of the units in the journal that can still be reused."""
+    files = set()
+    for entry in read_journal(journal).values():
+        if unchanged(entry["outputs"]) and unchanged(entry["inputs"]):
+            files.update(entry["outputs"])
+    return files
+
+
+def prune(journal, paths):
+    """Remove temporary files, except those of recorded units (kept for --resume)."""
+    keep = recorded_files(journal) if journal else set()
+    for path in paths:
+        if os.path.abspath(path) not in keep and os.path.exists(path):
+            os.remove(path)
+
+
+def main(argv):
+    inputs = [arg.split("=", 1)[1] for arg in argv if arg.startswith("--input=")]
+    settings = dict(arg.split("=", 1)[1].partition("=")[::2] for arg in argv if arg.startswith("--setting="))
+    argv = [arg for arg in argv if not arg.startswith(("--input=", "--setting="))]
+    if len(argv) >= 7 and argv[1] == "record":
+        try:
+            record(argv[2], argv[3], argv[4], argv[5], argv[6:], inputs, settings)
+        except OSError as exc:
+            print(f"Error: Cannot record {argv[3]} {argv[4]} {argv[5]} in the journal: {exc}")
+            return 1
+        return 0
+    if len(argv) >= 6 and argv[1] == "check":
+        entry = reusable(argv[2], argv[3], argv[4], argv[5], argv[6:], inputs or None, settings)
+        if entry is None:
+            return 1
+        # The inputs of the unit, for the steps that list them (virtual index)
+        for path in entry["inputs"]:
+            print(path)
+        return 0
+    if len(argv) >= 3 and argv[1] == "prune":
+        prune(argv[2], argv[3:])
+        return 0
+    print("Usage: python journal.py record <journal> <dataset> <variable> <unit> <output> [...] "
+          "[--input=<file> ...] [--setting=<name>=<value> ...]\n"
+          "       python journal.py check <journal> <dataset> <variable> <unit> [<output> ...] "
+          "[--input=<file> ...] [--setting=<name>=<value> ...]\n"
+          "       python journal.py prune <journal> <file> [<file> ...]")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,252 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Zero-copy reader for classic (CDF-1), 64-bit offset (CDF-2) and CDF-5
+# NetCDF files.
+#
+# In these formats every variable is stored uncompressed at a fixed byte
+# offset given in the file header. Non-record variables are contiguous, and
+# record variables are interleaved with a fixed record stride. The header is
+# parsed here and each variable is exposed as a numpy.memmap view (big-endian,
+# read-only), so reading a field touches only the page cache and makes no
+# copy. NetCDF4/HDF5 files are not handled; open_classic() returns None for
+# them and callers fall back to the netCDF library.
+#
+# ==============================================================================
+
+import struct
+import numpy as np
+
+MAGIC = b"CDF"
+STREAMING = 0xFFFFFFFF
+
+NC_DIMENSION = 0x0A
+NC_VARIABLE = 0x0B
+NC_ATTRIBUTE = 0x0C
+
+# nc_type -> big-endian numpy dtype
+NC_TYPES = {
+    1: np.dtype("i1"),
+    2: np.dtype("S1"),
+    3: np.dtype(">i2"),
+    4: np.dtype(">i4"),
+    5: np.dtype(">f4"),
+    6: np.dtype(">f8"),
+    7: np.dtype("u1"),
+    8: np.dtype(">u2"),
+    9: np.dtype(">u4"),
+    10: np.dtype(">i8"),
+    11: np.dtype(">u8"),
+}
+
+
+class ClassicVariable:
+    """A variable of a classic NetCDF file, read lazily through a memmap view."""
+
+    def __init__(self, name, dims, shape, dtype, attrs, begin, is_record):
+        self.name = name
+        self.dims = dims
+        self.shape = shape
+        self.dtype = dtype
+        self.attrs = attrs
+        self.begin = begin
+        self.is_record = is_record
+        self._file = None
+
+    @property
+    def data(self):
+        """Big-endian, read-only ndarray view of the variable's bytes."""
+        return self._file._view(self)
+
+
+class ClassicFile:
+    """Parsed header of a classic NetCDF file."""
+
+    def __init__(self, path, version, numrecs, dims, attrs, variables):
+        self.path = path
+        self.version = version
+        self.numrecs = numrecs
+        self.dimensions = dims
+        self.attrs = attrs
+        self.variables = variables
+        self._mmap = None
+        for var in variables.values():
+            var._file = self
+
+        record_vars = [v for v in variables.values() if v.is_record]
+        if len(record_vars) == 1:
+            # A lone record variable is stored without per-record padding.
+            only = record_vars[0]
+            self.recsize = int(np.prod(only.shape[1:], dtype=np.int64)) * only.dtype.itemsize
+        else:
+            self.recsize = sum(_vsize(v) for v in record_vars)
+
+    def _buffer(self):
+        if self._mmap is None:
+            self._mmap = np.memmap(self.path, dtype=np.uint8, mode="r")
+        return self._mmap
+
+    def _view(self, var):
+        if var.is_record:
+            shape = (self.numrecs,) + tuple(var.shape[1:])
+            inner = _c_strides(shape[1:], var.dtype.itemsize)
+            strides = (self.recsize,) + inner
+        else:
+            shape = tuple(var.shape)
+            strides = _c_strides(shape, var.dtype.itemsize)
+        if 0 in shape:
+            return np.empty(shape, dtype=var.dtype)
+        return np.ndarray(shape, dtype=var.dtype, buffer=self._buffer(),
+                          offset=var.begin, strides=strides)
+
+
+def _c_strides(shape, itemsize):
+    strides = []
+    step = itemsize
+    for size in reversed(shape):
+        strides.append(step)
+        step *= size
+    return tuple(reversed(strides))
+
+
+def _vsize(var):
+    """On-disk size of one record (or the whole variable), padded to 4 bytes."""
+    dims = var.shape[1:] if var.is_record else var.shape
+    size = int(np.prod(dims, dtype=np.int64)) * var.dtype.itemsize
+    return size + (-size % 4)
+
+
+class _HeaderReader:
+    def __init__(self, buf, version):
+        self.buf = buf
+        self.pos = 0
+        self.version = version
+
+    def _unpack(self, fmt, size):
+        value = struct.unpack_from(fmt, self.buf, self.pos)[0]
+        self.pos += size
+        return value
+
+    def int32(self):
+        return self._unpack(">i", 4)
+
+    def uint32(self):
+        return self._unpack(">I", 4)
+
+    def nelems(self):
+        # CDF-5 stores counts as 64-bit integers.
+        return self._unpack(">q", 8) if self.version == 5 else self._unpack(">i", 4)
+
+    def offset(self):
+        return self._unpack(">q", 8) if self.version in (2, 5) else self._unpack(">i", 4)
+
+    def name(self):
+        length = self.nelems()
+        raw = bytes(self.buf[self.pos:self.pos + length])
+        self.pos += length + (-length % 4)
+        return raw.decode("utf-8")
+
+    def values(self, nc_type, count):
+        dtype = NC_TYPES[nc_type]
+        size = dtype.itemsize * count
+        raw = np.frombuffer(self.buf, dtype=dtype, count=count, offset=self.pos)
+        self.pos += size + (-size % 4)
+        if nc_type == 2:
+            return raw.tobytes().decode("utf-8", errors="replace").rstrip("\x00")
+        values = raw.astype(dtype.newbyteorder("="))
+        return values[0] if count == 1 else values
+
+    def list_header(self, expected_tag):
+        tag = self.int32()
+        count = self.nelems()
+        if tag == 0 and count == 0:
+            return 0
+        if tag != expected_tag:
+            raise ValueError(f"Malformed NetCDF header (tag {tag:#x}, expected {expected_tag:#x})")
+        return count
+
+    def attributes(self):
+        attrs = {}
+        for _ in range(self.list_header(NC_ATTRIBUTE)):
+            name = self.name()
+            nc_type = self.int32()
+            count = self.nelems()
+            attrs[name] = self.values(nc_type, count)
+        return attrs
+
+
+def open_classic(path, header_bytes=1 << 20):
+    """
+    Parse the header of a classic NetCDF file.
+
+    Returns a ClassicFile, or None when the file is not CDF-1/2/5 (e.g.
+    NetCDF4/HDF5) so the caller can fall back to a normal read.
+    """
+    with open(path, "rb") as fh:
+        head = fh.read(4)
+        if len(head) < 4 or head[:3] != MAGIC or head[3] not in (1, 2, 5):
+            return None
+        fh.seek(0)
+        buf = fh.read(header_bytes)
+        version = head[3]
+        while True:
+            try:
+                return _parse(path, buf, version)
+            except struct.error:
+                # Header larger than the chunk read so far; read more.
+                more = fh.read(header_bytes)
+                if not more:
+                    raise
+                buf += more
+            except ValueError as exc:
+                if "buffer is smaller" not in str(exc):
+                    raise
+                more = fh.read(header_bytes)
+                if not more:
+                    raise
+                buf += more
+
+
+def _parse(path, buf, version):
+    reader = _HeaderReader(buf, version)
+    reader.pos = 4
+    numrecs = reader._unpack(">Q", 8) if version == 5 else reader.uint32()
+
+    dims = []
+    for _ in range(reader.list_header(NC_DIMENSION)):
+        dims.append((reader.name(), reader.nelems()))
+
+    attrs = reader.attributes()
+
+    variables = {}
+    for _ in range(reader.list_header(NC_VARIABLE)):
+        name = reader.name()
+        ndims = reader.nelems()
+        dimids = [reader.nelems() for _ in range(ndims)]
+        var_attrs = reader.attributes()
+        nc_type = reader.int32()
+        reader.nelems()  # vsize; recomputed, as it overflows for large variables
+        begin = reader.offset()
+
+        var_dims = tuple(dims[i][0] for i in dimids)
+        is_record = bool(dimids) and dims[dimids[0]][1] == 0
+        shape = tuple(dims[i][1] for i in dimids)
+        variables[name] = ClassicVariable(name, var_dims, shape, NC_TYPES[nc_type],
+                                          var_attrs, begin, is_record)
+
+    if numrecs == STREAMING:
+        raise ValueError(f"{path} is being written (streaming record count).")
+
+    dimensions = {name: (numrecs if size == 0 else size) for name, size in dims}
+    for var in variables.values():
+        if var.is_record:
+            var.shape = (numrecs,) + var.shape[1:]
+    return ClassicFile(path, version, numrecs, dimensions, attrs, variables)
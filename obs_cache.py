@@ -0,0 +1,196 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Shared cache of processed observation products, across runs and users.
+#
+# Every run processes the same observation files (e.g. OBS_1990_2020) into the
+# same final_obs_* means, and regrids them to the same model grid. With
+# obs_cache_dir set (e.g. a group directory), these products are made once and
+# then reused by every run. An entry of the cache is keyed by
+#
+#   the fingerprint of the observation directory: name, size and modification
+#   time of each monthly file of the variable in the year range,
+#   the year range, and the settings the products depend on (domain, levels,
+#   precision policy, storage profile of the maps),
+#
+# and kept under <obs_cache_dir>/v<version>/<obs_var>/<start>-<end>/<key>/.
+# The season is part of each product's file name (final_obs_JJAS_mean_t2m.nc),
+# and products regridded to a target grid go to grid_<grid key>/ of the entry,
+# keyed by the grid description. A changed or added input file gives a new key,
+# so a stale product is never reused; a new cache version starts afresh.
+#
+# Products are stored read-only and placed in output_data as hard links when
+# on the same filesystem (otherwise reflinked or copied). A run that finds a
+# product missing takes the entry's file lock before making it, so concurrent
+# runs wait for the first one and then reuse its products. The lock is an
+# flock on a file the shell opens read-only ("lock-path"), taken by "lock" on
+# that file descriptor; it is held until the shell closes it, or exits.
+#
+# Usage:
+#   python obs_cache.py fetch <cache_dir> <variable> <plev|no_plev> <obs_dir> <start_year> <end_year> [--grid=<griddes>] <file> [...]
+#   python obs_cache.py store <cache_dir> <variable> <plev|no_plev> <obs_dir> <start_year> <end_year> [--grid=<griddes>] <file> [...]
+#   python obs_cache.py lock-path <cache_dir> <variable> <plev|no_plev> <obs_dir> <start_year> <end_year>
+#   python obs_cache.py lock <fd>
+#   python obs_cache.py list <cache_dir>
+#
+# ==============================================================================
+
+import sys
+import os
+import glob
+import json
+import time
+import hashlib
+
+import domain
+from plot_manifest import publish_file
+from reduce_atm import OBS_NAMES
+
+CACHE_VERSION = 1
+ENTRY_FILE = "entry.json"
+LOCK_FILE = ".lock"
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def input_files(obs_dir, obs_var, start_year, end_year):
+    files = []
+    for year in range(start_year, end_year + 1):
+        for month in range(1, 13):
+            files.extend(sorted(glob.glob(os.path.join(obs_dir, f"*_{obs_var}_{year}_{month:02d}.nc"))))
+    return files
+
+
+def fingerprint(files):
+    """(name, size, modification time) of each input file."""
+    states = []
+    for path in files:
+        stat = os.stat(path)
+        states.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+    return states
+
+
+def settings(variable, level_type):
+    """The settings of the run that the products depend on."""
+    return {
+        "domain": domain.domain_box(),
+        "levels": domain.required_levels(variable) if level_type == "plev" else None,
+        "precision_policy": os.environ.get("precision_policy", "float32"),
+        "storage_profile_maps": os.environ.get("storage_profile_maps", "cdo_default"),
+    }
+
+
+def entry_dir(cache_dir, variable, level_type, obs_dir, start_year, end_year):
+    """Directory of the cache entry of a variable, and its key."""
+    obs_var = OBS_NAMES.get(variable, variable)
+    files = input_files(obs_dir, obs_var, start_year, end_year)
+    if not files:
+        raise ValueError(f"No observation files of {obs_var} for {start_year}-{end_year} in {obs_dir}")
+    key = {"inputs": fingerprint(files), "settings": settings(variable, level_type)}
+    path = os.path.join(cache_dir, f"v{CACHE_VERSION}", obs_var, f"{start_year}-{end_year}", _digest(key))
+    return path, key
+
+
+def grid_dir(path, griddes):
+    with open(griddes) as fh:
+        return os.path.join(path, "grid_" + _digest(fh.read()))
+
+
+def fetch(path, files):
+    """Place the cached products at files; True when all of them were cached."""
+    cached = [os.path.join(path, os.path.basename(dest)) for dest in files]
+    if not all(os.path.exists(source) for source in cached):
+        return False
+    for source, dest in zip(cached, files):
+        publish_file(source, dest)
+    return True
+
+
+def store(path, key, files, obs_dir):
+    """Add products to an entry, read-only; products already cached are kept."""
+    os.makedirs(path, exist_ok=True)
+    for source in files:
+        dest = os.path.join(path, os.path.basename(source))
+        if not os.path.exists(dest):
+            publish_file(source, dest)
+            os.chmod(dest, 0o444)
+    entry = os.path.join(os.path.dirname(path) if os.path.basename(path).startswith("grid_") else path, ENTRY_FILE)
+    if not os.path.exists(entry):
+        tmp_path = f"{entry}.tmp.{os.getpid()}"
+        with open(tmp_path, "w") as fh:
+            json.dump({"obs_dir": os.path.abspath(obs_dir), "files": len(key["inputs"]),
+                       "settings": key["settings"], "created": time.time(),
+                       "user": os.environ.get("USER", "")}, fh, indent=1)
+        os.replace(tmp_path, entry)
+
+
+def lock(fd):
+    """Take the exclusive lock on an open lock file, waiting for its holder."""
+    import fcntl
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print("Waiting for another run making the same observation products...")
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+
+def list_entries(cache_dir):
+    for entry in sorted(glob.glob(os.path.join(cache_dir, f"v{CACHE_VERSION}", "*", "*", "*", ENTRY_FILE))):
+        path = os.path.dirname(entry)
+        with open(entry) as fh:
+            info = json.load(fh)
+        products = [name for name in os.listdir(path) if name.endswith(".nc")]
+        grids = [name for name in os.listdir(path) if name.startswith("grid_")]
+        print(f"{os.path.relpath(path, cache_dir)}\t{len(products)} products, {len(grids)} grids\t"
+              f"{info['obs_dir']} ({info['files']} files)")
+
+
+def main(argv):
+    options = {arg.split("=", 1)[0]: arg.split("=", 1)[1] for arg in argv if arg.startswith("--") and "=" in arg}
+    argv = [arg for arg in argv if not arg.startswith("--")]
+    if len(argv) == 3 and argv[1] == "lock":
+        lock(int(argv[2]))
+        return 0
+    if len(argv) == 3 and argv[1] == "list":
+        list_entries(argv[2])
+        return 0
+    if len(argv) >= 8 and argv[1] in ("fetch", "store", "lock-path"):
+        command, cache_dir, variable, level_type, obs_dir = argv[1:6]
+        try:
+            path, key = entry_dir(cache_dir, variable, level_type, obs_dir, int(argv[6]), int(argv[7]))
+            if command == "lock-path":
+                # Opened read-only by the shell, so any user of the group can lock it
+                os.makedirs(path, exist_ok=True)
+                os.close(os.open(os.path.join(path, LOCK_FILE), os.O_RDONLY | os.O_CREAT, 0o666))
+                print(os.path.join(path, LOCK_FILE))
+                return 0
+            target = grid_dir(path, options["--grid"]) if "--grid" in options else path
+            if command == "fetch":
+                return 0 if fetch(target, argv[8:]) else 1
+            store(target, key, argv[8:], obs_dir)
+        except (OSError, ValueError) as exc:
+            print(f"Error: {exc}")
+            return 1
+        return 0
+    print("Usage: python obs_cache.py fetch <cache_dir> <variable> <plev|no_plev> <obs_dir> <start_year> <end_year> "
+          "[--grid=<griddes>] <file> [...]\n"
+          "       python obs_cache.py store <cache_dir> <variable> <plev|no_plev> <obs_dir> <start_year> <end_year> "
+          "[--grid=<griddes>] <file> [...]\n"
+          "       python obs_cache.py lock-path <cache_dir> <variable> <plev|no_plev> <obs_dir> <start_year> <end_year>\n"
+          "       python obs_cache.py lock <fd>\n"
+          "       python obs_cache.py list <cache_dir>")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -68,7 +68,23 @@ fi
 # Define output directory
 output_dir="./output_data"
 mkdir -p "$output_dir"
+# Intermediate files (yearly series and means) go to the scratch directory,
+# e.g. a tmpfs or local SSD, rather than the working directory
+scratch_dir="${scratch_dir:-${output_dir}/scratch}"
+mkdir -p "$scratch_dir"
 echo "Output files will be saved in $output_dir"
+product_store_dir="${product_store_dir:-${output_dir}/products.zarr}"
+reduction_engine="${reduction_engine:-cdo}"
+
+# CDO output options for the precision policy and the configured storage
+# profiles (see precision.py and storage_profiles.py)
+storage_profile_maps="${storage_profile_maps:-cdo_default}"
+storage_profile_series="${storage_profile_series:-cdo_default}"
+read -r -a precision_cdo_opts <<< "$(python3 precision.py cdo-opts)"
+read -r -a map_cdo_opts <<< "$(python3 storage_profiles.py cdo-opts "$storage_profile_maps")"
+read -r -a series_cdo_opts <<< "$(python3 storage_profiles.py cdo-opts "$storage_profile_series")"
+map_cdo_opts+=("${precision_cdo_opts[@]}")
+series_cdo_opts+=("${precision_cdo_opts[@]}")
 
 # Define the variable mappings for observations
 declare -A variable_mapping=(
@@ -97,9 +113,112 @@ function get_season_months {
     esac
 }
 
-# Trap to clean up temporary files on exit
+# Every season is produced in the same pass, whichever one is plotted
+seasons=(DJF MAM JJA SON JJAS)
+
+# Output files of a season ($1) for $obs_var
+function season_yearly_file {
+    echo "${output_dir}/obs_${1}_mean_yearly_${obs_var}.nc"
+}
+function season_mean_file {
+    echo "${output_dir}/final_obs_${1}_mean_${obs_var}.nc"
+}
+
+# Publish the products of $obs_var to the Zarr product store when it is enabled
+function publish_products {
+    if [ "$product_store" = "zarr" ]; then
+        period="${start_year_obs}-${end_year_obs}"
+        store_products=(
+            "annual_mean_yearly|$obs_combined_annual_mean_file"
+            "annual_mean|$final_annual_mean_file"
+            "monthly_clim|$obs_monthly_clim_file"
+        )
+        for s in "${seasons[@]}"; do
+            store_products+=("${s}_mean_yearly|$(season_yearly_file "$s")" "${s}_mean|$(season_mean_file "$s")")
+        done
+        for entry in "${store_products[@]}"; do
+            [ -f "${entry#*|}" ] || continue
+            python3 product_store.py put "$product_store_dir" "obs" "$obs_var" "${entry%%|*}" "$period" "${entry#*|}"
+            check_error "Storing ${entry%%|*} for $obs_var in the product store"
+        done
+    fi
+}
+
+# Checkpoint journal (see journal.py): each finished year and each finished
+# variable is recorded with the settings it was made with, and with --resume a
+# recorded unit whose files and settings are unchanged is reused instead of
+# computed again. The whole variable also records the period and its monthly
+# files, so a new period or an added file makes it again
+function unit_done {
+    [ -z "$ATM_JOURNAL" ] || python3 journal.py record "$ATM_JOURNAL" obs "$obs_var" "$@" "${unit_settings[@]}"
+}
+function unit_reusable {
+    [ "$ATM_RESUME" = true ] && [ -n "$ATM_JOURNAL" ] && python3 journal.py check "$ATM_JOURNAL" obs "$obs_var" "$@" "${unit_settings[@]}"
+}
+function variable_reusable {
+    unit_reusable all "--setting=period=${start_year_obs}-${end_year_obs}" "${period_files[@]/#/--input=}"
+}
+function record_variable {
+    local products=() file s
+    for file in "$obs_combined_annual_mean_file" "$final_annual_mean_file" "$obs_monthly_clim_file" \
+                "$all_years_merged_file" "$all_years_index" "$obs_moments_file"; do
+        [ -f "$file" ] && products+=("$file")
+    done
+    for s in "${seasons[@]}"; do
+        products+=("$(season_yearly_file "$s")" "$(season_mean_file "$s")")
+    done
+    unit_done all "${products[@]}" "--setting=period=${start_year_obs}-${end_year_obs}" "${period_files[@]/#/--input=}"
+    check_error "Recording $obs_var in the journal"
+}
+
+# Shared observation cache (see obs_cache.py): with obs_cache_dir set, the
+# products of a variable made by any earlier run from the same files, years
+# and settings are reused. A missing entry is made under the entry's lock, so
+# concurrent runs wait and reuse it rather than make it again.
+function obs_cache {
+    python3 obs_cache.py "$1" "$obs_cache_dir" "$var" "$var_type" "$obs_data_dir" "$start_year_obs" "$end_year_obs" "${@:2}"
+}
+function cache_lock {
+    local lock_path
+    lock_path=$(obs_cache lock-path) && exec {cache_fd}<"$lock_path" && python3 obs_cache.py lock "$cache_fd"
+    check_error "Locking the observation cache entry of $obs_var"
+}
+function cache_unlock {
+    if [ -n "$cache_fd" ]; then
+        exec {cache_fd}<&-
+        cache_fd=""
+    fi
+}
+function cache_store {
+    if [ -n "$obs_cache_dir" ]; then
+        obs_cache store "${cached_products[@]}"
+        check_error "Storing $obs_var in the observation cache"
+        cache_unlock
+    fi
+}
+
+# Step 3: a merged file (or a virtual index) of all monthly files of the variable
+function build_all_years {
+    if [ ${#all_monthly_files[@]} -gt 0 ]; then
+        if [ "$virtual_all_year" = true ]; then
+            echo "Indexing all monthly files for $obs_var as a virtual time series..."
+            python3 virtual_dataset.py build "$all_years_index" "$obs_var" "${domain_ops[@]/#/--select=}" "${all_monthly_files[@]}"
+            check_error "Creating virtual index for all years for $obs_var"
+        else
+            echo "Merging all monthly files for $obs_var into a single file..."
+            cdo "${series_cdo_opts[@]}" mergetime "${all_monthly_files[@]}" "$all_years_merged_file"
+            check_error "Creating merged file for all years for $obs_var"
+            python3 storage_profiles.py rechunk "$storage_profile_series" "$all_years_merged_file"
+            check_error "Rechunking all-years file for $obs_var"
+        fi
+    fi
+}
+
+# Trap to clean up temporary files on exit; the yearly files of years recorded
+# in the journal are kept, so an interrupted run can reuse them with --resume
 temp_files=()
-trap 'rm -f "${temp_files[@]}"' EXIT
+cache_fd=""
+trap 'python3 journal.py prune "$ATM_JOURNAL" "${temp_files[@]}"' EXIT
 
 # Process each variable type separately
 for var_type in "plev" "no_plev"; do
@@ -116,16 +235,80 @@ for var_type in "plev" "no_plev"; do
         
         # Define output paths for observation data
         obs_combined_annual_mean_file="${output_dir}/obs_annual_mean_yearly_${obs_var}.nc"
-        obs_combined_season_mean_file="${output_dir}/obs_${season}_mean_yearly_${obs_var}.nc"
         final_annual_mean_file="${output_dir}/final_obs_annual_mean_${obs_var}.nc"
-        final_season_mean_file="${output_dir}/final_obs_${season}_mean_${obs_var}.nc"
+        obs_monthly_clim_file="${output_dir}/obs_monthly_clim_${obs_var}.nc"
         all_years_merged_file="${output_dir}/obs_${obs_var}_all_years.nc"  # New merged file
+        all_years_index="${output_dir}/obs_${obs_var}_all_years.vds.json"  # Virtual alternative
+        obs_moments_file="${output_dir}/final_obs_moments_${obs_var}.nc"  # Interannual moments (python engine)
 
         # Check if all necessary files exist, if so, skip processing
-        if [[ -f "$obs_combined_annual_mean_file" && -f "$obs_combined_season_mean_file" && \
-              -f "$all_years_merged_file" && -f "$final_annual_mean_file" && \
-              -f "$final_season_mean_file" ]]; then
+        all_exist=true
+        for file in "$obs_combined_annual_mean_file" "$final_annual_mean_file" "$obs_monthly_clim_file"; do
+            [ -f "$file" ] || all_exist=false
+        done
+        for s in "${seasons[@]}"; do
+            [[ -f "$(season_yearly_file "$s")" && -f "$(season_mean_file "$s")" ]] || all_exist=false
+        done
+        # Region and levels to cut every input to at its first read (see domain.py)
+        domain_ops_line=$(python3 domain.py cdo-ops "$var" "$var_type" "$(ls "$obs_data_dir"/*_"${obs_var}"_*.nc 2>/dev/null | head -n 1)")
+        check_error "Resolving the domain for $obs_var"
+        read -r -a domain_ops <<< "$domain_ops_line"
+        unit_settings=("--setting=domain=${domain_ops[*]}" "--setting=precision_policy=$precision_policy"
+                       "--setting=storage_profile_maps=$storage_profile_maps" "--setting=reduction_engine=$reduction_engine")
+
+        # Monthly files of the period (period_files)
+        period_files=()
+        for year in $(seq "$start_year_obs" "$end_year_obs"); do
+            for month in {01..12}; do
+                file=$(ls "$obs_data_dir"/*_"${obs_var}"_"${year}"_"${month}".nc 2>/dev/null)
+                [ -f "$file" ] && period_files+=("$file")
+            done
+        done
+
+        # With --resume, only a variable recorded as complete in the journal is skipped
+        if [ "$ATM_RESUME" = true ] && [ -n "$ATM_JOURNAL" ]; then
+            if variable_reusable > /dev/null; then
+                echo "$obs_var is complete in the journal. Skipping calculations."
+                continue
+            fi
+        elif [[ "$all_exist" = true && ( -f "$all_years_merged_file" || -f "$all_years_index" ) ]]; then
             echo "All files for $obs_var already exist. Skipping calculations."
+            # Recorded as reused, so the retention step keeps them (see retention.py)
+            record_variable
+            continue
+        fi
+
+        # Products of the variable in the observation cache
+        cached_products=("$obs_combined_annual_mean_file" "$final_annual_mean_file" "$obs_monthly_clim_file")
+        for s in "${seasons[@]}"; do
+            cached_products+=("$(season_yearly_file "$s")" "$(season_mean_file "$s")")
+        done
+        # The moments are only made by the Python reduction
+        [ "$reduction_engine" = "python" ] && cached_products+=("$obs_moments_file")
+        if [ -n "$obs_cache_dir" ]; then
+            cache_lock
+            if obs_cache fetch "${cached_products[@]}"; then
+                cache_unlock
+                echo "Using cached observation products for $obs_var."
+                # The all-year series refers to the monthly files, so it is made here
+                if [[ ! -f "$all_years_merged_file" && ! -f "$all_years_index" ]]; then
+                    all_monthly_files=("${period_files[@]}")
+                    build_all_years
+                fi
+                publish_products
+                record_variable
+                continue
+            fi
+        fi
+
+        # Single-pass Python reduction (reduce_atm.py) in place of the CDO steps below
+        if [ "$reduction_engine" = "python" ]; then
+            python3 reduce_atm.py obs "$obs_var" "$obs_data_dir" "$start_year_obs" "$end_year_obs" "$output_dir" \
+                "${domain_ops[@]/#/--select=}"
+            check_error "Python reduction for $obs_var"
+            publish_products
+            record_variable
+            cache_store
             continue
         fi
 
@@ -133,73 +316,118 @@ for var_type in "plev" "no_plev"; do
         # Step 1: Calculate year-wise annual and seasonal means
         echo "Calculating year-wise means for years $start_year_obs to $end_year_obs..."
         yearly_annual_files=()
-        yearly_season_files=()
+        yearly_files=()
+        processed_years=()
         all_monthly_files=()  # Array to store all monthly files for merging
-        season_months=$(get_season_months "$season")
+        year_files_all=()
 
         for year in $(seq "$start_year_obs" "$end_year_obs"); do
+            # Files of this year's unit, kept until the variable is complete
+            yearly_file="${scratch_dir}/temp_obs_${year}_${obs_var}.nc"
+            yearly_annual_mean_file="${scratch_dir}/temp_annual_${year}_${obs_var}.nc"
+            year_files=("$yearly_file" "$yearly_annual_mean_file")
+            for s in "${seasons[@]}"; do
+                year_files+=("${scratch_dir}/temp_${s}_${year}_${obs_var}.nc")
+            done
+
             monthly_files=()
             for month in {01..12}; do
                 file=$(ls "$obs_data_dir"/*_"${obs_var}"_"${year}"_"${month}".nc 2>/dev/null)
                 if [ -f "$file" ]; then
                     monthly_files+=("$file")
-                    all_monthly_files+=("$file")  # Add to the global monthly file list
                 else
                     echo "Warning: Missing file $file" | tee -a "$output_dir/missing_files.log"
                 fi
             done
 
+            # A year finished by an interrupted run from the same monthly files is reused (--resume)
+            if [ ${#monthly_files[@]} -gt 0 ] && unit_reusable "$year" "${year_files[@]}" "${monthly_files[@]/#/--input=}" > /dev/null; then
+                echo "Reusing $obs_var for year $year from the journal."
+                all_monthly_files+=("${monthly_files[@]}")
+                yearly_annual_files+=("$yearly_annual_mean_file")
+                yearly_files+=("$yearly_file")
+                processed_years+=("$year")
+                year_files_all+=("${year_files[@]}")
+                temp_files+=("${year_files[@]}")
+                continue
+            fi
+
             if [ ${#monthly_files[@]} -gt 0 ]; then
-                yearly_file="temp_obs_${year}_${obs_var}.nc"
-                yearly_annual_mean_file="temp_annual_${year}_${obs_var}.nc"
-                yearly_season_mean_file="temp_season_${year}_${obs_var}.nc"
-                temp_files+=("$yearly_file" "$yearly_annual_mean_file" "$yearly_season_mean_file")
+                temp_files+=("${year_files[@]}")
 
-                # Concatenate monthly files into yearly file
-                cdo cat "${monthly_files[@]}" "$yearly_file"
+                # Concatenate monthly files into yearly file, cut to the domain,
+                # in one chained cdo call (see cdo_pipeline.py)
+                cat_args_text=$(python3 cdo_pipeline.py chain cat "${domain_ops[@]}" -- "${monthly_files[@]}")
+                check_error "Building the concatenation for year $year"
+                mapfile -t cat_args <<< "$cat_args_text"
+                cdo "${precision_cdo_opts[@]}" "${cat_args[@]}" "$yearly_file"
                 check_error "Concatenating files for year $year"
 
                 # Calculate year-wise annual mean
-                cdo timmean "$yearly_file" "$yearly_annual_mean_file"
+                cdo "${precision_cdo_opts[@]}" timmean "$yearly_file" "$yearly_annual_mean_file"
                 check_error "Calculating annual mean for year $year"
 
-                # Calculate year-wise seasonal mean
-                cdo selmon,$season_months "$yearly_file" "temp_${obs_var}_season_${year}.nc"
-                temp_files+=("temp_${obs_var}_season_${year}.nc")
-                cdo timmean "temp_${obs_var}_season_${year}.nc" "$yearly_season_mean_file"
-                check_error "Calculating seasonal mean for year $year"
+                # Calculate year-wise seasonal means for every season
+                for s in "${seasons[@]}"; do
+                    yearly_season_mean_file="${scratch_dir}/temp_${s}_${year}_${obs_var}.nc"
+                    cdo "${precision_cdo_opts[@]}" timmean -selmon,"$(get_season_months "$s")" "$yearly_file" "$yearly_season_mean_file"
+                    check_error "Calculating $s mean for year $year"
+                done
 
+                unit_done "$year" "${year_files[@]}" "${monthly_files[@]/#/--input=}"
+                check_error "Recording $obs_var for year $year in the journal"
+                all_monthly_files+=("${monthly_files[@]}")  # Add to the global monthly file list
                 yearly_annual_files+=("$yearly_annual_mean_file")
-                yearly_season_files+=("$yearly_season_mean_file")
+                yearly_files+=("$yearly_file")
+                processed_years+=("$year")
+                year_files_all+=("${year_files[@]}")
             fi
         done
 
         # Step 2: Merge year-wise annual and seasonal means
         echo "Merging year-wise means into combined files..."
         if [ ${#yearly_annual_files[@]} -gt 0 ]; then
-            cdo mergetime "${yearly_annual_files[@]}" "$obs_combined_annual_mean_file"
+            cdo "${series_cdo_opts[@]}" mergetime "${yearly_annual_files[@]}" "$obs_combined_annual_mean_file"
             check_error "Merging annual mean files"
         fi
 
-        if [ ${#yearly_season_files[@]} -gt 0 ]; then
-            cdo mergetime "${yearly_season_files[@]}" "$obs_combined_season_mean_file"
-            check_error "Merging seasonal mean files"
-        fi
+        if [ ${#processed_years[@]} -gt 0 ]; then
+            for s in "${seasons[@]}"; do
+                yearly_season_files=()
+                for year in "${processed_years[@]}"; do
+                    yearly_season_files+=("${scratch_dir}/temp_${s}_${year}_${obs_var}.nc")
+                done
+                cdo "${series_cdo_opts[@]}" mergetime "${yearly_season_files[@]}" "$(season_yearly_file "$s")"
+                check_error "Merging $s mean files"
+            done
 
-        # Step 3: Create a merged file for all years
-        if [ ${#all_monthly_files[@]} -gt 0 ]; then
-            echo "Merging all monthly files for $obs_var into a single file..."
-            cdo mergetime "${all_monthly_files[@]}" "$all_years_merged_file"
-            check_error "Creating merged file for all years for $obs_var"
+            # 12-month climatology from the same (domain-cut) yearly files
+            cdo "${map_cdo_opts[@]}" ymonmean -mergetime "${yearly_files[@]}" "$obs_monthly_clim_file"
+            check_error "Calculating monthly climatology for $obs_var"
         fi
 
+        # Step 3: Create a merged file (or a virtual index) for all years
+        build_all_years
+
         # Step 4: Calculate final time means
         echo "Calculating time mean of combined annual and seasonal files..."
-        cdo timmean "$obs_combined_annual_mean_file" "$final_annual_mean_file"
+        cdo "${map_cdo_opts[@]}" timmean "$obs_combined_annual_mean_file" "$final_annual_mean_file"
         check_error "Calculating final annual mean"
 
-        cdo timmean "$obs_combined_season_mean_file" "$final_season_mean_file"
-        check_error "Calculating final seasonal mean"
+        for s in "${seasons[@]}"; do
+            cdo "${map_cdo_opts[@]}" timmean "$(season_yearly_file "$s")" "$(season_mean_file "$s")"
+            check_error "Calculating final $s mean"
+        done
+
+        publish_products
+        if [ ${#processed_years[@]} -gt 0 ]; then
+            record_variable
+            cache_store
+        fi
+        cache_unlock
+
+        # The yearly files are only needed until the variable is complete
+        rm -f "${year_files_all[@]}"
     done
 done
 
@@ -0,0 +1,293 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Structured tracing of the wrapper's stages and external commands.
+#
+# With trace=true in user_inputs_atm.sh, the wrapper runs every stage and
+# every cdo, ncl, python, ncdump and nccopy call of the sub-scripts through
+# "pipeline_trace.py run", which executes the command and appends one event
+# to the run's trace file (JSON lines). Each event records wall time, CPU
+# time, peak RSS and bytes read/written of the command and its children,
+# together with the script, model, variable and year it ran for.
+#
+# "pipeline_trace.py report" turns the events into a Chrome trace (open it in
+# chrome://tracing or https://ui.perfetto.dev) with one span per variable
+# processed by each script, and prints a summary table of where time went.
+#
+# Usage:
+#   python pipeline_trace.py run [--name <name>] [--cat <category>] [key=value ...] -- <command> [args...]
+#   python pipeline_trace.py report <trace.jsonl> [<trace.json>] [<top_n>]
+#
+# run only records when ATM_TRACE_FILE is set; its exit status is that of
+# the command.
+#
+# ==============================================================================
+
+import sys
+import os
+import json
+import time
+import signal
+import subprocess
+
+TRACE_ENV = "ATM_TRACE_FILE"
+TRACE_PID_ENV = "ATM_TRACE_PID"
+
+# CDO options that take a value, skipped when looking for the operator
+CDO_VALUE_OPTIONS = ("-b", "-f", "-z", "-k", "-P", "-r", "-t", "--percentile")
+CDO_FLAG_OPTIONS = ("-O", "-s", "-v", "-w", "-a", "-L", "--shuffle", "--no_history")
+
+
+def read_proc_io():
+    """
+    Cumulative bytes read/written by this process and its reaped children.
+
+    Linux adds the I/O counters of a child to its parent when it is waited
+    for, so the difference around a wait covers the whole command tree.
+    """
+    counters = {}
+    try:
+        with open("/proc/self/io") as fh:
+            for line in fh:
+                key, _, value = line.partition(":")
+                counters[key] = int(value)
+    except OSError:
+        return 0, 0
+    return counters.get("rchar", 0), counters.get("wchar", 0)
+
+
+def event_name(command):
+    """Short name for a command: cdo operator, NCL script, Python script and subcommand, or program."""
+    prog = os.path.basename(command[0])
+    args = command[1:]
+    if prog == "cdo":
+        skip = False
+        for arg in args:
+            if skip:
+                skip = False
+            elif arg in CDO_VALUE_OPTIONS:
+                skip = True
+            elif arg not in CDO_FLAG_OPTIONS:
+                return f"cdo {arg.lstrip('-').split(',')[0]}"
+        return "cdo"
+    if prog == "ncl":
+        script = next((arg for arg in args if arg.endswith(".ncl")), None)
+        return f"ncl {os.path.basename(script)}" if script else "ncl"
+    if prog.startswith("python"):
+        for i, arg in enumerate(args):
+            if arg.endswith(".py"):
+                name = f"python {os.path.basename(arg)}"
+                sub = args[i + 1] if i + 1 < len(args) else ""
+                return f"{name} {sub}" if sub.replace("-", "").isalnum() else name
+        return "python"
+    return prog
+
+
+def append_event(trace_file, event):
+    """Append one event as a single line; O_APPEND keeps concurrent writers from interleaving."""
+    line = (json.dumps(event, separators=(",", ":")) + "\n").encode()
+    fd = os.open(trace_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def run(argv):
+    if "--" not in argv:
+        print("Usage: python pipeline_trace.py run [--name <name>] [--cat <category>] [key=value ...] -- <command> [args...]")
+        return 2
+    split = argv.index("--")
+    options, command = argv[:split], argv[split + 1:]
+    if not command:
+        print("Error: No command given to trace.")
+        return 2
+
+    name = None
+    category = "command"
+    context = {}
+    i = 0
+    while i < len(options):
+        if options[i] == "--name" and i + 1 < len(options):
+            name = options[i + 1]
+            i += 2
+        elif options[i] == "--cat" and i + 1 < len(options):
+            category = options[i + 1]
+            i += 2
+        else:
+            key, _, value = options[i].partition("=")
+            if value:
+                context[key] = value
+            i += 1
+
+    trace_file = os.environ.get(TRACE_ENV)
+    # The command owns the terminal; Ctrl-C reaches it directly.
+    previous = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    start = time.time()
+    wall_start = time.perf_counter()
+    read_before, written_before = read_proc_io()
+    try:
+        proc = subprocess.Popen(command, restore_signals=True,
+                                preexec_fn=lambda: signal.signal(signal.SIGINT, signal.SIG_DFL))
+    except OSError as exc:
+        signal.signal(signal.SIGINT, previous)
+        print(f"{command[0]}: {exc.strerror}", file=sys.stderr)
+        return 127
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - wall_start
+    read_after, written_after = read_proc_io()
+    signal.signal(signal.SIGINT, previous)
+
+    if trace_file:
+        event = {
+            "name": name or event_name(command),
+            "cat": category,
+            "ph": "X",
+            "ts": int(start * 1e6),
+            "dur": int(wall * 1e6),
+            "pid": int(os.environ.get(TRACE_PID_ENV, os.getppid())),
+            "tid": os.getppid(),
+            "args": dict(context, **{
+                "cpu_s": round(usage.ru_utime + usage.ru_stime, 6),
+                "max_rss_mb": round(usage.ru_maxrss / 1024.0, 1),
+                "read_bytes": read_after - read_before,
+                "write_bytes": written_after - written_before,
+                "exit_code": proc.returncode,
+                "command": " ".join(command)[:500],
+            }),
+        }
+        append_event(trace_file, event)
+    return proc.returncode
+
+
+def load_events(path):
+    events = []
+    with open(path) as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by a crash; keep the rest of the trace.
+                    continue
+    return events
+
+
+def variable_spans(events):
+    """One span per (script, model, variable) covering that variable's commands."""
+    groups = {}
+    for event in events:
+        args = event.get("args", {})
+        if event.get("cat") != "command" or not args.get("var"):
+            continue
+        key = (event["pid"], args.get("script", ""), args.get("model", ""), args["var"])
+        groups.setdefault(key, []).append(event)
+
+    spans = []
+    for (pid, script, model, var), members in groups.items():
+        start = min(e["ts"] for e in members)
+        end = max(e["ts"] + e["dur"] for e in members)
+        label = f"{script}: {var}" + (f" ({model})" if model else "")
+        spans.append({
+            "name": label, "cat": "substage", "ph": "X", "ts": start, "dur": end - start,
+            "pid": pid, "tid": members[0]["tid"],
+            "args": {
+                "script": script, "model": model, "var": var, "commands": len(members),
+                "cpu_s": round(sum(e["args"].get("cpu_s", 0) for e in members), 3),
+                "max_rss_mb": max(e["args"].get("max_rss_mb", 0) for e in members),
+                "read_bytes": sum(e["args"].get("read_bytes", 0) for e in members),
+                "write_bytes": sum(e["args"].get("write_bytes", 0) for e in members),
+            },
+        })
+    return spans
+
+
+def chrome_trace(events):
+    """Chrome trace JSON object, with thread names taken from the scripts."""
+    trace_events = list(events) + variable_spans(events)
+    names = {}
+    for event in events:
+        script = event.get("args", {}).get("script")
+        if script:
+            names.setdefault((event["pid"], event["tid"]), script)
+    for (pid, tid), script in names.items():
+        trace_events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": script}})
+    for pid in {event["pid"] for event in events}:
+        trace_events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "IITM-ESM wrapper"}})
+    return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+
+def summarize(events):
+    """Totals per (category, name), largest wall time first."""
+    rows = {}
+    for event in events:
+        key = (event.get("cat", ""), event.get("name", ""))
+        args = event.get("args", {})
+        row = rows.setdefault(key, {"cat": key[0], "name": key[1], "calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                    "max_rss_mb": 0.0, "read_mb": 0.0, "write_mb": 0.0, "failed": 0})
+        row["calls"] += 1
+        row["wall_s"] += event.get("dur", 0) / 1e6
+        row["cpu_s"] += args.get("cpu_s", 0.0)
+        row["max_rss_mb"] = max(row["max_rss_mb"], args.get("max_rss_mb", 0.0))
+        row["read_mb"] += args.get("read_bytes", 0) / 1e6
+        row["write_mb"] += args.get("write_bytes", 0) / 1e6
+        row["failed"] += 1 if args.get("exit_code", 0) else 0
+    return sorted(rows.values(), key=lambda row: row["wall_s"], reverse=True)
+
+
+def print_summary(rows, top_n):
+    print(f"{'category':10s} {'name':45s} {'calls':>6s} {'wall_s':>10s} {'cpu_s':>10s} "
+          f"{'rss_mb':>8s} {'read_mb':>10s} {'write_mb':>10s} {'failed':>6s}")
+    for category in ("stage", "command"):
+        selected = [row for row in rows if row["cat"] == category]
+        for row in selected[:top_n]:
+            print(f"{row['cat']:10s} {row['name'][:45]:45s} {row['calls']:6d} {row['wall_s']:10.2f} "
+                  f"{row['cpu_s']:10.2f} {row['max_rss_mb']:8.1f} {row['read_mb']:10.1f} "
+                  f"{row['write_mb']:10.1f} {row['failed']:6d}")
+        if len(selected) > top_n:
+            print(f"{'':10s} ... {len(selected) - top_n} more {category} entries")
+
+
+def report(argv):
+    if not argv:
+        print("Usage: python pipeline_trace.py report <trace.jsonl> [<trace.json>] [<top_n>]")
+        return 1
+    events_path = argv[0]
+    json_path = argv[1] if len(argv) > 1 else os.path.splitext(events_path)[0] + ".json"
+    top_n = int(argv[2]) if len(argv) > 2 else 25
+
+    events = load_events(events_path)
+    if not events:
+        print(f"No trace events in {events_path}.")
+        return 0
+    tmp_path = f"{json_path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w") as fh:
+        json.dump(chrome_trace(events), fh)
+    os.replace(tmp_path, json_path)
+
+    print_summary(summarize(events), top_n)
+    print(f"Chrome trace written to {json_path} (open in chrome://tracing or ui.perfetto.dev)")
+    return 0
+
+
+def main(argv):
+    if len(argv) >= 2 and argv[1] == "run":
+        return run(argv[2:])
+    if len(argv) >= 2 and argv[1] == "report":
+        return report(argv[2:])
+    print("Usage: python pipeline_trace.py <run|report> [args...]")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,207 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Run manifest of the plots rendered by the wrapper, and their publication
+# into plot_dir.
+#
+# The wrapper sets ATM_PLOT_MANIFEST to a per-run file (JSON lines). The Python
+# plotting scripts register each figure they save; NCL renderers are wrapped by
+# the wrapper, which registers the images each NCL script wrote ("register-ncl"):
+# only the plots under the pltDir and pltName the script declares, so figures
+# written at the same time by other plot tasks are not credited to it.
+#
+# "publish" copies the plots of the manifest into plot_dir, skipping those
+# already there unchanged. A plot is hardlinked when plot_dir is on the same
+# filesystem, else reflinked where the filesystem supports it, else copied.
+# It also writes the image list (path and caption lines) read by
+# create_plot_html.py, in file name order.
+#
+# Usage:
+#   python plot_manifest.py register <file> [<file> ...]
+#   python plot_manifest.py register-ncl <epoch_seconds> <script.ncl>
+#   python plot_manifest.py publish <manifest> <plot_dir> [<image_list>]
+#
+# ==============================================================================
+
+import sys
+import os
+import re
+import json
+import time
+import errno
+import shutil
+
+MANIFEST_ENV = "ATM_PLOT_MANIFEST"
+PLOT_EXTENSIONS = (".png", ".pdf")
+LIST_EXTENSIONS = (".png",)
+FICLONE = 0x40049409  # Linux ioctl cloning a whole file (btrfs, XFS, ...)
+NCL_DECLARATION = r'^\s*{}\s*=\s*"([^"]*)"'
+
+
+def register(*paths, renderer=None, manifest=None):
+    """Record plots written in this run; does nothing outside a wrapper run."""
+    manifest = manifest or os.environ.get(MANIFEST_ENV)
+    if not manifest:
+        return
+    renderer = renderer or (os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python")
+    lines = []
+    for path in paths:
+        path = os.path.abspath(os.fspath(path))
+        try:
+            stat = os.stat(path)
+        except OSError:
+            print(f"Warning: Plot not found, not registered: {path}")
+            continue
+        lines.append(json.dumps({"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                 "renderer": renderer, "time": time.time()}) + "\n")
+    if lines:
+        # One write per call with O_APPEND, so concurrent renderers do not interleave
+        fd = os.open(manifest, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, "".join(lines).encode())
+        finally:
+            os.close(fd)
+
+
+def ncl_plots(script, since):
+    """Plots written at or after since (epoch seconds) under the pltDir/pltName of an NCL script."""
+    try:
+        with open(script) as fh:
+            text = fh.read()
+    except OSError:
+        return []
+    declared = [re.search(NCL_DECLARATION.format(name), text, re.MULTILINE) for name in ("pltDir", "pltName")]
+    if not all(declared):
+        print(f"Warning: {script} declares no pltDir/pltName, its plots are not registered.")
+        return []
+    # Relative to the working directory of the ncl call, as NCL resolves them
+    directory, name = os.path.split(declared[0].group(1) + declared[1].group(1))
+    found = []
+    try:
+        entries = os.listdir(directory or ".")
+    except OSError:
+        return []
+    # NCL adds the extension, and a frame number (name.000001.png) for several frames
+    for entry in entries:
+        if entry.startswith(name + ".") and entry.lower().endswith(PLOT_EXTENSIONS):
+            path = os.path.join(directory, entry)
+            try:
+                if os.stat(path).st_mtime >= since:
+                    found.append(path)
+            except OSError:
+                continue
+    return sorted(found)
+
+
+def read_manifest(path):
+    """Registered plots still present, by path (the last registration wins)."""
+    entries = {}
+    try:
+        with open(path) as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if os.path.exists(entry.get("path", "")):
+                    entries[entry["path"]] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def same_file(source, dest):
+    try:
+        src, dst = os.stat(source), os.stat(dest)
+    except OSError:
+        return False
+    if (src.st_dev, src.st_ino) == (dst.st_dev, dst.st_ino):
+        return True
+    return src.st_size == dst.st_size and src.st_mtime_ns == dst.st_mtime_ns
+
+
+def reflink(source, dest):
+    import fcntl
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source, dest)
+
+
+def publish_file(source, dest):
+    """Place source at dest atomically; returns the method used."""
+    tmp_path = f"{dest}.tmp.{os.getpid()}"
+    method = None
+    if os.stat(source).st_dev == os.stat(os.path.dirname(dest)).st_dev:
+        try:
+            os.link(source, tmp_path)
+            method = "hardlink"
+        except OSError as exc:
+            if exc.errno not in (errno.EPERM, errno.EXDEV, errno.EMLINK, errno.ENOTSUP):
+                raise
+    if method is None:
+        try:
+            reflink(source, tmp_path)
+            method = "reflink"
+        except (OSError, ImportError):
+            shutil.copy2(source, tmp_path)
+            method = "copy"
+    os.replace(tmp_path, dest)
+    return method
+
+
+def publish(manifest, plot_dir, image_list=None):
+    entries = read_manifest(manifest)
+    os.makedirs(plot_dir, exist_ok=True)
+    counts = {"unchanged": 0}
+    published = {}
+    for source in sorted(entries, key=lambda path: (os.path.basename(path), path)):
+        name = os.path.basename(source)
+        if name in published:
+            print(f"Warning: {source} has the same name as {published[name]}, which is kept.")
+            continue
+        published[name] = source
+        dest = os.path.join(plot_dir, name)
+        if same_file(source, dest):
+            counts["unchanged"] += 1
+            continue
+        method = publish_file(source, dest)
+        counts[method] = counts.get(method, 0) + 1
+
+    if image_list:
+        tmp_path = f"{image_list}.tmp.{os.getpid()}"
+        with open(tmp_path, "w") as fh:
+            for name in sorted(published):
+                if name.lower().endswith(LIST_EXTENSIONS):
+                    fh.write(f"{os.path.join(plot_dir, name)}\n{name}\n")
+        os.replace(tmp_path, image_list)
+
+    summary = ", ".join(f"{count} {method}" for method, count in counts.items())
+    print(f"Published {len(published)} plots from {manifest} to {plot_dir} ({summary}).")
+    return 0
+
+
+def main(argv):
+    if len(argv) >= 3 and argv[1] == "register":
+        register(*argv[2:])
+        return 0
+    if len(argv) == 4 and argv[1] == "register-ncl":
+        register(*ncl_plots(argv[3], float(argv[2])), renderer=f"ncl {os.path.basename(argv[3])}")
+        return 0
+    if len(argv) in (4, 5) and argv[1] == "publish":
+        return publish(argv[2], argv[3], argv[4] if len(argv) == 5 else None)
+    print("Usage: python plot_manifest.py register <file> [<file> ...]\n"
+          "       python plot_manifest.py register-ncl <epoch_seconds> <script.ncl>\n"
+          "       python plot_manifest.py publish <manifest> <plot_dir> [<image_list>]")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
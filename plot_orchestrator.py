@@ -0,0 +1,352 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Concurrent, incremental plotting stage.
+#
+# plotting_functions_new.sh registers its regrid, bias, NCL and Python render
+# steps as tasks in a task list (JSON lines), each with the names of the tasks
+# it needs to have finished first. "run" executes the list with asyncio, at
+# most plot_jobs tasks at a time, across all variables. A task is run by bash,
+# so the exported cdo/ncl wrappers apply, with the working directory and
+# environment it was registered with. Its output goes to its own log file.
+#
+# Running tasks may register more tasks (the special_plot_*.sh scripts register
+# their NCL scripts once their bias files are written); they are picked up as
+# they appear. Dependencies are on tasks registered earlier (a name not
+# registered yet is an error), and a task registered again under the same name runs after the earlier one, as it did
+# in the sequential order. A task whose dependency failed is skipped; the
+# others still run. The exit code, wall time and log of every task are
+# collected in <tasks>.status.jsonl and summarised at the end.
+#
+# Tasks are rebuilt make-style. The fingerprint of a task covers its command,
+# the plot parameters in its environment (season, domain, ...), the size and
+# modification time of its inputs, and the fingerprints of the tasks it
+# depends on and of the task that registered it. Inputs are the files named in
+# the command plus those declared with --input (plot scripts, products read
+# under hard-coded paths). A task whose fingerprint is the one of its last
+# successful run, and whose outputs (declared with --output, and the plots it
+# registered) are all there, is not run again: its plots are registered in
+# this run's manifest and the tasks it registered then are registered again.
+# Fingerprints are kept in plot_state.json next to the task list, by the path
+# of registering task names (e.g. /special_plot_wind_ann/wind_850_season.ncl).
+#
+# Usage:
+#   python plot_orchestrator.py add <tasks.jsonl> <name> [--after=<name> ...] [--input=<file> ...] [--output=<file> ...] -- <command> [<arg> ...]
+#   python plot_orchestrator.py run <tasks.jsonl> [--jobs=<N>] [--rebuild]
+#
+# ==============================================================================
+
+import sys
+import os
+import json
+import time
+import asyncio
+import hashlib
+
+import plot_manifest
+
+LOG_TAIL_LINES = 10
+STATE_FILE = "plot_state.json"
+STATE_VERSION = 1
+OK_STATUSES = ("ok", "up-to-date")
+
+# Settings read by the renderers from the environment rather than arguments
+PARAM_ENV = ("season", "projection", "lat_range", "lon_range", "lat_min", "lat_max", "lon_min", "lon_max",
+             "precision_policy", "storage_profile_maps", "domain_pushdown", "domain_margin", "plev_levels",
+             "significance_alpha")
+
+# Variables of the current run, replacing those recorded with a task registered again
+RUN_ENV_PREFIX = "ATM_"
+
+
+def log_dir_of(tasks_path):
+    return os.path.splitext(tasks_path)[0] + "_logs"
+
+
+def status_path_of(tasks_path):
+    return os.path.splitext(tasks_path)[0] + ".status.jsonl"
+
+
+def read_tasks(tasks_path, offset=0):
+    """Tasks appended after offset, and the new offset."""
+    tasks = []
+    try:
+        with open(tasks_path) as fh:
+            fh.seek(offset)
+            for line in iter(fh.readline, ""):
+                if not line.endswith("\n"):
+                    break  # still being written
+                tasks.append(json.loads(line))
+                offset = fh.tell()
+    except FileNotFoundError:
+        pass
+    return tasks, offset
+
+
+def add(tasks_path, name, command, after=(), inputs=(), outputs=(), cwd=None, env=None, parent=None):
+    """
+    Register a task; returns the name it is registered under. Raises
+    ValueError if a dependency is not registered yet.
+    """
+    import fcntl
+    env = dict(os.environ) if env is None else env
+    fd = os.open(tasks_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        # Held while the names are read, so concurrent registrations see each other
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        names = [task["name"] for task in read_tasks(tasks_path)[0]]
+        unknown = [dep for dep in after if dep not in names]
+        if unknown:
+            raise ValueError(f"Task {name} depends on {', '.join(unknown)}, not registered before it")
+        after = list(after)
+        unique, follows = name, None
+        if name in names:
+            unique = f"{name}#{sum(1 for n in names if n.split('#')[0] == name) + 1}"
+            follows = next(n for n in reversed(names) if n.split("#")[0] == name)
+            after.append(follows)
+        entry = {"name": unique, "base": name, "command": list(command), "after": after, "follows": follows,
+                 "inputs": list(inputs), "outputs": list(outputs),
+                 "parent": parent if parent is not None else env.get("ATM_PLOT_TASK"),
+                 "cwd": cwd or os.getcwd(), "env": env}
+        os.write(fd, (json.dumps(entry) + "\n").encode())
+    finally:
+        os.close(fd)
+    return unique
+
+
+def file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def task_inputs(task):
+    """Declared inputs and the files named in the command (but not its outputs)."""
+    paths = set(task.get("inputs", []))
+    paths.update(arg for arg in task["command"] if os.path.isfile(os.path.join(task["cwd"], arg)))
+    return sorted(paths - set(task.get("outputs", [])))
+
+
+def fingerprint(task, keys):
+    value = {
+        "command": task["command"],
+        "params": {name: task["env"].get(name) for name in PARAM_ENV},
+        "inputs": {path: file_state(os.path.join(task["cwd"], path)) for path in task_inputs(task)},
+        # Not the earlier task of the same name, only run first to keep the order
+        "after": {dep: keys.get(dep) for dep in task["after"] if dep != task.get("follows")},
+        "parent": keys.get(task.get("parent")),
+    }
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def load_state(path):
+    try:
+        with open(path) as fh:
+            state = json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return state.get("tasks", {}) if state.get("version") == STATE_VERSION else {}
+
+
+def save_state(path, tasks):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w") as fh:
+        json.dump({"version": STATE_VERSION, "tasks": tasks}, fh)
+    os.replace(tmp_path, path)
+
+
+def tail(path, lines=LOG_TAIL_LINES):
+    try:
+        with open(path, errors="replace") as fh:
+            return fh.readlines()[-lines:]
+    except OSError:
+        return []
+
+
+class Orchestrator:
+    """Runs the tasks of a task list, at most jobs at a time."""
+
+    def __init__(self, tasks_path, jobs, rebuild=False):
+        self.tasks_path = tasks_path
+        self.log_dir = log_dir_of(tasks_path)
+        self.status_path = status_path_of(tasks_path)
+        self.state_path = os.path.join(os.path.dirname(os.path.abspath(tasks_path)), STATE_FILE)
+        self.state = {} if rebuild else load_state(self.state_path)
+        self.manifest = os.environ.get(plot_manifest.MANIFEST_ENV)
+        self.limit = asyncio.Semaphore(jobs)
+        self.runs = {}
+        self.keys = {}
+        self.ids = {}
+        self.results = {}
+
+    def record(self, result):
+        self.results[result["name"]] = result
+        with open(self.status_path, "a") as fh:
+            fh.write(json.dumps(result) + "\n")
+        wall = f" ({result['wall']:.1f} s)" if result["wall"] is not None else ""
+        print(f"[{result['status']}] {result['name']}{wall}", flush=True)
+
+    def state_id(self, task):
+        """
+        Name of a task in the state: its name under the task that registered it.
+        Unlike the "#N" names, it does not depend on the order in which concurrent
+        tasks registered theirs.
+        """
+        path = f"{self.ids.get(task.get('parent'), '')}/{task['base']}"
+        count = sum(1 for other in self.ids.values() if other.split("#")[0] == path)
+        return path if count == 0 else f"{path}#{count + 1}"
+
+    def up_to_date(self, task, key):
+        previous = self.state.get(self.ids[task["name"]])
+        if previous is None or previous["key"] != key:
+            return False
+        outputs = [os.path.join(task["cwd"], path) for path in task.get("outputs", [])] + previous["plots"]
+        return all(os.path.exists(path) for path in outputs)
+
+    def reuse(self, task):
+        """Register the plots of a task's last run, and the tasks it registered then."""
+        previous = self.state[self.ids[task["name"]]]
+        if self.manifest and previous["plots"]:
+            plot_manifest.register(*previous["plots"], renderer=f"{task['name']} (up to date)",
+                                   manifest=self.manifest)
+        for child in previous["children"]:
+            env = {name: value for name, value in child["env"].items() if not name.startswith(RUN_ENV_PREFIX)}
+            env.update({name: value for name, value in task["env"].items() if name.startswith(RUN_ENV_PREFIX)})
+            # The earlier task of the same name is added back by add itself
+            after = [dep for dep in child["after"] if dep != child.get("follows")]
+            add(self.tasks_path, child["base"], child["command"], after, child["inputs"],
+                child["outputs"], child["cwd"], env, parent=task["name"])
+
+    def remember(self, task, key, plots):
+        children = [child for child in read_tasks(self.tasks_path)[0] if child.get("parent") == task["name"]]
+        self.state[self.ids[task["name"]]] = {"key": key, "plots": plots, "children": children}
+        save_state(self.state_path, self.state)
+
+    async def run_task(self, task):
+        name = task["name"]
+        safe_name = name.replace("/", "_")
+        log = os.path.join(self.log_dir, safe_name + ".log")
+        for dep in task["after"]:
+            await self.runs[dep]
+            if self.results[dep]["status"] not in OK_STATUSES:
+                self.record({"name": name, "status": "skipped", "exit_code": None, "wall": None,
+                             "log": None, "reason": f"{dep} {self.results[dep]['status']}"})
+                return
+        key = self.keys[name] = fingerprint(task, self.keys)
+        if self.up_to_date(task, key):
+            self.reuse(task)
+            self.record({"name": name, "status": "up-to-date", "exit_code": None, "wall": None, "log": None})
+            return
+
+        # The task's own manifest, for the plots it writes
+        env = dict(task["env"], ATM_PLOT_TASK=name)
+        task_manifest = os.path.join(self.log_dir, safe_name + ".plots.jsonl")
+        env[plot_manifest.MANIFEST_ENV] = task_manifest
+        async with self.limit:
+            start = time.time()
+            with open(log, "w") as fh:
+                try:
+                    process = await asyncio.create_subprocess_exec(
+                        "bash", "-c", '"$@"', "bash", *task["command"],
+                        cwd=task["cwd"], env=env, stdin=asyncio.subprocess.DEVNULL,
+                        stdout=fh, stderr=asyncio.subprocess.STDOUT)
+                    code = await process.wait()
+                except OSError as exc:
+                    fh.write(f"Error: {exc}\n")
+                    code = 127
+        plots = sorted(plot_manifest.read_manifest(task_manifest))
+        if self.manifest and plots:
+            plot_manifest.register(*plots, renderer=name, manifest=self.manifest)
+        if code == 0:
+            self.remember(task, key, plots)
+        elif self.state.pop(self.ids[name], None) is not None:
+            save_state(self.state_path, self.state)
+        self.record({"name": name, "status": "ok" if code == 0 else "failed", "exit_code": code,
+                     "wall": time.time() - start, "log": log})
+
+    async def run(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        offset, pending = 0, set()
+        while True:
+            # Tasks registered by the tasks that finished meanwhile
+            new, offset = read_tasks(self.tasks_path, offset)
+            for task in new:
+                self.ids[task["name"]] = self.state_id(task)
+                self.runs[task["name"]] = asyncio.ensure_future(self.run_task(task))
+                pending.add(self.runs[task["name"]])
+            if not pending:
+                break
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+    def summary(self):
+        counts = {}
+        for result in self.results.values():
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        print(f"Plot tasks: {len(self.results)} run, " +
+              ", ".join(f"{count} {status}" for status, count in sorted(counts.items())) +
+              f". Logs in {self.log_dir}")
+        for result in self.results.values():
+            if result["status"] == "failed":
+                print(f"Task {result['name']} failed with exit code {result['exit_code']}; end of {result['log']}:")
+                for line in tail(result["log"]):
+                    print("    " + line.rstrip("\n"))
+            elif result["status"] == "skipped":
+                print(f"Task {result['name']} skipped: {result['reason']}")
+        return 1 if counts.get("failed") or counts.get("skipped") else 0
+
+
+def run(tasks_path, jobs=None, rebuild=False):
+    jobs = max(1, jobs or os.cpu_count() or 1)
+    orchestrator = Orchestrator(tasks_path, jobs, rebuild)
+    if os.path.exists(orchestrator.status_path):
+        os.remove(orchestrator.status_path)
+    print(f"Running plot tasks of {tasks_path}, {jobs} at a time...", flush=True)
+    asyncio.run(orchestrator.run())
+    return orchestrator.summary()
+
+
+def main(argv):
+    if len(argv) >= 6 and argv[1] == "add" and "--" in argv[4:]:
+        split = argv.index("--", 4)
+        options = {"--after": [], "--input": [], "--output": []}
+        for option in argv[4:split]:
+            name, _, value = option.partition("=")
+            if name not in options or not value:
+                return main(argv[:1])
+            options[name].append(value)
+        if split == len(argv) - 1:
+            return main(argv[:1])
+        try:
+            add(argv[2], argv[3], argv[split + 1:], options["--after"], options["--input"], options["--output"])
+        except ValueError as exc:
+            print(f"Error: {exc}")
+            return 1
+        return 0
+    if len(argv) >= 3 and argv[1] == "run":
+        jobs, rebuild = None, False
+        for option in argv[3:]:
+            if option.startswith("--jobs="):
+                jobs = int(option.split("=", 1)[1] or 0)
+            elif option == "--rebuild":
+                rebuild = True
+            else:
+                return main(argv[:1])
+        return run(argv[2], jobs, rebuild)
+    print("Usage: python plot_orchestrator.py add <tasks.jsonl> <name> [--after=<name> ...] [--input=<file> ...] "
+          "[--output=<file> ...] -- <command> [<arg> ...]\n"
+          "       python plot_orchestrator.py run <tasks.jsonl> [--jobs=<N>] [--rebuild]")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,297 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Function-level profiling for the Python plotting and HTML scripts.
+#
+# Enabled by the environment variable plot_profile (set in user_inputs_atm.sh
+# and exported by the wrapper):
+#   plot_profile=cprofile   deterministic profile (cProfile)
+#   plot_profile=sample     statistical profile, sampling the stack every 5 ms of CPU
+# Unset or empty, importing this module does nothing.
+#
+# Time and tracemalloc peak memory are kept per phase. The scripts mark their
+# coarse phases (load, transform, render, html, pdf_conversion), and the
+# matplotlib/cartopy calls contourf, colorbar and savefig are timed as phases of
+# their own. Products opened with open_product are loaded eagerly while
+# profiling so their read time lands in the load phase.
+#
+# When the script exits, a report with the phase table, a breakdown of time by
+# library (cartopy projection, contour generation, PNG encoding, ...) and the
+# top hotspots is written next to each figure saved, as <figure>.profile.txt
+# (plus <figure>.prof for cProfile, readable with pstats or snakeviz).
+#
+# Usage (in a plotting script, before importing product_store):
+#   import plot_profiling
+#   plot_profiling.phase_start("load")
+#
+# ==============================================================================
+
+import sys
+import os
+import io
+import time
+import atexit
+import signal
+import functools
+import tracemalloc
+from collections import Counter
+
+MODES = ("cprofile", "sample")
+SAMPLE_INTERVAL = 0.005
+TOP_N = 25
+
+# Library buckets for the breakdown, matched against source file paths
+CATEGORIES = [
+    ("cartopy projection", ("cartopy", "pyproj", "shapely")),
+    ("contour generation", ("contourpy", os.path.join("matplotlib", "contour"))),
+    ("PNG encoding", ("PIL", "_png", os.path.join("matplotlib", "image"), "backend_agg")),
+    ("matplotlib drawing", ("matplotlib",)),
+    ("data I/O", ("xarray", "netCDF4", "h5netcdf", "zarr", "numcodecs", "cftime")),
+    ("numpy", ("numpy",)),
+    ("PDF rendering", ("weasyprint", "pydyf")),
+]
+
+_profiler = None
+
+
+def _category(filename):
+    for name, patterns in CATEGORIES:
+        if any(pattern in filename for pattern in patterns):
+            return name
+    return "other"
+
+
+class _Profiler:
+    def __init__(self, mode, script):
+        self.mode = mode
+        self.script = script
+        self.stack = []
+        self.totals = {}
+        self.order = []
+        self.outputs = []
+        self.started = time.perf_counter()
+        tracemalloc.start()
+        if mode == "cprofile":
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            self.self_samples = Counter()
+            self.total_samples = Counter()
+            signal.signal(signal.SIGPROF, self._sample)
+            signal.setitimer(signal.ITIMER_PROF, SAMPLE_INTERVAL, SAMPLE_INTERVAL)
+        self.push("startup")
+
+    # -- stack sampling ---------------------------------------------------------
+    def _sample(self, signum, frame):
+        seen = set()
+        first = True
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_filename, code.co_firstlineno, code.co_name)
+            if first:
+                self.self_samples[key] += 1
+                first = False
+            if key not in seen:
+                self.total_samples[key] += 1
+                seen.add(key)
+            frame = frame.f_back
+
+    # -- phases -----------------------------------------------------------------
+    def push(self, name):
+        now = time.perf_counter()
+        peak = tracemalloc.get_traced_memory()[1]
+        if self.stack:
+            parent = self.stack[-1]
+            parent["wall"] += now - parent["since"]
+            parent["peak"] = max(parent["peak"], peak)
+        tracemalloc.reset_peak()
+        self.stack.append({"name": name, "since": now, "wall": 0.0, "peak": 0})
+
+    def pop(self):
+        now = time.perf_counter()
+        peak = tracemalloc.get_traced_memory()[1]
+        frame = self.stack.pop()
+        frame["wall"] += now - frame["since"]
+        frame["peak"] = max(frame["peak"], peak)
+        if frame["name"] not in self.totals:
+            self.totals[frame["name"]] = {"calls": 0, "wall": 0.0, "peak": 0}
+            self.order.append(frame["name"])
+        total = self.totals[frame["name"]]
+        total["calls"] += 1
+        total["wall"] += frame["wall"]
+        total["peak"] = max(total["peak"], frame["peak"])
+        if self.stack:
+            parent = self.stack[-1]
+            parent["since"] = now
+            parent["peak"] = max(parent["peak"], frame["peak"])
+        tracemalloc.reset_peak()
+
+    def mark(self, name):
+        while self.stack:
+            self.pop()
+        self.push(name)
+
+    # -- report -----------------------------------------------------------------
+    def finish(self):
+        while self.stack:
+            self.pop()
+        elapsed = time.perf_counter() - self.started
+        if self.mode == "cprofile":
+            self.profile.disable()
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        tracemalloc.stop()
+
+        report = self.report(elapsed)
+        outputs = self.outputs or [os.path.join(os.getcwd(), os.path.splitext(self.script)[0])]
+        for output in outputs:
+            base = os.path.splitext(output)[0]
+            with open(f"{base}.profile.txt", "w") as fh:
+                fh.write(report)
+            if self.mode == "cprofile":
+                self.profile.dump_stats(f"{base}.prof")
+            print(f"Profile written to {base}.profile.txt")
+
+    def report(self, elapsed):
+        out = io.StringIO()
+        figures = ", ".join(os.path.basename(path) for path in self.outputs) or "(no figure saved)"
+        out.write(f"Profile of {self.script} ({self.mode}) for {figures}\n")
+        out.write(f"Total wall time: {elapsed:.3f} s\n\n")
+
+        out.write(f"{'phase':20s} {'calls':>6s} {'wall_s':>10s} {'share':>7s} {'peak_mb':>9s}\n")
+        for name in self.order:
+            total = self.totals[name]
+            share = 100.0 * total["wall"] / elapsed if elapsed else 0.0
+            out.write(f"{name:20s} {total['calls']:6d} {total['wall']:10.3f} {share:6.1f}% "
+                      f"{total['peak'] / 1e6:9.1f}\n")
+        out.write("(wall_s excludes nested phases; peak_mb is the tracemalloc peak while the phase ran)\n\n")
+
+        if self.mode == "cprofile":
+            import pstats
+            stats = pstats.Stats(self.profile)
+            by_category = Counter()
+            for (filename, _, _), (_, _, tottime, _, _) in stats.stats.items():
+                by_category[_category(filename)] += tottime
+            unit = "s"
+        else:
+            by_category = Counter()
+            for (filename, _, _), count in self.self_samples.items():
+                by_category[_category(filename)] += count * SAMPLE_INTERVAL
+            unit = "s (sampled CPU)"
+
+        out.write(f"Time by library, {unit}:\n")
+        grand = sum(by_category.values()) or 1.0
+        for name, seconds in by_category.most_common():
+            out.write(f"  {name:22s} {seconds:10.3f} {100.0 * seconds / grand:6.1f}%\n")
+        out.write("\n")
+
+        if self.mode == "cprofile":
+            for sort_key in ("cumulative", "tottime"):
+                buffer = io.StringIO()
+                pstats.Stats(self.profile, stream=buffer).strip_dirs().sort_stats(sort_key).print_stats(TOP_N)
+                out.write(f"Top {TOP_N} functions by {sort_key} time:\n")
+                out.write(buffer.getvalue().strip("\n") + "\n\n")
+        else:
+            for title, counter in (("self", self.self_samples), ("inclusive", self.total_samples)):
+                out.write(f"Top {TOP_N} functions by {title} samples ({SAMPLE_INTERVAL * 1000:.0f} ms each):\n")
+                for (filename, line, function), count in counter.most_common(TOP_N):
+                    out.write(f"  {count:7d} {count * SAMPLE_INTERVAL:9.3f} s  "
+                              f"{function} ({os.path.basename(filename)}:{line})\n")
+                out.write("\n")
+        return out.getvalue()
+
+
+def enabled():
+    """True when plot_profile names a profiling mode."""
+    return os.environ.get("plot_profile", "") in MODES
+
+
+def phase_start(name):
+    """Start a top-level phase of the script, ending the previous one."""
+    if _profiler is not None:
+        _profiler.mark(name)
+
+
+class phase:
+    """Time a block as a nested phase (no-op when profiling is off)."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if _profiler is not None:
+            _profiler.push(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        if _profiler is not None:
+            _profiler.pop()
+        return False
+
+
+def add_output(path):
+    """Write the report next to this file in addition to any saved figures."""
+    if _profiler is not None and path not in _profiler.outputs:
+        _profiler.outputs.append(path)
+
+
+def _timed(name, function, on_call=None):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _profiler is None or (_profiler.stack and _profiler.stack[-1]["name"] == name):
+            return function(*args, **kwargs)
+        if on_call is not None:
+            on_call(args, kwargs)
+        with phase(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def _record_figure(args, kwargs):
+    target = args[1] if len(args) > 1 else kwargs.get("fname")
+    if isinstance(target, (str, os.PathLike)):
+        add_output(os.fspath(target))
+
+
+def _instrument():
+    """Time contourf, colorbar and savefig, and load products eagerly."""
+    import matplotlib.axes
+    import matplotlib.figure
+    matplotlib.axes.Axes.contourf = _timed("contourf", matplotlib.axes.Axes.contourf)
+    matplotlib.figure.Figure.colorbar = _timed("colorbar", matplotlib.figure.Figure.colorbar)
+    matplotlib.figure.Figure.savefig = _timed("savefig", matplotlib.figure.Figure.savefig, _record_figure)
+    try:
+        from cartopy.mpl.geoaxes import GeoAxes
+        GeoAxes.contourf = _timed("contourf", GeoAxes.contourf)
+    except ImportError:
+        pass
+
+    import product_store
+    open_product = product_store.open_product
+
+    @functools.wraps(open_product)
+    def open_product_eager(*args, **kwargs):
+        return open_product(*args, **kwargs).load()
+    product_store.open_product = _timed("load", open_product_eager)
+
+
+def _start():
+    global _profiler
+    if not enabled() or _profiler is not None:
+        return
+    script = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+    _profiler = _Profiler(os.environ["plot_profile"], script)
+    _instrument()
+    atexit.register(_profiler.finish)
+
+
+_start()
@@ -58,6 +58,14 @@ end_year=""
 plot_var=()
 separator_found=false
 
+# A single plot task of this script, run by the orchestrator (see plot_task)
+task_call=()
+if [[ "$1" == --task=* ]]; then
+    read -r -a task_call <<< "${1#--task=}"
+    shift
+fi
+script_args=("$@")
+
 # Debug mode flag
 debug=false
 if [ "$1" == "-d" ]; then
@@ -147,9 +155,59 @@ declare -A variable_mapping=(
     ["evspsbl"]="e"
 )
 
+# CDO output options for the precision policy and the configured storage
+# profiles (see precision.py and storage_profiles.py)
+storage_profile_maps="${storage_profile_maps:-cdo_default}"
+storage_profile_series="${storage_profile_series:-cdo_default}"
+read -r -a precision_cdo_opts <<< "$(python3 precision.py cdo-opts)"
+read -r -a map_cdo_opts <<< "$(python3 storage_profiles.py cdo-opts "$storage_profile_maps")"
+read -r -a series_cdo_opts <<< "$(python3 storage_profiles.py cdo-opts "$storage_profile_series")"
+map_cdo_opts+=("${precision_cdo_opts[@]}")
+series_cdo_opts+=("${precision_cdo_opts[@]}")
+
 # Log skipped variables
 skipped_log="$output_dir/skipped_plot_variables.log"
-> "$skipped_log"
+[ ${#task_call[@]} -gt 0 ] || > "$skipped_log"
+
+# Plot tasks (see plot_orchestrator.py): the steps below are registered as
+# tasks, run concurrently at most plot_jobs at a time once all are registered.
+#   plot_task <name> [--after=<name> ...] [--input=<file> ...] [--output=<file> ...] -- <command> [<arg> ...]
+# A task is run again only when its inputs (the files in its command, and those
+# declared), plot parameters or dependencies changed since its last run, or an
+# output is missing; plot_incremental=false renders everything again.
+# A command that is a function of this script is run by this script in task
+# mode. The special_plot_*.sh scripts register their NCL scripts the same way;
+# run on their own (without ATM_PLOT_TASKS), each command runs right away.
+function plot_task {
+    if [ -z "$ATM_PLOT_TASKS" ]; then
+        while [ "$1" != "--" ]; do shift; done
+        shift
+        "$@"
+        return
+    fi
+    local options=()
+    while [ "$1" != "--" ]; do
+        options+=("$1")
+        shift
+    done
+    shift
+    if [ "$(type -t "$1")" = "function" ] && [[ " ${task_functions[*]} " == *" $1 "* ]]; then
+        set -- bash "$plotting_script" "--task=$*" "${script_args[@]}"
+    fi
+    python3 plot_orchestrator.py add "$ATM_PLOT_TASKS" "${options[@]}" -- "$@"
+}
+export -f plot_task
+task_functions=(extract_grid regrid_data regrid_rnet call_specialized_plot)
+plotting_script="$(realpath "$0")"
+
+# Extract the grid of Model 1, the target of every regridding, from one of its products
+function extract_grid {
+    local model1_grid="${model1_prefix}_grid.txt"
+    echo "Extracting grid for Model 1..."
+    cdo griddes "$1" > "${model1_grid}.tmp.$$"
+    check_error "Extracting grid for Model 1"
+    mv "${model1_grid}.tmp.$$" "$model1_grid"
+}
 
 # Function to regrid data
 function regrid_data {
@@ -172,47 +230,129 @@ function regrid_data {
     local model2_annual="${model2_prefix}_annual_mean_${var}${suffix}.nc"
     local model2_season="${model2_prefix}_${season}_mean_${var}${suffix}.nc"
 
+    # Written by the model1_grid task, which the regridding tasks wait for
     local model1_grid="${model1_prefix}_grid.txt"
-    if [ ! -f "$model1_grid" ]; then
-        echo "Extracting grid for Model 1..."
-        cdo griddes "$model1_annual" > "$model1_grid"
-        check_error "Extracting grid for Model 1"
-    fi
+    verify_file "$model1_grid" || return
 
-    # Regrid observation data
-    if [ ! -f "$obs_annual_regridded" ]; then
+    # Regrid observation data, or reuse it from the shared observation cache
+    # (see obs_cache.py), keyed there by the grid of Model 1
+    local cache_args=("$obs_cache_dir" "$var" "${suffix#_}" "$obs_data_dir" "$start_year_obs" "$end_year_obs" --grid="$model1_grid")
+    if [ -n "$obs_cache_dir" ] && [[ ! -f "$obs_annual_regridded" || ! -f "$obs_season_regridded" ]]; then
+        python3 obs_cache.py fetch "${cache_args[@]}" "$obs_annual_regridded" "$obs_season_regridded"
+    fi
+    if [ ! "$obs_annual_regridded" -nt "$obs_annual" ]; then
         verify_file "$obs_annual" || return
-        cdo -selvar,"$obs_var" "$obs_annual" temp_$obs_var.nc
-        cdo remapbil,"$model1_grid" temp_$obs_var.nc "$obs_annual_regridded"
-        rm temp_$obs_var.nc
-
+        cdo "${map_cdo_opts[@]}" remapbil,"$model1_grid" -selvar,"$obs_var" "$obs_annual" "$obs_annual_regridded"
         check_error "Regridding annual observation data for $var"
     fi
-    if [ ! -f "$obs_season_regridded" ]; then
+    if [ ! "$obs_season_regridded" -nt "$obs_season" ]; then
         verify_file "$obs_season" || return
-        cdo -selvar,"$obs_var" "$obs_season" temp_$obs_var.nc
-	cdo remapbil,"$model1_grid" temp_$obs_var.nc "$obs_season_regridded"
-	rm temp_$obs_var.nc
-
+        cdo "${map_cdo_opts[@]}" remapbil,"$model1_grid" -selvar,"$obs_var" "$obs_season" "$obs_season_regridded"
         check_error "Regridding seasonal observation data for $var"
     fi
+    if [ -n "$obs_cache_dir" ]; then
+        python3 obs_cache.py store "${cache_args[@]}" "$obs_annual_regridded" "$obs_season_regridded"
+        check_error "Storing regridded observation data for $var in the observation cache"
+    fi
+    # Interannual moments, for the significance of the biases (see significance.py)
+    local obs_moments="${obs_prefix}moments_${obs_var}.nc"
+    local obs_moments_regridded="${output_dir}/obs_moments_${obs_var}_regridded.nc"
+    if [ -f "$obs_moments" ] && [ ! "$obs_moments_regridded" -nt "$obs_moments" ]; then
+        cdo "${map_cdo_opts[@]}" remapbil,"$model1_grid" "$obs_moments" "$obs_moments_regridded"
+        check_error "Regridding observation moments for $var"
+    fi
 
     # Regrid Model 2 data if provided
     if [[ -n "$model2_prefix" ]]; then
         echo "Regridding Model 2 data for $var..."
-        if [ ! -f "${output_dir}/model2_annual_mean_${var}${suffix}_regridded.nc" ]; then
+        if [ ! "${output_dir}/model2_annual_mean_${var}${suffix}_regridded.nc" -nt "$model2_annual" ]; then
             verify_file "$model2_annual" || return
-            cdo remapbil,"$model1_grid" "$model2_annual" "${output_dir}/model2_annual_mean_${var}${suffix}_regridded.nc"
+            cdo "${map_cdo_opts[@]}" remapbil,"$model1_grid" "$model2_annual" "${output_dir}/model2_annual_mean_${var}${suffix}_regridded.nc"
             check_error "Regridding Model 2 annual data for $var"
         fi
-        if [ ! -f "${output_dir}/model2_${season}_mean_${var}${suffix}_regridded.nc" ]; then
+        if [ ! "${output_dir}/model2_${season}_mean_${var}${suffix}_regridded.nc" -nt "$model2_season" ]; then
             verify_file "$model2_season" || return
-            cdo remapbil,"$model1_grid" "$model2_season" "${output_dir}/model2_${season}_mean_${var}${suffix}_regridded.nc"
+            cdo "${map_cdo_opts[@]}" remapbil,"$model1_grid" "$model2_season" "${output_dir}/model2_${season}_mean_${var}${suffix}_regridded.nc"
             check_error "Regridding Model 2 seasonal data for $var"
         fi
+        local model2_moments="${model2_prefix}_moments_${var}${suffix}.nc"
+        local model2_moments_regridded="${output_dir}/model2_moments_${var}${suffix}_regridded.nc"
+        if [ -f "$model2_moments" ] && [ ! "$model2_moments_regridded" -nt "$model2_moments" ]; then
+            cdo "${map_cdo_opts[@]}" remapbil,"$model1_grid" "$model2_moments" "$model2_moments_regridded"
+            check_error "Regridding Model 2 moments for $var"
+        fi
     fi
 }
 
+# Register the special plot of a variable, with the products and plot scripts it reads
+function specialized_plot_task {
+    local var="$1"
+    local suffix="$2"
+    local obs_var="${variable_mapping[$var]:-$var}"
+    local inputs=(
+        --input="./special_plot_${var}.sh"
+        --input="${model1_prefix}_annual_mean_${var}${suffix}.nc"
+        --input="${model1_prefix}_${season}_mean_${var}${suffix}.nc"
+        --input="${model1_prefix}_moments_${var}${suffix}.nc"
+        --input="${output_dir}/obs_moments_${obs_var}_regridded.nc"
+        --input="${output_dir}/obs_annual_mean_${obs_var}_regridded.nc"
+        --input="${output_dir}/obs_${season}_mean_${obs_var}_regridded.nc"
+    )
+    if [[ -n "$model2_prefix" ]]; then
+        inputs+=(--input="${output_dir}/model2_moments_${var}${suffix}_regridded.nc"
+                 --input="${output_dir}/model2_annual_mean_${var}${suffix}_regridded.nc"
+                 --input="${output_dir}/model2_${season}_mean_${var}${suffix}_regridded.nc")
+    fi
+    local renderer
+    for renderer in ./"${var}"_*plotting_script_*.py; do
+        [ -f "$renderer" ] && inputs+=(--input="$renderer")
+    done
+    plot_task "special_plot_$var" --after="regrid_$var" "${inputs[@]}" -- call_specialized_plot "$var" "$suffix"
+}
+
+# Resolve an all-year series into CDO input arguments (all_year_args): the merged
+# file if it exists, otherwise the chained inputs recorded in its virtual index.
+# Exported for the special_plot_*.sh scripts run from here
+function all_year_input {
+    local nc_file="$1"
+    local index_file="${nc_file%.nc}.vds.json"
+    all_year_args=()
+    if [ -f "$nc_file" ]; then
+        all_year_args=("$nc_file")
+    elif [ -f "$index_file" ]; then
+        mapfile -t all_year_args < <(python3 virtual_dataset.py cdo-args "$index_file")
+    else
+        return 1
+    fi
+}
+export -f all_year_input
+
+# Register the field mean of an all-year series as a task (added to fldmean_tasks),
+# rebuilt whenever the series or its virtual index changes
+function fldmean_task {
+    local name="$1" all_year="$2" fldmean="$3"
+    if all_year_input "$all_year"; then
+        plot_task "$name" --input="${all_year%.nc}.vds.json" --output="$fldmean" -- \
+            cdo "${precision_cdo_opts[@]}" fldmean "${all_year_args[@]}" "$fldmean"
+        fldmean_tasks+=(--after="$name")
+    else
+        echo "Warning: $all_year (or its virtual index) not found, skipping $name."
+    fi
+}
+
+# Regrid the derived net downward radiation (rnet) of Model 2 to the grid of Model 1
+function regrid_rnet {
+    local model1_grid="${model1_prefix}_grid.txt" period
+    verify_file "$model1_grid" || return
+    for period in annual "$season"; do
+        if [ -f "${model2_prefix}_${period}_mean_rnet_no_plev.nc" ]; then
+            cdo "${map_cdo_opts[@]}" remapbil,"$model1_grid" "${model2_prefix}_${period}_mean_rnet_no_plev.nc" \
+                "${output_dir}/model2_${period}_mean_rnet_no_plev_regridded.nc"
+            check_error "Regridding Model 2 $period rnet"
+        fi
+    done
+}
+
 # Function to call specialized plot scripts
 function call_specialized_plot {
     local var="$1"
@@ -245,13 +385,51 @@ function call_specialized_plot {
     fi
 }
 
+# In task mode, run the task and exit
+if [ ${#task_call[@]} -gt 0 ]; then
+    "${task_call[@]}"
+    exit $?
+fi
+
+# Task list of this plotting run
+export ATM_PLOT_TASKS="$(realpath "$output_dir")/plot_tasks_$(date +%Y%m%d_%H%M%S).jsonl"
+: > "$ATM_PLOT_TASKS"
+
+# The grid of Model 1, the target of every regridding, is extracted once by a
+# single task, which the regridding tasks of the variables wait for
+grid_task=()
+for var in "${plev_variables[@]}" "${no_plev_variables[@]}"; do
+    suffix="_plev"
+    [[ " ${no_plev_variables[@]} " =~ " $var " ]] && suffix="_no_plev"
+    if [ -f "${model1_prefix}_annual_mean_${var}${suffix}.nc" ]; then
+        plot_task model1_grid --output="${model1_prefix}_grid.txt" -- extract_grid "${model1_prefix}_annual_mean_${var}${suffix}.nc"
+        grid_task=(--after=model1_grid)
+        break
+    fi
+done
+
 # Process each variable
 for var in "${plev_variables[@]}" "${no_plev_variables[@]}"; do
     suffix="_plev"
     if [[ " ${no_plev_variables[@]} " =~ " $var " ]]; then
         suffix="_no_plev"
     fi
-    regrid_data "$var" "$suffix"
+    obs_var="${variable_mapping[$var]:-$var}"
+    regrid_files=(
+        --input="${obs_prefix}annual_mean_${obs_var}.nc" --input="${obs_prefix}${season}_mean_${obs_var}.nc"
+        --input="${obs_prefix}moments_${obs_var}.nc"
+        --output="${output_dir}/obs_annual_mean_${obs_var}_regridded.nc"
+        --output="${output_dir}/obs_${season}_mean_${obs_var}_regridded.nc"
+    )
+    if [[ -n "$model2_prefix" ]]; then
+        regrid_files+=(
+            --input="${model2_prefix}_annual_mean_${var}${suffix}.nc" --input="${model2_prefix}_${season}_mean_${var}${suffix}.nc"
+            --input="${model2_prefix}_moments_${var}${suffix}.nc"
+            --output="${output_dir}/model2_annual_mean_${var}${suffix}_regridded.nc"
+            --output="${output_dir}/model2_${season}_mean_${var}${suffix}_regridded.nc"
+        )
+    fi
+    plot_task "regrid_$var" "${grid_task[@]}" "${regrid_files[@]}" -- regrid_data "$var" "$suffix"
     #call_specialized_plot "$var" "$suffix"
 done
 
@@ -270,43 +448,30 @@ echo "This part will be skipped."
 if is_variable_in_list "tas"; then
     echo "Processing TAS..."
 
-    # Run fldmean calculations in parallel only if the output file does not exist
-    if [ ! -f "${model1_prefix}_tas_all_year_fldmean_no_plev.nc" ]; then
-        cdo fldmean "${model1_prefix}_tas_annual_all_year_no_plev.nc" "${model1_prefix}_tas_all_year_fldmean_no_plev.nc" &
-    else
-        echo "Skipping Model 1 fldmean: Output file already exists."
-    fi
-
-    if [ ! -f "${model2_prefix}_tas_all_year_fldmean_no_plev.nc" ]; then
-        cdo fldmean "${model2_prefix}_tas_annual_all_year_no_plev.nc" "${model2_prefix}_tas_all_year_fldmean_no_plev.nc" &
-    else
-        echo "Skipping Model 2 fldmean: Output file already exists."
-    fi
-
-    if [ ! -f "${output_dir}/obs_t2m_all_years_fldmean.nc" ]; then
-        cdo fldmean "${output_dir}/obs_t2m_all_years.nc" "${output_dir}/obs_t2m_all_years_fldmean.nc" &
-    else
-        echo "Skipping Observation fldmean: Output file already exists."
-    fi
-
-    # Wait for background processes to complete before moving to the next step
-    wait
-
-    echo "Fldmean calculations for TAS completed."
+    # fldmean tasks of the all-year series; the time series plots wait for them
+    fldmean_tasks=()
+    fldmean_task tas_fldmean_model1 "${model1_prefix}_tas_annual_all_year_no_plev.nc" "${model1_prefix}_tas_all_year_fldmean_no_plev.nc"
+    fldmean_task tas_fldmean_model2 "${model2_prefix}_tas_annual_all_year_no_plev.nc" "${model2_prefix}_tas_all_year_fldmean_no_plev.nc"
+    fldmean_task tas_fldmean_obs "${output_dir}/obs_t2m_all_years.nc" "${output_dir}/obs_t2m_all_years_fldmean.nc"
 
     # Call specialized plot function for TAS
     suffix="_no_plev"
-    call_specialized_plot "tas" "$suffix"
-
-    # Run NCL scripts sequentially
+    specialized_plot_task "tas" "$suffix"
+
+    # NCL time series plots, of the fldmean series
+    fldmean_tasks+=(
+        --input="${model1_prefix}_tas_all_year_fldmean_no_plev.nc"
+        --input="${model2_prefix}_tas_all_year_fldmean_no_plev.nc"
+        --input="${output_dir}/obs_t2m_all_years_fldmean.nc"
+    )
     if [[ -f "TAS_timeseries_plot_ann.ncl" && -f "TAS_timeseries_plot_ann_24yr_common.ncl" ]]; then
-        ncl TAS_timeseries_plot_ann.ncl
-        ncl TAS_timeseries_plot_ann_24yr_common.ncl
+        plot_task TAS_timeseries_plot_ann.ncl "${fldmean_tasks[@]}" -- ncl TAS_timeseries_plot_ann.ncl
+        plot_task TAS_timeseries_plot_ann_24yr_common.ncl "${fldmean_tasks[@]}" -- ncl TAS_timeseries_plot_ann_24yr_common.ncl
     else
         echo "Error: One or both NCL scripts not found!"
     fi
 
-    echo "TAS processing and plotting completed."
+    echo "TAS plot tasks registered."
 fi
 
 
@@ -316,7 +481,7 @@ if is_variable_in_list "pr"; then
     
     # Call the specialized plot function
     suffix="_no_plev"
-    call_specialized_plot "pr" "$suffix"
+    specialized_plot_task "pr" "$suffix"
 
     # Define the target grid
     export target_grid="./India_grid.txt"
@@ -327,58 +492,68 @@ if is_variable_in_list "pr"; then
         exit 1
     fi
 
-    # Perform CDO regridding in parallel
-    (
-        if [[ -f output_data/model1_pr_annual_all_year_no_plev.nc ]]; then
-            cdo remapbil,"$target_grid" output_data/model1_pr_annual_all_year_no_plev.nc \
-                output_data/model1_pr_annual_all_year_no_plev_regrid.nc
-        else
-            echo "Warning: Model1 PR file not found!"
-        fi
-    ) &
-
-    (
-        if [[ -f output_data/model2_pr_annual_all_year_no_plev.nc ]]; then
-            cdo remapbil,"$target_grid" output_data/model2_pr_annual_all_year_no_plev.nc \
-                output_data/model2_pr_annual_all_year_no_plev_regrid.nc
-        else
-            echo "Warning: Model2 PR file not found!"
-        fi
-    ) &
+    # Cut the series to the India grid (plus a margin for the bilinear
+    # weights) before regridding, instead of regridding the whole globe
+    india_crop=$(python3 domain.py grid-ops "$target_grid")
+    check_error "Reading the India grid box"
+
+    # CDO regridding tasks, run in parallel. The NCL scripts only use the
+    # monthly climatology (and its mean), so the 12-month climatology products
+    # are regridded rather than the all-year series.
+    pr_regrid_tasks=()
+    if [[ -f output_data/model1_monthly_clim_pr_no_plev.nc ]]; then
+        plot_task pr_regrid_model1 --output=output_data/model1_pr_monthly_clim_no_plev_regrid.nc -- cdo "${map_cdo_opts[@]}" remapbil,"$target_grid" "$india_crop" output_data/model1_monthly_clim_pr_no_plev.nc \
+            output_data/model1_pr_monthly_clim_no_plev_regrid.nc
+        pr_regrid_tasks+=(--after=pr_regrid_model1)
+    else
+        echo "Warning: Model1 PR file not found!"
+    fi
 
-    (
-        if [[ -f output_data/obs_precip_all_years.nc ]]; then
-            cdo remapbil,"$target_grid" -selvar,precip output_data/obs_precip_all_years.nc \
-                output_data/obs_precip_all_years_regrid.nc
-        else
-            echo "Warning: Observational PR file not found!"
-        fi
-    ) &
+    if [[ -f output_data/model2_monthly_clim_pr_no_plev.nc ]]; then
+        plot_task pr_regrid_model2 --output=output_data/model2_pr_monthly_clim_no_plev_regrid.nc -- cdo "${map_cdo_opts[@]}" remapbil,"$target_grid" "$india_crop" output_data/model2_monthly_clim_pr_no_plev.nc \
+            output_data/model2_pr_monthly_clim_no_plev_regrid.nc
+        pr_regrid_tasks+=(--after=pr_regrid_model2)
+    else
+        echo "Warning: Model2 PR file not found!"
+    fi
 
-    # Wait for all CDO processes to finish before moving on
-    wait
+    if [[ -f output_data/obs_monthly_clim_precip.nc ]]; then
+        plot_task pr_regrid_obs --output=output_data/obs_precip_monthly_clim_regrid.nc -- cdo "${map_cdo_opts[@]}" remapbil,"$target_grid" "$india_crop" -selvar,precip output_data/obs_monthly_clim_precip.nc \
+            output_data/obs_precip_monthly_clim_regrid.nc
+        pr_regrid_tasks+=(--after=pr_regrid_obs)
+    else
+        echo "Warning: Observational PR file not found!"
+    fi
 
-    echo "Regridding completed for PR."
+    # Central India box (16-26N, 75-85E) on the native Model 1 grid, the only
+    # part of the climatology read by precip_monthly_climatology_box2.ncl
+    if [[ -f output_data/model1_monthly_clim_pr_no_plev.nc ]]; then
+        plot_task pr_central_india_model1 --output=output_data/model1_pr_central_india_monthly_clim_no_plev.nc -- cdo "${precision_cdo_opts[@]}" sellonlatbox,75,85,16,26 output_data/model1_monthly_clim_pr_no_plev.nc \
+            output_data/model1_pr_central_india_monthly_clim_no_plev.nc
+        pr_regrid_tasks+=(--after=pr_central_india_model1)
+    else
+        echo "Warning: Model1 PR file not found!"
+    fi
 
-    # Check if NCL scripts exist before running
+    # NCL plots, once the regridding is done
     if [[ -f precip_monthly_climatology_India.ncl ]]; then
-        ncl precip_monthly_climatology_India.ncl
+        plot_task precip_monthly_climatology_India.ncl "${pr_regrid_tasks[@]}" -- ncl precip_monthly_climatology_India.ncl
     else
         echo "Warning: precip_monthly_climatology_India.ncl not found!"
     fi
     if [[ -f precip_India_contour.ncl ]]; then
-        ncl precip_India_contour.ncl
+        plot_task precip_India_contour.ncl "${pr_regrid_tasks[@]}" -- ncl precip_India_contour.ncl
     else
         echo "Warning: precip_India_contour.ncll not found!"
     fi
 
     if [[ -f precip_monthly_climatology_box2.ncl ]]; then
-        ncl precip_monthly_climatology_box2.ncl
+        plot_task precip_monthly_climatology_box2.ncl "${pr_regrid_tasks[@]}" -- ncl precip_monthly_climatology_box2.ncl
     else
         echo "Warning: precip_monthly_climatology_box2.ncl not found!"
     fi
 
-    echo "PR processing and plotting completed."
+    echo "PR plot tasks registered."
 fi
 
 ####==============================================================================
@@ -388,9 +563,9 @@ if is_variable_in_list "slp"; then
 
     # Call the specialized plot function
     suffix="_plev"
-    call_specialized_plot "slp" "$suffix"
+    specialized_plot_task "slp" "$suffix"
     
-    echo "SLP processing and plotting completed."
+    echo "SLP plot tasks registered."
 fi
 
 
@@ -402,7 +577,7 @@ if is_variable_in_list "evspsbl"; then
     
     for var in "evspsbl"; do
         suffix="_no_plev"
-        call_specialized_plot "$var" "$suffix"
+        specialized_plot_task "$var" "$suffix"
     done
 fi
 
@@ -412,12 +587,12 @@ if is_variable_in_list "ta"; then
     
     for var in "ta"; do
         suffix="_plev"
-        call_specialized_plot "$var" "$suffix"
+        specialized_plot_task "$var" "$suffix"
 
-        ncl ta_level_lat_ann.ncl
-        ncl ta_level_lat_season.ncl
-        ncl ta_level_lon_ann.ncl
-        ncl ta_level_lon_season.ncl
+        # Cross sections of the reordered and bias files of special_plot_ta.sh
+        for ncl_script in ta_level_lat_ann.ncl ta_level_lat_season.ncl ta_level_lon_ann.ncl ta_level_lon_season.ncl; do
+            plot_task "$ncl_script" --after="special_plot_$var" -- ncl "$ncl_script"
+        done
     done
 fi
 
@@ -433,10 +608,10 @@ if is_variable_in_list "hght"; then
     model2_annual_regridded_hght="${output_dir}/model2_annual_mean_hght${suffix}_regridded.nc"
     model2_season_regridded_hght="${output_dir}/model2_${season}_mean_hght${suffix}_regridded.nc"
 
-    ./special_plot_hght_ann.sh "$obs_annual_regridded_hght" "$model1_annual_hght" "$projection" "$lat_range" "$lon_range" "$season" "$model2_annual_regridded_hght" 
-    ./special_plot_hght_season.sh "$obs_season_regridded_hght" "$model1_season_hght" "$projection" "$lat_range" "$lon_range" "$season" "$model2_season_regridded_hght"
+    plot_task special_plot_hght_ann --after=regrid_hght -- ./special_plot_hght_ann.sh "$obs_annual_regridded_hght" "$model1_annual_hght" "$projection" "$lat_range" "$lon_range" "$season" "$model2_annual_regridded_hght" 
+    plot_task special_plot_hght_season --after=regrid_hght -- ./special_plot_hght_season.sh "$obs_season_regridded_hght" "$model1_season_hght" "$projection" "$lat_range" "$lon_range" "$season" "$model2_season_regridded_hght"
 
-    echo "Height (hght) plotting completed."
+    echo "Height (hght) plot tasks registered."
 fi
 
 # Processing Wind (ua & va)
@@ -458,13 +633,15 @@ if is_variable_in_list "ua" || is_variable_in_list "va"; then
     model2_annual_regridded_va="${output_dir}/model2_annual_mean_va${suffix}_regridded.nc"
     model2_season_regridded_va="${output_dir}/model2_${season}_mean_va${suffix}_regridded.nc"
 
-    ./special_plot_wind_ann.sh "$obs_annual_regridded_ua" "$obs_annual_regridded_va" "$model1_annual_ua" "$model1_annual_va" "$projection" "$lat_range" "$lon_range" "$season" "$model2_annual_regridded_ua" "$model2_annual_regridded_va"
-    check_error "Annual plotting for ua and va"
+    plot_task special_plot_wind_ann --after=regrid_ua --after=regrid_va -- \
+        ./special_plot_wind_ann.sh "$obs_annual_regridded_ua" "$obs_annual_regridded_va" "$model1_annual_ua" "$model1_annual_va" "$projection" "$lat_range" "$lon_range" "$season" "$model2_annual_regridded_ua" "$model2_annual_regridded_va"
+    check_error "Registering annual plotting for ua and va"
 
-    ./special_plot_wind_season.sh "$obs_season_regridded_ua" "$obs_season_regridded_va" "$model1_season_ua" "$model1_season_va" "$projection" "$lat_range" "$lon_range" "$season" "$model2_season_regridded_ua" "$model2_season_regridded_va"
-    check_error "Seasonal plotting for ua and va"
+    plot_task special_plot_wind_season --after=regrid_ua --after=regrid_va -- \
+        ./special_plot_wind_season.sh "$obs_season_regridded_ua" "$obs_season_regridded_va" "$model1_season_ua" "$model1_season_va" "$projection" "$lat_range" "$lon_range" "$season" "$model2_season_regridded_ua" "$model2_season_regridded_va"
+    check_error "Registering seasonal plotting for ua and va"
 
-    echo "Wind plotting for both ua and va completed."
+    echo "Wind plot tasks for both ua and va registered."
 fi
 
 # Processing Radiation Data (rsdt, rlut, rsut)
@@ -493,13 +670,30 @@ if is_variable_in_list "rsdt" || is_variable_in_list "rlut" || is_variable_in_li
     model2_annual_regridded_rsut="${output_dir}/model2_annual_mean_rsut${suffix}_regridded.nc"
     model2_season_regridded_rsut="${output_dir}/model2_${season}_mean_rsut${suffix}_regridded.nc"
 
-    ./special_plot_radiation_ann.sh "$obs_annual_regridded_rsdt" "$obs_annual_regridded_rlut" "$obs_annual_regridded_rsut" "$model1_annual_rsdt" "$model1_annual_rlut" "$model1_annual_rsut" "$projection" "$lat_range" "$lon_range" "$season" "$model2_annual_regridded_rsdt" "$model2_annual_regridded_rlut" "$model2_annual_regridded_rsut"
-    check_error "Annual plotting for rsdt, rlut, and rsut"
+    # Net downward radiation of Model 2 on the Model 1 grid, when the processing
+    # derived rnet (derived_variables); the net radiation plots then read it in
+    # place of rsdt, rsut and rlut
+    rnet_files=()
+    for period in annual "$season"; do
+        [ -f "${model2_prefix}_${period}_mean_rnet${suffix}.nc" ] && \
+            rnet_files+=(--input="${model2_prefix}_${period}_mean_rnet${suffix}.nc"
+                         --output="${output_dir}/model2_${period}_mean_rnet${suffix}_regridded.nc")
+    done
+    rnet_task=()
+    if [[ -n "$model2_prefix" && ${#rnet_files[@]} -gt 0 ]]; then
+        plot_task regrid_rnet "${grid_task[@]}" "${rnet_files[@]}" -- regrid_rnet
+        rnet_task=(--after=regrid_rnet)
+    fi
+
+    plot_task special_plot_radiation_ann --after=regrid_rsdt --after=regrid_rlut --after=regrid_rsut "${rnet_task[@]}" -- \
+        ./special_plot_radiation_ann.sh "$obs_annual_regridded_rsdt" "$obs_annual_regridded_rlut" "$obs_annual_regridded_rsut" "$model1_annual_rsdt" "$model1_annual_rlut" "$model1_annual_rsut" "$projection" "$lat_range" "$lon_range" "$season" "$model2_annual_regridded_rsdt" "$model2_annual_regridded_rlut" "$model2_annual_regridded_rsut"
+    check_error "Registering annual plotting for rsdt, rlut, and rsut"
 
-    ./special_plot_radiation_season.sh "$obs_season_regridded_rsdt" "$obs_season_regridded_rlut" "$obs_season_regridded_rsut" "$model1_season_rsdt" "$model1_season_rlut" "$model1_season_rsut" "$projection" "$lat_range" "$lon_range" "$season" "$model2_season_regridded_rsdt" "$model2_season_regridded_rlut" "$model2_season_regridded_rsut"
-    check_error "Seasonal plotting for rsdt, rlut, and rsut"
+    plot_task special_plot_radiation_season --after=regrid_rsdt --after=regrid_rlut --after=regrid_rsut "${rnet_task[@]}" -- \
+        ./special_plot_radiation_season.sh "$obs_season_regridded_rsdt" "$obs_season_regridded_rlut" "$obs_season_regridded_rsut" "$model1_season_rsdt" "$model1_season_rlut" "$model1_season_rsut" "$projection" "$lat_range" "$lon_range" "$season" "$model2_season_regridded_rsdt" "$model2_season_regridded_rlut" "$model2_season_regridded_rsut"
+    check_error "Registering seasonal plotting for rsdt, rlut, and rsut"
 
-    echo "Radiation plotting for rsdt, rlut, and rsut completed."
+    echo "Radiation plot tasks for rsdt, rlut, and rsut registered."
 fi
 
 ####===========================================================
@@ -510,5 +704,14 @@ fi
 
 
 
+# Run the registered tasks. A failed task does not stop the others; failures
+# are listed with the end of their logs.
+rebuild_flag=""
+[ "${plot_incremental:-true}" = false ] && rebuild_flag="--rebuild"
+python3 plot_orchestrator.py run "$ATM_PLOT_TASKS" --jobs="${plot_jobs}" $rebuild_flag
+if [ $? -ne 0 ]; then
+    echo "Warning: Some plot tasks failed or were skipped (see $(basename "${ATM_PLOT_TASKS%.jsonl}").status.jsonl)."
+fi
+
 echo "Plotting completed successfully. Outputs saved in $output_dir."
 
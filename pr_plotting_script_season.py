@@ -12,7 +12,10 @@
 import sys
 import os
 import numpy as np
-import xarray as xr
+import plot_profiling
+import plot_manifest
+import significance
+from product_store import open_product
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
@@ -113,20 +116,22 @@ def plot_polar_stereo(ax, data, lon_name, lat_name, levels, cmap, lat_min, lat_m
     ax.set_title(title)
     return contour
 
+plot_profiling.phase_start("load")
 # Load datasets
 try:
-    model1_season_data = xr.open_dataset(model1_season, decode_times=False)[var].isel(time=0)
-    model2_season_data = xr.open_dataset(model2_season, decode_times=False)[var].isel(time=0) if model2_season else None
-    obs_season_data = xr.open_dataset(obs_season, decode_times=False)[obs_var].isel(time=0)
-    bias1_season_data = xr.open_dataset(bias1_season, decode_times=False)[var].isel(time=0)
-    bias2_season_data = xr.open_dataset(bias2_season, decode_times=False)[var].isel(time=0) if bias2_season else None
-    bias3_season_data = xr.open_dataset(bias3_season, decode_times=False)[var].isel(time=0) if bias3_season else None
+    model1_season_data = open_product(model1_season)[var].isel(time=0)
+    model2_season_data = open_product(model2_season)[var].isel(time=0) if model2_season else None
+    obs_season_data = open_product(obs_season)[obs_var].isel(time=0)
+    bias1_season_data = open_product(bias1_season)[var].isel(time=0)
+    bias2_season_data = open_product(bias2_season)[var].isel(time=0) if bias2_season else None
+    bias3_season_data = open_product(bias3_season)[var].isel(time=0) if bias3_season else None
 except Exception as e:
     print(f"Error loading datasets: {e}")
     sys.exit(1)
 
 
 
+plot_profiling.phase_start("transform")
 # Dynamically identify coordinates
 lon_name = "lon" if "lon" in model1_season_data.coords else "longitude"
 lat_name = "lat" if "lat" in model1_season_data.coords else "latitude"
@@ -141,6 +146,7 @@ mean_cmap = 'YlGnBu'  # For model and observation
 bias_cmap = 'BrBG'  # For bias
 
 
+plot_profiling.phase_start("render")
 # Ensure output directory exists
 os.makedirs(output_dir, exist_ok=True)
 
@@ -171,6 +177,7 @@ if model2_season_data is not None:
     # Plot Bias between Model 1 and Model 2
     contour2 = plot_function(axes[0, 1], bias3_season_data, lon_name, lat_name, bias_levels, bias_cmap,
                              lat_min, lat_max, lon_min, lon_max, "Bias (CMIP7 - CMIP6)")
+    significance.stipple(axes[0, 1], bias3_season, ccrs.PlateCarree())
     fig.colorbar(contour2, ax=axes[0, 1], orientation='horizontal', pad=0.1, fraction=0.05, shrink=0.8)
 
     # Plot Model 1 season Mean
@@ -186,11 +193,13 @@ if model2_season_data is not None:
     # Plot Bias between Model 1 and Observation
     contour5 = plot_function(axes[1, 1], bias1_season_data, lon_name, lat_name, bias_levels, bias_cmap,
                              lat_min, lat_max, lon_min, lon_max, "Bias (CMIP7 - Obs)")
+    significance.stipple(axes[1, 1], bias1_season, ccrs.PlateCarree())
     fig.colorbar(contour5, ax=axes[1, 1], orientation='horizontal', pad=0.1, fraction=0.05, shrink=0.8)
 
     # Plot Bias between Model 2 and Observation
     contour6 = plot_function(axes[2, 1], bias2_season_data, lon_name, lat_name, bias_levels, bias_cmap,
                              lat_min, lat_max, lon_min, lon_max, "Bias (CMIP6 - Obs)")
+    significance.stipple(axes[2, 1], bias2_season, ccrs.PlateCarree())
     fig.colorbar(contour6, ax=axes[2, 1], orientation='horizontal', pad=0.1, fraction=0.05, shrink=0.8)
 
     # Save plot
@@ -213,6 +222,7 @@ else:
     # Plot Bias between Model 1 and Observation
     contour3 = plot_function(axes[2], bias1_season_data, lon_name, lat_name, bias_levels, bias_cmap,
                              lat_min, lat_max, lon_min, lon_max, "Bias (Model 1 - Obs)")
+    significance.stipple(axes[2], bias1_season, ccrs.PlateCarree())
     fig.colorbar(contour3, ax=axes[2], orientation='horizontal', pad=0.1, fraction=0.05, shrink=0.8)
 
     # Save plot
@@ -220,6 +230,7 @@ else:
 
 # Save the plot
 plt.savefig(output_file)
+plot_manifest.register(output_file)
 print(f"Plot saved to {output_file}")
 plt.close()
 
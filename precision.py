@@ -0,0 +1,101 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Precision policy for processing and plotting.
+#
+# Model output is float32. Stored products and in-memory fields are kept in
+# float32 so 3D pressure-level fields do not double in size; only running sums
+# and reductions accumulate in float64 and are cast back on output.
+#
+# The shell side of the policy is the CDO option "-b F32" (CDO itself
+# accumulates in double precision internally):
+#   python precision.py cdo-opts
+#
+# Set precision_policy="native" in user_inputs_atm.sh to keep input types.
+#
+# ==============================================================================
+
+import sys
+import os
+import numpy as np
+
+STORAGE_DTYPE = np.float32
+ACCUM_DTYPE = np.float64
+
+
+def policy_enabled():
+    """The float32 policy is on unless precision_policy=native is exported."""
+    return os.environ.get("precision_policy", "float32") != "native"
+
+
+def cdo_options():
+    """Global CDO options that store data variables as float32."""
+    return ["-b", "F32"] if policy_enabled() else []
+
+
+def to_storage(obj):
+    """
+    Cast the floating-point data of a DataArray, Dataset or ndarray to float32.
+
+    Coordinates and attributes are left untouched; integer data are not cast.
+    """
+    if not policy_enabled():
+        return obj
+    if hasattr(obj, "data_vars"):
+        cast = {name: to_storage(da) for name, da in obj.data_vars.items()
+                if np.issubdtype(da.dtype, np.floating) and da.dtype != STORAGE_DTYPE}
+        return obj.assign(cast) if cast else obj
+    if np.issubdtype(obj.dtype, np.floating) and obj.dtype != STORAGE_DTYPE:
+        if hasattr(obj, "dims"):
+            return obj.astype(STORAGE_DTYPE, keep_attrs=True)
+        return obj.astype(STORAGE_DTYPE)
+    return obj
+
+
+def storage_scalar(value):
+    """A Python constant as a float32 scalar, so arithmetic never promotes."""
+    return STORAGE_DTYPE(value) if policy_enabled() else value
+
+
+def new_accumulator(shape):
+    """A zeroed float64 running sum."""
+    return np.zeros(shape, dtype=ACCUM_DTYPE)
+
+
+def accumulate(acc, field, axis=None):
+    """
+    Add a float32 field (optionally summed over one axis) into a float64 sum.
+
+    Numpy casts blockwise while adding, so no float64 copy of the field is made.
+    """
+    if axis is None:
+        np.add(acc, field, out=acc)
+    else:
+        np.add(acc, np.sum(field, axis=axis, dtype=ACCUM_DTYPE), out=acc)
+    return acc
+
+
+def mean(da, dim):
+    """NaN-aware DataArray mean that sums in float64 and returns float32."""
+    result = da.reduce(np.nanmean, dim=dim, dtype=ACCUM_DTYPE, keep_attrs=True)
+    return to_storage(result)
+
+
+def main(argv):
+    if len(argv) == 2 and argv[1] == "cdo-opts":
+        print(" ".join(cdo_options()))
+        return 0
+    print("Usage: python precision.py cdo-opts")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
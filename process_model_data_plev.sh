@@ -41,6 +41,28 @@ function check_error {
 }
 # Define output directory from the wrapper
 output_dir="./output_data"
+# Intermediate files (yearly series and means) go to the scratch directory,
+# e.g. a tmpfs or local SSD, rather than the working directory
+scratch_dir="${scratch_dir:-${output_dir}/scratch}"
+mkdir -p "$scratch_dir"
+product_store_dir="${product_store_dir:-${output_dir}/products.zarr}"
+reduction_engine="${reduction_engine:-cdo}"
+plev_source="${plev_source:-plev}"
+if [ "$plev_source" = "model_levels" ] && [ "$reduction_engine" != "python" ]; then
+    echo "Error: plev_source=\"model_levels\" needs reduction_engine=\"python\"."
+    exit 1
+fi
+
+# CDO output options for the precision policy and the configured storage
+# profiles (see precision.py and storage_profiles.py)
+storage_profile_maps="${storage_profile_maps:-cdo_default}"
+storage_profile_series="${storage_profile_series:-cdo_default}"
+read -r -a precision_cdo_opts <<< "$(python3 precision.py cdo-opts)"
+read -r -a map_cdo_opts <<< "$(python3 storage_profiles.py cdo-opts "$storage_profile_maps")"
+read -r -a series_cdo_opts <<< "$(python3 storage_profiles.py cdo-opts "$storage_profile_series")"
+map_cdo_opts+=("${precision_cdo_opts[@]}")
+series_cdo_opts+=("${precision_cdo_opts[@]}")
+
 # Function to determine months for each season
 function get_season_months {
     case "$1" in
@@ -53,33 +75,162 @@ function get_season_months {
     esac
 }
 
+# Every season is produced in the same pass, whichever one is plotted
+seasons=(DJF MAM JJA SON JJAS)
+
+# Output files of a season ($1) for $var
+function season_yearly_file {
+    echo "${output_dir}/${output_prefix}_${1}_mean_yearly_${var}_plev.nc"
+}
+function season_mean_file {
+    echo "${output_dir}/${output_prefix}_${1}_mean_${var}_plev.nc"
+}
+
+# Publish the products of $var to the Zarr product store when it is enabled
+function publish_products {
+    if [ "$product_store" = "zarr" ]; then
+        period="${start_year_model}-${end_year_model}"
+        store_products=(
+            "annual_mean_yearly|$model_annual_mean_yr_file"
+            "annual_mean|$model_annual_mean_file"
+            "monthly_clim|$model_monthly_clim_file"
+        )
+        for s in "${seasons[@]}"; do
+            store_products+=("${s}_mean_yearly|$(season_yearly_file "$s")" "${s}_mean|$(season_mean_file "$s")")
+        done
+        for entry in "${store_products[@]}"; do
+            if [ -f "${entry#*|}" ]; then
+                python3 product_store.py put "$product_store_dir" "$output_prefix" "$var" "${entry%%|*}" "$period" "${entry#*|}"
+                check_error "Storing ${entry%%|*} for $var in the product store"
+            fi
+        done
+    fi
+}
+
+# Checkpoint journal (see journal.py): each finished year and each finished
+# variable is recorded with the settings it was made with, and with --resume a
+# recorded unit whose files and settings are unchanged is reused instead of
+# computed again. The whole variable also records the period and its monthly
+# files, so a new period or an added file makes it again
+function unit_done {
+    [ -z "$ATM_JOURNAL" ] || python3 journal.py record "$ATM_JOURNAL" "$output_prefix" "$var" "$@" "${unit_settings[@]}"
+}
+function unit_reusable {
+    [ "$ATM_RESUME" = true ] && [ -n "$ATM_JOURNAL" ] && python3 journal.py check "$ATM_JOURNAL" "$output_prefix" "$var" "$@" "${unit_settings[@]}"
+}
+function variable_reusable {
+    unit_reusable all "--setting=period=${start_year_model}-${end_year_model}" "${period_files[@]/#/--input=}"
+}
+function record_variable {
+    local products=() file s
+    for file in "$model_annual_mean_yr_file" "$model_annual_mean_file" "$model_monthly_clim_file" \
+                "$all_merged_annual" "$all_year_index" "$model_moments_file"; do
+        [ -f "$file" ] && products+=("$file")
+    done
+    for s in "${seasons[@]}"; do
+        products+=("$(season_yearly_file "$s")" "$(season_mean_file "$s")")
+    done
+    unit_done all "${products[@]}" "--setting=period=${start_year_model}-${end_year_model}" "${period_files[@]/#/--input=}"
+    check_error "Recording $var in the journal"
+}
+
+# Region and levels to cut every input of $var to at its first read (see
+# domain.py), and the settings its journal entries are made with
+function resolve_domain {
+    domain_ops_line=$(python3 domain.py cdo-ops "$var" plev "$(ls "$netcdf_dir"/*plev*.nc 2>/dev/null | head -n 1)")
+    check_error "Resolving the domain for $var"
+    read -r -a domain_ops <<< "$domain_ops_line"
+    unit_settings=("--setting=domain=${domain_ops[*]}" "--setting=precision_policy=$precision_policy"
+                   "--setting=storage_profile_maps=$storage_profile_maps" "--setting=reduction_engine=$reduction_engine")
+}
+
+# Output files of $var
+function set_output_files {
+    model_annual_mean_yr_file="${output_dir}/${output_prefix}_annual_mean_yearly_${var}_plev.nc"
+    model_annual_mean_file="${output_dir}/${output_prefix}_annual_mean_${var}_plev.nc"
+    model_monthly_clim_file="${output_dir}/${output_prefix}_monthly_clim_${var}_plev.nc"
+    all_merged_annual="${output_dir}/${output_prefix}_${var}_annual_all_year_plev.nc"
+    all_year_index="${output_dir}/${output_prefix}_${var}_annual_all_year_plev.vds.json"
+    model_moments_file="${output_dir}/${output_prefix}_moments_${var}_plev.nc"  # Interannual moments (python engine)
+}
+
+# Derived variables of these variables (see derived_vars.py), reduced in the
+# same pass as their sources by the Python engine
+read -r -a derived_variables_list <<< "$(python3 derived_vars.py select "${variables[@]}")"
+check_error "Resolving the derived variables"
+if [ ${#derived_variables_list[@]} -gt 0 ]; then
+    if [ "$reduction_engine" = "python" ]; then
+        variables+=("${derived_variables_list[@]}")
+    else
+        echo "Warning: Derived variables ${derived_variables_list[*]} need reduction_engine=\"python\". Skipping them."
+    fi
+fi
+# Variables left to the single Python pass after the loop
+fused_variables=()
+
+# Monthly files of the period (period_files)
+period_files=()
+for year in $(seq "$start_year_model" "$end_year_model"); do
+    for month in $(seq -w 01 12); do
+        file=$(ls "$netcdf_dir"/*"${year}_${month}"*plev*.nc 2>/dev/null)
+        [ -n "$file" ] && period_files+=("$file")
+    done
+done
+
 # Iterate over each variable and process
 for var in "${variables[@]}"; do
     echo "Starting processing for variable: $var"
 
     # Define output files with prefix
-    model_annual_mean_yr_file="${output_dir}/${output_prefix}_annual_mean_yearly_${var}_plev.nc"
-    model_season_mean_yr_file="${output_dir}/${output_prefix}_${season}_mean_yearly_${var}_plev.nc"
-    model_annual_mean_file="${output_dir}/${output_prefix}_annual_mean_${var}_plev.nc"
-    model_season_mean_file="${output_dir}/${output_prefix}_${season}_mean_${var}_plev.nc"
-    all_merged_annual="${output_dir}/${output_prefix}_${var}_annual_all_year_plev.nc"
+    set_output_files
 
     # Skip processing if all relevant files already exist
-    if [ -f "$model_annual_mean_file" ] && [ -f "$model_season_mean_file" ] && \
-       [ -f "$model_annual_mean_yr_file" ] && [ -f "$model_season_mean_yr_file" ] && \
-       [ -f "$all_merged_annual" ]; then
+    all_exist=true
+    for file in "$model_annual_mean_file" "$model_annual_mean_yr_file" "$model_monthly_clim_file"; do
+        [ -f "$file" ] || all_exist=false
+    done
+    for s in "${seasons[@]}"; do
+        { [ -f "$(season_yearly_file "$s")" ] && [ -f "$(season_mean_file "$s")" ]; } || all_exist=false
+    done
+    resolve_domain
+
+    # With --resume, only a variable recorded as complete in the journal is skipped
+    if [ "$ATM_RESUME" = true ] && [ -n "$ATM_JOURNAL" ]; then
+        if variable_reusable > /dev/null; then
+            echo "$var is complete in the journal. Skipping calculations."
+            continue
+        fi
+    elif [ "$all_exist" = true ] && { [ -f "$all_merged_annual" ] || [ -f "$all_year_index" ]; }; then
         echo "All files for $var already exist. Skipping calculations."
+        # Recorded as reused, so the retention step keeps them (see retention.py)
+        record_variable
+        continue
+    fi
+
+    # Single-pass Python reduction (reduce_atm.py) in place of the CDO steps
+    # below, for all variables at once after the loop
+    if [ "$reduction_engine" = "python" ]; then
+        fused_variables+=("$var")
         continue
     fi
 
 
     annual_mean_files=()
-    seasonal_mean_files=()
     yearly_merged_files=()
-    season_months=$(get_season_months "$season")
+    all_monthly_files=()
+    processed_years=()
+    year_files_all=()
 
     for year in $(seq "$start_year_model" "$end_year_model"); do
-        monthly_temp_files=()
+        # Files of this year's unit, kept until the variable is complete
+        yearly_merged_file="${scratch_dir}/merged_${output_prefix}${var}_${year}.nc"
+        annual_mean_file="${scratch_dir}/${output_prefix}annual_mean_${var}_${year}.nc"
+        year_files=("$yearly_merged_file" "$annual_mean_file")
+        for s in "${seasons[@]}"; do
+            year_files+=("${scratch_dir}/${output_prefix}${s}_mean_${var}_${year}.nc")
+        done
+
+        year_monthly_files=()
         for month in $(seq -w 01 12); do
             monthly_file=$(ls "$netcdf_dir"/*"${year}_${month}"*plev*.nc 2>/dev/null)
             if [ -z "$monthly_file" ]; then
@@ -91,68 +242,115 @@ for var in "${variables[@]}"; do
                 echo "Variable $var not found in $monthly_file. Skipping."
                 continue
             fi
-
-            temp_var_file="temp_${output_prefix}${var}_${year}_${month}.nc"
-            cdo selvar,"$var" "$monthly_file" "$temp_var_file"
-            check_error "Selecting variable $var for $year-$month"
-            monthly_temp_files+=("$temp_var_file")
+            year_monthly_files+=("$monthly_file")
         done
 
-        if [ ${#monthly_temp_files[@]} -gt 0 ]; then
-            yearly_merged_file="merged_${output_prefix}${var}_${year}.nc"
-            cdo mergetime "${monthly_temp_files[@]}" "$yearly_merged_file"
-            check_error "Merging monthly files for $var for year $year"
+        # A year finished by an interrupted run from the same monthly files is reused (--resume)
+        if [ ${#year_monthly_files[@]} -gt 0 ] && unit_reusable "$year" "${year_files[@]}" "${year_monthly_files[@]/#/--input=}" > /dev/null; then
+            echo "Reusing $var for year $year from the journal."
+            all_monthly_files+=("${year_monthly_files[@]}")
             yearly_merged_files+=("$yearly_merged_file")
+            annual_mean_files+=("$annual_mean_file")
+            processed_years+=("$year")
+            year_files_all+=("${year_files[@]}")
+            continue
+        fi
+
+        if [ ${#year_monthly_files[@]} -gt 0 ]; then
+            # Variable selection, domain cut and merge of the months in one
+            # chained cdo call (see cdo_pipeline.py), without monthly temporaries
+            merge_args_text=$(python3 cdo_pipeline.py chain selvar,"$var" "${domain_ops[@]}" mergetime -- "${year_monthly_files[@]}")
+            check_error "Building the merge of $var for year $year"
+            mapfile -t merge_args <<< "$merge_args_text"
+            cdo "${precision_cdo_opts[@]}" "${merge_args[@]}" "$yearly_merged_file"
+            check_error "Merging monthly files for $var for year $year"
 
-            annual_mean_file="${output_prefix}annual_mean_${var}_${year}.nc"
-            cdo timmean "$yearly_merged_file" "$annual_mean_file"
+            cdo "${precision_cdo_opts[@]}" timmean "$yearly_merged_file" "$annual_mean_file"
             check_error "Calculating annual mean for $var for year $year"
-            annual_mean_files+=("$annual_mean_file")
 
-            if [ -n "$season_months" ]; then
-                seasonal_merged_file="selected_${output_prefix}${season}_${var}_${year}.nc"
-                seasonal_mean_file="${output_prefix}${season}_mean_${var}_${year}.nc"
-                cdo selmon,$season_months "$yearly_merged_file" "$seasonal_merged_file"
-                check_error "Selecting $season months for $var for year $year"
-                cdo timmean "$seasonal_merged_file" "$seasonal_mean_file"
-                check_error "Calculating ${season} mean for $var for year $year"
-                seasonal_mean_files+=("$seasonal_mean_file")
-                rm "$seasonal_merged_file"
-            fi
+            for s in "${seasons[@]}"; do
+                cdo "${precision_cdo_opts[@]}" timmean -selmon,"$(get_season_months "$s")" "$yearly_merged_file" \
+                    "${scratch_dir}/${output_prefix}${s}_mean_${var}_${year}.nc"
+                check_error "Calculating ${s} mean for $var for year $year"
+            done
 
-            # Remove temporary monthly files after processing
-            rm "${monthly_temp_files[@]}"
+            unit_done "$year" "${year_files[@]}" "${year_monthly_files[@]/#/--input=}"
+            check_error "Recording $var for year $year in the journal"
+            all_monthly_files+=("${year_monthly_files[@]}")
+            yearly_merged_files+=("$yearly_merged_file")
+            annual_mean_files+=("$annual_mean_file")
+            processed_years+=("$year")
+            year_files_all+=("${year_files[@]}")
         fi
     done
 
-    # Merge yearly merged files into one file for all years
+    # Merge yearly merged files into one file for all years, or only index the
+    # monthly inputs when the all-year series is kept virtual
     if [ ${#yearly_merged_files[@]} -gt 0 ]; then
-        cdo mergetime "${yearly_merged_files[@]}" "$all_merged_annual"
-        check_error "Merging all yearly files for $var"
-        rm "${yearly_merged_files[@]}"
+        # 12-month climatology from the same yearly files
+        cdo "${map_cdo_opts[@]}" ymonmean -mergetime "${yearly_merged_files[@]}" "$model_monthly_clim_file"
+        check_error "Calculating monthly climatology for $var"
+
+        if [ "$virtual_all_year" = true ]; then
+            python3 virtual_dataset.py build "$all_year_index" "$var" "${domain_ops[@]/#/--select=}" "${all_monthly_files[@]}"
+            check_error "Indexing all monthly files for $var"
+        else
+            cdo "${series_cdo_opts[@]}" mergetime "${yearly_merged_files[@]}" "$all_merged_annual"
+            check_error "Merging all yearly files for $var"
+            python3 storage_profiles.py rechunk "$storage_profile_series" "$all_merged_annual"
+            check_error "Rechunking all-year file for $var"
+        fi
     fi
 
     # Merge annual means into a time series and calculate overall annual mean
     if [ ${#annual_mean_files[@]} -gt 0 ]; then
-        cdo mergetime "${annual_mean_files[@]}" "$model_annual_mean_yr_file"
+        cdo "${series_cdo_opts[@]}" mergetime "${annual_mean_files[@]}" "$model_annual_mean_yr_file"
         check_error "Creating annual mean time series for $var"
-        cdo timmean "$model_annual_mean_yr_file" "$model_annual_mean_file"
+        cdo "${map_cdo_opts[@]}" timmean "$model_annual_mean_yr_file" "$model_annual_mean_file"
         check_error "Calculating overall annual mean for $var"
-        rm "${annual_mean_files[@]}"
     fi
 
-    # Merge seasonal means into a time series and calculate overall seasonal mean
-    if [ ${#seasonal_mean_files[@]} -gt 0 ]; then
-        cdo mergetime "${seasonal_mean_files[@]}" "$model_season_mean_yr_file"
-        check_error "Creating seasonal mean time series for $var"
-        cdo timmean "$model_season_mean_yr_file" "$model_season_mean_file"
-        check_error "Calculating overall seasonal mean for $var"
-        rm "${seasonal_mean_files[@]}"
+    # Merge seasonal means into a time series and calculate overall seasonal mean, for every season
+    if [ ${#processed_years[@]} -gt 0 ]; then
+        for s in "${seasons[@]}"; do
+            seasonal_mean_files=()
+            for year in "${processed_years[@]}"; do
+                seasonal_mean_files+=("${scratch_dir}/${output_prefix}${s}_mean_${var}_${year}.nc")
+            done
+            cdo "${series_cdo_opts[@]}" mergetime "${seasonal_mean_files[@]}" "$(season_yearly_file "$s")"
+            check_error "Creating $s mean time series for $var"
+            cdo "${map_cdo_opts[@]}" timmean "$(season_yearly_file "$s")" "$(season_mean_file "$s")"
+            check_error "Calculating overall $s mean for $var"
+        done
+    fi
+
+    publish_products
+    if [ ${#processed_years[@]} -gt 0 ]; then
+        record_variable
     fi
 
+    # The yearly files are only needed until the variable is complete
+    rm -f "${year_files_all[@]}"
+
     echo "Completed processing for variable: $var"
 done
 
 
+# One pass over the monthly files for all variables left, each cut to the
+# run's domain and its own levels, with the derived variables evaluated on
+# their sources' fields in memory
+if [ ${#fused_variables[@]} -gt 0 ]; then
+    python3 reduce_atm.py model plev "$(IFS=,; echo "${fused_variables[*]}")" "$netcdf_dir" \
+        "$start_year_model" "$end_year_model" "$output_prefix" "$output_dir"
+    check_error "Python reduction for ${fused_variables[*]}"
+    for var in "${fused_variables[@]}"; do
+        set_output_files
+        resolve_domain
+        publish_products
+        record_variable
+        echo "Completed processing for variable: $var"
+    done
+fi
+
 echo "All variables processed successfully."
 
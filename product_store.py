@@ -0,0 +1,151 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Optional chunked, compressed Zarr product store for output_data.
+#
+# Products are kept in one Zarr hierarchy organised as
+#     <store>/<dataset>/<variable>/<product>/<period>
+# e.g. model1/tas/annual_mean/2391-2395 or obs/t2m/JJAS_mean_yearly/1990-2020.
+# Every product is its own group, so processing workers can write different
+# products concurrently. The NetCDF products in output_data stay the ones the
+# plotting stage reads; stored products can be exported back to NetCDF.
+#
+# Usage:
+#   python product_store.py put <store> <dataset> <variable> <product> <period> <file.nc>
+#   python product_store.py export <store> <dataset/variable/product/period> <out.nc>
+#   python product_store.py list <store>
+#
+# ==============================================================================
+
+import sys
+import os
+
+from precision import to_storage
+
+# One time step per chunk, with the horizontal tiled, so a map or a region of
+# one time step is read from a few chunks.
+DEFAULT_CHUNKS = {"time": 1, "valid_time": 1, "lat": 96, "lon": 96, "latitude": 96, "longitude": 96}
+
+
+def product_key(dataset, variable, product, period):
+    """Join the four levels of the hierarchy into a group path."""
+    parts = [dataset, variable, product, period]
+    for part in parts:
+        if not part or "/" in part:
+            raise ValueError(f"Invalid product key component: '{part}'")
+    return "/".join(parts)
+
+
+def _compression_encoding(level=3):
+    """Blosc/zstd with bit-shuffle, spelled for the installed zarr major version."""
+    import zarr
+    if int(zarr.__version__.split(".")[0]) >= 3:
+        from zarr.codecs import BloscCodec
+        return {"compressors": (BloscCodec(cname="zstd", clevel=level, shuffle="bitshuffle"),)}
+    from numcodecs import Blosc
+    return {"compressor": Blosc(cname="zstd", clevel=level, shuffle=Blosc.BITSHUFFLE)}
+
+
+def _chunks_for(da, chunks):
+    return tuple(min(chunks.get(dim, size), size) for dim, size in zip(da.dims, da.shape))
+
+
+class ProductStore:
+    """A Zarr hierarchy of processed products, one group per product."""
+
+    def __init__(self, root, chunks=None, compression_level=3):
+        self.root = root
+        self.chunks = dict(DEFAULT_CHUNKS, **(chunks or {}))
+        self.compression_level = compression_level
+
+    def write(self, ds, dataset, variable, product, period):
+        """Write (or overwrite) one product group."""
+        key = product_key(dataset, variable, product, period)
+        ds = to_storage(ds)
+        compression = _compression_encoding(self.compression_level)
+        encoding = {}
+        for name, da in ds.data_vars.items():
+            encoding[name] = dict(compression, chunks=_chunks_for(da, self.chunks))
+        ds.to_zarr(self.root, group=key, mode="w", encoding=encoding, consolidated=False)
+        return key
+
+    def open(self, key):
+        """Open a product lazily."""
+        import xarray as xr
+        return xr.open_zarr(self.root, group=key, consolidated=False, decode_times=False)
+
+    def keys(self):
+        """List product keys (groups four levels below the root)."""
+        found = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            rel = os.path.relpath(dirpath, self.root)
+            depth = 0 if rel == "." else rel.count(os.sep) + 1
+            if depth == 4 and (".zgroup" in filenames or "zarr.json" in filenames):
+                found.append(rel.replace(os.sep, "/"))
+                dirnames[:] = []
+            elif depth >= 4:
+                dirnames[:] = []
+        return sorted(found)
+
+    def export_netcdf(self, key, path):
+        """Write a product back out as a NetCDF file for CDO/NCL consumers."""
+        ds = self.open(key).load()
+        for name in ds.variables:
+            ds[name].encoding.pop("chunks", None)
+            ds[name].encoding.pop("compressor", None)
+            ds[name].encoding.pop("compressors", None)
+            ds[name].encoding.pop("preferred_chunks", None)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        ds.to_netcdf(tmp_path)
+        os.replace(tmp_path, path)
+
+
+def open_product(path):
+    """
+    Open a NetCDF product for rendering. Floating-point fields are returned
+    as float32 under the precision policy.
+    """
+    import xarray as xr
+    return to_storage(xr.open_dataset(path, decode_times=False))
+
+
+def main(argv):
+    if len(argv) < 3:
+        print("Usage: python product_store.py <put|export|list> <store> [args...]")
+        return 1
+
+    command, root = argv[1], argv[2]
+    store = ProductStore(root)
+
+    if command == "put":
+        if len(argv) != 8:
+            print("Usage: python product_store.py put <store> <dataset> <variable> <product> <period> <file.nc>")
+            return 1
+        import xarray as xr
+        with xr.open_dataset(argv[7], decode_times=False) as ds:
+            key = store.write(ds, *argv[3:7])
+        print(f"Stored {argv[7]} as {root}#{key}")
+    elif command == "export":
+        if len(argv) != 5:
+            print("Usage: python product_store.py export <store> <dataset/variable/product/period> <out.nc>")
+            return 1
+        store.export_netcdf(argv[3], argv[4])
+        print(f"Exported {root}#{argv[3]} to {argv[4]}")
+    elif command == "list":
+        print("\n".join(store.keys()))
+    else:
+        print(f"Error: Unknown command '{command}'.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,1048 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Single-pass reduction engine for model and observation monthly files.
+#
+# Produces the same products as the CDO steps of process_model_data_*.sh and
+# observation_data_processing_atm.sh (yearly annual and seasonal mean series for
+# every season, their overall means, the 12-month climatology and the all-year
+# series or its virtual index), reading every monthly file once. Each time step
+# is summed once into its month; the annual, seasonal and climatological means
+# are combined from the monthly sums. Sums are kept in float64 and products are
+# written in the precision policy's storage type (see precision.py).
+#
+# The yearly annual and seasonal means also feed running moments (Welford's
+# count, mean and M2 per grid point), written as <prefix>_moments_<variable>.nc:
+# the interannual standard deviation and sample size of each period, used by
+# significance.py for the t-test masks of the bias maps without reading the
+# yearly series again.
+#
+# With plev_source="model_levels", pressure-level variables are read from the
+# model-level files and interpolated to pressure levels as each file is read
+# (see vertical_interp.py); the all-year series is then written, not indexed.
+#
+# Classic and 64-bit-offset NetCDF inputs are read through zero-copy memmap
+# views (see netcdf3_mmap.py), so time means accumulate straight from the page
+# cache; NetCDF4 inputs fall back to a normal read.
+#
+# Usage:
+#   python reduce_atm.py model <plev|no_plev> <variable>[,<variable> ...] <netcdf_dir> <start_year> <end_year> <output_prefix> [output_dir] [--select=<cdo_op> ...]
+#   python reduce_atm.py obs <obs_variable> <obs_data_dir> <start_year> <end_year> [output_dir] [--select=<cdo_op> ...]
+#
+# Selected with reduction_engine="python" in user_inputs_atm.sh. The --select
+# operators (from "domain.py cdo-ops") cut every input to the run's domain and
+# levels as it is read; without them, each model variable is cut to the run's
+# domain and its own levels.
+#
+# Several model variables given as a comma-separated list are reduced in one
+# pass over the monthly files, each source variable read once. Derived
+# variables (see derived_vars.py) can be listed with them: they are evaluated
+# on the monthly fields of their sources in memory.
+#
+# ==============================================================================
+
+import sys
+import os
+import glob
+import json
+import numpy as np
+
+import domain
+import netcdf3_mmap
+import virtual_dataset
+import vertical_interp
+import derived_vars
+from precision import ACCUM_DTYPE, STORAGE_DTYPE, policy_enabled, new_accumulator, accumulate
+from storage_profiles import get_profile, chunk_shape, netcdf_format
+
+TIME_DIMS = ("time", "valid_time")
+DEFAULT_FILL = 1.0e20
+PACKING_ATTRS = ("_FillValue", "missing_value", "scale_factor", "add_offset", "valid_range",
+                 "valid_min", "valid_max")
+
+# Months of each season, as in get_season_months of the processing scripts
+SEASON_MONTHS = {
+    "DJF": (12, 1, 2),
+    "MAM": (3, 4, 5),
+    "JJA": (6, 7, 8),
+    "SON": (9, 10, 11),
+    "JJAS": (6, 7, 8, 9),
+}
+
+
+# ------------------------------------------------------------------------------
+# Input discovery (same patterns as the shell scripts)
+# ------------------------------------------------------------------------------
+
+def model_file(netcdf_dir, year, month, level_type, model_levels=False):
+    """The monthly model file for a year/month, or None."""
+    if level_type == "plev" and not model_levels:
+        matches = sorted(glob.glob(os.path.join(netcdf_dir, f"*{year}_{month:02d}*plev*.nc")))
+    else:
+        matches = [path for path in sorted(glob.glob(os.path.join(netcdf_dir, f"*{year}_{month:02d}*.nc")))
+                   if "plev" not in path]
+    return matches[0] if matches else None
+
+
+def obs_file(obs_data_dir, obs_var, year, month):
+    """The monthly observation file for a year/month, or None."""
+    matches = sorted(glob.glob(os.path.join(obs_data_dir, f"*_{obs_var}_{year}_{month:02d}.nc")))
+    return matches[0] if matches else None
+
+
+PERIODS = ("annual",) + tuple(SEASON_MONTHS)
+
+# Observation variable names of the model variables, as in the processing scripts
+OBS_NAMES = {
+    "tas": "t2m",
+    "pr": "precip",
+    "ta": "t",
+    "ua": "u",
+    "va": "v",
+    "hght": "z",
+    "slp": "msl",
+    "rsdt": "solar_mon",
+    "rsut": "toa_sw_all_mon",
+    "rlut": "toa_lw_all_mon",
+    "evspsbl": "e",
+}
+
+
+def model_inputs(netcdf_dir, start_year, end_year, level_type, model_levels=False):
+    """(year, month, path) of the monthly model files of a year range."""
+    inputs = []
+    for year in range(start_year, end_year + 1):
+        for month in range(1, 13):
+            path = model_file(netcdf_dir, year, month, level_type, model_levels)
+            if path is None:
+                print(f"No file found for {year}-{month:02d}. Skipping.")
+                continue
+            inputs.append((year, month, path))
+    return inputs
+
+
+def obs_inputs(obs_data_dir, obs_var, start_year, end_year, output_dir):
+    """(year, month, path) of the monthly observation files; gaps go to missing_files.log."""
+    inputs = []
+    with open(os.path.join(output_dir, "missing_files.log"), "a") as log:
+        for year in range(start_year, end_year + 1):
+            for month in range(1, 13):
+                path = obs_file(obs_data_dir, obs_var, year, month)
+                if path is None:
+                    message = f"Warning: Missing file for {obs_var} {year}-{month:02d}"
+                    print(message)
+                    log.write(message + "\n")
+                    continue
+                inputs.append((year, month, path))
+    return inputs
+
+
+def model_products(output_dir, prefix, variable, level_type):
+    products = {
+        "monthly_clim": f"{output_dir}/{prefix}_monthly_clim_{variable}_{level_type}.nc",
+        "all_year": f"{output_dir}/{prefix}_{variable}_annual_all_year_{level_type}.nc",
+        "moments": f"{output_dir}/{prefix}_moments_{variable}_{level_type}.nc",
+    }
+    for period in PERIODS:
+        products[f"{period}_mean_yearly"] = f"{output_dir}/{prefix}_{period}_mean_yearly_{variable}_{level_type}.nc"
+        products[f"{period}_mean"] = f"{output_dir}/{prefix}_{period}_mean_{variable}_{level_type}.nc"
+    return products
+
+
+def obs_products(output_dir, obs_var):
+    products = {
+        "monthly_clim": f"{output_dir}/obs_monthly_clim_{obs_var}.nc",
+        "all_year": f"{output_dir}/obs_{obs_var}_all_years.nc",
+        "moments": f"{output_dir}/final_obs_moments_{obs_var}.nc",
+    }
+    for period in PERIODS:
+        products[f"{period}_mean_yearly"] = f"{output_dir}/obs_{period}_mean_yearly_{obs_var}.nc"
+        products[f"{period}_mean"] = f"{output_dir}/final_obs_{period}_mean_{obs_var}.nc"
+    return products
+
+
+# ------------------------------------------------------------------------------
+# Reading
+# ------------------------------------------------------------------------------
+
+def open_field(path, variable):
+    """
+    Return (data, attrs, dims) of a variable, or None if the file lacks it.
+
+    Classic NetCDF files give a read-only memmap view of the variable; NetCDF4
+    files are read into memory through the netCDF library. Values are raw
+    (not unpacked, not masked).
+    """
+    classic = netcdf3_mmap.open_classic(path)
+    if classic is not None:
+        var = classic.variables.get(variable)
+        if var is None:
+            return None
+        return var.data, var.attrs, var.dims
+
+    from netCDF4 import Dataset
+    with Dataset(path) as nc:
+        if variable not in nc.variables:
+            return None
+        var = nc.variables[variable]
+        var.set_auto_maskandscale(False)
+        return np.asarray(var[:]), {name: var.getncattr(name) for name in var.ncattrs()}, var.dimensions
+
+
+def interpolate_levels(path, data, dims, packing, chosen, targets):
+    """
+    (data, dims) of a model-level field of path on the target pressure levels
+    (Pa), cut to the domain first; missing values are NaN (see vertical_interp.py).
+    """
+    from netCDF4 import Dataset
+    with Dataset(path) as nc:
+        dim = vertical_interp.level_dim(nc, dims)
+        a, b = vertical_interp.coefficients(nc, dim)
+        ps_name = vertical_interp.surface_pressure_name(nc, dim)
+    ps_data, ps_attrs, ps_dims = open_field(path, ps_name)
+    ps_packing = Packing(ps_attrs)
+    ps = domain.apply(ps_data, ps_dims, chosen)
+    ps = ps_packing.decode(ps, ps_packing.missing(ps, {}), ACCUM_DTYPE, np.nan)
+    data = domain.apply(data, dims, chosen)
+    data = packing.decode(data, packing.missing(data, {}), ACCUM_DTYPE, np.nan)
+    axis = dims.index(dim)
+    if ps.ndim < data.ndim - 1:
+        ps = np.broadcast_to(ps, data.shape[:axis] + data.shape[axis + 1:])
+    result = vertical_interp.interpolate(data, a, b, ps, targets, axis)
+    return result, tuple("plev" if d == dim else d for d in dims)
+
+
+class Packing:
+    """scale_factor/add_offset and missing values of a source variable."""
+
+    def __init__(self, attrs):
+        self.scale = float(attrs.get("scale_factor", 1.0))
+        self.offset = float(attrs.get("add_offset", 0.0))
+        self.packed = self.scale != 1.0 or self.offset != 0.0
+        fills = []
+        for name in ("_FillValue", "missing_value"):
+            if name in attrs:
+                fills.extend(float(value) for value in np.atleast_1d(attrs[name]))
+        self.fills = []
+        for fill in fills:
+            if not any(fill == seen or (np.isnan(fill) and np.isnan(seen)) for seen in self.fills):
+                self.fills.append(fill)
+
+    def missing(self, field, buffers):
+        """
+        Mask of missing points, or None when the field has none.
+
+        The mask is computed into reusable buffers (one pair per field shape),
+        so checking a field allocates nothing.
+        """
+        if not self.fills:
+            return None
+        if field.shape not in buffers:
+            buffers[field.shape] = (np.empty(field.shape, dtype=bool), np.empty(field.shape, dtype=bool))
+        mask, scratch = buffers[field.shape]
+        for i, fill in enumerate(self.fills):
+            target = mask if i == 0 else scratch
+            if np.isnan(fill):
+                np.isnan(field, out=target)
+            else:
+                np.equal(field, fill, out=target)
+            if i:
+                np.logical_or(mask, scratch, out=mask)
+        return mask if mask.any() else None
+
+    def decode(self, field, missing, dtype, fill):
+        """An unpacked copy of a field with missing points set to fill."""
+        values = field.astype(ACCUM_DTYPE)
+        if self.packed:
+            values *= self.scale
+            values += self.offset
+        if missing is not None:
+            values[missing] = fill
+        return values.astype(dtype)
+
+
+class MeanAccumulator:
+    """
+    Float64 running mean of fields.
+
+    Fields without missing points or packing are added directly from their
+    source buffer; a per-point count is only kept once a field with missing
+    points has been seen.
+    """
+
+    def __init__(self):
+        self.sum = None
+        self.count = None
+        self.steps = 0
+        self.time_sum = 0.0
+
+    def add(self, field, time_value, packing, missing=None):
+        if self.sum is None:
+            self.sum = new_accumulator(field.shape)
+        if packing.packed or missing is not None:
+            values = field.astype(ACCUM_DTYPE)
+            if packing.packed:
+                values *= packing.scale
+                values += packing.offset
+            if missing is not None:
+                values[missing] = 0.0
+                if self.count is None:
+                    self.count = np.full(field.shape, self.steps, dtype=np.int32)
+            np.add(self.sum, values, out=self.sum)
+        else:
+            accumulate(self.sum, field)
+        if self.count is not None:
+            self.count += 1
+            if missing is not None:
+                np.subtract(self.count, missing, out=self.count)
+        self.steps += 1
+        self.time_sum += float(time_value)
+
+    def merge(self, other):
+        """Add the sums of another accumulator (the mean of both sets of fields)."""
+        if not other.steps:
+            return
+        if self.sum is None:
+            self.sum = other.sum.copy()
+        else:
+            np.add(self.sum, other.sum, out=self.sum)
+        if self.count is not None or other.count is not None:
+            if self.count is None:
+                self.count = np.full(self.sum.shape, self.steps, dtype=np.int32)
+            self.count += other.count if other.count is not None else other.steps
+        self.steps += other.steps
+        self.time_sum += other.time_sum
+
+    def state(self, key):
+        """The sums as arrays named after key, for np.savez."""
+        if not self.steps:
+            return {}
+        arrays = {f"{key}_sum": self.sum, f"{key}_meta": np.array([self.steps, self.time_sum])}
+        if self.count is not None:
+            arrays[f"{key}_count"] = self.count
+        return arrays
+
+    @classmethod
+    def from_state(cls, arrays, key):
+        acc = cls()
+        if f"{key}_sum" in arrays:
+            acc.sum = np.array(arrays[f"{key}_sum"])
+            acc.count = np.array(arrays[f"{key}_count"]) if f"{key}_count" in arrays else None
+            steps, acc.time_sum = arrays[f"{key}_meta"]
+            acc.steps = int(steps)
+        return acc
+
+    def mean(self, dtype, fill):
+        if self.count is None:
+            return (self.sum / self.steps).astype(dtype)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = self.sum / self.count
+        result[self.count == 0] = fill
+        return result.astype(dtype)
+
+    def time_mean(self):
+        return self.time_sum / self.steps
+
+
+class MomentAccumulator:
+    """
+    Running count, mean and M2 (sum of squared deviations) per grid point of
+    fields given one at a time, by Welford's update; missing points are not
+    counted. Also a running mean (mean() and time_mean() as MeanAccumulator).
+    """
+
+    def __init__(self):
+        self.count = None
+        self.mean_values = None
+        self.m2 = None
+        self.steps = 0
+        self.time_sum = 0.0
+
+    def add(self, field, time_value, missing=None):
+        if self.count is None:
+            self.count = np.zeros(field.shape, dtype=np.int32)
+            self.mean_values = np.zeros(field.shape, dtype=ACCUM_DTYPE)
+            self.m2 = np.zeros(field.shape, dtype=ACCUM_DTYPE)
+        values = field.astype(ACCUM_DTYPE)
+        if missing is None:
+            self.count += 1
+        else:
+            values[missing] = 0.0
+            self.count += ~missing
+        delta = values - self.mean_values
+        if missing is not None:
+            delta[missing] = 0.0
+        self.mean_values += delta / np.maximum(self.count, 1)
+        self.m2 += delta * (values - self.mean_values)
+        self.steps += 1
+        self.time_sum += float(time_value)
+
+    def merge(self, other):
+        """Combine with the moments of another set of fields (Chan et al.)."""
+        if not other.steps:
+            return
+        if not self.steps:
+            self.count, self.mean_values, self.m2 = other.count.copy(), other.mean_values.copy(), other.m2.copy()
+        else:
+            total = self.count + other.count
+            delta = other.mean_values - self.mean_values
+            weight = np.divide(other.count, total, out=np.zeros(total.shape), where=total > 0)
+            self.mean_values += delta * weight
+            self.m2 += other.m2 + delta * delta * self.count * weight
+            self.count = total
+        self.steps += other.steps
+        self.time_sum += other.time_sum
+
+    def state(self, key):
+        """The moments as arrays named after key, for np.savez."""
+        if not self.steps:
+            return {}
+        return {f"{key}_n": self.count, f"{key}_mean": self.mean_values, f"{key}_m2": self.m2,
+                f"{key}_meta": np.array([self.steps, self.time_sum])}
+
+    @classmethod
+    def from_state(cls, arrays, key):
+        acc = cls()
+        if f"{key}_n" in arrays:
+            acc.count = np.array(arrays[f"{key}_n"])
+            acc.mean_values = np.array(arrays[f"{key}_mean"])
+            acc.m2 = np.array(arrays[f"{key}_m2"])
+            steps, acc.time_sum = arrays[f"{key}_meta"]
+            acc.steps = int(steps)
+        return acc
+
+    def mean(self, dtype, fill):
+        result = self.mean_values.copy()
+        result[self.count == 0] = fill
+        return result.astype(dtype)
+
+    def std(self, dtype, fill):
+        """Sample standard deviation (n - 1); fill where fewer than two values."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = np.sqrt(self.m2 / (self.count - 1))
+        result[self.count < 2] = fill
+        return result.astype(dtype)
+
+    def time_mean(self):
+        return self.time_sum / self.steps
+
+
+# ------------------------------------------------------------------------------
+# Writing
+# ------------------------------------------------------------------------------
+
+class Template:
+    """Grid, coordinates and metadata of a variable, taken from its first input file."""
+
+    def __init__(self, path, variable):
+        from netCDF4 import Dataset
+        self.variable = variable
+        with Dataset(path) as nc:
+            var = nc.variables[variable]
+            dims = var.dimensions
+            first = dims[0] if dims else None
+            self.has_time = first is not None and (first in TIME_DIMS or nc.dimensions[first].isunlimited())
+            self.time_dim = first if self.has_time else "time"
+            grid = dims[1:] if self.has_time else dims
+            self.grid_dims = [(dim, len(nc.dimensions[dim])) for dim in grid]
+            self.coords = {}
+            for dim in grid:
+                if dim in nc.variables:
+                    coord = nc.variables[dim]
+                    coord.set_auto_maskandscale(False)
+                    self.coords[dim] = (coord.dimensions, np.asarray(coord[:]), _attrs(coord, skip=("_FillValue",)))
+            self.time_attrs = {}
+            if self.has_time and self.time_dim in nc.variables:
+                self.time_attrs = _attrs(nc.variables[self.time_dim], skip=("_FillValue",))
+            self.attrs = _attrs(var, skip=PACKING_ATTRS)
+            self.dtype = var.dtype
+            self.global_attrs = {name: nc.getncattr(name) for name in nc.ncattrs()}
+
+    def subset(self, chosen):
+        """Cut the grid and its coordinates to a domain selection (see domain.py)."""
+        self.grid_dims = [(dim, len(np.arange(size)[chosen[dim]]) if dim in chosen else size)
+                          for dim, size in self.grid_dims]
+        for name, (dims, values, attrs) in self.coords.items():
+            self.coords[name] = (dims, domain.apply(values, dims, chosen), attrs)
+
+    def to_pressure(self, path, targets):
+        """Replace the hybrid level axis by the target pressure levels (Pa)."""
+        from netCDF4 import Dataset
+        with Dataset(path) as nc:
+            dim = vertical_interp.level_dim(nc, [self.time_dim] + [name for name, _ in self.grid_dims])
+        self.grid_dims = [("plev", len(targets)) if name == dim else (name, size) for name, size in self.grid_dims]
+        self.coords.pop(dim, None)
+        self.coords["plev"] = (("plev",), np.asarray(targets, dtype=np.float64),
+                               {"standard_name": "air_pressure", "long_name": "pressure", "units": "Pa",
+                                "positive": "down", "axis": "Z"})
+        self.attrs.pop("coordinates", None)
+
+    @property
+    def shape(self):
+        return tuple(size for _, size in self.grid_dims)
+
+
+def _attrs(var, skip=()):
+    return {name: var.getncattr(name) for name in var.ncattrs() if name not in skip}
+
+
+class ProductWriter:
+    """
+    A NetCDF product on the template grid with an unlimited time axis.
+
+    Fields are appended one time step at a time. The file is written under a
+    temporary name and renamed into place by close(), so a product path only
+    ever holds a complete file.
+    """
+
+    def __init__(self, path, template, profile, dtype, fill, expected_steps=1):
+        from netCDF4 import Dataset
+        self.path = path
+        self.tmp_path = f"{path}.tmp.{os.getpid()}"
+        self.index = 0
+        nc = Dataset(self.tmp_path, "w", format=netcdf_format(profile))
+        self.nc = nc
+        nc.setncatts(template.global_attrs)
+
+        time_dim = template.time_dim
+        nc.createDimension(time_dim, None)
+        for dim, size in template.grid_dims:
+            nc.createDimension(dim, size)
+        for name, (dims, values, attrs) in template.coords.items():
+            coord = nc.createVariable(name, values.dtype, dims)
+            coord.setncatts(attrs)
+            coord[:] = values
+        self.time = nc.createVariable(time_dim, "f8", (time_dim,))
+        self.time.setncatts(template.time_attrs)
+
+        dims = (time_dim,) + tuple(dim for dim, _ in template.grid_dims)
+        options = {}
+        settings = get_profile(profile)
+        if settings["format"]:
+            options["zlib"] = settings["zlib"] > 0
+            options["shuffle"] = settings["shuffle"]
+            if settings["zlib"]:
+                options["complevel"] = settings["zlib"]
+            chunks = chunk_shape(profile, dims, (max(expected_steps, 1),) + template.shape)
+            if chunks is not None:
+                options["chunksizes"] = chunks
+        self.var = nc.createVariable(template.variable, dtype, dims, fill_value=dtype.type(fill), **options)
+        self.var.setncatts(template.attrs)
+        self.var.missing_value = dtype.type(fill)
+        self.var.set_auto_maskandscale(False)
+
+    def append(self, field, time_value):
+        self.var[self.index] = field
+        self.time[self.index] = time_value
+        self.index += 1
+
+    def close(self):
+        self.nc.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        try:
+            self.nc.close()
+        finally:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+
+# ------------------------------------------------------------------------------
+# Reduction
+# ------------------------------------------------------------------------------
+
+def output_dtype(template, packing):
+    """float32 under the precision policy, otherwise the unpacked input type."""
+    if policy_enabled():
+        return np.dtype(STORAGE_DTYPE)
+    if np.issubdtype(template.dtype, np.floating) and not packing.packed:
+        return np.dtype(template.dtype)
+    return np.dtype(ACCUM_DTYPE)
+
+
+def output_fill(packing):
+    finite = [fill for fill in packing.fills if np.isfinite(fill)]
+    return finite[0] if finite and not packing.packed else DEFAULT_FILL
+
+
+# Interpolated and derived fields are unpacked, with NaN for missing values
+DECODED = Packing({"_FillValue": np.nan})
+
+
+class Reduction:
+    """
+    The products of one variable, accumulated from its monthly fields in time
+    order (see reduce_variables).
+
+    select holds the domain selection operators of the variable; with
+    model_levels in settings, the inputs are model-level files interpolated to
+    pressure levels as they are read. With partial (a .npz path), only the
+    series products are written, and the climatology sums, moments and files
+    read are saved to partial for merge_partials (see shard_runner.py).
+    """
+
+    def __init__(self, variable, products, settings, select, years, partial=None):
+        self.variable = variable
+        self.sources = (variable,)
+        self.products = products
+        self.settings = settings
+        self.select = select
+        self.years = years
+        self.partial = partial
+        self.virtual = settings["virtual"]
+        self.box, self.levels = domain.parse_cdo_ops(select)
+        self.model_levels = settings.get("model_levels", False)
+        self.targets = vertical_interp.target_levels(self.levels) if self.model_levels else None
+        self.template = None
+        self.writers = {}
+        self.used = []
+        self.buffers = {}
+        self.overall = {period: MomentAccumulator() for period in PERIODS}
+        self.climatology = {month: MeanAccumulator() for month in range(1, 13)}
+        self.monthly = {month: MeanAccumulator() for month in range(1, 13)}
+
+    def make_template(self, path):
+        template = Template(path, self.variable)
+        if self.model_levels:
+            template.to_pressure(path, self.targets)
+        return template
+
+    def packing(self, attrs):
+        return DECODED if self.model_levels else Packing(attrs)
+
+    def prepare(self, path, fields):
+        """Grid, domain selection, storage type and series writers, from the first input."""
+        _, attrs, dims = fields[self.sources[0]]
+        self.template = self.make_template(path)
+        self.chosen = domain.selection(dims, {name: values for name, (_, values, _) in self.template.coords.items()},
+                                       self.box, self.levels)
+        self.template.subset(self.chosen)
+        packing = self.packing(attrs)
+        self.dtype = output_dtype(self.template, packing)
+        self.fill = output_fill(packing)
+        self.mean_packing = Packing({"_FillValue": self.fill})
+        for period in PERIODS:
+            self.writers[f"{period}_mean_yearly"] = ProductWriter(
+                self.products[f"{period}_mean_yearly"], self.template, self.settings["series"],
+                self.dtype, self.fill, len(self.years))
+        if not self.virtual:
+            self.writers["all_year"] = ProductWriter(
+                self.products["all_year"], self.template, self.settings["series"],
+                self.dtype, self.fill, 12 * len(self.years))
+
+    def read(self, path, fields):
+        """(data cut to the domain, its dims, its packing) of a file's raw fields."""
+        data, attrs, dims = fields[self.variable]
+        if self.model_levels:
+            data, dims = interpolate_levels(path, data, dims, Packing(attrs), self.chosen, self.targets)
+            return data, dims, DECODED
+        return domain.apply(data, dims, self.chosen), dims, Packing(attrs)
+
+    def add(self, path, month, fields):
+        """Sum the time steps of one monthly file into its month."""
+        if self.template is None:
+            self.prepare(path, fields)
+        data, dims, packing = self.read(path, fields)
+        if self.template.has_time:
+            times = open_field(path, self.template.time_dim)
+            times = np.asarray(times[0], dtype=np.float64) if times is not None else np.arange(data.shape[0])
+        else:
+            data = data[np.newaxis]
+            times = np.zeros(1)
+
+        for step in range(data.shape[0]):
+            values = data[step]
+            missing = packing.missing(values, self.buffers)
+            self.monthly[month].add(values, times[step], packing, missing)
+            if "all_year" in self.writers:
+                self.writers["all_year"].append(packing.decode(values, missing, self.dtype, self.fill), times[step])
+        self.used.append(path)
+
+    def end_year(self):
+        """Write the yearly means of the year just read and start the next one."""
+        for month, acc in self.monthly.items():
+            self.climatology[month].merge(acc)
+        for period in PERIODS:
+            acc = MeanAccumulator()
+            for month in SEASON_MONTHS.get(period, range(1, 13)):
+                acc.merge(self.monthly[month])
+            if acc.steps:
+                mean = acc.mean(self.dtype, self.fill)
+                self.writers[f"{period}_mean_yearly"].append(mean, acc.time_mean())
+                self.overall[period].add(mean, acc.time_mean(), self.mean_packing.missing(mean, self.buffers))
+        self.monthly = {month: MeanAccumulator() for month in range(1, 13)}
+
+    def finish(self):
+        """Write the overall means, climatology and moments, and close the series."""
+        if self.template is None:
+            raise ValueError(f"No input data found for {self.variable}.")
+        template, dtype, fill = self.template, self.dtype, self.fill
+        if not self.partial:
+            for period in PERIODS:
+                acc = self.overall[period]
+                if acc.steps:
+                    writer = ProductWriter(self.products[f"{period}_mean"], template, self.settings["maps"], dtype, fill)
+                    writer.append(acc.mean(dtype, fill), acc.time_mean())
+                    writer.close()
+            write_climatology(self.products["monthly_clim"], self.climatology, template, self.settings, dtype, fill)
+            write_moments(self.products["moments"], self.overall, template, self.settings, dtype, fill)
+
+        for name, writer in self.writers.items():
+            if writer.index or name == "all_year":
+                writer.close()
+            else:
+                writer.abort()
+        self.writers = {}
+
+        if self.partial:
+            save_partial(self.partial, self.climatology, self.overall, self.used)
+        elif self.virtual:
+            index = virtual_dataset.build_index(self.variable, self.used, self.select)
+            virtual_dataset.write_index(index, virtual_dataset.index_path_for(self.products["all_year"]))
+
+    def abort(self):
+        for writer in self.writers.values():
+            writer.abort()
+        self.writers = {}
+
+
+class DerivedReduction(Reduction):
+    """
+    The products of a derived variable (see derived_vars.py), evaluated on the
+    monthly fields of its sources as they are read. Its all-year series is
+    always written: there is no input file to index.
+    """
+
+    def __init__(self, variable, products, settings, select, years, partial=None):
+        super().__init__(variable, products, settings, select, years, partial)
+        self.expression = derived_vars.expression(variable)
+        self.sources = tuple(self.expression.sources)
+        self.virtual = False
+        self.level_dim = None
+        self.level_values = None
+
+    def make_template(self, path):
+        # The grid of the first source is the grid of the derived variable,
+        # without its levels when the sources are only used at single levels
+        template = Template(path, self.sources[0])
+        if self.model_levels and len(template.grid_dims) > 2:
+            template.to_pressure(path, self.targets)
+        self.level_dim = next((dim for dim, _ in template.grid_dims if dim in domain.LEVEL_NAMES), None)
+        if self.level_dim is not None:
+            self.level_values = template.coords[self.level_dim][1] if self.level_dim in template.coords else None
+            if not self.expression.keeps_levels:
+                template.grid_dims = [(dim, size) for dim, size in template.grid_dims if dim != self.level_dim]
+                template.coords = {name: coord for name, coord in template.coords.items()
+                                   if self.level_dim not in coord[0]}
+        template.variable = self.variable
+        template.attrs = dict(self.expression.attrs)
+        return template
+
+    def packing(self, attrs):
+        return DECODED
+
+    def read(self, path, fields):
+        values, out_dims = {}, None
+        for name in self.sources:
+            data, attrs, dims = fields[name]
+            packing = Packing(attrs)
+            vertical = [dim for dim in dims if dim != self.template.time_dim
+                        and dim not in domain.LAT_NAMES and dim not in domain.LON_NAMES]
+            if self.model_levels and vertical:
+                data, dims = interpolate_levels(path, data, dims, packing, self.chosen, self.targets)
+            else:
+                data = domain.apply(data, dims, self.chosen)
+                data = packing.decode(data, packing.missing(data, {}), ACCUM_DTYPE, np.nan)
+            values[name] = data
+            if out_dims is None or len(dims) > len(out_dims):
+                out_dims = dims
+        level_axis, level_values = None, None
+        if self.level_dim in out_dims:
+            level_axis = out_dims.index(self.level_dim)
+            level_values = domain.apply(self.level_values, (self.level_dim,), self.chosen)
+            if not self.expression.keeps_levels:
+                out_dims = tuple(dim for dim in out_dims if dim != self.level_dim)
+        return self.expression.evaluate(values, level_axis, level_values), out_dims, DECODED
+
+
+def reduction(variable, products, settings, select, years, partial=None):
+    """The Reduction of a variable, derived or read from the inputs."""
+    kind = DerivedReduction if derived_vars.expression(variable) is not None else Reduction
+    return kind(variable, products, settings, select, years, partial)
+
+
+def reduce_variables(variables, inputs, products, settings, selects=None, partials=None):
+    """
+    Reduce the monthly inputs of several variables to all their products in
+    one pass: each file is opened once and each source variable read once,
+    for the variable itself and for the derived variables computed from it.
+
+    inputs is a list of (year, month, path) in time order, products maps each
+    variable to its products. settings holds the storage profiles, whether
+    the all-year series are kept virtual and the default domain selection
+    operators; selects and partials optionally give them per variable.
+    Returns {variable: list of files read}.
+    """
+    years = sorted({year for year, _, _ in inputs})
+    selects, partials = selects or {}, partials or {}
+    reductions = [reduction(variable, products[variable], settings,
+                            selects.get(variable, settings.get("select", [])), years, partials.get(variable))
+                  for variable in variables]
+    sources = list(dict.fromkeys(name for r in reductions for name in r.sources))
+
+    try:
+        for year in years:
+            for _, month, path in (entry for entry in inputs if entry[0] == year):
+                fields = {}
+                for name in sources:
+                    field = open_field(path, name)
+                    if field is not None:
+                        fields[name] = field
+                for r in reductions:
+                    missing = [name for name in r.sources if name not in fields]
+                    if missing:
+                        print(f"Variable {missing[0]} not found in {path}. Skipping.")
+                        continue
+                    r.add(path, month, fields)
+            for r in reductions:
+                if r.template is not None:
+                    r.end_year()
+
+        errors = []
+        for r in reductions:
+            try:
+                r.finish()
+            except ValueError as exc:
+                errors.append(str(exc))
+    except BaseException:
+        for r in reductions:
+            r.abort()
+        raise
+    if errors:
+        raise ValueError(" ".join(errors))
+    return {r.variable: r.used for r in reductions}
+
+
+def reduce_variable(variable, inputs, products, settings, partial=None):
+    """
+    Reduce the monthly inputs of one variable to all products in one pass
+    (see reduce_variables). Returns the list of files that were read.
+    """
+    return reduce_variables([variable], inputs, {variable: products}, settings,
+                            partials={variable: partial} if partial else None)[variable]
+
+
+def write_climatology(path, climatology, template, settings, dtype, fill):
+    """Calendar-month means over all years, as cdo ymonmean."""
+    writer = ProductWriter(path, template, settings["maps"], dtype, fill, 12)
+    try:
+        for month, acc in climatology.items():
+            if acc.steps:
+                writer.append(acc.mean(dtype, fill), acc.time_mean())
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+
+
+def write_moments(path, moments, template, settings, dtype, fill):
+    """
+    Sample size, mean and interannual standard deviation of the yearly means
+    of each period, as <period>_n, <period>_mean and <period>_std on the grid.
+    """
+    from netCDF4 import Dataset
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    dims = tuple(dim for dim, _ in template.grid_dims)
+    profile = get_profile(settings["maps"])
+    options = {"zlib": profile["zlib"] > 0, "shuffle": profile["shuffle"]} if profile["format"] else {}
+    if profile["format"] and profile["zlib"]:
+        options["complevel"] = profile["zlib"]
+    try:
+        with Dataset(tmp_path, "w", format=netcdf_format(settings["maps"])) as nc:
+            nc.setncatts(template.global_attrs)
+            for dim, size in template.grid_dims:
+                nc.createDimension(dim, size)
+            for name, (coord_dims, values, attrs) in template.coords.items():
+                coord = nc.createVariable(name, values.dtype, coord_dims)
+                coord.setncatts(attrs)
+                coord[:] = values
+            for period, acc in moments.items():
+                if not acc.steps:
+                    continue
+                count = nc.createVariable(f"{period}_n", "i4", dims, **options)
+                count.long_name = f"Number of years in the {period} mean"
+                count[:] = acc.count
+                for name, values, long_name in (("mean", acc.mean(dtype, fill), "mean"),
+                                                ("std", acc.std(dtype, fill), "interannual standard deviation")):
+                    var = nc.createVariable(f"{period}_{name}", dtype, dims, fill_value=dtype.type(fill), **options)
+                    var.setncatts({key: value for key, value in template.attrs.items() if key != "long_name"})
+                    var.long_name = f"{period} {long_name} of {template.variable}"
+                    var.missing_value = dtype.type(fill)
+                    var.set_auto_maskandscale(False)
+                    var[:] = values
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+def save_partial(path, climatology, moments, used):
+    arrays = {}
+    for month, acc in climatology.items():
+        arrays.update(acc.state(f"m{month:02d}"))
+    for period, acc in moments.items():
+        arrays.update(acc.state(f"moments_{period}"))
+    arrays["used"] = np.array(json.dumps(used))
+    tmp_path = f"{path}.tmp.{os.getpid()}.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_partial(path):
+    """(climatology accumulators, moments, files read) saved by a partial reduction."""
+    with np.load(path) as arrays:
+        climatology = {month: MeanAccumulator.from_state(arrays, f"m{month:02d}") for month in range(1, 13)}
+        moments = {period: MomentAccumulator.from_state(arrays, f"moments_{period}") for period in PERIODS}
+        used = json.loads(str(arrays["used"]))
+    return climatology, moments, used
+
+
+def _read_series(path, variable):
+    """(values, times) of a product written by ProductWriter."""
+    from netCDF4 import Dataset
+    with Dataset(path) as nc:
+        var = nc.variables[variable]
+        var.set_auto_maskandscale(False)
+        return np.asarray(var[:]), np.asarray(nc.variables[var.dimensions[0]][:], dtype=np.float64)
+
+
+def merge_partials(variable, parts, products, settings):
+    """
+    Write the products of a variable from partial reductions of consecutive
+    year blocks. parts is a list of (block products, block .npz) in time
+    order: series are concatenated, the overall means are taken over the
+    yearly means of all blocks, and the climatology sums and moments are added up.
+    Returns the list of files read by all blocks.
+    """
+    from netCDF4 import Dataset
+    first = parts[0][0]["annual_mean_yearly"]
+    template = Template(first, variable)
+    dtype = np.dtype(template.dtype)
+    with Dataset(first) as nc:
+        fill = float(nc.variables[variable].getncattr("_FillValue"))
+    mean_packing = Packing({"_FillValue": fill})
+    buffers = {}
+    # Derived variables have no input files to index (see DerivedReduction)
+    virtual = settings["virtual"] and derived_vars.expression(variable) is None
+
+    names = [f"{period}_mean_yearly" for period in PERIODS]
+    if not virtual:
+        names.append("all_year")
+    for name in names:
+        blocks = [_read_series(part[name], variable) for part, _ in parts if os.path.exists(part[name])]
+        if not blocks:
+            continue
+        overall = MeanAccumulator()
+        writer = ProductWriter(products[name], template, settings["series"], dtype, fill,
+                               sum(len(times) for _, times in blocks))
+        try:
+            for data, times in blocks:
+                for field, time_value in zip(data, times):
+                    writer.append(field, time_value)
+                    if name != "all_year":
+                        overall.add(field, time_value, mean_packing, mean_packing.missing(field, buffers))
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        if overall.steps:
+            writer = ProductWriter(products[name.replace("_yearly", "")], template, settings["maps"], dtype, fill)
+            writer.append(overall.mean(dtype, fill), overall.time_mean())
+            writer.close()
+
+    climatology = {month: MeanAccumulator() for month in range(1, 13)}
+    moments = {period: MomentAccumulator() for period in PERIODS}
+    used = []
+    for _, partial in parts:
+        block_climatology, block_moments, block_used = load_partial(partial)
+        for month, acc in block_climatology.items():
+            climatology[month].merge(acc)
+        for period, acc in block_moments.items():
+            moments[period].merge(acc)
+        used.extend(block_used)
+    write_climatology(products["monthly_clim"], climatology, template, settings, dtype, fill)
+    write_moments(products["moments"], moments, template, settings, dtype, fill)
+
+    if virtual:
+        index = virtual_dataset.build_index(variable, used, settings.get("select", []))
+        virtual_dataset.write_index(index, virtual_dataset.index_path_for(products["all_year"]))
+    return used
+
+
+def settings_from_env(level_type=None):
+    """Storage settings exported by the wrapper from user_inputs_atm.sh."""
+    model_levels = level_type == "plev" and vertical_interp.enabled()
+    return {
+        "maps": os.environ.get("storage_profile_maps", "cdo_default"),
+        "series": os.environ.get("storage_profile_series", "cdo_default"),
+        # An index of model-level files cannot give the interpolated series
+        "virtual": os.environ.get("virtual_all_year", "true") == "true" and not model_levels,
+        "model_levels": model_levels,
+    }
+
+
+def main(argv):
+    select = [arg.split("=", 1)[1] for arg in argv if arg.startswith("--select=")]
+    argv = [arg for arg in argv if not arg.startswith("--select=")]
+    selects = None
+    if len(argv) >= 8 and argv[1] == "model":
+        level_type, netcdf_dir = argv[2], argv[4]
+        variables = [variable for variable in argv[3].split(",") if variable]
+        start_year, end_year, prefix = int(argv[5]), int(argv[6]), argv[7]
+        output_dir = argv[8] if len(argv) > 8 else "./output_data"
+        settings = settings_from_env(level_type)
+        inputs = model_inputs(netcdf_dir, start_year, end_year, level_type, settings["model_levels"])
+        products = {variable: model_products(output_dir, prefix, variable, level_type) for variable in variables}
+        if not select:
+            # Each variable cut to the run's domain and its own levels
+            selects = {variable: domain.cdo_ops(variable, level_type) for variable in variables}
+    elif len(argv) >= 6 and argv[1] == "obs":
+        variable, obs_data_dir = argv[2:4]
+        start_year, end_year = int(argv[4]), int(argv[5])
+        output_dir = argv[6] if len(argv) > 6 else "./output_data"
+        os.makedirs(output_dir, exist_ok=True)
+        settings = settings_from_env()
+        variables = [variable]
+        inputs = obs_inputs(obs_data_dir, variable, start_year, end_year, output_dir)
+        products = {variable: obs_products(output_dir, variable)}
+    else:
+        print("Usage: python reduce_atm.py model <plev|no_plev> <variable>[,<variable> ...] <netcdf_dir> "
+              "<start_year> <end_year> <output_prefix> [output_dir] [--select=<cdo_op> ...]")
+        print("       python reduce_atm.py obs <obs_variable> <obs_data_dir> "
+              "<start_year> <end_year> [output_dir] [--select=<cdo_op> ...]")
+        return 1
+
+    os.makedirs(output_dir, exist_ok=True)
+    settings["select"] = select
+    try:
+        used = reduce_variables(variables, inputs, products, settings, selects)
+    except ValueError as exc:
+        print(f"Error: {exc}")
+        return 1
+    for variable, files in used.items():
+        print(f"Reduced {variable} from {len(files)} monthly files.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
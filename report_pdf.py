@@ -0,0 +1,169 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# PDF version of the plot report (create_plot_html.py): one plot per A4 page
+# with its file name as caption.
+#
+# Each page is rendered with WeasyPrint on its own, in a process pool, and
+# cached as a one-page PDF named after the hash of the image, its caption and
+# the embedded image width. The cached pages are then concatenated with pypdf,
+# so a re-run only renders the pages of plots that changed. Without pypdf the
+# whole document is rendered in one WeasyPrint call as before.
+#
+# Plots can be embedded downscaled to a given pixel width (pdf_image_width),
+# which makes the PDF much smaller for plots saved at dpi=300.
+#
+# ==============================================================================
+
+import os
+import hashlib
+import pathlib
+from html import escape
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from pypdf import PdfWriter
+except ImportError:
+    PdfWriter = None
+
+PAGE_STYLE = """
+    <style>
+        @page {
+            size: A4 portrait;
+            margin: 20px;
+        }
+        body {
+            font-family: Arial, sans-serif;
+            text-align: center;
+        }
+        .caption {
+            font-size: 16px;
+            font-weight: bold;
+            margin-bottom: 10px;
+        }
+        img {
+            max-width: 100%;
+            max-height: 100%;
+            display: block;
+            margin: auto;
+        }
+    </style>
+"""
+
+
+def caption_for(image):
+    """Caption of a page: the plot file name without extension."""
+    return os.path.splitext(os.path.basename(image))[0]
+
+
+def page_key(digest, caption, image_width):
+    return hashlib.sha1(f"{digest}|{caption}|{image_width or 'full'}".encode()).hexdigest()[:20]
+
+
+def document_html(pages):
+    """HTML for (image path, caption) pages, one per A4 page."""
+    breaks = ['<div style="page-break-after: always;">'] * (len(pages) - 1) + ["<div>"]
+    body = "".join(f'{div}<div class="caption">{escape(caption)}</div>'
+                   f'<img src="{pathlib.Path(os.path.abspath(image)).as_uri()}" alt="Plot"></div>\n'
+                   for div, (image, caption) in zip(breaks, pages))
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Plots (PDF Version)</title>{PAGE_STYLE}</head>
+<body>
+{body}</body>
+</html>
+"""
+
+
+def downscale(image, path, width):
+    """Write a copy of the image at most width pixels wide; returns the image to embed."""
+    from PIL import Image
+    with Image.open(image) as source:
+        if source.width <= width:
+            return image
+        source.thumbnail((width, width * 4), Image.LANCZOS)
+        source.save(path, format="PNG", optimize=True)
+    return path
+
+
+def render_page(image, caption, page_path, image_width=None):
+    """Render one page to page_path (written atomically)."""
+    from weasyprint import HTML
+    tmp_path = f"{page_path}.tmp.{os.getpid()}"
+    embedded = downscale(image, f"{tmp_path}.png", image_width) if image_width else image
+    try:
+        HTML(string=document_html([(embedded, caption)])).write_pdf(tmp_path)
+        os.replace(tmp_path, page_path)
+    finally:
+        for path in (tmp_path, f"{tmp_path}.png"):
+            if os.path.exists(path):
+                os.remove(path)
+    return page_path
+
+
+def build_pdf(pages, out_pdf, page_dir, image_width=None, workers=None):
+    """
+    Write out_pdf from (image path, caption, image hash) pages, rendering only
+    pages not in page_dir yet. Returns the number of pages rendered.
+    """
+    if PdfWriter is None:
+        render_document(pages, out_pdf, page_dir, image_width)
+        return len(pages)
+
+    os.makedirs(page_dir, exist_ok=True)
+    page_paths = [os.path.join(page_dir, f"{page_key(digest, caption, image_width)}.pdf")
+                  for _, caption, digest in pages]
+    pending = [(image, caption, path) for (image, caption, _), path in zip(pages, page_paths)
+               if not os.path.exists(path)]
+    if pending:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+        args = ([p[0] for p in pending], [p[1] for p in pending], [p[2] for p in pending],
+                [image_width] * len(pending))
+        if workers == 1:
+            list(map(render_page, *args))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(render_page, *args))
+
+    writer = PdfWriter()
+    for path in page_paths:
+        writer.append(path)
+    tmp_pdf = f"{out_pdf}.tmp.{os.getpid()}"
+    with open(tmp_pdf, "wb") as fh:
+        writer.write(fh)
+    os.replace(tmp_pdf, out_pdf)
+
+    # Drop pages of plots that are gone or have changed
+    keep = {os.path.basename(path) for path in page_paths}
+    for name in os.listdir(page_dir):
+        if name.endswith(".pdf") and name not in keep:
+            os.remove(os.path.join(page_dir, name))
+    return len(pending)
+
+
+def render_document(pages, out_pdf, work_dir, image_width=None):
+    """Render all pages in a single WeasyPrint call (used when pypdf is not installed)."""
+    from weasyprint import HTML
+    os.makedirs(work_dir, exist_ok=True)
+    embedded = []
+    for i, (image, caption, _) in enumerate(pages):
+        if image_width:
+            image = downscale(image, os.path.join(work_dir, f"page_{i:04d}.png"), image_width)
+        embedded.append((image, caption))
+    try:
+        HTML(string=document_html(embedded)).write_pdf(out_pdf)
+    finally:
+        for i in range(len(pages)):
+            path = os.path.join(work_dir, f"page_{i:04d}.png")
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,184 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Thumbnails and the entry cache of the HTML plot report (create_plot_html.py).
+#
+# Each plot gets a downscaled PNG thumbnail named after the hash of the source
+# image, so an unchanged plot reuses its thumbnail whatever its path, and a
+# replaced plot gets a new one. Thumbnails are made in a process pool.
+#
+# The cache index (index.json in the thumbnail directory) remembers, per image
+# path, its size, modification time, hash, thumbnail and rendered HTML entry;
+# images whose size and modification time are unchanged are not even re-read.
+#
+# ==============================================================================
+
+import os
+import re
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DEFAULT_WIDTH = 480
+INDEX_NAME = "index.json"
+INDEX_VERSION = 1
+HASH_CHUNK = 1 << 20
+
+# <var>_annual_comparison_..._<projection>.png, <var>_season_comparison_..._<projection>_<season>.png
+PLOT_NAME = re.compile(r"^(?P<var>.+?)_(?P<period>annual|season)_comparison_.*?(?:_(?P<season>[A-Z]+))?$")
+# NCL figures, by file name prefix: (pattern, variable, fixed period or None).
+# The variable is the one of the plots_<var> directory the script writes to.
+NCL_PLOTS = (
+    (re.compile(r"^Geopot_"), "hght", None),
+    (re.compile(r"^(Wind|Zonal_wind|Meridional_wind|ZonalWind|precip_Wind)_"), "ua_va", None),
+    (re.compile(r"^TOA_"), "radiation", None),
+    (re.compile(r"^precip_"), "pr", None),
+    (re.compile(r"^Tas_"), "tas", "time series"),
+    (re.compile(r"^vertTemp_"), "ta", None),
+)
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def thumbnail_name(digest, width):
+    return f"{digest[:20]}_w{width}.png"
+
+
+def ncl_period(stem):
+    """The period of an NCL figure from the words of its name (annual when it names none)."""
+    words = stem.lower().split("_")
+    if "timeseries" in words:
+        return "time series"
+    if "climatology" in words:
+        return "monthly climatology"
+    if "season" in words:
+        return os.environ.get("season") or "season"
+    return "annual"
+
+
+def classify(filename):
+    """(variable, season) a plot belongs to, from its file name; season is 'annual' for annual plots."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    match = PLOT_NAME.match(stem)
+    if match:
+        if match.group("period") == "annual":
+            return match.group("var"), "annual"
+        return match.group("var"), match.group("season") or os.environ.get("season") or "season"
+    if stem.startswith("vertical_profile"):
+        return "ta", "vertical profile"
+    if stem.startswith("skill_"):
+        return "skill", stem.rsplit("_", 1)[-1]
+    for pattern, variable, period in NCL_PLOTS:
+        if pattern.match(stem):
+            return variable, period or ncl_period(stem)
+    return "other", ""
+
+
+def make_thumbnail(source, thumb_dir, width, digest=None):
+    """
+    Hash the source (unless the hash is given) and write its thumbnail if it
+    does not exist yet. Returns (source, digest, thumbnail name, width, height);
+    the thumbnail name is None when no thumbnail could be made.
+    """
+    digest = digest or file_hash(source)
+    if Image is None:
+        return source, digest, None, None, None
+    name = thumbnail_name(digest, width)
+    path = os.path.join(thumb_dir, name)
+    try:
+        if os.path.exists(path):
+            with Image.open(path) as thumb:
+                return source, digest, name, thumb.width, thumb.height
+        with Image.open(source) as image:
+            image.thumbnail((width, width * 4), Image.LANCZOS)
+            tmp_path = f"{path}.tmp.{os.getpid()}"
+            image.save(tmp_path, format="PNG", optimize=True)
+            os.replace(tmp_path, path)
+            return source, digest, name, image.width, image.height
+    except OSError as exc:
+        print(f"Warning: No thumbnail for {source}: {exc}")
+        return source, digest, None, None, None
+
+
+def load_index(thumb_dir):
+    try:
+        with open(os.path.join(thumb_dir, INDEX_NAME)) as fh:
+            index = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    if index.get("version") != INDEX_VERSION:
+        return {}
+    return index.get("entries", {})
+
+
+def save_index(thumb_dir, entries):
+    path = os.path.join(thumb_dir, INDEX_NAME)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w") as fh:
+        json.dump({"version": INDEX_VERSION, "entries": entries}, fh, indent=1)
+    os.replace(tmp_path, path)
+
+
+def update_thumbnails(sources, thumb_dir, width, cached, workers=None):
+    """
+    Thumbnail info {source: {size, mtime_ns, hash, thumb, target_width, width, height}}
+    for every source image, reusing cached entries whose file is unchanged and
+    generating the rest in parallel. Returns (info, number regenerated).
+    """
+    os.makedirs(thumb_dir, exist_ok=True)
+    info = {}
+    pending = []
+    for source in sources:
+        try:
+            stat = os.stat(source)
+        except OSError:
+            print(f"Warning: Image not found: {source}")
+            continue
+        entry = cached.get(source, {})
+        same_file = entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns
+        thumb = entry.get("thumb")
+        if same_file and entry.get("target_width") == width and thumb and \
+                os.path.exists(os.path.join(thumb_dir, thumb)):
+            info[source] = dict(entry)
+        else:
+            pending.append((source, stat, entry.get("hash") if same_file else None))
+
+    if pending:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+        if workers == 1:
+            results = [make_thumbnail(source, thumb_dir, width, digest) for source, _, digest in pending]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(make_thumbnail, [p[0] for p in pending], [thumb_dir] * len(pending),
+                                        [width] * len(pending), [p[2] for p in pending]))
+        for (source, stat, _), (_, digest, name, thumb_width, thumb_height) in zip(pending, results):
+            info[source] = dict(cached.get(source, {}), size=stat.st_size, mtime_ns=stat.st_mtime_ns, hash=digest,
+                                thumb=name, target_width=width if name else None,
+                                width=thumb_width, height=thumb_height)
+    return info, len(pending)
+
+
+def prune_thumbnails(thumb_dir, keep):
+    """Remove thumbnails no longer referenced by the report."""
+    for name in os.listdir(thumb_dir):
+        if name.endswith(".png") and name not in keep:
+            os.remove(os.path.join(thumb_dir, name))
@@ -0,0 +1,199 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Size-budgeted retention of processed products in output_data.
+#
+# At the end of a run the wrapper keeps output_data within retention_budget
+# (e.g. "200G"). Products are evicted in order of how cheap they are to get
+# back per byte freed, then least recently used first:
+#
+#   scratch      yearly intermediates kept for --resume (output_data/scratch, shards)
+#   all_year     *_all_year* series: the largest, rebuilt by one merge
+#   derived      regridded, reordered, fldmean and bias files, rebuilt from the means
+#   yearly       *_mean_yearly* series
+#   mean         annual and seasonal means
+#   climatology  *_monthly_clim* files: small, and need all years again
+#
+# Products used by the current run are pinned and never evicted: those recorded
+# in its checkpoint journal (the processing scripts also record the products
+# they reuse as they are), the inputs and outputs of its plot tasks (the
+# plot_tasks_*.jsonl lists written since it started), and those written or read
+# since it started. Access times are not relied on alone, as noatime and
+# relatime mounts do not update them on every read. The last use of a file is
+# its access or modification time, whichever is later.
+# Small files the diagnostics always need (INDIA_mask.nc, grid descriptions,
+# virtual indexes) are never evicted.
+#
+# Usage:
+#   python retention.py enforce <output_dir> <budget> [--since=<epoch_seconds>] [--journal=<journal>] [--dry-run]
+#   python retention.py report <output_dir>
+#
+# ==============================================================================
+
+import sys
+import os
+import re
+import glob
+import time
+
+import journal
+import plot_orchestrator
+
+# Eviction classes, evicted first to last
+CLASSES = ("scratch", "all_year", "derived", "yearly", "mean", "climatology")
+SCRATCH_DIRS = ("scratch", "shards")
+PRODUCT_EXTENSIONS = (".nc", ".npz")
+PROTECTED = ("INDIA_mask.nc",)
+DERIVED_TAGS = ("regrid", "_ordered", "fldmean", "bias", "_hpa", "_mm", "ensemble", "central_india")
+SKIP_DIRS = ("products.zarr", ".git", "__pycache__")
+UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(text):
+    """Bytes of a size like "500M", "200G" or "1.5T"."""
+    match = re.fullmatch(r"\s*([0-9.]+)\s*([KMGT]?)i?B?\s*", text.upper())
+    if not match:
+        raise ValueError(f"Invalid size '{text}', expected e.g. 500M, 200G or 1.5T")
+    return int(float(match.group(1)) * UNITS[match.group(2)])
+
+
+def format_size(size):
+    for unit in ("T", "G", "M", "K"):
+        if size >= UNITS[unit]:
+            return f"{size / UNITS[unit]:.1f}{unit}"
+    return f"{size}B"
+
+
+def product_class(path, output_dir):
+    """Eviction class of a file, or None for files that are never evicted."""
+    name = os.path.basename(path)
+    if name in PROTECTED or not name.endswith(PRODUCT_EXTENSIONS):
+        return None
+    top = os.path.relpath(path, output_dir).split(os.sep)[0]
+    if top in SCRATCH_DIRS:
+        return "scratch"
+    if any(tag in name for tag in DERIVED_TAGS):
+        return "derived"
+    if "_all_year" in name:
+        return "all_year"
+    if "_mean_yearly_" in name:
+        return "yearly"
+    if "monthly_clim" in name:
+        return "climatology"
+    return "mean"
+
+
+def scan(output_dir):
+    """(path, class, size, last use) of the evictable files under output_dir."""
+    found = []
+    for root, dirs, files in os.walk(output_dir):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in files:
+            path = os.path.join(root, name)
+            kind = product_class(path, output_dir)
+            if kind is None:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found.append((path, kind, stat.st_size, max(stat.st_atime, stat.st_mtime)))
+    return found
+
+
+def pinned_files(journal_path=None, output_dir=None, since=None):
+    """Files recorded in the run's journal, and those read or written by its plot tasks."""
+    pinned = set()
+    if journal_path:
+        for entry in journal.read_journal(journal_path).values():
+            pinned.update(entry["outputs"])
+    if output_dir and since is not None:
+        for tasks_path in glob.glob(os.path.join(output_dir, "plot_tasks_*.jsonl")):
+            try:
+                if os.stat(tasks_path).st_mtime < since:
+                    continue
+            except OSError:
+                continue
+            for task in plot_orchestrator.read_tasks(tasks_path)[0]:
+                for path in plot_orchestrator.task_inputs(task) + task.get("outputs", []):
+                    pinned.add(os.path.abspath(os.path.join(task["cwd"], path)))
+    return pinned
+
+
+def plan_evictions(files, budget, since=None, pinned=()):
+    """Files to evict, in order, to bring the total size within budget."""
+    total = sum(size for _, _, size, _ in files)
+    candidates = [f for f in files
+                  if os.path.abspath(f[0]) not in pinned and (since is None or f[3] < since)]
+    candidates.sort(key=lambda f: (CLASSES.index(f[1]), f[3]))
+    evict = []
+    for entry in candidates:
+        if total <= budget:
+            break
+        evict.append(entry)
+        total -= entry[2]
+    return evict, total
+
+
+def enforce(output_dir, budget, since=None, journal_path=None, dry_run=False):
+    files = scan(output_dir)
+    total = sum(size for _, _, size, _ in files)
+    evict, remaining = plan_evictions(files, budget, since, pinned_files(journal_path, output_dir, since))
+    action = "Would evict" if dry_run else "Evicting"
+    for path, kind, size, _ in evict:
+        print(f"{action} {path} ({kind}, {format_size(size)})")
+        if not dry_run:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    print(f"Products in {output_dir}: {format_size(total)} before, {format_size(remaining)} after "
+          f"({len(evict)} evicted, budget {format_size(budget)}).")
+    if remaining > budget:
+        print(f"Warning: The products used by this run alone exceed the budget of {format_size(budget)}.")
+    return 0
+
+
+def report(output_dir):
+    files = scan(output_dir)
+    now = time.time()
+    print(f"{'class':12s} {'files':>6s} {'size':>9s} {'oldest use (days)':>18s}")
+    for kind in CLASSES:
+        members = [f for f in files if f[1] == kind]
+        if members:
+            oldest = (now - min(f[3] for f in members)) / 86400.0
+            print(f"{kind:12s} {len(members):6d} {format_size(sum(f[2] for f in members)):>9s} {oldest:18.1f}")
+    print(f"{'total':12s} {len(files):6d} {format_size(sum(f[2] for f in files)):>9s}")
+    return 0
+
+
+def main(argv):
+    options = {arg.split("=", 1)[0]: arg.split("=", 1)[1] if "=" in arg else True
+               for arg in argv if arg.startswith("--")}
+    argv = [arg for arg in argv if not arg.startswith("--")]
+    if len(argv) == 4 and argv[1] == "enforce":
+        try:
+            budget = parse_size(argv[3])
+            since = float(options["--since"]) if "--since" in options else None
+        except ValueError as exc:
+            print(f"Error: {exc}")
+            return 1
+        return enforce(argv[2], budget, since, options.get("--journal"), "--dry-run" in options)
+    if len(argv) == 3 and argv[1] == "report":
+        return report(argv[2])
+    print("Usage: python retention.py enforce <output_dir> <budget> [--since=<epoch_seconds>] "
+          "[--journal=<journal>] [--dry-run]\n"
+          "       python retention.py report <output_dir>")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
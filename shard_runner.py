@@ -0,0 +1,331 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Sharded processing: the run is split into independent shards, one per
+# variable, dataset and block of shard_years years.
+#
+# "add" plans the shards of a dataset and variable into a shard list (JSON),
+# replacing any shards planned for them before.
+# Each shard is a partial reduce_atm.py run over its years: it writes the
+# yearly series of its block and saves the climatology sums and the files it
+# read to <shard_dir>/partial.npz. A shard is done when its partial.npz exists
+# and the key written next to it (a hash of the shard's settings, input
+# directory and the sizes and times of its monthly files) still matches, so a
+# change to the domain, precision policy, levels or inputs reruns it. "merge"
+# then combines the shards of each dataset and variable into
+# the standard products in output_data, as an unsharded run would write them.
+#
+# Shards can run on this machine in a process pool ("run-local"), or be handed
+# to a batch system one by one ("run" with a shard id, or --index=N for array
+# jobs, e.g. --index=$SLURM_ARRAY_TASK_ID). All paths in the shard list are
+# absolute and each shard carries its storage settings, so a shard runs the
+# same on any node that sees the data and output directories.
+#
+# Usage:
+#   python shard_runner.py add <shards.json> model <plev|no_plev> <variable> <netcdf_dir> <start_year> <end_year> <output_prefix>
+#   python shard_runner.py add <shards.json> obs <plev|no_plev> <variable> <obs_data_dir> <start_year> <end_year>
+#   python shard_runner.py run <shards.json> <shard_id>|--index=<N>
+#   python shard_runner.py run-local <shards.json> [workers]
+#   python shard_runner.py merge <shards.json>
+#   python shard_runner.py list <shards.json>
+#
+# ==============================================================================
+
+import sys
+import os
+import glob
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import domain
+import journal
+import reduce_atm
+
+DEFAULT_BLOCK_YEARS = 10
+STATE_FILE = "partial.npz"
+KEY_FILE = "key.txt"
+
+
+def load_shards(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return []
+
+
+def save_shards(path, shards):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w") as fh:
+        json.dump(shards, fh, indent=1)
+    os.replace(tmp_path, path)
+
+
+def year_blocks(start_year, end_year, block_years):
+    return [(year, min(year + block_years - 1, end_year)) for year in range(start_year, end_year + 1, block_years)]
+
+
+def plan(kind, level_type, variable, input_dir, start_year, end_year, dataset, output_dir, block_years):
+    """Shards of one dataset and variable, one per block of years."""
+    if kind == "model":
+        sample = next(iter(sorted(glob.glob(os.path.join(input_dir, "*plev*.nc")))), None) \
+            if level_type == "plev" else None
+        file_variable = variable
+    else:
+        file_variable = reduce_atm.OBS_NAMES.get(variable, variable)
+        sample = next(iter(sorted(glob.glob(os.path.join(input_dir, f"*_{file_variable}_*.nc")))), None)
+    settings = reduce_atm.settings_from_env(level_type if kind == "model" else None)
+    settings["select"] = domain.cdo_ops(variable, level_type, sample)
+    settings["precision_policy"] = os.environ.get("precision_policy", "float32")
+
+    shards_dir = os.path.join(os.path.abspath(output_dir), "shards")
+    shards = []
+    for block_start, block_end in year_blocks(start_year, end_year, block_years):
+        shard_id = f"{dataset}-{file_variable}-{level_type}-{block_start}-{block_end}"
+        shards.append({
+            "id": shard_id,
+            "kind": kind,
+            "dataset": dataset,
+            "level_type": level_type,
+            "variable": file_variable,
+            "input_dir": os.path.abspath(input_dir),
+            "start_year": start_year,
+            "end_year": end_year,
+            "block": [block_start, block_end],
+            "output_dir": os.path.abspath(output_dir),
+            "shard_dir": os.path.join(shards_dir, shard_id),
+            "settings": settings,
+        })
+    return shards
+
+
+def products_of(shard, output_dir):
+    if shard["kind"] == "model":
+        return reduce_atm.model_products(output_dir, shard["dataset"], shard["variable"], shard["level_type"])
+    return reduce_atm.obs_products(output_dir, shard["variable"])
+
+
+def state_path(shard):
+    return os.path.join(shard["shard_dir"], STATE_FILE)
+
+
+def key_path(shard):
+    return os.path.join(shard["shard_dir"], KEY_FILE)
+
+
+def block_files(shard):
+    """The monthly files of the years of a shard."""
+    block_start, block_end = shard["block"]
+    paths = []
+    for year in range(block_start, block_end + 1):
+        for month in range(1, 13):
+            if shard["kind"] == "model":
+                path = reduce_atm.model_file(shard["input_dir"], year, month, shard["level_type"],
+                                             shard["settings"].get("model_levels", False))
+            else:
+                path = reduce_atm.obs_file(shard["input_dir"], shard["variable"], year, month)
+            if path is not None:
+                paths.append(path)
+    return paths
+
+
+def shard_key(shard):
+    """Hash of the settings, input directory and monthly file states of a shard."""
+    value = {
+        "settings": shard["settings"],
+        "input_dir": shard["input_dir"],
+        "inputs": {path: journal.file_state(path) for path in block_files(shard)},
+    }
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def is_done(shard):
+    """True if the shard's partial sums exist and were made from its current settings and inputs."""
+    if not os.path.exists(state_path(shard)):
+        return False
+    try:
+        with open(key_path(shard)) as fh:
+            return fh.read().strip() == shard_key(shard)
+    except OSError:
+        return False
+
+
+def run_shard(shard):
+    """Partial reduction of the years of one shard; returns the shard id."""
+    os.environ["precision_policy"] = shard["settings"]["precision_policy"]
+    os.makedirs(shard["shard_dir"], exist_ok=True)
+    for path in (state_path(shard), key_path(shard)):
+        if os.path.exists(path):
+            os.remove(path)
+    key = shard_key(shard)
+    block_start, block_end = shard["block"]
+    if shard["kind"] == "model":
+        inputs = reduce_atm.model_inputs(shard["input_dir"], block_start, block_end, shard["level_type"],
+                                         shard["settings"].get("model_levels", False))
+    else:
+        inputs = reduce_atm.obs_inputs(shard["input_dir"], shard["variable"], block_start, block_end,
+                                       shard["shard_dir"])
+    reduce_atm.reduce_variable(shard["variable"], inputs, products_of(shard, shard["shard_dir"]),
+                               shard["settings"], partial=state_path(shard))
+    tmp_path = f"{key_path(shard)}.tmp.{os.getpid()}"
+    with open(tmp_path, "w") as fh:
+        fh.write(key + "\n")
+    os.replace(tmp_path, key_path(shard))
+    return shard["id"]
+
+
+def run_local(shards, workers=None):
+    """Run the shards not done yet in a process pool; returns the number that failed."""
+    pending = [shard for shard in shards if not is_done(shard)]
+    print(f"{len(shards) - len(pending)} of {len(shards)} shards already done, running {len(pending)}.")
+    if not pending:
+        return 0
+    failed = 0
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_shard, shard): shard["id"] for shard in pending}
+        for future in as_completed(futures):
+            try:
+                print(f"Shard {future.result()} done.")
+            except Exception as exc:
+                print(f"Error: Shard {futures[future]} failed: {exc}")
+                failed += 1
+    return failed
+
+
+def groups(shards):
+    """Shards by (dataset, variable, level_type), each in year order."""
+    grouped = {}
+    for shard in shards:
+        grouped.setdefault((shard["dataset"], shard["variable"], shard["level_type"]), []).append(shard)
+    return {key: sorted(members, key=lambda shard: shard["block"][0]) for key, members in grouped.items()}
+
+
+def check_blocks(members):
+    """Raise ValueError unless the year blocks of a group cover its period once, without gaps."""
+    first = members[0]
+    name = f"{first['dataset']} {first['variable']}"
+    expected = first["start_year"]
+    for shard in members:
+        block_start, block_end = shard["block"]
+        if block_start < expected:
+            raise ValueError(f"Shard {shard['id']} overlaps the other shards of {name}; plan them again")
+        if block_start > expected:
+            raise ValueError(f"The shards of {name} miss the years {expected}-{block_start - 1}; plan them again")
+        expected = block_end + 1
+    if expected <= first["end_year"]:
+        raise ValueError(f"The shards of {name} miss the years {expected}-{first['end_year']}; plan them again")
+
+
+def publish(shard, products):
+    """Put the merged products into the Zarr product store when it is enabled."""
+    if os.environ.get("product_store") != "zarr":
+        return
+    import xarray as xr
+    from product_store import ProductStore
+    store = ProductStore(os.environ.get("product_store_dir") or
+                         os.path.join(shard["output_dir"], "products.zarr"))
+    period = f"{shard['start_year']}-{shard['end_year']}"
+    for name, path in products.items():
+        if name != "all_year" and os.path.exists(path):
+            with xr.open_dataset(path, decode_times=False) as ds:
+                store.write(ds, shard["dataset"], shard["variable"], name, period)
+
+
+def merge(shards):
+    """Write the standard products of every dataset and variable from its shards."""
+    grouped = groups(shards)
+    for members in grouped.values():
+        check_blocks(members)
+    for (dataset, variable, _), members in grouped.items():
+        first = members[0]
+        products = products_of(first, first["output_dir"])
+        parts = [(products_of(shard, shard["shard_dir"]), state_path(shard)) for shard in members]
+        used = reduce_atm.merge_partials(variable, parts, products, first["settings"])
+        publish(first, products)
+        print(f"Merged {len(members)} shards of {dataset} {variable} ({len(used)} monthly files).")
+
+
+def main(argv):
+    if len(argv) in (9, 10) and argv[1] == "add":
+        shards_file, kind, level_type, variable, input_dir = argv[2:7]
+        start_year, end_year = int(argv[7]), int(argv[8])
+        if (kind == "model") != (len(argv) == 10) or kind not in ("model", "obs"):
+            return main(argv[:1])
+        dataset = argv[9] if kind == "model" else "obs"
+        output_dir = os.path.dirname(os.path.dirname(os.path.abspath(shards_file)))
+        block_years = int(os.environ.get("shard_years") or DEFAULT_BLOCK_YEARS)
+        try:
+            new = plan(kind, level_type, variable, input_dir, start_year, end_year, dataset, output_dir, block_years)
+        except (OSError, ValueError) as exc:
+            print(f"Error: {exc}")
+            return 1
+        os.makedirs(os.path.dirname(os.path.abspath(shards_file)), exist_ok=True)
+        # A new plan replaces every shard of the dataset and variable, whatever its block size
+        key = (dataset, new[0]["variable"], level_type)
+        kept = [shard for shard in load_shards(shards_file)
+                if (shard["dataset"], shard["variable"], shard["level_type"]) != key]
+        save_shards(shards_file, kept + new)
+        print(f"Planned {len(new)} shards of {dataset} {new[0]['variable']} in {shards_file}.")
+        return 0
+
+    if len(argv) == 4 and argv[1] == "run":
+        shards = load_shards(argv[2])
+        if argv[3].startswith("--index="):
+            index = int(argv[3].split("=", 1)[1])
+            chosen = shards[index:index + 1] if 0 <= index < len(shards) else []
+        else:
+            chosen = [shard for shard in shards if shard["id"] == argv[3]]
+        if not chosen:
+            print(f"Error: No shard {argv[3]} in {argv[2]}.")
+            return 1
+        try:
+            print(f"Shard {run_shard(chosen[0])} done.")
+        except ValueError as exc:
+            print(f"Error: {exc}")
+            return 1
+        return 0
+
+    if len(argv) in (3, 4) and argv[1] == "run-local":
+        return 1 if run_local(load_shards(argv[2]), int(argv[3]) if len(argv) == 4 else None) else 0
+
+    if len(argv) == 3 and argv[1] == "merge":
+        shards = load_shards(argv[2])
+        pending = [shard["id"] for shard in shards if not is_done(shard)]
+        if pending:
+            print(f"{len(pending)} of {len(shards)} shards are not done yet: {', '.join(pending)}")
+            return 2
+        try:
+            merge(shards)
+        except ValueError as exc:
+            print(f"Error: {exc}")
+            return 1
+        return 0
+
+    if len(argv) == 3 and argv[1] == "list":
+        for index, shard in enumerate(load_shards(argv[2])):
+            print(f"{index}\t{shard['id']}\t{'done' if is_done(shard) else 'pending'}")
+        return 0
+
+    print("Usage: python shard_runner.py add <shards.json> model <plev|no_plev> <variable> <netcdf_dir> "
+          "<start_year> <end_year> <output_prefix>\n"
+          "       python shard_runner.py add <shards.json> obs <plev|no_plev> <variable> <obs_data_dir> "
+          "<start_year> <end_year>\n"
+          "       python shard_runner.py run <shards.json> <shard_id>|--index=<N>\n"
+          "       python shard_runner.py run-local <shards.json> [workers]\n"
+          "       python shard_runner.py merge <shards.json>\n"
+          "       python shard_runner.py list <shards.json>")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,210 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Significance of the bias maps, from the interannual moments.
+#
+# reduce_atm.py keeps the count, mean and M2 of the yearly means of every
+# period as it reduces the monthly files, and writes them as
+# <prefix>_moments_<variable>.nc next to the means (<period>_n, <period>_mean
+# and <period>_std, the interannual standard deviation map). The plotting stage
+# regrids the moments of the observations and of Model 2 to the grid of Model 1
+# with the means.
+#
+# "mask" runs Welch's t-test of the difference of two means at each grid
+# point, from their moments (unequal variances, Welch-Satterthwaite degrees of
+# freedom), and writes the p-value and the mask of points significant at
+# significance_alpha (0.05 by default). The moments of a mean are found from
+# its file name: <prefix>_<period>_mean_<rest> -> <prefix>_moments_<rest>.
+# --scale-a/--scale-b give the unit conversion the bias applies to a mean
+# (e.g. 86400 for kg m-2 s-1 to mm/day).
+# Without moments (reduction_engine="cdo") no mask is written and the bias
+# panels are drawn without stippling.
+#
+# The renderers call stipple() to hatch the significant points of a bias
+# panel, from <bias>_signif.nc when it exists.
+#
+# Usage:
+#   python significance.py mask <mean_a> <mean_b> <output.nc> [--scale-a=<factor>] [--scale-b=<factor>]
+#
+# ==============================================================================
+
+import sys
+import os
+import re
+import math
+import numpy as np
+
+from reduce_atm import PERIODS
+
+SIGNIF_SUFFIX = "_signif.nc"
+MEAN_PATTERN = re.compile(r"_(" + "|".join(PERIODS) + r")_mean_")
+CF_ITERATIONS = 200
+
+
+def moments_of(mean_path):
+    """(moments path, period) of a mean product, or (None, None)."""
+    name = os.path.basename(mean_path)
+    match = MEAN_PATTERN.search(name)
+    if match is None:
+        return None, None
+    moments = name[:match.start()] + "_moments_" + name[match.end():]
+    return os.path.join(os.path.dirname(mean_path), moments), match.group(1)
+
+
+def signif_path(bias_path):
+    return os.path.splitext(bias_path)[0] + SIGNIF_SUFFIX
+
+
+def read_moments(path, period):
+    """(n, mean, std) of a period as float64 arrays, NaN where missing, and the netCDF dims."""
+    from netCDF4 import Dataset
+    with Dataset(path) as nc:
+        arrays = []
+        for name in ("n", "mean", "std"):
+            var = nc.variables[f"{period}_{name}"]
+            arrays.append(np.ma.filled(np.ma.asarray(var[:], dtype=np.float64), np.nan))
+        return arrays, nc.variables[f"{period}_mean"].dimensions
+
+
+def _betacf(a, b, x):
+    """Continued fraction of the incomplete beta function (modified Lentz), elementwise."""
+    tiny = 1.0e-300
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c = np.ones_like(x)
+    d = 1.0 - qab * x / qap
+    d = 1.0 / np.where(np.abs(d) < tiny, tiny, d)
+    h = d.copy()
+    for m in range(1, CF_ITERATIONS + 1):
+        m2 = 2 * m
+        for aa in (m * (b - m) * x / ((qam + m2) * (a + m2)),
+                   -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))):
+            d = 1.0 + aa * d
+            d = 1.0 / np.where(np.abs(d) < tiny, tiny, d)
+            c = 1.0 + aa / c
+            c = np.where(np.abs(c) < tiny, tiny, c)
+            delta = d * c
+            h *= delta
+        if np.all(np.abs(delta - 1.0) < 3.0e-14):
+            break
+    return h
+
+
+def betainc(a, b, x):
+    """Regularised incomplete beta function I_x(a, b), elementwise."""
+    a, b, x = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64),
+                                  np.clip(np.asarray(x, dtype=np.float64), 0.0, 1.0))
+    lgamma = np.vectorize(math.lgamma, otypes=[np.float64])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        front = np.exp(a * np.log(x) + b * np.log1p(-x) - (lgamma(a) + lgamma(b) - lgamma(a + b)))
+        lower = x < (a + 1.0) / (a + b + 2.0)
+        # The continued fraction converges fast on the near side of the mode
+        xs = np.where(lower, x, 1.0 - x)
+        cf = _betacf(np.where(lower, a, b), np.where(lower, b, a), xs)
+        result = np.where(lower, front * cf / a, 1.0 - front * cf / b)
+    return np.where(x <= 0.0, 0.0, np.where(x >= 1.0, 1.0, result))
+
+
+def welch(n_a, mean_a, std_a, n_b, mean_b, std_b):
+    """t statistic, degrees of freedom and two-sided p-value of Welch's t-test."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var_a, var_b = std_a ** 2 / n_a, std_b ** 2 / n_b
+        t = (mean_a - mean_b) / np.sqrt(var_a + var_b)
+        df = (var_a + var_b) ** 2 / (var_a ** 2 / (n_a - 1) + var_b ** 2 / (n_b - 1))
+        valid = np.isfinite(t) & np.isfinite(df) & (df > 0)
+        p = np.full(t.shape, np.nan)
+        p[valid] = betainc(df[valid] / 2.0, 0.5, df[valid] / (df[valid] + t[valid] ** 2))
+    return t, df, p
+
+
+def write_mask(path, template, dims, t, p, alpha):
+    """The p-value and the significance mask on the grid of template (a moments file)."""
+    from netCDF4 import Dataset
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        with Dataset(template) as src, Dataset(tmp_path, "w") as nc:
+            for dim in dims:
+                nc.createDimension(dim, len(src.dimensions[dim]))
+                if dim in src.variables:
+                    coord = nc.createVariable(dim, src.variables[dim].dtype, (dim,))
+                    coord.setncatts({name: src.variables[dim].getncattr(name)
+                                     for name in src.variables[dim].ncattrs() if name != "_FillValue"})
+                    coord[:] = src.variables[dim][:]
+            var = nc.createVariable("t", "f4", dims, fill_value=np.float32(1.0e20))
+            var.long_name = "Welch t statistic"
+            var[:] = np.ma.masked_invalid(t)
+            var = nc.createVariable("p", "f4", dims, fill_value=np.float32(1.0e20))
+            var.long_name = "Two-sided p-value of the difference of the means"
+            var[:] = np.ma.masked_invalid(p)
+            var = nc.createVariable("significant", "i1", dims)
+            var.long_name = f"Difference significant at the {alpha:g} level"
+            var[:] = np.where(np.isfinite(p), p < alpha, False).astype(np.int8)
+            nc.alpha = alpha
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+def mask(mean_a, mean_b, output, scale_a=1.0, scale_b=1.0, alpha=None):
+    """
+    Write the significance mask of scale_a * mean_a - scale_b * mean_b.
+    False when a moments file is missing.
+    """
+    alpha = alpha if alpha is not None else float(os.environ.get("significance_alpha", "0.05"))
+    (moments_a, period_a), (moments_b, period_b) = moments_of(mean_a), moments_of(mean_b)
+    for moments, mean in ((moments_a, mean_a), (moments_b, mean_b)):
+        if moments is None or not os.path.exists(moments):
+            print(f"No interannual moments for {mean}; no significance mask for {output}.")
+            if os.path.exists(output):
+                os.remove(output)  # stale
+            return False
+    (n_a, m_a, s_a), dims = read_moments(moments_a, period_a)
+    (n_b, m_b, s_b), _ = read_moments(moments_b, period_b)
+    if n_a.shape != n_b.shape:
+        raise ValueError(f"{moments_a} and {moments_b} are not on the same grid")
+    t, _, p = welch(n_a, scale_a * m_a, abs(scale_a) * s_a, n_b, scale_b * m_b, abs(scale_b) * s_b)
+    write_mask(output, moments_a, dims, t, p, alpha)
+    share = np.count_nonzero(np.isfinite(p) & (p < alpha)) / max(np.count_nonzero(np.isfinite(p)), 1)
+    print(f"Significance mask written to {output} ({100 * share:.0f}% of points at p < {alpha:g}).")
+    return True
+
+
+def stipple(ax, bias_path, transform=None, hatch="..."):
+    """Hatch the points of a bias panel where the bias is significant (see mask)."""
+    path = signif_path(bias_path) if bias_path else None
+    if not path or not os.path.exists(path):
+        return None
+    import xarray as xr
+    with xr.open_dataset(path) as ds:
+        significant = ds["significant"].squeeze().load()
+    lat_name, lon_name = significant.dims[-2:]
+    options = {"transform": transform} if transform is not None else {}
+    return ax.contourf(significant[lon_name], significant[lat_name], significant, levels=[0.5, 1.5],
+                       colors="none", hatches=[hatch], **options)
+
+
+def main(argv):
+    options = {arg.split("=", 1)[0]: arg.split("=", 1)[1] for arg in argv if arg.startswith("--") and "=" in arg}
+    argv = [arg for arg in argv if not arg.startswith("--")]
+    if len(argv) == 5 and argv[1] == "mask":
+        try:
+            mask(argv[2], argv[3], argv[4], float(options.get("--scale-a", 1.0)), float(options.get("--scale-b", 1.0)))
+        except (OSError, KeyError, ValueError) as exc:
+            print(f"Error: {exc}")
+            return 1
+        return 0
+    print("Usage: python significance.py mask <mean_a> <mean_b> <output.nc> [--scale-a=<factor>] [--scale-b=<factor>]")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,329 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Skill scores of every model against the observations, for all variables,
+# periods (annual and the season) and regions at once.
+#
+# The annual and seasonal means of each model and of the observations are
+# regridded to the grid of the first model (bilinear weights shared per source
+# grid, see ensemble_compare.py) and stacked into one array of
+# (field, period, model, lat, lon), a field being a variable or a pressure
+# level of one. With area weights (cos(lat)) per region, every statistic is a
+# weighted sum over lat/lon of the whole stack, taken in one pass:
+#
+#   bias       weighted mean of model - obs
+#   rmse       root mean square of model - obs
+#   crmse      centred RMSE (anomalies from the regional means)
+#   corr       centred pattern correlation
+#   sd_ratio   standard deviation of the model over that of the observations
+#
+# Points missing in either field are left out. The table is written to
+# <output_dir>/skill_metrics.csv; the Taylor diagram and the portrait plot
+# (normalised RMSE of each field, region and model) of each period go to
+# plot_dir and the run's plot manifest, so they appear in the HTML report.
+#
+# Usage:
+#   python skill_metrics.py <output_dir> <plot_dir> <season> <plev_variables> <no_plev_variables> <model_prefix> [<model_prefix> ...] [--levels=850,200]
+#
+# ==============================================================================
+
+import sys
+import os
+import csv
+import numpy as np
+
+import domain
+import plot_profiling
+import plot_manifest
+from ensemble_compare import MODEL_SCALE, OBS_SCALE, DEFAULT_LEVELS, Regridder, load_field
+from reduce_atm import OBS_NAMES, SEASON_MONTHS, model_products, obs_products
+
+# (lat_min, lat_max, lon_min, lon_max) of each region
+REGIONS = {
+    "global": (-90.0, 90.0, 0.0, 360.0),
+    "tropics": (-30.0, 30.0, 0.0, 360.0),
+    "nh_extratropics": (30.0, 90.0, 0.0, 360.0),
+    "sh_extratropics": (-90.0, -30.0, 0.0, 360.0),
+    "india": (6.5, 38.5, 66.5, 100.0),
+}
+STATISTICS = ("bias", "rmse", "crmse", "corr", "sd_ratio", "obs_std")
+TABLE_FILE = "skill_metrics.csv"
+
+
+def region_weights(lat, lon):
+    """Area weights (region, lat, lon): cos(lat) inside each region, 0 outside."""
+    lat = np.asarray(lat, dtype=np.float64)
+    weights = np.zeros((len(REGIONS), len(lat), len(lon)))
+    cos_lat = np.clip(np.cos(np.deg2rad(lat)), 0.0, None)
+    for r, (lat_min, lat_max, lon_min, lon_max) in enumerate(REGIONS.values()):
+        rows = domain.lat_indices(lat, lat_min, lat_max)
+        columns = domain.lon_indices(lon, lon_min, lon_max)
+        weights[r][np.ix_(rows, columns)] = cos_lat[rows, np.newaxis]
+    return weights
+
+
+def load_stack(output_dir, variables, periods, prefixes, levels):
+    """
+    (fields, models (field, period, model, lat, lon), obs (field, period, lat, lon),
+    lat, lon) on the grid of the first model; missing products are NaN.
+    fields lists (variable, level or None) in stack order.
+    """
+    target = None
+    for variable, level_type in variables:
+        path = model_products(output_dir, prefixes[0], variable, level_type)["annual_mean"]
+        if os.path.exists(path):
+            _, target_lat, target_lon, _ = load_field(path, variable, levels if level_type == "plev" else None)
+            target = (target_lat, target_lon)
+            break
+    if target is None:
+        raise ValueError(f"No mean products of {prefixes[0]} in {output_dir}")
+    regrid = Regridder(*target)
+    shape = (len(target[0]), len(target[1]))
+
+    fields, model_rows, obs_rows = [], [], []
+    for variable, level_type in variables:
+        field_levels = levels if level_type == "plev" else None
+        planes = {}  # period -> (model planes, obs plane), each (level, lat, lon)
+        level_values = None
+        try:
+            for period in periods:
+                stack = []
+                for prefix in prefixes:
+                    path = model_products(output_dir, prefix, variable, level_type)[f"{period}_mean"]
+                    if not os.path.exists(path):
+                        stack.append(None)
+                        continue
+                    values, lat, lon, found_levels = load_field(path, variable, field_levels)
+                    level_values = found_levels if level_values is None else level_values
+                    stack.append(regrid(values, lat, lon) * MODEL_SCALE.get(variable, 1.0))
+                obs_var = OBS_NAMES.get(variable, variable)
+                obs_path = obs_products(output_dir, obs_var)[f"{period}_mean"]
+                obs = None
+                if os.path.exists(obs_path):
+                    values, lat, lon, _ = load_field(obs_path, obs_var, field_levels)
+                    obs = regrid(values, lat, lon) * OBS_SCALE.get(variable, 1.0)
+                planes[period] = (stack, obs)
+        except ValueError as exc:
+            print(f"Warning: {exc}; {variable} left out of the skill metrics.")
+            continue
+        if level_values is None and all(plane is None for stack, _ in planes.values() for plane in stack):
+            print(f"Warning: No mean products of {variable}, left out of the skill metrics.")
+            continue
+        count = 1 if level_values is None else len(level_values)
+        labels = [None] if level_values is None else [float(level) for level in level_values]
+        for i, level in enumerate(labels):
+            fields.append((variable, level))
+            model_rows.append([[_plane(plane, i, count, shape) for plane in planes[period][0]] for period in periods])
+            obs_rows.append([_plane(planes[period][1], i, count, shape) for period in periods])
+    return fields, np.array(model_rows), np.array(obs_rows), target[0], target[1]
+
+
+def _plane(values, index, count, shape):
+    if values is None:
+        return np.full(shape, np.nan)
+    values = np.asarray(values, dtype=np.float64).reshape((-1,) + shape)
+    return values[index] if len(values) == count else values[0]
+
+
+def skill(models, obs, weights):
+    """
+    The statistics of every field, period, model and region, as a dict of
+    arrays (field, period, model, region), from weighted sums over lat/lon.
+    """
+    obs = np.broadcast_to(obs[:, :, np.newaxis], models.shape)
+    valid = np.isfinite(models) & np.isfinite(obs)
+    x = np.where(valid, models, 0.0)
+    o = np.where(valid, obs, 0.0)
+    mask = valid.astype(np.float64)
+
+    def weighted_sum(values):
+        return np.einsum("ryx,fpmyx->fpmr", weights, values, optimize=True)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = weighted_sum(mask)
+        mean_x, mean_o = weighted_sum(x) / total, weighted_sum(o) / total
+        var_x = np.maximum(weighted_sum(x * x) / total - mean_x ** 2, 0.0)
+        var_o = np.maximum(weighted_sum(o * o) / total - mean_o ** 2, 0.0)
+        cov = weighted_sum(x * o) / total - mean_x * mean_o
+        std_x, std_o = np.sqrt(var_x), np.sqrt(var_o)
+        return {
+            "bias": mean_x - mean_o,
+            "rmse": np.sqrt(np.maximum(weighted_sum((x - o) ** 2) / total, 0.0)),
+            "crmse": np.sqrt(np.maximum(var_x + var_o - 2.0 * cov, 0.0)),
+            "corr": np.clip(cov / (std_x * std_o), -1.0, 1.0),
+            "sd_ratio": std_x / std_o,
+            "obs_std": std_o,
+        }
+
+
+def field_label(field):
+    variable, level = field
+    return variable if level is None else f"{variable} {level:g}hPa"
+
+
+def write_table(path, fields, periods, prefixes, scores):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["variable", "level", "period", "region", "model"] + list(STATISTICS))
+        for f, (variable, level) in enumerate(fields):
+            for p, period in enumerate(periods):
+                for r, region in enumerate(REGIONS):
+                    for m, prefix in enumerate(prefixes):
+                        values = [scores[name][f, p, m, r] for name in STATISTICS]
+                        if not np.isfinite(values[1]):
+                            continue
+                        writer.writerow([variable, "" if level is None else f"{level:g}", period, region, prefix]
+                                        + [f"{value:.6g}" for value in values])
+    os.replace(tmp_path, path)
+
+
+def summarize(fields, periods, prefixes, scores):
+    """For each period and region, how often each model has the lowest RMSE."""
+    if len(prefixes) < 2:
+        return
+    rmse = scores["rmse"]
+    for p, period in enumerate(periods):
+        for r, region in enumerate(REGIONS):
+            block = rmse[:, p, :, r]
+            complete = np.all(np.isfinite(block), axis=1)
+            if not complete.any():
+                continue
+            wins = np.bincount(np.argmin(block[complete], axis=1), minlength=len(prefixes))
+            print(f"Lowest RMSE, {period} {region}: " +
+                  ", ".join(f"{prefix} {count} of {complete.sum()}" for prefix, count in zip(prefixes, wins)))
+
+
+def plot_taylor(path, fields, period_index, prefixes, scores, title):
+    """Taylor diagram: one panel per region, a marker per model and field."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    columns = 3
+    rows = -(-len(REGIONS) // columns)
+    fig = plt.figure(figsize=(6 * columns, 5.5 * rows))
+    markers = "osD^v<>p*h"
+    colors = plt.get_cmap("tab10")
+    for r, region in enumerate(REGIONS):
+        corr = scores["corr"][:, period_index, :, r]
+        ratio = scores["sd_ratio"][:, period_index, :, r]
+        shown = np.isfinite(corr) & np.isfinite(ratio)
+        ax = fig.add_subplot(rows, columns, r + 1, projection="polar")
+        limit = max(1.5, float(np.nanmax(np.where(shown, ratio, np.nan), initial=1.0)) * 1.1)
+        # A quadrant unless some correlation is negative
+        negative = bool(np.any(corr[shown] < 0))
+        ticks = np.array([-0.99, -0.9, -0.6, -0.3, 0.0, 0.3, 0.6, 0.8, 0.9, 0.95, 0.99])
+        ticks = ticks if negative else ticks[ticks >= 0]
+        ax.set_thetagrids(np.degrees(np.arccos(ticks)), [f"{tick:g}" for tick in ticks])
+        ax.set_thetamin(0)
+        ax.set_thetamax(180 if negative else 90)
+        ax.set_rlim(0, limit)
+        # Centred RMSE (normalised) around the reference point
+        theta = np.linspace(0, np.pi, 181)
+        for radius in (0.5, 1.0, 1.5):
+            x, y = 1.0 + radius * np.cos(theta), radius * np.sin(theta)
+            inside = (np.hypot(x, y) <= limit) & (np.arctan2(y, x) <= (np.pi if negative else np.pi / 2))
+            ax.plot(np.arctan2(y, x)[inside], np.hypot(x, y)[inside], color="0.8", linewidth=0.8, linestyle="--")
+        ax.plot(0, 1.0, marker="*", color="k", markersize=12)
+        for m, prefix in enumerate(prefixes):
+            for f, field in enumerate(fields):
+                if shown[f, m]:
+                    angle = np.arccos(corr[f, m])
+                    ax.plot(angle, ratio[f, m], marker=markers[m % len(markers)], color=colors(m % 10),
+                            linestyle="none", label=prefix if f == np.argmax(shown[:, m]) else None)
+                    ax.annotate(field_label(field), (angle, ratio[f, m]), fontsize=7,
+                                xytext=(3, 3), textcoords="offset points")
+        ax.set_title(region.replace("_", " "), pad=18)
+        if r == 0:
+            ax.legend(loc="upper right", bbox_to_anchor=(1.3, 1.1), fontsize=9)
+    fig.suptitle(f"{title} (angle: pattern correlation, radius: standard deviation ratio)")
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def plot_portrait(path, fields, period_index, prefixes, scores, title):
+    """Portrait plot: RMSE over the observed standard deviation, by field and region x model."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        normalised = scores["rmse"][:, period_index] / scores["obs_std"][:, period_index]
+    # Columns grouped by region, a column per model
+    table = normalised.transpose(0, 2, 1).reshape(len(fields), -1)
+    columns = [f"{region.replace('_', ' ')}\n{prefix}" for region in REGIONS for prefix in prefixes]
+    fig, ax = plt.subplots(figsize=(max(8, 0.9 * len(columns) + 3), max(4, 0.45 * len(fields) + 2)))
+    image = ax.imshow(np.ma.masked_invalid(table), cmap="RdYlGn_r", aspect="auto",
+                      vmin=0, vmax=max(1.0, float(np.nanpercentile(table, 95)) if np.isfinite(table).any() else 1.0))
+    for (row, column), value in np.ndenumerate(table):
+        if np.isfinite(value):
+            ax.text(column, row, f"{value:.2f}", ha="center", va="center", fontsize=7)
+    ax.set_xticks(range(len(columns)))
+    ax.set_xticklabels(columns, fontsize=8, rotation=90)
+    ax.set_yticks(range(len(fields)))
+    ax.set_yticklabels([field_label(field) for field in fields], fontsize=8)
+    for boundary in range(len(prefixes), len(columns), len(prefixes)):
+        ax.axvline(boundary - 0.5, color="k", linewidth=1.2)
+    fig.colorbar(image, ax=ax, label="RMSE / observed standard deviation")
+    ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def main(argv):
+    levels = DEFAULT_LEVELS
+    for arg in argv[1:]:
+        if arg.startswith("--levels="):
+            levels = tuple(float(level) for level in arg.split("=", 1)[1].split(",") if level) or DEFAULT_LEVELS
+    argv = [arg for arg in argv if not arg.startswith("--levels=")]
+    if len(argv) < 7:
+        print("Usage: python skill_metrics.py <output_dir> <plot_dir> <season> <plev_variables> <no_plev_variables> "
+              "<model_prefix> [<model_prefix> ...] [--levels=850,200]")
+        return 1
+    output_dir, plot_dir, season = argv[1:4]
+    variables = [(name, "plev") for name in argv[4].split(",") if name] + \
+                [(name, "no_plev") for name in argv[5].split(",") if name]
+    prefixes = argv[6:]
+    if season not in SEASON_MONTHS:
+        print(f"Error: Invalid season {season}")
+        return 1
+    periods = ("annual", season)
+
+    plot_profiling.phase_start("load")
+    try:
+        fields, models, obs, lat, lon = load_stack(output_dir, variables, periods, prefixes, levels)
+    except ValueError as exc:
+        print(f"Error: {exc}")
+        return 1
+
+    plot_profiling.phase_start("transform")
+    scores = skill(models, obs, region_weights(lat, lon))
+    table = os.path.join(output_dir, TABLE_FILE)
+    write_table(table, fields, periods, prefixes, scores)
+    print(f"Skill metrics of {len(fields)} fields, {len(prefixes)} models and {len(REGIONS)} regions written to {table}")
+    summarize(fields, periods, prefixes, scores)
+
+    plot_profiling.phase_start("render")
+    os.makedirs(plot_dir, exist_ok=True)
+    for p, period in enumerate(periods):
+        for name, plot in (("taylor_diagram", plot_taylor), ("portrait_plot", plot_portrait)):
+            output_file = os.path.join(plot_dir, f"skill_{name}_{period}.png")
+            plot(output_file, fields, p, prefixes, scores, f"{period} skill against observations")
+            plot_manifest.register(output_file)
+            print(f"Plot saved to {output_file}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -17,6 +17,9 @@ function check_error {
     fi
 }
 
+# float32 precision policy for CDO outputs (see precision.py)
+read -r -a precision_cdo_opts <<< "$(python3 precision.py cdo-opts)"
+
 # Validate input arguments
 if [ "$#" -lt 8 ]; then
     echo "Usage: $0 <obs_annual_regridded> <obs_season_regridded> <model1_annual_mean> <model1_season_mean> <projection> <lat_range> <lon_range> <season> [<model2_annual_regridded> <model2_season_regridded>]"
@@ -41,17 +44,17 @@ mkdir -p "$output_dir"
 
 # Output filenames
 obs_annual_mm="${output_dir}/obs_annual_mean_evspsbl_mm.nc"
-obs_season_mm="${output_dir}/obs_season_mean_evspsbl_mm.nc"
+obs_season_mm="${output_dir}/obs_${season}_mean_evspsbl_mm.nc"
 model1_annual_mm="${output_dir}/model1_annual_mean_evspsbl_mm.nc"
-model1_season_mm="${output_dir}/model1_season_mean_evspsbl_mm.nc"
+model1_season_mm="${output_dir}/model1_${season}_mean_evspsbl_mm.nc"
 model2_annual_mm="${output_dir}/model2_annual_mean_evspsbl_mm.nc"
-model2_season_mm="${output_dir}/model2_season_mean_evspsbl_mm.nc"
+model2_season_mm="${output_dir}/model2_${season}_mean_evspsbl_mm.nc"
 annual_bias_model1_obs="${output_dir}/evspsbl_annual_bias_model1_obs.nc"
-season_bias_model1_obs="${output_dir}/evspsbl_season_bias_model1_obs.nc"
+season_bias_model1_obs="${output_dir}/evspsbl_${season}_bias_model1_obs.nc"
 annual_bias_model2_obs="${output_dir}/evspsbl_annual_bias_model2_obs.nc"
-season_bias_model2_obs="${output_dir}/evspsbl_season_bias_model2_obs.nc"
+season_bias_model2_obs="${output_dir}/evspsbl_${season}_bias_model2_obs.nc"
 annual_bias_model1_model2="${output_dir}/evspsbl_annual_bias_model1_model2.nc"
-season_bias_model1_model2="${output_dir}/evspsbl_season_bias_model1_model2.nc"
+season_bias_model1_model2="${output_dir}/evspsbl_${season}_bias_model1_model2.nc"
 annual_plot="${output_dir}/evspsbl_annual_comparison.png"
 season_plot="${output_dir}/evspsbl_season_comparison.png"
 
@@ -96,88 +99,88 @@ done
 echo "Converting Observation data to mm/day by multiplying by 1000..."
 
 # Convert Observation annual mean
-if [ ! -f "$obs_annual_mm" ]; then
-    cdo mulc,-1000 "$obs_annual_regridded" "$obs_annual_mm"
+if [ ! "$obs_annual_mm" -nt "$obs_annual_regridded" ]; then
+    cdo "${precision_cdo_opts[@]}" mulc,-1000 "$obs_annual_regridded" "$obs_annual_mm"
     check_error "Converting Observation annual mean to mm/day"
 else
-    echo "Debug: $obs_annual_mm already exists. Skipping conversion."
+    echo "Debug: $obs_annual_mm is up to date. Skipping conversion."
 fi
 
 # Convert Observation seasonal mean
-if [ ! -f "$obs_season_mm" ]; then
-    cdo mulc,-1000 "$obs_season_regridded" "$obs_season_mm"
+if [ ! "$obs_season_mm" -nt "$obs_season_regridded" ]; then
+    cdo "${precision_cdo_opts[@]}" mulc,-1000 "$obs_season_regridded" "$obs_season_mm"
     check_error "Converting Observation seasonal mean to mm/day"
 else
-    echo "Debug: $obs_season_mm already exists. Skipping conversion."
+    echo "Debug: $obs_season_mm is up to date. Skipping conversion."
 fi
 
 # === MODEL UNIT CONVERSION ===
 echo "Converting Model 1 and Model 2 flux data to mm/day..."
 
 # Convert Model 1 annual mean
-if [ ! -f "$model1_annual_mm" ]; then
-    cdo mulc,86400 "$model1_annual_mean" "$model1_annual_mm"
+if [ ! "$model1_annual_mm" -nt "$model1_annual_mean" ]; then
+    cdo "${precision_cdo_opts[@]}" mulc,86400 "$model1_annual_mean" "$model1_annual_mm"
     check_error "Converting Model 1 annual mean to mm/day"
 else
-    echo "Debug: $model1_annual_mm already exists. Skipping conversion."
+    echo "Debug: $model1_annual_mm is up to date. Skipping conversion."
 fi
 
 # Convert Model 1 seasonal mean
-if [ ! -f "$model1_season_mm" ]; then
-    cdo mulc,86400 "$model1_season_mean" "$model1_season_mm"
+if [ ! "$model1_season_mm" -nt "$model1_season_mean" ]; then
+    cdo "${precision_cdo_opts[@]}" mulc,86400 "$model1_season_mean" "$model1_season_mm"
     check_error "Converting Model 1 seasonal mean to mm/day"
 else
-    echo "Debug: $model1_season_mm already exists. Skipping conversion."
+    echo "Debug: $model1_season_mm is up to date. Skipping conversion."
 fi
 
 # Convert Model 2 annual mean (if provided)
-if [ -n "$model2_annual_regridded" ] && [ ! -f "$model2_annual_mm" ]; then
-    cdo mulc,86400 "$model2_annual_regridded" "$model2_annual_mm"
+if [ -n "$model2_annual_regridded" ] && [ ! "$model2_annual_mm" -nt "$model2_annual_regridded" ]; then
+    cdo "${precision_cdo_opts[@]}" mulc,86400 "$model2_annual_regridded" "$model2_annual_mm"
     check_error "Converting Model 2 annual mean to mm/day"
 else
-    echo "Debug: $model2_annual_mm already exists. Skipping conversion."
+    echo "Debug: $model2_annual_mm is up to date. Skipping conversion."
 fi
 
 # Convert Model 2 seasonal mean (if provided)
-if [ -n "$model2_season_regridded" ] && [ ! -f "$model2_season_mm" ]; then
-    cdo mulc,86400 "$model2_season_regridded" "$model2_season_mm"
+if [ -n "$model2_season_regridded" ] && [ ! "$model2_season_mm" -nt "$model2_season_regridded" ]; then
+    cdo "${precision_cdo_opts[@]}" mulc,86400 "$model2_season_regridded" "$model2_season_mm"
     check_error "Converting Model 2 seasonal mean to mm/day"
 else
-    echo "Debug: $model2_season_mm already exists. Skipping conversion."
+    echo "Debug: $model2_season_mm is up to date. Skipping conversion."
 fi
 
 # === BIAS CALCULATION ===
 echo "Calculating biases for evspsbl..."
 
 # Obs - Model 1 biases
-if [ ! -f "$annual_bias_model1_obs" ]; then
-    cdo sub "$model1_annual_mm" "$obs_annual_mm" "$annual_bias_model1_obs"
+if [ ! "$annual_bias_model1_obs" -nt "$model1_annual_mm" ] || [ ! "$annual_bias_model1_obs" -nt "$obs_annual_mm" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_annual_mm" "$obs_annual_mm" "$annual_bias_model1_obs"
     check_error "Calculating annual bias for evspsbl (Obs - Model 1)"
 else
-    echo "Debug: $annual_bias_model1_obs already exists. Skipping..."
+    echo "Debug: $annual_bias_model1_obs is up to date. Skipping..."
 fi
 
-if [ ! -f "$season_bias_model1_obs" ]; then
-    cdo sub "$model1_season_mm" "$obs_season_mm" "$season_bias_model1_obs"
+if [ ! "$season_bias_model1_obs" -nt "$model1_season_mm" ] || [ ! "$season_bias_model1_obs" -nt "$obs_season_mm" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_season_mm" "$obs_season_mm" "$season_bias_model1_obs"
     check_error "Calculating seasonal bias for evspsbl (Obs - Model 1)"
 else
-    echo "Debug: $season_bias_model1_obs already exists. Skipping..."
+    echo "Debug: $season_bias_model1_obs is up to date. Skipping..."
 fi
 
 # Obs - Model 2 biases
 if [ -n "$model2_annual_regridded" ]; then
-    if [ ! -f "$annual_bias_model2_obs" ]; then
-        cdo sub "$model2_annual_mm" "$obs_annual_mm" "$annual_bias_model2_obs"
+    if [ ! "$annual_bias_model2_obs" -nt "$model2_annual_mm" ] || [ ! "$annual_bias_model2_obs" -nt "$obs_annual_mm" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model2_annual_mm" "$obs_annual_mm" "$annual_bias_model2_obs"
         check_error "Calculating annual bias for evspsbl (Obs - Model 2)"
     else
-        echo "Debug: $annual_bias_model2_obs already exists. Skipping..."
+        echo "Debug: $annual_bias_model2_obs is up to date. Skipping..."
     fi
 
-    if [ ! -f "$season_bias_model2_obs" ]; then
-        cdo sub "$model2_season_mm" "$obs_season_mm" "$season_bias_model2_obs"
+    if [ ! "$season_bias_model2_obs" -nt "$model2_season_mm" ] || [ ! "$season_bias_model2_obs" -nt "$obs_season_mm" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model2_season_mm" "$obs_season_mm" "$season_bias_model2_obs"
         check_error "Calculating seasonal bias for evspsbl (Obs - Model 2)"
     else
-        echo "Debug: $season_bias_model2_obs already exists. Skipping..."
+        echo "Debug: $season_bias_model2_obs is up to date. Skipping..."
     fi
 fi
 
@@ -185,23 +188,42 @@ fi
 
 # Model 1 - Model 2 biases
 if [ -n "$model2_annual_mm" ]; then
-    if [ ! -f "$annual_bias_model1_model2" ]; then
-        cdo sub "$model1_annual_mm" "$model2_annual_mm" "$annual_bias_model1_model2"
+    if [ ! "$annual_bias_model1_model2" -nt "$model1_annual_mm" ] || [ ! "$annual_bias_model1_model2" -nt "$model2_annual_mm" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model1_annual_mm" "$model2_annual_mm" "$annual_bias_model1_model2"
         check_error "Calculating annual bias for evspsbl (Model 1 - Model 2)"
     else
-        echo "Debug: $annual_bias_model1_model2 already exists. Skipping..."
+        echo "Debug: $annual_bias_model1_model2 is up to date. Skipping..."
     fi
 
-    if [ ! -f "$season_bias_model1_model2" ]; then
-        cdo sub "$model1_season_mm" "$model2_season_mm" "$season_bias_model1_model2"
+    if [ ! "$season_bias_model1_model2" -nt "$model1_season_mm" ] || [ ! "$season_bias_model1_model2" -nt "$model2_season_mm" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model1_season_mm" "$model2_season_mm" "$season_bias_model1_model2"
         check_error "Calculating seasonal bias for evspsbl (Model 1 - Model 2)"
     else
-        echo "Debug: $season_bias_model1_model2 already exists. Skipping..."
+        echo "Debug: $season_bias_model1_model2 is up to date. Skipping..."
     fi
 fi
 
 
 
+# === SIGNIFICANCE ===
+# Welch t-test of each bias from the interannual moments of the means (see
+# significance.py), in the units of the bias (mm/day); the plots stipple the
+# points where the bias is significant
+model_scale=86400
+obs_scale=-1000
+function significance_mask {
+    python3 significance.py mask "$1" "$2" "${3%.nc}_signif.nc" --scale-a="$4" --scale-b="$5"
+    check_error "Testing the significance of $3"
+}
+significance_mask "$model1_annual_mean" "$obs_annual_regridded" "$annual_bias_model1_obs" "$model_scale" "$obs_scale"
+significance_mask "$model1_season_mean" "$obs_season_regridded" "$season_bias_model1_obs" "$model_scale" "$obs_scale"
+if [ -n "$model2_annual_regridded" ]; then
+    significance_mask "$model2_annual_regridded" "$obs_annual_regridded" "$annual_bias_model2_obs" "$model_scale" "$obs_scale"
+    significance_mask "$model2_season_regridded" "$obs_season_regridded" "$season_bias_model2_obs" "$model_scale" "$obs_scale"
+    significance_mask "$model1_annual_mean" "$model2_annual_regridded" "$annual_bias_model1_model2" "$model_scale" "$model_scale"
+    significance_mask "$model1_season_mean" "$model2_season_regridded" "$season_bias_model1_model2" "$model_scale" "$model_scale"
+fi
+
 # Validate Latitude Range
 if [[ ! "$lat_range" =~ ^-?[0-9]+(\.[0-9]+)?,-?[0-9]+(\.[0-9]+)?$ ]]; then
     echo "Error: Latitude range '$lat_range' is invalid. Expected format: 'min_lat,max_lat'."
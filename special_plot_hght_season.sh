@@ -17,6 +17,19 @@ function check_error {
     fi
 }
 
+# Plot tasks (see plot_orchestrator.py): run from plotting_functions_new.sh the
+# NCL scripts below are registered as concurrent tasks; otherwise each runs right away
+if ! declare -F plot_task > /dev/null; then
+    function plot_task {
+        while [ "$1" != "--" ]; do shift; done
+        shift
+        "$@"
+    }
+fi
+
+# float32 precision policy for CDO outputs (see precision.py)
+read -r -a precision_cdo_opts <<< "$(python3 precision.py cdo-opts)"
+
 # Validate input arguments
 if [ "$#" -lt 5 ]; then
     echo "Usage: $0 <obs_season_regridded_hght> <model1_season_hght> <projection> <lat_range> <lon_range> [<model2_season_hght>]"
@@ -36,43 +49,36 @@ model2_season_hght="${7:-}"  # Optional
 output_dir="./plots_hght"
 mkdir -p "$output_dir"
 
-# Desired pressure levels in descending order
-pressure_levels=(1000 925 850 700 600 500 400 300 250 200 150 100 70 50 30 20 10 5 1)
+# Pressure levels used by the plots (850 and 200 hPa), in descending order
+pressure_levels=(850 200)
 
 # Function to reorder pressure levels
 reorder_pressure_levels() {
     input_file="$1"       # Input file
     output_file="$2"      # Output file
     var="hght"            # Variable name
-    temp_files=()
 
-    if [ -f "$output_file" ]; then
-        echo "File $output_file already exists. Skipping reordering for $var."
+    if [ "$output_file" -nt "$input_file" ]; then
+        echo "File $output_file is up to date. Skipping reordering for $var."
         return
     fi
 
     echo "Reordering pressure levels for file: $input_file (Variable: $var)"
 
+    # Each level selected as a chained input of one merge, in the order wanted
+    level_args=()
     for p in "${pressure_levels[@]}"; do
-        temp_file="${output_dir}/temp_${var}_level_${p}.nc"
-        cdo sellevel,$p "$input_file" "$temp_file"
-        check_error "Selecting pressure level $p for $var"
-        temp_files+=("$temp_file")
+        level_args+=(-sellevel,$p "$input_file")
     done
-
-    # Merge all selected levels into the output file
-    cdo merge "${temp_files[@]}" "$output_file"
+    cdo "${precision_cdo_opts[@]}" merge "${level_args[@]}" "$output_file"
     check_error "Merging reordered pressure levels for $var"
-
-    # Clean up temporary files
-    rm -f "${temp_files[@]}"
     echo "Reordered file for $var saved as: $output_file"
 }
 
 # Define file paths for reordered outputs
-obs_hght_output="${output_dir}/obs_hght_season_regridded_ordered.nc"
-model1_hght_output="${output_dir}/model1_hght_season_ordered.nc"
-model2_hght_output="${output_dir}/model2_hght_season_ordered.nc"
+obs_hght_output="${output_dir}/obs_hght_${season}_regridded_ordered.nc"
+model1_hght_output="${output_dir}/model1_hght_${season}_ordered.nc"
+model2_hght_output="${output_dir}/model2_hght_${season}_ordered.nc"
 
 # Reorder pressure levels for observation hght
 reorder_pressure_levels "$obs_season_hght" "$obs_hght_output"
@@ -86,33 +92,33 @@ if [ -n "$model2_season_hght" ]; then
 fi
 
 # Bias Calculation (850 hPa and 200 hPa)
-bias_obs_model1_hght_850="${output_dir}/bias_obs_model1_hght_season_850.nc"
-bias_obs_model1_hght_200="${output_dir}/bias_obs_model1_hght_season_200.nc"
+bias_obs_model1_hght_850="${output_dir}/bias_obs_model1_hght_${season}_850.nc"
+bias_obs_model1_hght_200="${output_dir}/bias_obs_model1_hght_${season}_200.nc"
 
-bias_obs_model2_hght_850="${output_dir}/bias_obs_model2_hght_season_850.nc"
-bias_obs_model2_hght_200="${output_dir}/bias_obs_model2_hght_season_200.nc"
+bias_obs_model2_hght_850="${output_dir}/bias_obs_model2_hght_${season}_850.nc"
+bias_obs_model2_hght_200="${output_dir}/bias_obs_model2_hght_${season}_200.nc"
 
-bias_model1_model2_hght_850="${output_dir}/bias_model1_model2_hght_season_850.nc"
-bias_model1_model2_hght_200="${output_dir}/bias_model1_model2_hght_season_200.nc"
+bias_model1_model2_hght_850="${output_dir}/bias_model1_model2_hght_${season}_850.nc"
+bias_model1_model2_hght_200="${output_dir}/bias_model1_model2_hght_${season}_200.nc"
 
-obs_hght_850="${output_dir}/obs_hght_season_850.nc"
-obs_hght_200="${output_dir}/obs_hght_season_200.nc"
-model1_hght_850="${output_dir}/model1_hght_season_850.nc"
-model1_hght_200="${output_dir}/model1_hght_season_200.nc"
-model2_hght_850="${output_dir}/model2_hght_season_850.nc"
-model2_hght_200="${output_dir}/model2_hght_season_200.nc"
+obs_hght_850="${output_dir}/obs_hght_${season}_850.nc"
+obs_hght_200="${output_dir}/obs_hght_${season}_200.nc"
+model1_hght_850="${output_dir}/model1_hght_${season}_850.nc"
+model1_hght_200="${output_dir}/model1_hght_${season}_200.nc"
+model2_hght_850="${output_dir}/model2_hght_${season}_850.nc"
+model2_hght_200="${output_dir}/model2_hght_${season}_200.nc"
 
 echo "Calculating bias for 850 hPa and 200 hPa..."
 
 echo "Scaling observation files from geopotential to geopotential height..."
 
-scaled_obs_hght_output="${output_dir}/obs_hght_season_scaled.nc"
+scaled_obs_hght_output="${output_dir}/obs_hght_${season}_scaled.nc"
 
-if [ ! -f "$scaled_obs_hght_output" ]; then
-    cdo divc,9.80665 "$obs_hght_output" "$scaled_obs_hght_output"
+if [ ! "$scaled_obs_hght_output" -nt "$obs_hght_output" ]; then
+    cdo "${precision_cdo_opts[@]}" divc,9.80665 "$obs_hght_output" "$scaled_obs_hght_output"
     check_error "Scaling observation file to geopotential height"
 else
-    echo "Scaled observation file $scaled_obs_hght_output already exists. Skipping scaling..."
+    echo "Scaled observation file $scaled_obs_hght_output is up to date. Skipping scaling..."
 fi
 
 # Update `obs_hght_output` to the scaled file for further calculations
@@ -123,25 +129,25 @@ echo "Scaling completed. Proceeding with bias calculations..."
 echo "Calculating bias for 850 hPa and 200 hPa..."
 
 # Extract 850 hPa and 200 hPa levels for hght
-cdo sellevel,850 "$obs_hght_output_s" "$obs_hght_850"
-cdo sellevel,200 "$obs_hght_output_s" "$obs_hght_200"
-cdo sellevel,850 "$model1_hght_output" "$model1_hght_850"
-cdo sellevel,200 "$model1_hght_output" "$model1_hght_200"
+cdo "${precision_cdo_opts[@]}" sellevel,850 "$obs_hght_output_s" "$obs_hght_850"
+cdo "${precision_cdo_opts[@]}" sellevel,200 "$obs_hght_output_s" "$obs_hght_200"
+cdo "${precision_cdo_opts[@]}" sellevel,850 "$model1_hght_output" "$model1_hght_850"
+cdo "${precision_cdo_opts[@]}" sellevel,200 "$model1_hght_output" "$model1_hght_200"
 
 if [ -n "$model2_hght_output" ]; then
-    cdo sellevel,850 "$model2_hght_output" "$model2_hght_850"
-    cdo sellevel,200 "$model2_hght_output" "$model2_hght_200"
+    cdo "${precision_cdo_opts[@]}" sellevel,850 "$model2_hght_output" "$model2_hght_850"
+    cdo "${precision_cdo_opts[@]}" sellevel,200 "$model2_hght_output" "$model2_hght_200"
 fi
 
 # Calculate biases for hght (model - obs)
-cdo sub "$model1_hght_850" "$obs_hght_850" "$bias_obs_model1_hght_850"
-cdo sub "$model1_hght_200" "$obs_hght_200" "$bias_obs_model1_hght_200"
+cdo "${precision_cdo_opts[@]}" sub "$model1_hght_850" "$obs_hght_850" "$bias_obs_model1_hght_850"
+cdo "${precision_cdo_opts[@]}" sub "$model1_hght_200" "$obs_hght_200" "$bias_obs_model1_hght_200"
 
 if [ -n "$model2_hght_output" ]; then
-    cdo sub "$model2_hght_850" "$obs_hght_850" "$bias_obs_model2_hght_850"
-    cdo sub "$model2_hght_200" "$obs_hght_200" "$bias_obs_model2_hght_200"
-    cdo sub "$model2_hght_850" "$model1_hght_850" "$bias_model1_model2_hght_850"
-    cdo sub "$model2_hght_200" "$model1_hght_200" "$bias_model1_model2_hght_200"
+    cdo "${precision_cdo_opts[@]}" sub "$model2_hght_850" "$obs_hght_850" "$bias_obs_model2_hght_850"
+    cdo "${precision_cdo_opts[@]}" sub "$model2_hght_200" "$obs_hght_200" "$bias_obs_model2_hght_200"
+    cdo "${precision_cdo_opts[@]}" sub "$model2_hght_850" "$model1_hght_850" "$bias_model1_model2_hght_850"
+    cdo "${precision_cdo_opts[@]}" sub "$model2_hght_200" "$model1_hght_200" "$bias_model1_model2_hght_200"
 fi
 
 echo "Bias calculations completed for 850 hPa and 200 hPa."
@@ -166,8 +172,8 @@ export season="$season"
 echo "Parsed and exported Latitude/Longitude ranges."
 
 # Call NCL scripts for plotting
-ncl hght_850_season.ncl
-ncl hght_200_season.ncl
+plot_task hght_850_season.ncl -- ncl hght_850_season.ncl
+plot_task hght_200_season.ncl -- ncl hght_200_season.ncl
 
 check_error "Height plotting script"
 
@@ -17,6 +17,22 @@ function check_error {
     fi
 }
 
+# Plot tasks (see plot_orchestrator.py): run from plotting_functions_new.sh the
+# NCL scripts below are registered as concurrent tasks; otherwise each runs right away
+if ! declare -F plot_task > /dev/null; then
+    function plot_task {
+        while [ "$1" != "--" ]; do shift; done
+        shift
+        "$@"
+    }
+fi
+
+# all_year_input (the merged all-year file, or its virtual index) is exported by
+# plotting_functions_new.sh
+
+# float32 precision policy for CDO outputs (see precision.py)
+read -r -a precision_cdo_opts <<< "$(python3 precision.py cdo-opts)"
+
 # Validate input arguments
 if [ "$#" -lt 12 ]; then
     echo "Usage: $0 <obs_rsdt> <obs_rlut> <obs_rsut> <model1_rsdt> <model1_rlut> <model1_rsut> <projection> <lat_range> <lon_range> <season> [<model2_rsdt> <model2_rlut> <model2_rsut>]"
@@ -57,61 +73,63 @@ bias3_rsut="${output_dir}/bias_model1_model2_annual_rsut.nc"
 
 # Calculate biases for rsdt
 echo "Calculating biases for rsdt..."
-if [ ! -f "$bias1_rsdt" ]; then
-    cdo sub "$model1_rsdt" "$obs_rsdt" "$bias1_rsdt"
+if [ ! "$bias1_rsdt" -nt "$model1_rsdt" ] || [ ! "$bias1_rsdt" -nt "$obs_rsdt" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_rsdt" "$obs_rsdt" "$bias1_rsdt"
     check_error "Calculating bias for Model 1 - Obs (annual rsdt)"
 fi
 
-if [ -n "$model2_rsdt" ] && [ ! -f "$bias2_rsdt" ]; then
-    cdo sub "$model2_rsdt" "$obs_rsdt" "$bias2_rsdt"
+if [ -n "$model2_rsdt" ] && { [ ! "$bias2_rsdt" -nt "$model2_rsdt" ] || [ ! "$bias2_rsdt" -nt "$obs_rsdt" ]; }; then
+    cdo "${precision_cdo_opts[@]}" sub "$model2_rsdt" "$obs_rsdt" "$bias2_rsdt"
     check_error "Calculating bias for Model 2 - Obs (annual rsdt)"
 fi
 
-if [ -n "$model2_rsdt" ] && [ ! -f "$bias3_rsdt" ]; then
-    cdo sub "$model1_rsdt" "$model2_rsdt" "$bias3_rsdt"
+if [ -n "$model2_rsdt" ] && { [ ! "$bias3_rsdt" -nt "$model1_rsdt" ] || [ ! "$bias3_rsdt" -nt "$model2_rsdt" ]; }; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_rsdt" "$model2_rsdt" "$bias3_rsdt"
     check_error "Calculating bias for Model 1 - Model 2 (annual rsdt)"
 fi
 
 # Calculate biases for rlut
 echo "Calculating biases for rlut..."
-if [ ! -f "$bias1_rlut" ]; then
-    cdo sub "$model1_rlut" "$obs_rlut" "$bias1_rlut"
+if [ ! "$bias1_rlut" -nt "$model1_rlut" ] || [ ! "$bias1_rlut" -nt "$obs_rlut" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_rlut" "$obs_rlut" "$bias1_rlut"
     check_error "Calculating bias for Model 1 - Obs (annual rlut)"
 fi
 
-if [ -n "$model2_rlut" ] && [ ! -f "$bias2_rlut" ]; then
-    cdo sub "$model2_rlut" "$obs_rlut" "$bias2_rlut"
+if [ -n "$model2_rlut" ] && { [ ! "$bias2_rlut" -nt "$model2_rlut" ] || [ ! "$bias2_rlut" -nt "$obs_rlut" ]; }; then
+    cdo "${precision_cdo_opts[@]}" sub "$model2_rlut" "$obs_rlut" "$bias2_rlut"
     check_error "Calculating bias for Model 2 - Obs (annual rlut)"
 fi
 
-if [ -n "$model2_rlut" ] && [ ! -f "$bias3_rlut" ]; then
-    cdo sub "$model1_rlut" "$model2_rlut" "$bias3_rlut"
+if [ -n "$model2_rlut" ] && { [ ! "$bias3_rlut" -nt "$model1_rlut" ] || [ ! "$bias3_rlut" -nt "$model2_rlut" ]; }; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_rlut" "$model2_rlut" "$bias3_rlut"
     check_error "Calculating bias for Model 1 - Model 2 (annual rlut)"
 fi
 
 # Calculate biases for rsut
 echo "Calculating biases for rsut..."
-if [ ! -f "$bias1_rsut" ]; then
-    cdo sub "$model1_rsut" "$obs_rsut" "$bias1_rsut"
+if [ ! "$bias1_rsut" -nt "$model1_rsut" ] || [ ! "$bias1_rsut" -nt "$obs_rsut" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_rsut" "$obs_rsut" "$bias1_rsut"
     check_error "Calculating bias for Model 1 - Obs (annual rsut)"
 fi
 
-if [ -n "$model2_rsut" ] && [ ! -f "$bias2_rsut" ]; then
-    cdo sub "$model2_rsut" "$obs_rsut" "$bias2_rsut"
+if [ -n "$model2_rsut" ] && { [ ! "$bias2_rsut" -nt "$model2_rsut" ] || [ ! "$bias2_rsut" -nt "$obs_rsut" ]; }; then
+    cdo "${precision_cdo_opts[@]}" sub "$model2_rsut" "$obs_rsut" "$bias2_rsut"
     check_error "Calculating bias for Model 2 - Obs (annual rsut)"
 fi
 
-if [ -n "$model2_rsut" ] && [ ! -f "$bias3_rsut" ]; then
-    cdo sub "$model1_rsut" "$model2_rsut" "$bias3_rsut"
+if [ -n "$model2_rsut" ] && { [ ! "$bias3_rsut" -nt "$model1_rsut" ] || [ ! "$bias3_rsut" -nt "$model2_rsut" ]; }; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_rsut" "$model2_rsut" "$bias3_rsut"
     check_error "Calculating bias for Model 1 - Model 2 (annual rsut)"
 fi
 
 # Debugging Information
 echo "Bias calculations completed. Output files are saved in $output_dir."
 
-ncl rlut_mean_bias_ann.ncl
-ncl rsut_mean_bias_ann.ncl
-ncl toa_rad_mean_bias_ann.ncl
+plot_task rlut_mean_bias_ann.ncl -- ncl rlut_mean_bias_ann.ncl
+plot_task rsut_mean_bias_ann.ncl -- ncl rsut_mean_bias_ann.ncl
+# Reads the derived net radiation (rnet) of the models in place of rsdt, rsut and rlut when it exists
+plot_task toa_rad_mean_bias_ann.ncl --input="./output_data/model1_annual_mean_rnet_no_plev.nc" \
+    --input="./output_data/model2_annual_mean_rnet_no_plev_regridded.nc" -- ncl toa_rad_mean_bias_ann.ncl
 
 
 
@@ -147,15 +165,20 @@ function regrid_file {
     local input_file=$1
     local output_file=$2
 
-    if [ ! -f "$output_file" ]; then
+    # Made again when the series (or its virtual index) is newer
+    if [ ! "$output_file" -nt "$input_file" ] || [ ! "$output_file" -nt "${input_file%.nc}.vds.json" ]; then
         echo "Regridding $input_file to $output_file..."
-        cdo remapbil,$targetgrid "$input_file" "$output_file"
+        if ! all_year_input "$input_file"; then
+            echo "Error: $input_file (or its virtual index) not found."
+            exit 1
+        fi
+        cdo "${precision_cdo_opts[@]}" remapbil,$targetgrid "${all_year_args[@]}" "$output_file"
         if [ $? -ne 0 ]; then
             echo "Error: Regridding failed for $input_file."
             exit 1
         fi
     else
-        echo "Regridded file $output_file already exists. Skipping..."
+        echo "Regridded file $output_file is up to date. Skipping..."
     fi
 }
 
@@ -213,15 +236,20 @@ function calculate_fldmean {
     local input_file=$1
     local output_file=$2
 
-    if [ ! -f "$output_file" ]; then
+    # Made again when the series (or its virtual index) is newer
+    if [ ! "$output_file" -nt "$input_file" ] || [ ! "$output_file" -nt "${input_file%.nc}.vds.json" ]; then
         echo "Calculating field mean for $input_file..."
-        cdo fldmean "$input_file" "$output_file"
+        if ! all_year_input "$input_file"; then
+            echo "Error: $input_file (or its virtual index) not found."
+            exit 1
+        fi
+        cdo "${precision_cdo_opts[@]}" fldmean "${all_year_args[@]}" "$output_file"
         if [ $? -ne 0 ]; then
             echo "Error: Field mean calculation failed for $input_file."
             exit 1
         fi
     else
-        echo "Field mean file $output_file already exists. Skipping..."
+        echo "Field mean file $output_file is up to date. Skipping..."
     fi
 }
 
@@ -244,7 +272,7 @@ calculate_fldmean "$model2_rlut_regrid" "$model2_rlut_fldmean"
 
 echo "Field mean calculations completed for all radiation variables."
 
-ncl toa_rad_timeseries.ncl
+plot_task toa_rad_timeseries.ncl -- ncl toa_rad_timeseries.ncl
 
 check_error "Plotting radiation variables (annual)"
 echo "Radiation plotting for annual data completed successfully."
@@ -16,6 +16,19 @@ function check_error {
     fi
 }
 
+# Plot tasks (see plot_orchestrator.py): run from plotting_functions_new.sh the
+# NCL scripts below are registered as concurrent tasks; otherwise each runs right away
+if ! declare -F plot_task > /dev/null; then
+    function plot_task {
+        while [ "$1" != "--" ]; do shift; done
+        shift
+        "$@"
+    }
+fi
+
+# float32 precision policy for CDO outputs (see precision.py)
+read -r -a precision_cdo_opts <<< "$(python3 precision.py cdo-opts)"
+
 # Validate input arguments
 if [ "$#" -lt 12 ]; then
     echo "Usage: $0 <obs_rsdt> <obs_rlut> <obs_rsut> <model1_rsdt> <model1_rlut> <model1_rsut> <projection> <lat_range> <lon_range> <season> [<model2_rsdt> <model2_rlut> <model2_rsut>]"
@@ -42,66 +55,66 @@ output_dir="./bias_radiation_ann"
 mkdir -p "$output_dir"
 
 # Output files
-bias1_rsdt="${output_dir}/bias_model1_obs_season_rsdt.nc"
-bias2_rsdt="${output_dir}/bias_model2_obs_season_rsdt.nc"
-bias3_rsdt="${output_dir}/bias_model1_model2_season_rsdt.nc"
+bias1_rsdt="${output_dir}/bias_model1_obs_${season}_rsdt.nc"
+bias2_rsdt="${output_dir}/bias_model2_obs_${season}_rsdt.nc"
+bias3_rsdt="${output_dir}/bias_model1_model2_${season}_rsdt.nc"
 
-bias1_rlut="${output_dir}/bias_model1_obs_season_rlut.nc"
-bias2_rlut="${output_dir}/bias_model2_obs_season_rlut.nc"
-bias3_rlut="${output_dir}/bias_model1_model2_season_rlut.nc"
+bias1_rlut="${output_dir}/bias_model1_obs_${season}_rlut.nc"
+bias2_rlut="${output_dir}/bias_model2_obs_${season}_rlut.nc"
+bias3_rlut="${output_dir}/bias_model1_model2_${season}_rlut.nc"
 
-bias1_rsut="${output_dir}/bias_model1_obs_season_rsut.nc"
-bias2_rsut="${output_dir}/bias_model2_obs_season_rsut.nc"
-bias3_rsut="${output_dir}/bias_model1_model2_season_rsut.nc"
+bias1_rsut="${output_dir}/bias_model1_obs_${season}_rsut.nc"
+bias2_rsut="${output_dir}/bias_model2_obs_${season}_rsut.nc"
+bias3_rsut="${output_dir}/bias_model1_model2_${season}_rsut.nc"
 
 # Calculate biases for rsdt
 echo "Calculating biases for rsdt..."
-if [ ! -f "$bias1_rsdt" ]; then
-    cdo sub "$model1_rsdt" "$obs_rsdt" "$bias1_rsdt"
+if [ ! "$bias1_rsdt" -nt "$model1_rsdt" ] || [ ! "$bias1_rsdt" -nt "$obs_rsdt" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_rsdt" "$obs_rsdt" "$bias1_rsdt"
     check_error "Calculating bias for Model 1 - Obs (season rsdt)"
 fi
 
-if [ -n "$model2_rsdt" ] && [ ! -f "$bias2_rsdt" ]; then
-    cdo sub "$model2_rsdt" "$obs_rsdt" "$bias2_rsdt"
+if [ -n "$model2_rsdt" ] && { [ ! "$bias2_rsdt" -nt "$model2_rsdt" ] || [ ! "$bias2_rsdt" -nt "$obs_rsdt" ]; }; then
+    cdo "${precision_cdo_opts[@]}" sub "$model2_rsdt" "$obs_rsdt" "$bias2_rsdt"
     check_error "Calculating bias for Model 2 - Obs (season rsdt)"
 fi
 
-if [ -n "$model2_rsdt" ] && [ ! -f "$bias3_rsdt" ]; then
-    cdo sub "$model1_rsdt" "$model2_rsdt" "$bias3_rsdt"
+if [ -n "$model2_rsdt" ] && { [ ! "$bias3_rsdt" -nt "$model1_rsdt" ] || [ ! "$bias3_rsdt" -nt "$model2_rsdt" ]; }; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_rsdt" "$model2_rsdt" "$bias3_rsdt"
     check_error "Calculating bias for Model 1 - Model 2 (season rsdt)"
 fi
 
 # Calculate biases for rlut
 echo "Calculating biases for rlut..."
-if [ ! -f "$bias1_rlut" ]; then
-    cdo sub "$model1_rlut" "$obs_rlut" "$bias1_rlut"
+if [ ! "$bias1_rlut" -nt "$model1_rlut" ] || [ ! "$bias1_rlut" -nt "$obs_rlut" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_rlut" "$obs_rlut" "$bias1_rlut"
     check_error "Calculating bias for Model 1 - Obs (season rlut)"
 fi
 
-if [ -n "$model2_rlut" ] && [ ! -f "$bias2_rlut" ]; then
-    cdo sub "$model2_rlut" "$obs_rlut" "$bias2_rlut"
+if [ -n "$model2_rlut" ] && { [ ! "$bias2_rlut" -nt "$model2_rlut" ] || [ ! "$bias2_rlut" -nt "$obs_rlut" ]; }; then
+    cdo "${precision_cdo_opts[@]}" sub "$model2_rlut" "$obs_rlut" "$bias2_rlut"
     check_error "Calculating bias for Model 2 - Obs (season rlut)"
 fi
 
-if [ -n "$model2_rlut" ] && [ ! -f "$bias3_rlut" ]; then
-    cdo sub "$model1_rlut" "$model2_rlut" "$bias3_rlut"
+if [ -n "$model2_rlut" ] && { [ ! "$bias3_rlut" -nt "$model1_rlut" ] || [ ! "$bias3_rlut" -nt "$model2_rlut" ]; }; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_rlut" "$model2_rlut" "$bias3_rlut"
     check_error "Calculating bias for Model 1 - Model 2 (season rlut)"
 fi
 
 # Calculate biases for rsut
 echo "Calculating biases for rsut..."
-if [ ! -f "$bias1_rsut" ]; then
-    cdo sub "$model1_rsut" "$obs_rsut" "$bias1_rsut"
+if [ ! "$bias1_rsut" -nt "$model1_rsut" ] || [ ! "$bias1_rsut" -nt "$obs_rsut" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_rsut" "$obs_rsut" "$bias1_rsut"
     check_error "Calculating bias for Model 1 - Obs (season rsut)"
 fi
 
-if [ -n "$model2_rsut" ] && [ ! -f "$bias2_rsut" ]; then
-    cdo sub "$model2_rsut" "$obs_rsut" "$bias2_rsut"
+if [ -n "$model2_rsut" ] && { [ ! "$bias2_rsut" -nt "$model2_rsut" ] || [ ! "$bias2_rsut" -nt "$obs_rsut" ]; }; then
+    cdo "${precision_cdo_opts[@]}" sub "$model2_rsut" "$obs_rsut" "$bias2_rsut"
     check_error "Calculating bias for Model 2 - Obs (season rsut)"
 fi
 
-if [ -n "$model2_rsut" ] && [ ! -f "$bias3_rsut" ]; then
-    cdo sub "$model1_rsut" "$model2_rsut" "$bias3_rsut"
+if [ -n "$model2_rsut" ] && { [ ! "$bias3_rsut" -nt "$model1_rsut" ] || [ ! "$bias3_rsut" -nt "$model2_rsut" ]; }; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_rsut" "$model2_rsut" "$bias3_rsut"
     check_error "Calculating bias for Model 1 - Model 2 (season rsut)"
 fi
 
@@ -110,9 +123,11 @@ echo "Bias calculations completed. Output files are saved in $output_dir."
 
 export season="$season"
 echo "SEASON: $season"
-ncl rlut_mean_bias_season.ncl
-ncl rsut_mean_bias_season.ncl
-ncl toa_rad_mean_bias_season.ncl
+plot_task rlut_mean_bias_season.ncl -- ncl rlut_mean_bias_season.ncl
+plot_task rsut_mean_bias_season.ncl -- ncl rsut_mean_bias_season.ncl
+# Reads the derived net radiation (rnet) of the models in place of rsdt, rsut and rlut when it exists
+plot_task toa_rad_mean_bias_season.ncl --input="./output_data/model1_${season}_mean_rnet_no_plev.nc" \
+    --input="./output_data/model2_${season}_mean_rnet_no_plev_regridded.nc" -- ncl toa_rad_mean_bias_season.ncl
 check_error "Plotting radiation variables (season)"
 echo "Radiation plotting for season data completed successfully."
 
@@ -17,6 +17,9 @@ function check_error {
     fi
 }
 
+# float32 precision policy for CDO outputs (see precision.py)
+read -r -a precision_cdo_opts <<< "$(python3 precision.py cdo-opts)"
+
 # Validate input arguments
 if [ "$#" -lt 8 ]; then
     echo "Usage: $0 <obs_annual_regridded> <obs_season_regridded> <model1_annual_mean> <model1_season_mean> <projection> <lat_range> <lon_range> <season> [<model2_annual_regridded> <model2_season_regridded>]"
@@ -41,11 +44,11 @@ mkdir -p "$output_dir"
 
 # Output filenames
 annual_bias_model1_obs="${output_dir}/slp_annual_bias_obs_model1.nc"
-season_bias_model1_obs="${output_dir}/slp_season_bias_obs_model1.nc"
+season_bias_model1_obs="${output_dir}/slp_${season}_bias_obs_model1.nc"
 annual_bias_model2_obs="${output_dir}/slp_annual_bias_obs_model2.nc"
-season_bias_model2_obs="${output_dir}/slp_season_bias_obs_model2.nc"
+season_bias_model2_obs="${output_dir}/slp_${season}_bias_obs_model2.nc"
 annual_bias_model1_model2="${output_dir}/slp_annual_bias_model1_model2.nc"
-season_bias_model1_model2="${output_dir}/slp_season_bias_model1_model2.nc"
+season_bias_model1_model2="${output_dir}/slp_${season}_bias_model1_model2.nc"
 annual_plot="${output_dir}/slp_annual_comparison.png"
 season_plot="${output_dir}/slp_season_comparison.png"
 
@@ -90,21 +93,21 @@ done
 echo "Converting observation data from Pa to hPa for bias calculations..."
 
 # Convert observation annual mean
-if [ ! -f "obs_annual_mean_msl_hpa_regridded.nc" ]; then
+if [ ! "obs_annual_mean_msl_hpa_regridded.nc" -nt "$obs_annual_regridded" ]; then
     echo "Converting $obs_annual_regridded from Pa to hPa..."
-    cdo divc,100 "$obs_annual_regridded" "obs_annual_mean_msl_hpa_regridded.nc"
+    cdo "${precision_cdo_opts[@]}" divc,100 "$obs_annual_regridded" "obs_annual_mean_msl_hpa_regridded.nc"
     check_error "Conversion of annual observation data from Pa to hPa"
 else
-    echo "File obs_annual_mean_msl_hpa_regridded.nc already exists. Skipping conversion."
+    echo "File obs_annual_mean_msl_hpa_regridded.nc is up to date. Skipping conversion."
 fi
 
 # Convert observation seasonal mean
-if [ ! -f "obs_${season}_mean_msl_hpa_regridded.nc" ]; then
+if [ ! "obs_${season}_mean_msl_hpa_regridded.nc" -nt "$obs_season_regridded" ]; then
     echo "Converting $obs_season_regridded from Pa to hPa..."
-    cdo divc,100 "$obs_season_regridded" "obs_${season}_mean_msl_hpa_regridded.nc"
+    cdo "${precision_cdo_opts[@]}" divc,100 "$obs_season_regridded" "obs_${season}_mean_msl_hpa_regridded.nc"
     check_error "Conversion of seasonal observation data from Pa to hPa"
 else
-    echo "File obs_${season}_mean_msl_hpa_regridded.nc already exists. Skipping conversion."
+    echo "File obs_${season}_mean_msl_hpa_regridded.nc is up to date. Skipping conversion."
 fi
 
 # Update paths for bias calculation
@@ -115,53 +118,53 @@ obs_season_regridded_hpa="obs_${season}_mean_msl_hpa_regridded.nc"
 echo "Calculating biases for SLP..."
 
 # Annual Bias (Model 1 - Observation)
-if [ ! -f "$annual_bias_model1_obs" ]; then
-    cdo sub "$model1_annual_mean" "$obs_annual_regridded_hpa" "$annual_bias_model1_obs"
+if [ ! "$annual_bias_model1_obs" -nt "$model1_annual_mean" ] || [ ! "$annual_bias_model1_obs" -nt "$obs_annual_regridded_hpa" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_annual_mean" "$obs_annual_regridded_hpa" "$annual_bias_model1_obs"
     check_error "Calculating annual bias for SLP (Model 1 - Observation)"
 else
-    echo "File $annual_bias_model1_obs already exists. Skipping..."
+    echo "File $annual_bias_model1_obs is up to date. Skipping..."
 fi
 
 # Seasonal Bias (Model 1 - Observation)
-if [ ! -f "$season_bias_model1_obs" ]; then
-    cdo sub "$model1_season_mean" "$obs_season_regridded_hpa" "$season_bias_model1_obs"
+if [ ! "$season_bias_model1_obs" -nt "$model1_season_mean" ] || [ ! "$season_bias_model1_obs" -nt "$obs_season_regridded_hpa" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_season_mean" "$obs_season_regridded_hpa" "$season_bias_model1_obs"
     check_error "Calculating seasonal bias for SLP (Model 1 - Observation)"
 else
-    echo "File $season_bias_model1_obs already exists. Skipping..."
+    echo "File $season_bias_model1_obs is up to date. Skipping..."
 fi
 
 # Annual and Seasonal Bias for Model 2 (if provided)
 if [ -n "$model2_annual_regridded" ]; then
     # Annual Bias (Model 2 - Observation)
-    if [ ! -f "$annual_bias_model2_obs" ]; then
-        cdo sub "$model2_annual_regridded" "$obs_annual_regridded_hpa" "$annual_bias_model2_obs"
+    if [ ! "$annual_bias_model2_obs" -nt "$model2_annual_regridded" ] || [ ! "$annual_bias_model2_obs" -nt "$obs_annual_regridded_hpa" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model2_annual_regridded" "$obs_annual_regridded_hpa" "$annual_bias_model2_obs"
         check_error "Calculating annual bias for SLP (Model 2 - Observation)"
     else
-        echo "File $annual_bias_model2_obs already exists. Skipping..."
+        echo "File $annual_bias_model2_obs is up to date. Skipping..."
     fi
 
     # Seasonal Bias (Model 2 - Observation)
-    if [ ! -f "$season_bias_model2_obs" ]; then
-        cdo sub "$model2_season_regridded" "$obs_season_regridded_hpa" "$season_bias_model2_obs"
+    if [ ! "$season_bias_model2_obs" -nt "$model2_season_regridded" ] || [ ! "$season_bias_model2_obs" -nt "$obs_season_regridded_hpa" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model2_season_regridded" "$obs_season_regridded_hpa" "$season_bias_model2_obs"
         check_error "Calculating seasonal bias for SLP (Model 2 - Observation)"
     else
-        echo "File $season_bias_model2_obs already exists. Skipping..."
+        echo "File $season_bias_model2_obs is up to date. Skipping..."
     fi
 
     # Annual Bias (Model 1 - Model 2)
-    if [ ! -f "$annual_bias_model1_model2" ]; then
-        cdo sub "$model1_annual_mean" "$model2_annual_regridded" "$annual_bias_model1_model2"
+    if [ ! "$annual_bias_model1_model2" -nt "$model1_annual_mean" ] || [ ! "$annual_bias_model1_model2" -nt "$model2_annual_regridded" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model1_annual_mean" "$model2_annual_regridded" "$annual_bias_model1_model2"
         check_error "Calculating annual bias for SLP (Model 1 - Model 2)"
     else
-        echo "File $annual_bias_model1_model2 already exists. Skipping..."
+        echo "File $annual_bias_model1_model2 is up to date. Skipping..."
     fi
 
     # Seasonal Bias (Model 1 - Model 2)
-    if [ ! -f "$season_bias_model1_model2" ]; then
-        cdo sub "$model1_season_mean" "$model2_season_regridded" "$season_bias_model1_model2"
+    if [ ! "$season_bias_model1_model2" -nt "$model1_season_mean" ] || [ ! "$season_bias_model1_model2" -nt "$model2_season_regridded" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model1_season_mean" "$model2_season_regridded" "$season_bias_model1_model2"
         check_error "Calculating seasonal bias for SLP (Model 1 - Model 2)"
     else
-        echo "File $season_bias_model1_model2 already exists. Skipping..."
+        echo "File $season_bias_model1_model2 is up to date. Skipping..."
     fi
 fi
 
@@ -170,6 +173,25 @@ fi
 
 
 
+# === SIGNIFICANCE ===
+# Welch t-test of each bias from the interannual moments of the means (see
+# significance.py), in the units of the bias (hPa); the plots stipple the
+# points where the bias is significant
+model_scale=1
+obs_scale=0.01
+function significance_mask {
+    python3 significance.py mask "$1" "$2" "${3%.nc}_signif.nc" --scale-a="$4" --scale-b="$5"
+    check_error "Testing the significance of $3"
+}
+significance_mask "$model1_annual_mean" "$obs_annual_regridded" "$annual_bias_model1_obs" "$model_scale" "$obs_scale"
+significance_mask "$model1_season_mean" "$obs_season_regridded" "$season_bias_model1_obs" "$model_scale" "$obs_scale"
+if [ -n "$model2_annual_regridded" ]; then
+    significance_mask "$model2_annual_regridded" "$obs_annual_regridded" "$annual_bias_model2_obs" "$model_scale" "$obs_scale"
+    significance_mask "$model2_season_regridded" "$obs_season_regridded" "$season_bias_model2_obs" "$model_scale" "$obs_scale"
+    significance_mask "$model1_annual_mean" "$model2_annual_regridded" "$annual_bias_model1_model2" "$model_scale" "$model_scale"
+    significance_mask "$model1_season_mean" "$model2_season_regridded" "$season_bias_model1_model2" "$model_scale" "$model_scale"
+fi
+
 # Validate Latitude Range
 if [[ ! "$lat_range" =~ ^-?[0-9]+(\.[0-9]+)?,-?[0-9]+(\.[0-9]+)?$ ]]; then
     echo "Error: Latitude range '$lat_range' is invalid. Expected format: 'min_lat,max_lat'."
@@ -17,6 +17,9 @@ function check_error {
     fi
 }
 
+# float32 precision policy for CDO outputs (see precision.py)
+read -r -a precision_cdo_opts <<< "$(python3 precision.py cdo-opts)"
+
 # Validate input arguments
 if [ "$#" -lt 8 ]; then
     echo "Usage: $0 <obs_annual_regridded> <obs_season_regridded> <model1_annual_mean> <model1_season_mean> <projection> <lat_range> <lon_range> <season> [<model2_annual_regridded> <model2_season_regridded>]"
@@ -41,11 +44,11 @@ mkdir -p "$output_dir"
 
 # Output filenames
 annual_bias_model1_obs="${output_dir}/ta_annual_bias_obs_model1.nc"
-season_bias_model1_obs="${output_dir}/ta_season_bias_obs_model1.nc"
+season_bias_model1_obs="${output_dir}/ta_${season}_bias_obs_model1.nc"
 annual_bias_model2_obs="${output_dir}/ta_annual_bias_obs_model2.nc"
-season_bias_model2_obs="${output_dir}/ta_season_bias_obs_model2.nc"
+season_bias_model2_obs="${output_dir}/ta_${season}_bias_obs_model2.nc"
 annual_bias_model1_model2="${output_dir}/ta_annual_bias_model1_model2.nc"
-season_bias_model1_model2="${output_dir}/ta_season_bias_model1_model2.nc"
+season_bias_model1_model2="${output_dir}/ta_${season}_bias_model1_model2.nc"
 annual_plot="${output_dir}/ta_annual_comparison.png"
 season_plot="${output_dir}/ta_season_comparison.png"
 
@@ -93,69 +96,62 @@ pressure_levels=(1000 925 850 700 600 500 400 300 250 200 150 100 70 50 30 20 10
 reorder_pressure_levels() {
     input_file="$1"
     output_file="$2"
-    temp_files=()
 
     echo "Reordering pressure levels for file: $input_file"
 
+    # Each level selected as a chained input of one merge, in the order wanted
+    level_args=()
     for p in "${pressure_levels[@]}"; do
-        temp_file="${output_dir}/temp_level_${p}.nc"
-        cdo sellevel,$p "$input_file" "$temp_file"
-        check_error "Selecting pressure level $p"
-        temp_files+=("$temp_file")
+        level_args+=(-sellevel,$p "$input_file")
     done
-
-    # Merge all selected levels into the output file
-    cdo merge "${temp_files[@]}" "$output_file"
+    cdo "${precision_cdo_opts[@]}" merge "${level_args[@]}" "$output_file"
     check_error "Merging reordered pressure levels"
-    
-    # Clean up temporary files
-    rm -f "${temp_files[@]}"
     echo "Reordered file saved as: $output_file"
 }
 
 # Example for observation annual data
 obs_annual_regridded_ordered="${output_dir}/obs_annual_regridded_ordered.nc"
-if [ ! -f "$obs_annual_regridded_ordered" ]; then
+if [ ! "$obs_annual_regridded_ordered" -nt "$obs_annual_regridded" ]; then
     reorder_pressure_levels "$obs_annual_regridded" "$obs_annual_regridded_ordered"
 else
-    echo "File $obs_annual_regridded_ordered already exists. Skipping."
+    echo "File $obs_annual_regridded_ordered is up to date. Skipping."
 fi
 
 # Repeat for all required files
-obs_season_regridded_ordered="${output_dir}/obs_season_regridded_ordered.nc"
-if [ ! -f "$obs_season_regridded_ordered" ]; then
+obs_season_regridded_ordered="${output_dir}/obs_${season}_regridded_ordered.nc"
+if [ ! "$obs_season_regridded_ordered" -nt "$obs_season_regridded" ]; then
     reorder_pressure_levels "$obs_season_regridded" "$obs_season_regridded_ordered"
 else
-    echo "File $obs_season_regridded_ordered already exists. Skipping."
+    echo "File $obs_season_regridded_ordered is up to date. Skipping."
 fi
 
 model1_annual_mean_ordered="${output_dir}/model1_annual_mean_ordered.nc"
-if [ ! -f "$model1_annual_mean_ordered" ]; then
+if [ ! "$model1_annual_mean_ordered" -nt "$model1_annual_mean" ]; then
     reorder_pressure_levels "$model1_annual_mean" "$model1_annual_mean_ordered"
 else
-    echo "File $model1_annual_mean_ordered already exists. Skipping."
+    echo "File $model1_annual_mean_ordered is up to date. Skipping."
 fi
 
-model1_season_mean_ordered="${output_dir}/model1_season_mean_ordered.nc"
-if [ ! -f "$model1_season_mean_ordered" ]; then
+model1_season_mean_ordered="${output_dir}/model1_${season}_mean_ordered.nc"
+if [ ! "$model1_season_mean_ordered" -nt "$model1_season_mean" ]; then
     reorder_pressure_levels "$model1_season_mean" "$model1_season_mean_ordered"
 else
-    echo "File $model1_season_mean_ordered already exists. Skipping."
+    echo "File $model1_season_mean_ordered is up to date. Skipping."
 fi
 
 if [ -n "$model2_annual_regridded" ]; then
     model2_annual_regridded_ordered="${output_dir}/model2_annual_regridded_ordered.nc"
-    if [ ! -f "$model2_annual_regridded_ordered" ]; then
+    if [ ! "$model2_annual_regridded_ordered" -nt "$model2_annual_regridded" ]; then
         reorder_pressure_levels "$model2_annual_regridded" "$model2_annual_regridded_ordered"
     else
-        echo "File $model2_annual_regridded_ordered already exists. Skipping."
+        echo "File $model2_annual_regridded_ordered is up to date. Skipping."
     fi
 
-    model2_season_regridded_ordered="${output_dir}/model2_season_regridded_ordered.nc"
-    if [ ! -f "$model2_season_regridded_ordered" ]; then
+    model2_season_regridded_ordered="${output_dir}/model2_${season}_regridded_ordered.nc"
+    if [ ! "$model2_season_regridded_ordered" -nt "$model2_season_regridded" ]; then
         reorder_pressure_levels "$model2_season_regridded" "$model2_season_regridded_ordered"
     else
-        echo "File $model2_season_regridded_ordered already exists. Skipping."
+        echo "File $model2_season_regridded_ordered is up to date. Skipping."
     fi
 fi
 
@@ -179,53 +175,53 @@ echo "Calculating biases after arranging pressure levels..."
 echo "Calculating biases for ta..."
 
 # Check and calculate annual bias (Obs - Model 1)
-if [ ! -f "$annual_bias_model1_obs" ]; then
-    cdo sub "$model1_annual_mean" "$obs_annual_regridded" "$annual_bias_model1_obs"
+if [ ! "$annual_bias_model1_obs" -nt "$model1_annual_mean" ] || [ ! "$annual_bias_model1_obs" -nt "$obs_annual_regridded" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_annual_mean" "$obs_annual_regridded" "$annual_bias_model1_obs"
     check_error "Calculating annual bias for ta (Obs - Model 1)"
 else
-    echo "Debug: $annual_bias_model1_obs already exists. Skipping..."
+    echo "Debug: $annual_bias_model1_obs is up to date. Skipping..."
 fi
 
 # Check and calculate seasonal bias (Obs - Model 1)
-if [ ! -f "$season_bias_model1_obs" ]; then
-    cdo sub "$model1_season_mean" "$obs_season_regridded" "$season_bias_model1_obs"
+if [ ! "$season_bias_model1_obs" -nt "$model1_season_mean" ] || [ ! "$season_bias_model1_obs" -nt "$obs_season_regridded" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_season_mean" "$obs_season_regridded" "$season_bias_model1_obs"
     check_error "Calculating seasonal bias for ta (Obs - Model 1)"
 else
-    echo "Debug: $season_bias_model1_obs already exists. Skipping..."
+    echo "Debug: $season_bias_model1_obs is up to date. Skipping..."
 fi
 
 # Check and calculate biases for Model 2 if provided
 if [ -n "$model2_annual_regridded" ]; then
     # Annual bias (Obs - Model 2)
-    if [ ! -f "$annual_bias_model2_obs" ]; then
-        cdo sub "$model2_annual_regridded" "$obs_annual_regridded" "$annual_bias_model2_obs"
+    if [ ! "$annual_bias_model2_obs" -nt "$model2_annual_regridded" ] || [ ! "$annual_bias_model2_obs" -nt "$obs_annual_regridded" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model2_annual_regridded" "$obs_annual_regridded" "$annual_bias_model2_obs"
         check_error "Calculating annual bias for ta (Obs - Model 2)"
     else
-        echo "Debug: $annual_bias_model2_obs already exists. Skipping..."
+        echo "Debug: $annual_bias_model2_obs is up to date. Skipping..."
     fi
 
     # Seasonal bias (Obs - Model 2)
-    if [ ! -f "$season_bias_model2_obs" ]; then
-        cdo sub "$model2_season_regridded" "$obs_season_regridded" "$season_bias_model2_obs"
+    if [ ! "$season_bias_model2_obs" -nt "$model2_season_regridded" ] || [ ! "$season_bias_model2_obs" -nt "$obs_season_regridded" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model2_season_regridded" "$obs_season_regridded" "$season_bias_model2_obs"
         check_error "Calculating seasonal bias for ta (Obs - Model 2)"
     else
-        echo "Debug: $season_bias_model2_obs already exists. Skipping..."
+        echo "Debug: $season_bias_model2_obs is up to date. Skipping..."
     fi
 
     # Annual bias (Model 1 - Model 2)
-    if [ ! -f "$annual_bias_model1_model2" ]; then
-        cdo sub "$model1_annual_mean" "$model2_annual_regridded" "$annual_bias_model1_model2"
+    if [ ! "$annual_bias_model1_model2" -nt "$model1_annual_mean" ] || [ ! "$annual_bias_model1_model2" -nt "$model2_annual_regridded" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model1_annual_mean" "$model2_annual_regridded" "$annual_bias_model1_model2"
         check_error "Calculating annual bias for ta (Model 1 - Model 2)"
     else
-        echo "Debug: $annual_bias_model1_model2 already exists. Skipping..."
+        echo "Debug: $annual_bias_model1_model2 is up to date. Skipping..."
     fi
 
     # Seasonal bias (Model 1 - Model 2)
-    if [ ! -f "$season_bias_model1_model2" ]; then
-        cdo sub "$model1_season_mean" "$model2_season_regridded" "$season_bias_model1_model2"
+    if [ ! "$season_bias_model1_model2" -nt "$model1_season_mean" ] || [ ! "$season_bias_model1_model2" -nt "$model2_season_regridded" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model1_season_mean" "$model2_season_regridded" "$season_bias_model1_model2"
         check_error "Calculating seasonal bias for ta (Model 1 - Model 2)"
     else
-        echo "Debug: $season_bias_model1_model2 already exists. Skipping..."
+        echo "Debug: $season_bias_model1_model2 is up to date. Skipping..."
     fi
 fi
 
@@ -16,6 +16,9 @@ function check_error {
     fi
 }
 
+# float32 precision policy for CDO outputs (see precision.py)
+read -r -a precision_cdo_opts <<< "$(python3 precision.py cdo-opts)"
+
 # Validate input arguments
 if [ "$#" -lt 8 ]; then
     echo "Usage: $0 <obs_annual_regridded> <obs_season_regridded> <model1_annual_mean> <model1_season_mean> <projection> <lat_range> <lon_range> <season> [<model2_annual_regridded> <model2_season_regridded>]"
@@ -40,11 +43,11 @@ mkdir -p "$output_dir"
 
 # Output filenames
 annual_bias_model1_obs="${output_dir}/tas_annual_bias_obs_model1.nc"
-season_bias_model1_obs="${output_dir}/tas_season_bias_obs_model1.nc"
+season_bias_model1_obs="${output_dir}/tas_${season}_bias_obs_model1.nc"
 annual_bias_model2_obs="${output_dir}/tas_annual_bias_obs_model2.nc"
-season_bias_model2_obs="${output_dir}/tas_season_bias_obs_model2.nc"
+season_bias_model2_obs="${output_dir}/tas_${season}_bias_obs_model2.nc"
 annual_bias_model1_model2="${output_dir}/tas_annual_bias_model1_model2.nc"
-season_bias_model1_model2="${output_dir}/tas_season_bias_model1_model2.nc"
+season_bias_model1_model2="${output_dir}/tas_${season}_bias_model1_model2.nc"
 annual_plot="${output_dir}/tas_annual_comparison.png"
 season_plot="${output_dir}/tas_season_comparison.png"
 
@@ -90,58 +93,77 @@ done
 echo "Calculating biases for TAS..."
 
 # Check and calculate annual bias (Obs - Model 1)
-if [ ! -f "$annual_bias_model1_obs" ]; then
-    cdo sub "$model1_annual_mean" "$obs_annual_regridded" "$annual_bias_model1_obs"
+if [ ! "$annual_bias_model1_obs" -nt "$model1_annual_mean" ] || [ ! "$annual_bias_model1_obs" -nt "$obs_annual_regridded" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_annual_mean" "$obs_annual_regridded" "$annual_bias_model1_obs"
     check_error "Calculating annual bias for TAS (Obs - Model 1)"
 else
-    echo "Debug: $annual_bias_model1_obs already exists. Skipping..."
+    echo "Debug: $annual_bias_model1_obs is up to date. Skipping..."
 fi
 
 # Check and calculate seasonal bias (Obs - Model 1)
-if [ ! -f "$season_bias_model1_obs" ]; then
-    cdo sub "$model1_season_mean" "$obs_season_regridded" "$season_bias_model1_obs"
+if [ ! "$season_bias_model1_obs" -nt "$model1_season_mean" ] || [ ! "$season_bias_model1_obs" -nt "$obs_season_regridded" ]; then
+    cdo "${precision_cdo_opts[@]}" sub "$model1_season_mean" "$obs_season_regridded" "$season_bias_model1_obs"
     check_error "Calculating seasonal bias for TAS (Obs - Model 1)"
 else
-    echo "Debug: $season_bias_model1_obs already exists. Skipping..."
+    echo "Debug: $season_bias_model1_obs is up to date. Skipping..."
 fi
 
 # Check and calculate biases for Model 2 if provided
 if [ -n "$model2_annual_regridded" ]; then
     # Annual bias (Obs - Model 2)
-    if [ ! -f "$annual_bias_model2_obs" ]; then
-        cdo sub "$model2_annual_regridded" "$obs_annual_regridded" "$annual_bias_model2_obs"
+    if [ ! "$annual_bias_model2_obs" -nt "$model2_annual_regridded" ] || [ ! "$annual_bias_model2_obs" -nt "$obs_annual_regridded" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model2_annual_regridded" "$obs_annual_regridded" "$annual_bias_model2_obs"
         check_error "Calculating annual bias for TAS (Obs - Model 2)"
     else
-        echo "Debug: $annual_bias_model2_obs already exists. Skipping..."
+        echo "Debug: $annual_bias_model2_obs is up to date. Skipping..."
     fi
 
     # Seasonal bias (Obs - Model 2)
-    if [ ! -f "$season_bias_model2_obs" ]; then
-        cdo sub "$model2_season_regridded" "$obs_season_regridded" "$season_bias_model2_obs"
+    if [ ! "$season_bias_model2_obs" -nt "$model2_season_regridded" ] || [ ! "$season_bias_model2_obs" -nt "$obs_season_regridded" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model2_season_regridded" "$obs_season_regridded" "$season_bias_model2_obs"
         check_error "Calculating seasonal bias for TAS (Obs - Model 2)"
     else
-        echo "Debug: $season_bias_model2_obs already exists. Skipping..."
+        echo "Debug: $season_bias_model2_obs is up to date. Skipping..."
     fi
 
     # Annual bias (Model 1 - Model 2)
-    if [ ! -f "$annual_bias_model1_model2" ]; then
-        cdo sub "$model1_annual_mean" "$model2_annual_regridded" "$annual_bias_model1_model2"
+    if [ ! "$annual_bias_model1_model2" -nt "$model1_annual_mean" ] || [ ! "$annual_bias_model1_model2" -nt "$model2_annual_regridded" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model1_annual_mean" "$model2_annual_regridded" "$annual_bias_model1_model2"
         check_error "Calculating annual bias for TAS (Model 1 - Model 2)"
     else
-        echo "Debug: $annual_bias_model1_model2 already exists. Skipping..."
+        echo "Debug: $annual_bias_model1_model2 is up to date. Skipping..."
     fi
 
     # Seasonal bias (Model 1 - Model 2)
-    if [ ! -f "$season_bias_model1_model2" ]; then
-        cdo sub "$model1_season_mean" "$model2_season_regridded" "$season_bias_model1_model2"
+    if [ ! "$season_bias_model1_model2" -nt "$model1_season_mean" ] || [ ! "$season_bias_model1_model2" -nt "$model2_season_regridded" ]; then
+        cdo "${precision_cdo_opts[@]}" sub "$model1_season_mean" "$model2_season_regridded" "$season_bias_model1_model2"
         check_error "Calculating seasonal bias for TAS (Model 1 - Model 2)"
     else
-        echo "Debug: $season_bias_model1_model2 already exists. Skipping..."
+        echo "Debug: $season_bias_model1_model2 is up to date. Skipping..."
     fi
 fi
 
 
 
+# === SIGNIFICANCE ===
+# Welch t-test of each bias from the interannual moments of the means (see
+# significance.py), in the units of the bias; the plots stipple the
+# points where the bias is significant
+model_scale=1
+obs_scale=1
+function significance_mask {
+    python3 significance.py mask "$1" "$2" "${3%.nc}_signif.nc" --scale-a="$4" --scale-b="$5"
+    check_error "Testing the significance of $3"
+}
+significance_mask "$model1_annual_mean" "$obs_annual_regridded" "$annual_bias_model1_obs" "$model_scale" "$obs_scale"
+significance_mask "$model1_season_mean" "$obs_season_regridded" "$season_bias_model1_obs" "$model_scale" "$obs_scale"
+if [ -n "$model2_annual_regridded" ]; then
+    significance_mask "$model2_annual_regridded" "$obs_annual_regridded" "$annual_bias_model2_obs" "$model_scale" "$obs_scale"
+    significance_mask "$model2_season_regridded" "$obs_season_regridded" "$season_bias_model2_obs" "$model_scale" "$obs_scale"
+    significance_mask "$model1_annual_mean" "$model2_annual_regridded" "$annual_bias_model1_model2" "$model_scale" "$model_scale"
+    significance_mask "$model1_season_mean" "$model2_season_regridded" "$season_bias_model1_model2" "$model_scale" "$model_scale"
+fi
+
 # Validate Latitude Range
 if [[ ! "$lat_range" =~ ^-?[0-9]+(\.[0-9]+)?,-?[0-9]+(\.[0-9]+)?$ ]]; then
     echo "Error: Latitude range '$lat_range' is invalid. Expected format: 'min_lat,max_lat'."
@@ -16,6 +16,19 @@ function check_error {
     fi
 }
 
+# Plot tasks (see plot_orchestrator.py): run from plotting_functions_new.sh the
+# NCL scripts below are registered as concurrent tasks; otherwise each runs right away
+if ! declare -F plot_task > /dev/null; then
+    function plot_task {
+        while [ "$1" != "--" ]; do shift; done
+        shift
+        "$@"
+    }
+fi
+
+# float32 precision policy for CDO outputs (see precision.py)
+read -r -a precision_cdo_opts <<< "$(python3 precision.py cdo-opts)"
+
 # Validate input arguments
 if [ "$#" -lt 8 ]; then
     echo "Usage: $0 <obs_annual_regridded_ua> <obs_annual_regridded_va> <model1_annual_ua> <model1_annual_va> <projection> <lat_range> <lon_range> <season> [<model2_annual_ua> <model2_annual_va>]"
@@ -46,28 +59,21 @@ reorder_pressure_levels() {
     input_file="$1"       # Input file
     output_file="$2"      # Output file
     var="$3"              # Variable name
-    temp_files=()
 
-    if [ -f "$output_file" ]; then
-        echo "File $output_file already exists. Skipping reordering for $var."
+    if [ "$output_file" -nt "$input_file" ]; then
+        echo "File $output_file is up to date. Skipping reordering for $var."
         return
     fi
 
     echo "Reordering pressure levels for file: $input_file (Variable: $var)"
 
+    # Each level selected as a chained input of one merge, in the order wanted
+    level_args=()
     for p in "${pressure_levels[@]}"; do
-        temp_file="${output_dir}/temp_${var}_level_${p}.nc"
-        cdo sellevel,$p "$input_file" "$temp_file"
-        check_error "Selecting pressure level $p for $var"
-        temp_files+=("$temp_file")
+        level_args+=(-sellevel,$p "$input_file")
     done
-
-    # Merge all selected levels into the output file
-    cdo merge "${temp_files[@]}" "$output_file"
+    cdo "${precision_cdo_opts[@]}" merge "${level_args[@]}" "$output_file"
     check_error "Merging reordered pressure levels for $var"
-
-    # Clean up temporary files
-    rm -f "${temp_files[@]}"
     echo "Reordered file for $var saved as: $output_file"
 }
 
@@ -127,25 +133,25 @@ model2_va_200="${output_dir}/model2_va_200.nc"
 echo "Calculating bias for 850 hPa and 200 hPa..."
 
 # Extract 850 hPa and 200 hPa levels for ua
-cdo sellevel,850 "$obs_ua_output" "$obs_ua_850"
-cdo sellevel,200 "$obs_ua_output" "$obs_ua_200"
-cdo sellevel,850 "$model1_ua_output" "$model1_ua_850"
-cdo sellevel,200 "$model1_ua_output" "$model1_ua_200"
+cdo "${precision_cdo_opts[@]}" sellevel,850 "$obs_ua_output" "$obs_ua_850"
+cdo "${precision_cdo_opts[@]}" sellevel,200 "$obs_ua_output" "$obs_ua_200"
+cdo "${precision_cdo_opts[@]}" sellevel,850 "$model1_ua_output" "$model1_ua_850"
+cdo "${precision_cdo_opts[@]}" sellevel,200 "$model1_ua_output" "$model1_ua_200"
 
 if [ -n "$model2_ua_output" ]; then
-    cdo sellevel,850 "$model2_ua_output" "$model2_ua_850"
-    cdo sellevel,200 "$model2_ua_output" "$model2_ua_200"
+    cdo "${precision_cdo_opts[@]}" sellevel,850 "$model2_ua_output" "$model2_ua_850"
+    cdo "${precision_cdo_opts[@]}" sellevel,200 "$model2_ua_output" "$model2_ua_200"
 fi
 
 # Extract 850 hPa and 200 hPa levels for va
-cdo sellevel,850 "$obs_va_output" "$obs_va_850"
-cdo sellevel,200 "$obs_va_output" "$obs_va_200"
-cdo sellevel,850 "$model1_va_output" "$model1_va_850"
-cdo sellevel,200 "$model1_va_output" "$model1_va_200"
+cdo "${precision_cdo_opts[@]}" sellevel,850 "$obs_va_output" "$obs_va_850"
+cdo "${precision_cdo_opts[@]}" sellevel,200 "$obs_va_output" "$obs_va_200"
+cdo "${precision_cdo_opts[@]}" sellevel,850 "$model1_va_output" "$model1_va_850"
+cdo "${precision_cdo_opts[@]}" sellevel,200 "$model1_va_output" "$model1_va_200"
 
 if [ -n "$model2_va_output" ]; then
-    cdo sellevel,850 "$model2_va_output" "$model2_va_850"
-    cdo sellevel,200 "$model2_va_output" "$model2_va_200"
+    cdo "${precision_cdo_opts[@]}" sellevel,850 "$model2_va_output" "$model2_va_850"
+    cdo "${precision_cdo_opts[@]}" sellevel,200 "$model2_va_output" "$model2_va_200"
 fi
 
 
@@ -200,22 +206,25 @@ echo "Exported Latitude Range: lat_min=$lat_min, lat_max=$lat_max"
 echo "Exported Longitude Range: lon_min=$lon_min, lon_max=$lon_max"
 # Call the NCL script with arguments
 
-ncl wind_850.ncl
-ncl wind_200.ncl
-ncl wind_850_season.ncl
-ncl wind_200_season.ncl
-ncl zonal_wind_200.ncl
-ncl zonal_wind_850.ncl
+plot_task wind_850.ncl -- ncl wind_850.ncl
+plot_task wind_200.ncl -- ncl wind_200.ncl
+plot_task wind_850_season.ncl -- ncl wind_850_season.ncl
+plot_task wind_200_season.ncl -- ncl wind_200_season.ncl
+plot_task zonal_wind_200.ncl -- ncl zonal_wind_200.ncl
+plot_task zonal_wind_850.ncl -- ncl zonal_wind_850.ncl
 
-ncl meridional_wind_850.ncl
-ncl meridional_wind_200.ncl
+plot_task meridional_wind_850.ncl -- ncl meridional_wind_850.ncl
+plot_task meridional_wind_200.ncl -- ncl meridional_wind_200.ncl
 
-ncl Zonal_wind_level_lat_ann.ncl
-ncl Zonal_wind_level_lat_season.ncl
-ncl Zonal_wind_level_lat_ann_log.ncl
-ncl Zonal_wind_level_lat_season_log.ncl
+plot_task Zonal_wind_level_lat_ann.ncl -- ncl Zonal_wind_level_lat_ann.ncl
+plot_task Zonal_wind_level_lat_season.ncl -- ncl Zonal_wind_level_lat_season.ncl
+plot_task Zonal_wind_level_lat_ann_log.ncl -- ncl Zonal_wind_level_lat_ann_log.ncl
+plot_task Zonal_wind_level_lat_season_log.ncl -- ncl Zonal_wind_level_lat_season_log.ncl
 
-ncl precip_wind850_season.ncl
+# Precipitation with the 850 hPa winds, after special_plot_pr when pr is plotted
+if [ -z "$ATM_PLOT_TASKS" ] || [[ ",$plot_var," == *",pr,"* ]]; then
+    plot_task precip_wind850_season.ncl --after=special_plot_pr -- ncl precip_wind850_season.ncl
+fi
 
 
 
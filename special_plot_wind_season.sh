@@ -17,6 +17,19 @@ function check_error {
     fi
 }
 
+# Plot tasks (see plot_orchestrator.py): run from plotting_functions_new.sh the
+# NCL scripts below are registered as concurrent tasks; otherwise each runs right away
+if ! declare -F plot_task > /dev/null; then
+    function plot_task {
+        while [ "$1" != "--" ]; do shift; done
+        shift
+        "$@"
+    }
+fi
+
+# float32 precision policy for CDO outputs (see precision.py)
+read -r -a precision_cdo_opts <<< "$(python3 precision.py cdo-opts)"
+
 # Validate input arguments
 if [ "$#" -lt 8 ]; then
     echo "Usage: $0 <obs_annual_regridded_ua> <obs_annual_regridded_va> <model1_annual_ua> <model1_annual_va> <projection> <lat_range> <lon_range> <season> [<model2_annual_ua> <model2_annual_va>]"
@@ -47,38 +60,31 @@ reorder_pressure_levels() {
     input_file="$1"       # Input file
     output_file="$2"      # Output file
     var="$3"              # Variable name
-    temp_files=()
 
-    if [ -f "$output_file" ]; then
-        echo "File $output_file already exists. Skipping reordering for $var."
+    if [ "$output_file" -nt "$input_file" ]; then
+        echo "File $output_file is up to date. Skipping reordering for $var."
         return
     fi
 
     echo "Reordering pressure levels for file: $input_file (Variable: $var)"
 
+    # Each level selected as a chained input of one merge, in the order wanted
+    level_args=()
     for p in "${pressure_levels[@]}"; do
-        temp_file="${output_dir}/temp_${var}_level_${p}.nc"
-        cdo sellevel,$p "$input_file" "$temp_file"
-        check_error "Selecting pressure level $p for $var"
-        temp_files+=("$temp_file")
+        level_args+=(-sellevel,$p "$input_file")
     done
-
-    # Merge all selected levels into the output file
-    cdo merge "${temp_files[@]}" "$output_file"
+    cdo "${precision_cdo_opts[@]}" merge "${level_args[@]}" "$output_file"
     check_error "Merging reordered pressure levels for $var"
-
-    # Clean up temporary files
-    rm -f "${temp_files[@]}"
     echo "Reordered file for $var saved as: $output_file"
 }
 
 # Define file paths for reordered outputs
-obs_ua_output="${output_dir}/obs_ua_season_regridded_ordered.nc"
-obs_va_output="${output_dir}/obs_va_season_regridded_ordered.nc"
-model1_ua_output="${output_dir}/model1_ua_season_ordered.nc"
-model1_va_output="${output_dir}/model1_va_season_ordered.nc"
-model2_ua_output="${output_dir}/model2_ua_season_ordered.nc"
-model2_va_output="${output_dir}/model2_va_season_ordered.nc"
+obs_ua_output="${output_dir}/obs_ua_${season}_regridded_ordered.nc"
+obs_va_output="${output_dir}/obs_va_${season}_regridded_ordered.nc"
+model1_ua_output="${output_dir}/model1_ua_${season}_ordered.nc"
+model1_va_output="${output_dir}/model1_va_${season}_ordered.nc"
+model2_ua_output="${output_dir}/model2_ua_${season}_ordered.nc"
+model2_va_output="${output_dir}/model2_va_${season}_ordered.nc"
 
 # Reorder pressure levels for observation ua and va
 reorder_pressure_levels "$obs_annual_ua" "$obs_ua_output" "u"
@@ -95,80 +101,80 @@ if [ -n "$model2_annual_ua" ] && [ -n "$model2_annual_va" ]; then
 fi
 
 # Bias Calculation (850 hPa and 200 hPa)
-bias_obs_model1_ua_850="${output_dir}/bias_obs_model1_ua_season_850.nc"
-bias_obs_model1_ua_200="${output_dir}/bias_obs_model1_ua_season_200.nc"
-bias_obs_model1_va_850="${output_dir}/bias_obs_model1_va_season_850.nc"
-bias_obs_model1_va_200="${output_dir}/bias_obs_model1_va_season_200.nc"
-
-bias_obs_model2_ua_850="${output_dir}/bias_obs_model2_ua_season_850.nc"
-bias_obs_model2_ua_200="${output_dir}/bias_obs_model2_ua_season_200.nc"
-bias_obs_model2_va_850="${output_dir}/bias_obs_model2_va_season_850.nc"
-bias_obs_model2_va_200="${output_dir}/bias_obs_model2_va_season_200.nc"
-
-bias_model1_model2_ua_850="${output_dir}/bias_model1_model2_ua_season_850.nc"
-bias_model1_model2_ua_200="${output_dir}/bias_model1_model2_ua_season_200.nc"
-bias_model1_model2_va_850="${output_dir}/bias_model1_model2_va_season_850.nc"
-bias_model1_model2_va_200="${output_dir}/bias_model1_model2_va_season_200.nc"
-
-obs_ua_850="${output_dir}/obs_ua_season_850.nc"
-obs_ua_200="${output_dir}/obs_ua_season_200.nc"
-obs_va_850="${output_dir}/obs_va_season_850.nc"
-obs_va_200="${output_dir}/obs_va_season_200.nc"
-
-model1_va_850="${output_dir}/model1_va_season_850.nc"
-model1_va_200="${output_dir}/model1_va_season_200.nc"
-model1_ua_850="${output_dir}/model1_ua_season_850.nc"
-model1_ua_200="${output_dir}/model1_ua_season_200.nc"
-
-model2_ua_850="${output_dir}/model2_ua_season_850.nc"
-model2_ua_200="${output_dir}/model2_ua_season_200.nc"
-model2_va_850="${output_dir}/model2_va_season_850.nc"
-model2_va_200="${output_dir}/model2_va_season_200.nc"
+bias_obs_model1_ua_850="${output_dir}/bias_obs_model1_ua_${season}_850.nc"
+bias_obs_model1_ua_200="${output_dir}/bias_obs_model1_ua_${season}_200.nc"
+bias_obs_model1_va_850="${output_dir}/bias_obs_model1_va_${season}_850.nc"
+bias_obs_model1_va_200="${output_dir}/bias_obs_model1_va_${season}_200.nc"
+
+bias_obs_model2_ua_850="${output_dir}/bias_obs_model2_ua_${season}_850.nc"
+bias_obs_model2_ua_200="${output_dir}/bias_obs_model2_ua_${season}_200.nc"
+bias_obs_model2_va_850="${output_dir}/bias_obs_model2_va_${season}_850.nc"
+bias_obs_model2_va_200="${output_dir}/bias_obs_model2_va_${season}_200.nc"
+
+bias_model1_model2_ua_850="${output_dir}/bias_model1_model2_ua_${season}_850.nc"
+bias_model1_model2_ua_200="${output_dir}/bias_model1_model2_ua_${season}_200.nc"
+bias_model1_model2_va_850="${output_dir}/bias_model1_model2_va_${season}_850.nc"
+bias_model1_model2_va_200="${output_dir}/bias_model1_model2_va_${season}_200.nc"
+
+obs_ua_850="${output_dir}/obs_ua_${season}_850.nc"
+obs_ua_200="${output_dir}/obs_ua_${season}_200.nc"
+obs_va_850="${output_dir}/obs_va_${season}_850.nc"
+obs_va_200="${output_dir}/obs_va_${season}_200.nc"
+
+model1_va_850="${output_dir}/model1_va_${season}_850.nc"
+model1_va_200="${output_dir}/model1_va_${season}_200.nc"
+model1_ua_850="${output_dir}/model1_ua_${season}_850.nc"
+model1_ua_200="${output_dir}/model1_ua_${season}_200.nc"
+
+model2_ua_850="${output_dir}/model2_ua_${season}_850.nc"
+model2_ua_200="${output_dir}/model2_ua_${season}_200.nc"
+model2_va_850="${output_dir}/model2_va_${season}_850.nc"
+model2_va_200="${output_dir}/model2_va_${season}_200.nc"
 
 echo "Calculating bias for 850 hPa and 200 hPa..."
 
 # Extract 850 hPa and 200 hPa levels for ua
-cdo sellevel,850 "$obs_ua_output" "$obs_ua_850"
-cdo sellevel,200 "$obs_ua_output" "$obs_ua_200"
-cdo sellevel,850 "$model1_ua_output" "$model1_ua_850"
-cdo sellevel,200 "$model1_ua_output" "$model1_ua_200"
+cdo "${precision_cdo_opts[@]}" sellevel,850 "$obs_ua_output" "$obs_ua_850"
+cdo "${precision_cdo_opts[@]}" sellevel,200 "$obs_ua_output" "$obs_ua_200"
+cdo "${precision_cdo_opts[@]}" sellevel,850 "$model1_ua_output" "$model1_ua_850"
+cdo "${precision_cdo_opts[@]}" sellevel,200 "$model1_ua_output" "$model1_ua_200"
 
 if [ -n "$model2_ua_output" ]; then
-    cdo sellevel,850 "$model2_ua_output" "$model2_ua_850"
-    cdo sellevel,200 "$model2_ua_output" "$model2_ua_200"
+    cdo "${precision_cdo_opts[@]}" sellevel,850 "$model2_ua_output" "$model2_ua_850"
+    cdo "${precision_cdo_opts[@]}" sellevel,200 "$model2_ua_output" "$model2_ua_200"
 fi
 
 # Extract 850 hPa and 200 hPa levels for va
-cdo sellevel,850 "$obs_va_output" "$obs_va_850"
-cdo sellevel,200 "$obs_va_output" "$obs_va_200"
-cdo sellevel,850 "$model1_va_output" "$model1_va_850"
-cdo sellevel,200 "$model1_va_output" "$model1_va_200"
+cdo "${precision_cdo_opts[@]}" sellevel,850 "$obs_va_output" "$obs_va_850"
+cdo "${precision_cdo_opts[@]}" sellevel,200 "$obs_va_output" "$obs_va_200"
+cdo "${precision_cdo_opts[@]}" sellevel,850 "$model1_va_output" "$model1_va_850"
+cdo "${precision_cdo_opts[@]}" sellevel,200 "$model1_va_output" "$model1_va_200"
 
 if [ -n "$model2_va_output" ]; then
-    cdo sellevel,850 "$model2_va_output" "$model2_va_850"
-    cdo sellevel,200 "$model2_va_output" "$model2_va_200"
+    cdo "${precision_cdo_opts[@]}" sellevel,850 "$model2_va_output" "$model2_va_850"
+    cdo "${precision_cdo_opts[@]}" sellevel,200 "$model2_va_output" "$model2_va_200"
 fi
 
 # Calculate biases for ua (model - obs)
-cdo sub "${output_dir}/model1_ua_season_850.nc" "${output_dir}/obs_ua_season_850.nc" "$bias_obs_model1_ua_850"
-cdo sub "${output_dir}/model1_ua_season_200.nc" "${output_dir}/obs_ua_season_200.nc" "$bias_obs_model1_ua_200"
+cdo "${precision_cdo_opts[@]}" sub "${output_dir}/model1_ua_${season}_850.nc" "${output_dir}/obs_ua_${season}_850.nc" "$bias_obs_model1_ua_850"
+cdo "${precision_cdo_opts[@]}" sub "${output_dir}/model1_ua_${season}_200.nc" "${output_dir}/obs_ua_${season}_200.nc" "$bias_obs_model1_ua_200"
 
 if [ -n "$model2_ua_output" ]; then
-    cdo sub "${output_dir}/model2_ua_season_850.nc" "${output_dir}/obs_ua_season_850.nc" "$bias_obs_model2_ua_850"
-    cdo sub "${output_dir}/model2_ua_season_200.nc" "${output_dir}/obs_ua_season_200.nc" "$bias_obs_model2_ua_200"
-    cdo sub "${output_dir}/model2_ua_season_850.nc" "${output_dir}/model1_ua_season_850.nc" "$bias_model1_model2_ua_850"
-    cdo sub "${output_dir}/model2_ua_season_200.nc" "${output_dir}/model1_ua_season_200.nc" "$bias_model1_model2_ua_200"
+    cdo "${precision_cdo_opts[@]}" sub "${output_dir}/model2_ua_${season}_850.nc" "${output_dir}/obs_ua_${season}_850.nc" "$bias_obs_model2_ua_850"
+    cdo "${precision_cdo_opts[@]}" sub "${output_dir}/model2_ua_${season}_200.nc" "${output_dir}/obs_ua_${season}_200.nc" "$bias_obs_model2_ua_200"
+    cdo "${precision_cdo_opts[@]}" sub "${output_dir}/model2_ua_${season}_850.nc" "${output_dir}/model1_ua_${season}_850.nc" "$bias_model1_model2_ua_850"
+    cdo "${precision_cdo_opts[@]}" sub "${output_dir}/model2_ua_${season}_200.nc" "${output_dir}/model1_ua_${season}_200.nc" "$bias_model1_model2_ua_200"
 fi
 
 # Calculate biases for va (model - obs)
-cdo sub "${output_dir}/model1_va_season_850.nc" "${output_dir}/obs_va_season_850.nc" "$bias_obs_model1_va_850"
-cdo sub "${output_dir}/model1_va_season_200.nc" "${output_dir}/obs_va_season_200.nc" "$bias_obs_model1_va_200"
+cdo "${precision_cdo_opts[@]}" sub "${output_dir}/model1_va_${season}_850.nc" "${output_dir}/obs_va_${season}_850.nc" "$bias_obs_model1_va_850"
+cdo "${precision_cdo_opts[@]}" sub "${output_dir}/model1_va_${season}_200.nc" "${output_dir}/obs_va_${season}_200.nc" "$bias_obs_model1_va_200"
 
 if [ -n "$model2_va_output" ]; then
-    cdo sub "${output_dir}/model2_va_season_850.nc" "${output_dir}/obs_va_season_850.nc" "$bias_obs_model2_va_850"
-    cdo sub "${output_dir}/model2_va_season_200.nc" "${output_dir}/obs_va_season_200.nc" "$bias_obs_model2_va_200"
-    cdo sub "${output_dir}/model2_va_season_850.nc" "${output_dir}/model1_va_season_850.nc" "$bias_model1_model2_va_850"
-    cdo sub "${output_dir}/model2_va_season_200.nc" "${output_dir}/model1_va_season_200.nc" "$bias_model1_model2_va_200"
+    cdo "${precision_cdo_opts[@]}" sub "${output_dir}/model2_va_${season}_850.nc" "${output_dir}/obs_va_${season}_850.nc" "$bias_obs_model2_va_850"
+    cdo "${precision_cdo_opts[@]}" sub "${output_dir}/model2_va_${season}_200.nc" "${output_dir}/obs_va_${season}_200.nc" "$bias_obs_model2_va_200"
+    cdo "${precision_cdo_opts[@]}" sub "${output_dir}/model2_va_${season}_850.nc" "${output_dir}/model1_va_${season}_850.nc" "$bias_model1_model2_va_850"
+    cdo "${precision_cdo_opts[@]}" sub "${output_dir}/model2_va_${season}_200.nc" "${output_dir}/model1_va_${season}_200.nc" "$bias_model1_model2_va_200"
 fi
 
 echo "Bias calculations completed for 850 hPa and 200 hPa."
@@ -222,10 +228,13 @@ echo "Exported Latitude Range: lat_min=$lat_min, lat_max=$lat_max"
 echo "Exported Longitude Range: lon_min=$lon_min, lon_max=$lon_max"
 echo "SEASON: $season"
 # Call the NCL script with arguments
-ncl wind_850_season.ncl
-ncl wind_200_season.ncl
-ncl Zonal_wind_level_lat_season.ncl
-ncl precip_wind850_season.ncl
+plot_task wind_850_season.ncl -- ncl wind_850_season.ncl
+plot_task wind_200_season.ncl -- ncl wind_200_season.ncl
+plot_task Zonal_wind_level_lat_season.ncl -- ncl Zonal_wind_level_lat_season.ncl
+# Precipitation with the 850 hPa winds, after special_plot_pr when pr is plotted
+if [ -z "$ATM_PLOT_TASKS" ] || [[ ",$plot_var," == *",pr,"* ]]; then
+    plot_task precip_wind850_season.ncl --after=special_plot_pr -- ncl precip_wind850_season.ncl
+fi
 
 
 
@@ -0,0 +1,162 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Benchmark of the storage profiles in storage_profiles.py.
+#
+# A product (typically an *_all_year* series) is rewritten with every profile
+# and the write time, file size and cold-cache read latency of the access
+# patterns used downstream are measured:
+#   fldmean    - area-weighted global mean of every time step (TAS time series)
+#   india_box  - all time steps over the India_grid.txt domain (PR India regrid)
+#   map        - one full horizontal field (contour maps)
+#
+# Usage:
+#   python storage_benchmark.py <input.nc> <variable> [<work_dir>] [<profile> ...]
+#
+# ==============================================================================
+
+import sys
+import os
+import csv
+import time
+import statistics
+import numpy as np
+import xarray as xr
+
+from storage_profiles import PROFILES, xarray_encoding, netcdf_format
+
+REPEATS = 3
+INDIA_LAT = (6.5, 38.5)
+INDIA_LON = (66.5, 100.0)
+TIME_DIMS = ("time", "valid_time")
+
+
+def drop_page_cache(path):
+    """Ask the kernel to forget cached pages of a file so reads are cold."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def coord_names(da):
+    lat_name = "lat" if "lat" in da.coords else "latitude"
+    lon_name = "lon" if "lon" in da.coords else "longitude"
+    return lat_name, lon_name
+
+
+def read_fldmean(path, variable):
+    with xr.open_dataset(path, decode_times=False) as ds:
+        da = ds[variable]
+        lat_name, lon_name = coord_names(da)
+        weights = np.cos(np.deg2rad(da[lat_name]))
+        return da.weighted(weights).mean(dim=[lat_name, lon_name]).values
+
+
+def read_india_box(path, variable):
+    with xr.open_dataset(path, decode_times=False) as ds:
+        da = ds[variable]
+        lat_name, lon_name = coord_names(da)
+        lat_vals = da[lat_name].values
+        lat_slice = slice(*INDIA_LAT) if lat_vals[0] < lat_vals[-1] else slice(*INDIA_LAT[::-1])
+        return da.sel({lat_name: lat_slice, lon_name: slice(*INDIA_LON)}).values
+
+
+def read_map(path, variable):
+    with xr.open_dataset(path, decode_times=False) as ds:
+        da = ds[variable]
+        time_dim = next((dim for dim in da.dims if dim in TIME_DIMS), None)
+        return (da.isel({time_dim: -1}) if time_dim else da).values
+
+
+ACCESS_PATTERNS = {
+    "fldmean": read_fldmean,
+    "india_box": read_india_box,
+    "map": read_map,
+}
+
+
+def time_read(reader, path, variable):
+    """Median cold-cache latency of a read pattern over REPEATS runs."""
+    samples = []
+    for _ in range(REPEATS):
+        drop_page_cache(path)
+        start = time.perf_counter()
+        reader(path, variable)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def benchmark_profile(ds, variable, profile, work_dir):
+    """Write the product with one profile and time its downstream reads."""
+    out_path = os.path.join(work_dir, f"bench_{profile}.nc")
+    if os.path.exists(out_path):
+        os.remove(out_path)
+
+    encoding = {variable: xarray_encoding(profile, ds[variable])}
+    start = time.perf_counter()
+    ds.to_netcdf(out_path, format=netcdf_format(profile), encoding=encoding)
+    write_time = time.perf_counter() - start
+
+    result = {
+        "profile": profile,
+        "write_s": write_time,
+        "size_mb": os.path.getsize(out_path) / 1e6,
+    }
+    for pattern, reader in ACCESS_PATTERNS.items():
+        result[f"{pattern}_s"] = time_read(reader, out_path, variable)
+
+    os.remove(out_path)
+    return result
+
+
+def print_table(results):
+    columns = ["profile", "write_s", "size_mb"] + [f"{pattern}_s" for pattern in ACCESS_PATTERNS]
+    print(" ".join(f"{col:>22s}" if col == "profile" else f"{col:>12s}" for col in columns))
+    for row in results:
+        cells = []
+        for col in columns:
+            value = row[col]
+            cells.append(f"{value:>22s}" if col == "profile" else f"{value:12.3f}")
+        print(" ".join(cells))
+
+
+def main(argv):
+    if len(argv) < 3:
+        print("Usage: python storage_benchmark.py <input.nc> <variable> [<work_dir>] [<profile> ...]")
+        return 1
+
+    input_file, variable = argv[1], argv[2]
+    work_dir = argv[3] if len(argv) > 3 else "./storage_benchmark"
+    profiles = argv[4:] or list(PROFILES)
+    os.makedirs(work_dir, exist_ok=True)
+
+    with xr.open_dataset(input_file, decode_times=False) as src:
+        ds = src[[variable]].load()
+    for name in ds.variables:
+        ds[name].encoding = {}
+
+    print(f"Benchmarking {variable} from {input_file}: shape {ds[variable].shape}, dtype {ds[variable].dtype}")
+    results = [benchmark_profile(ds, variable, profile, work_dir) for profile in profiles]
+    print_table(results)
+
+    csv_path = os.path.join(work_dir, "storage_benchmark.csv")
+    with open(csv_path, "w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"Results written to {csv_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,163 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Storage profiles for processed NetCDF products.
+#
+# A profile fixes the on-disk format, zlib/shuffle compression and the chunk
+# layout of a product. "map" layouts keep one horizontal field per chunk (fast
+# for contour maps); "timeseries" layouts keep many time steps of a small
+# horizontal tile per chunk (fast for fldmean, box means and India regrids).
+#
+# Usage:
+#   python storage_profiles.py list
+#   python storage_profiles.py cdo-opts <profile>
+#   python storage_profiles.py rechunk <profile> <file.nc>
+#
+# ==============================================================================
+
+import sys
+import os
+import subprocess
+
+TIME_DIMS = ("time", "valid_time")
+LEVEL_DIMS = ("plev", "lev", "level", "pressure_level")
+
+PROFILES = {
+    # CDO's own default: format of the input, no compression, no chunking.
+    "cdo_default": {"format": None, "zlib": 0, "shuffle": False, "layout": None},
+    "nc4_zip1": {"format": "nc4", "zlib": 1, "shuffle": True, "layout": None},
+    "nc4_zip4": {"format": "nc4", "zlib": 4, "shuffle": True, "layout": None},
+    "nc4_zip1_map": {"format": "nc4", "zlib": 1, "shuffle": True, "layout": "map"},
+    "nc4_zip4_map": {"format": "nc4", "zlib": 4, "shuffle": True, "layout": "map"},
+    "nc4_zip1_timeseries": {"format": "nc4", "zlib": 1, "shuffle": True, "layout": "timeseries"},
+    "nc4_zip4_timeseries": {"format": "nc4", "zlib": 4, "shuffle": True, "layout": "timeseries"},
+}
+
+# Time-series chunks: up to 20 years of months over a 32x32 horizontal tile.
+TIMESERIES_TIME_CHUNK = 240
+TIMESERIES_TILE = 32
+
+
+def get_profile(name):
+    """Look up a profile by name."""
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown storage profile '{name}'. Available: {', '.join(PROFILES)}")
+
+
+def cdo_options(name):
+    """Global CDO options that write a product in the given profile."""
+    profile = get_profile(name)
+    options = []
+    if profile["format"]:
+        options += ["-f", profile["format"]]
+    if profile["zlib"]:
+        options += ["-z", f"zip_{profile['zlib']}"]
+    if profile["shuffle"]:
+        options.append("--shuffle")
+    if profile["layout"] == "map":
+        options += ["-k", "grid"]
+    return options
+
+
+def chunk_shape(name, dims, shape):
+    """Chunk sizes for a variable with the given dims/shape, or None for the library default."""
+    layout = get_profile(name)["layout"]
+    if layout is None:
+        return None
+    chunks = []
+    for dim, size in zip(dims, shape):
+        if dim in TIME_DIMS:
+            chunks.append(min(size, TIMESERIES_TIME_CHUNK) if layout == "timeseries" else 1)
+        elif dim in LEVEL_DIMS:
+            chunks.append(1)
+        else:
+            chunks.append(min(size, TIMESERIES_TILE) if layout == "timeseries" else size)
+    return tuple(chunks)
+
+
+def xarray_encoding(name, da):
+    """netCDF4 encoding for writing a DataArray with xarray in the given profile."""
+    profile = get_profile(name)
+    if not profile["format"]:
+        return {}
+    encoding = {"zlib": profile["zlib"] > 0, "shuffle": profile["shuffle"]}
+    if profile["zlib"]:
+        encoding["complevel"] = profile["zlib"]
+    chunks = chunk_shape(name, da.dims, da.shape)
+    if chunks is not None:
+        encoding["chunksizes"] = chunks
+    return encoding
+
+
+def netcdf_format(name):
+    """xarray/netCDF4 format string for the profile."""
+    return "NETCDF4" if get_profile(name)["format"] else "NETCDF3_64BIT"
+
+
+def rechunk(name, path):
+    """
+    Rewrite a CDO product in place with the profile's time-series chunking.
+
+    CDO can only chunk by horizontal field, so time-series layouts are applied
+    afterwards with nccopy. Other layouts need no rewrite.
+    """
+    profile = get_profile(name)
+    if profile["layout"] != "timeseries":
+        return False
+
+    from netCDF4 import Dataset
+    with Dataset(path) as nc:
+        dims = {dim: len(nc.dimensions[dim]) for dim in nc.dimensions}
+    spec = []
+    for dim, size in dims.items():
+        if dim in TIME_DIMS:
+            spec.append(f"{dim}/{min(size, TIMESERIES_TIME_CHUNK)}")
+        elif dim in LEVEL_DIMS:
+            spec.append(f"{dim}/1")
+        elif size > 0:
+            spec.append(f"{dim}/{min(size, TIMESERIES_TILE)}")
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    cmd = ["nccopy", "-k", "nc4", "-c", ",".join(spec)]
+    if profile["zlib"]:
+        cmd += ["-d", str(profile["zlib"])]
+    if profile["shuffle"]:
+        cmd.append("-s")
+    subprocess.run(cmd + [path, tmp_path], check=True)
+    os.replace(tmp_path, path)
+    return True
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("Usage: python storage_profiles.py <list|cdo-opts|rechunk> [args...]")
+        return 1
+
+    command = argv[1]
+    if command == "list":
+        for name, profile in PROFILES.items():
+            print(f"{name:22s} format={profile['format'] or 'input'} zlib={profile['zlib']} "
+                  f"shuffle={profile['shuffle']} layout={profile['layout'] or 'default'}")
+    elif command == "cdo-opts" and len(argv) == 3:
+        print(" ".join(cdo_options(argv[2])))
+    elif command == "rechunk" and len(argv) == 4:
+        if rechunk(argv[2], argv[3]):
+            print(f"Rechunked {argv[3]} for time-series access ({argv[2]})")
+    else:
+        print("Usage: python storage_profiles.py <list|cdo-opts <profile>|rechunk <profile> <file.nc>>")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
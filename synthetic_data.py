@@ -0,0 +1,292 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Synthetic IITM-ESM model and observation data for testing and benchmarking.
+#
+# Model files follow the layout the processing scripts look for:
+#     <dir>/IITM-ESM_<year>_<month>_plev.nc   (time, plev, lat, lon)
+#     <dir>/IITM-ESM_<year>_<month>.nc        (time, lat, lon)
+# written as 64-bit-offset NetCDF like the model output. Observation files are
+# ERA5-style NetCDF4, one per variable and month:
+#     <dir>/obs_<obs_var>_<year>_<month>.nc   (valid_time, [pressure_level,] latitude, longitude)
+# Fields are a smooth latitude/season pattern plus noise, in the model's and
+# the observations' units, so every stage of the pipeline runs on them.
+#
+# Usage:
+#   python synthetic_data.py model <out_dir> <start_year> <end_year> <nlon>x<nlat> [plev_vars] [no_plev_vars] [nlevels]
+#   python synthetic_data.py obs <out_dir> <start_year> <end_year> <nlon>x<nlat> [plev_vars] [no_plev_vars] [nlevels]
+#
+# Variable lists are comma-separated, e.g. "ua,va,ta,slp,hght" and
+# "tas,pr,rsdt,rlut,rsut,evspsbl" (the defaults).
+#
+# ==============================================================================
+
+import sys
+import os
+import numpy as np
+
+DEFAULT_PLEV_VARIABLES = ["ua", "va", "ta", "slp", "hght"]
+DEFAULT_NO_PLEV_VARIABLES = ["tas", "pr", "rsdt", "rlut", "rsut", "evspsbl"]
+
+# Standard pressure levels (hPa), surface upwards
+STANDARD_LEVELS = [1000, 925, 850, 700, 600, 500, 400, 300, 250, 200, 150, 100, 70, 50, 30, 20, 10, 5, 1]
+
+# Same mapping as variable_mapping in the processing and plotting scripts
+VARIABLE_MAPPING = {
+    "tas": "t2m",
+    "pr": "precip",
+    "ta": "t",
+    "ua": "u",
+    "va": "v",
+    "hght": "z",
+    "slp": "msl",
+    "rsdt": "solar_mon",
+    "rsut": "toa_sw_all_mon",
+    "rlut": "toa_lw_all_mon",
+    "evspsbl": "e",
+}
+
+# Variables with a pressure-level axis (slp lives in the plev files but is single-level)
+THREE_D_VARIABLES = ("ua", "va", "ta", "hght")
+
+# (units, equator value, pole value, seasonal amplitude, noise) per model variable
+MODEL_FIELDS = {
+    "tas": ("K", 300.0, 250.0, 8.0, 1.0),
+    "pr": ("kg m-2 s-1", 8.0e-5, 1.0e-5, 2.0e-5, 5.0e-6),
+    "rsdt": ("W m-2", 420.0, 180.0, 60.0, 2.0),
+    "rlut": ("W m-2", 260.0, 170.0, 10.0, 3.0),
+    "rsut": ("W m-2", 90.0, 120.0, 20.0, 5.0),
+    "evspsbl": ("kg m-2 s-1", 5.0e-5, 1.0e-5, 1.0e-5, 3.0e-6),
+    "ua": ("m s-1", -5.0, 10.0, 5.0, 2.0),
+    "va": ("m s-1", 0.0, 0.0, 1.0, 1.0),
+    "ta": ("K", 300.0, 250.0, 6.0, 1.0),
+    "slp": ("hPa", 1010.0, 1015.0, 6.0, 1.5),
+    "hght": ("m", 0.0, 0.0, 30.0, 10.0),
+}
+
+# Observation units and the factor from model units
+OBS_UNITS = {
+    "pr": ("mm/day", 86400.0),
+    "evspsbl": ("m of water equivalent", -86400.0 / 1000.0),
+    "hght": ("m**2 s**-2", 9.80665),
+    "slp": ("Pa", 100.0),
+}
+
+
+def parse_grid(spec):
+    """'<nlon>x<nlat>' -> (nlon, nlat)."""
+    try:
+        nlon, nlat = (int(part) for part in spec.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Invalid grid '{spec}', expected <nlon>x<nlat> (e.g. 192x96)")
+    return nlon, nlat
+
+
+def grid_coords(nlon, nlat):
+    """Regular cell-centred grid; latitudes south to north, longitudes 0-360."""
+    dlat = 180.0 / nlat
+    dlon = 360.0 / nlon
+    lat = -90.0 + dlat / 2 + dlat * np.arange(nlat)
+    lon = dlon * np.arange(nlon)
+    return lat, lon
+
+
+def synthetic_field(variable, month, lat, lon, levels, rng):
+    """A float32 field (level, lat, lon) or (lat, lon) for one month."""
+    units, equator, pole, seasonal, noise = MODEL_FIELDS[variable]
+    coslat = np.cos(np.deg2rad(lat))[:, None]
+    season = np.sin(2 * np.pi * (month - 4) / 12.0) * np.sin(np.deg2rad(lat))[:, None]
+    wave = 0.1 * np.cos(np.deg2rad(2 * lon))[None, :]
+    base = pole + (equator - pole) * coslat + seasonal * season + abs(equator - pole) * wave * coslat
+    if levels is None:
+        field = base + noise * rng.standard_normal(base.shape)
+        return field.astype(np.float32)
+
+    fields = []
+    for level in levels:
+        if variable == "ta":
+            layer = base - 6.5e-3 * 7000.0 * np.log(1000.0 / level)
+        elif variable == "hght":
+            layer = base + 7000.0 * np.log(1000.0 / level)
+        elif variable == "ua":
+            layer = base + 30.0 * coslat * np.exp(-((np.log(level / 200.0)) ** 2))
+        else:
+            layer = base
+        fields.append(layer + noise * rng.standard_normal(base.shape))
+    return np.asarray(fields, dtype=np.float32)
+
+
+def is_3d(variable):
+    return variable in THREE_D_VARIABLES
+
+
+def month_offset(year, month, start_year):
+    """Mid-month day offset in a 365-day calendar."""
+    days_before = [0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334, 365]
+    return (year - start_year) * 365 + (days_before[month - 1] + days_before[month]) / 2.0
+
+
+def write_model_file(path, variables, year, month, start_year, lat, lon, levels, rng, plev_file):
+    from netCDF4 import Dataset
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with Dataset(tmp_path, "w", format="NETCDF3_64BIT_OFFSET") as nc:
+        nc.title = "Synthetic IITM-ESM monthly output"
+        nc.createDimension("time", None)
+        if plev_file:
+            nc.createDimension("plev", len(levels))
+        nc.createDimension("lat", len(lat))
+        nc.createDimension("lon", len(lon))
+
+        time = nc.createVariable("time", "f8", ("time",))
+        time.units = f"days since {start_year}-01-01 00:00:00"
+        time.calendar = "365_day"
+        time.standard_name = "time"
+        time[:] = [month_offset(year, month, start_year)]
+        if plev_file:
+            plev = nc.createVariable("plev", "f8", ("plev",))
+            plev.units = "Pa"
+            plev.standard_name = "air_pressure"
+            plev.positive = "down"
+            plev[:] = np.asarray(levels, dtype=np.float64) * 100.0
+        lat_var = nc.createVariable("lat", "f8", ("lat",))
+        lat_var.units = "degrees_north"
+        lat_var.standard_name = "latitude"
+        lat_var[:] = lat
+        lon_var = nc.createVariable("lon", "f8", ("lon",))
+        lon_var.units = "degrees_east"
+        lon_var.standard_name = "longitude"
+        lon_var[:] = lon
+
+        for variable in variables:
+            three_d = plev_file and is_3d(variable)
+            dims = ("time", "plev", "lat", "lon") if three_d else ("time", "lat", "lon")
+            var = nc.createVariable(variable, "f4", dims, fill_value=np.float32(1.0e20))
+            var.units = MODEL_FIELDS[variable][0]
+            var.missing_value = np.float32(1.0e20)
+            var[0] = synthetic_field(variable, month, lat, lon, levels if three_d else None, rng)
+    os.replace(tmp_path, path)
+
+
+def write_obs_file(path, variable, year, month, lat, lon, levels, rng):
+    from netCDF4 import Dataset
+    obs_var = VARIABLE_MAPPING.get(variable, variable)
+    units, factor = OBS_UNITS.get(variable, (MODEL_FIELDS[variable][0], 1.0))
+    three_d = is_3d(variable)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with Dataset(tmp_path, "w", format="NETCDF4") as nc:
+        nc.title = "Synthetic ERA5-style monthly means"
+        nc.createDimension("valid_time", None)
+        if three_d:
+            nc.createDimension("pressure_level", len(levels))
+        nc.createDimension("latitude", len(lat))
+        nc.createDimension("longitude", len(lon))
+
+        time = nc.createVariable("valid_time", "i8", ("valid_time",))
+        time.units = "seconds since 1970-01-01"
+        time.calendar = "proleptic_gregorian"
+        time.standard_name = "time"
+        time[:] = [int(np.datetime64(f"{year:04d}-{month:02d}-01", "s").astype(np.int64))]
+        if three_d:
+            plev = nc.createVariable("pressure_level", "f8", ("pressure_level",))
+            plev.units = "hPa"
+            plev[:] = levels
+        lat_var = nc.createVariable("latitude", "f8", ("latitude",))
+        lat_var.units = "degrees_north"
+        lat_var[:] = lat[::-1]
+        lon_var = nc.createVariable("longitude", "f8", ("longitude",))
+        lon_var.units = "degrees_east"
+        lon_var[:] = lon
+
+        dims = ("valid_time", "pressure_level", "latitude", "longitude") if three_d \
+            else ("valid_time", "latitude", "longitude")
+        var = nc.createVariable(obs_var, "f4", dims, fill_value=np.float32(np.nan), zlib=True, complevel=1)
+        var.units = units
+        field = synthetic_field(variable, month, lat, lon, levels if three_d else None, rng) * np.float32(factor)
+        var[0] = field[..., ::-1, :]
+    os.replace(tmp_path, path)
+
+
+def generate_model(out_dir, start_year, end_year, nlon, nlat, plev_variables=None,
+                   no_plev_variables=None, nlevels=len(STANDARD_LEVELS), seed=0):
+    """Write monthly model files; returns the number of files written."""
+    plev_variables = DEFAULT_PLEV_VARIABLES if plev_variables is None else plev_variables
+    no_plev_variables = DEFAULT_NO_PLEV_VARIABLES if no_plev_variables is None else no_plev_variables
+    lat, lon = grid_coords(nlon, nlat)
+    levels = STANDARD_LEVELS[:nlevels]
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    written = 0
+    for year in range(start_year, end_year + 1):
+        for month in range(1, 13):
+            if plev_variables:
+                path = os.path.join(out_dir, f"IITM-ESM_{year}_{month:02d}_plev.nc")
+                write_model_file(path, plev_variables, year, month, start_year, lat, lon, levels, rng, True)
+                written += 1
+            if no_plev_variables:
+                path = os.path.join(out_dir, f"IITM-ESM_{year}_{month:02d}.nc")
+                write_model_file(path, no_plev_variables, year, month, start_year, lat, lon, levels, rng, False)
+                written += 1
+    return written
+
+
+def generate_obs(out_dir, start_year, end_year, nlon, nlat, plev_variables=None,
+                 no_plev_variables=None, nlevels=len(STANDARD_LEVELS), seed=1):
+    """Write monthly ERA5-style observation files; returns the number of files written."""
+    plev_variables = DEFAULT_PLEV_VARIABLES if plev_variables is None else plev_variables
+    no_plev_variables = DEFAULT_NO_PLEV_VARIABLES if no_plev_variables is None else no_plev_variables
+    lat, lon = grid_coords(nlon, nlat)
+    levels = STANDARD_LEVELS[:nlevels]
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    written = 0
+    for variable in list(plev_variables) + list(no_plev_variables):
+        obs_var = VARIABLE_MAPPING.get(variable, variable)
+        for year in range(start_year, end_year + 1):
+            for month in range(1, 13):
+                path = os.path.join(out_dir, f"obs_{obs_var}_{year}_{month:02d}.nc")
+                write_obs_file(path, variable, year, month, lat, lon, levels, rng)
+                written += 1
+    return written
+
+
+def split_list(value, default):
+    if value is None:
+        return default
+    return [item for item in value.split(",") if item]
+
+
+def main(argv):
+    if len(argv) < 6 or argv[1] not in ("model", "obs"):
+        print("Usage: python synthetic_data.py <model|obs> <out_dir> <start_year> <end_year> <nlon>x<nlat> "
+              "[plev_vars] [no_plev_vars] [nlevels]")
+        return 1
+
+    kind, out_dir = argv[1], argv[2]
+    start_year, end_year = int(argv[3]), int(argv[4])
+    nlon, nlat = parse_grid(argv[5])
+    plev_variables = split_list(argv[6] if len(argv) > 6 else None, DEFAULT_PLEV_VARIABLES)
+    no_plev_variables = split_list(argv[7] if len(argv) > 7 else None, DEFAULT_NO_PLEV_VARIABLES)
+    nlevels = int(argv[8]) if len(argv) > 8 else len(STANDARD_LEVELS)
+
+    unknown = [v for v in plev_variables + no_plev_variables if v not in MODEL_FIELDS]
+    if unknown:
+        print(f"Error: No synthetic definition for {', '.join(unknown)}. Available: {', '.join(MODEL_FIELDS)}")
+        return 1
+
+    generate = generate_model if kind == "model" else generate_obs
+    written = generate(out_dir, start_year, end_year, nlon, nlat, plev_variables, no_plev_variables, nlevels)
+    print(f"Wrote {written} synthetic {kind} files ({nlon}x{nlat}, {nlevels} levels, "
+          f"{start_year}-{end_year}) to {out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
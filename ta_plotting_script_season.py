@@ -12,7 +12,10 @@
 import sys
 import os
 import numpy as np
-import xarray as xr
+import plot_profiling
+import plot_manifest
+from product_store import open_product
+import precision
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
@@ -136,8 +139,9 @@ def average_over_levels(dataset, variable, min_plev, max_plev):
         print(f"Available variables: {list(dataset.data_vars.keys())}")
         sys.exit(1)
 
-    return dataset[variable].sel({plev_dim: slice(min_plev, max_plev)}).mean(dim=plev_dim)
+    return precision.mean(dataset[variable].sel({plev_dim: slice(min_plev, max_plev)}), plev_dim)
 
+plot_profiling.phase_start("transform")
 # Load and process all datasets
 datasets = {
     "model1": (model1_season, var, False),
@@ -155,7 +159,7 @@ for key, (file_path, variable, is_bias) in datasets.items():
     if file_path:
         try:
             # Open the dataset
-            ds = xr.open_dataset(file_path, decode_times=False)
+            ds = open_product(file_path)
 
             # Verify if the variable exists in the dataset
             if variable not in ds:
@@ -198,6 +202,7 @@ mean_cmap = 'rainbow'  # For model and observation
 bias_cmap = 'coolwarm'  # For bias
 
 
+plot_profiling.phase_start("render")
 # Ensure output directory exists
 os.makedirs(output_dir, exist_ok=True)
 
@@ -291,6 +296,7 @@ else:
 
 # Save the plot
 plt.savefig(output_file)
+plot_manifest.register(output_file)
 print(f"Plot saved to {output_file}")
 plt.close()
 
@@ -14,7 +14,10 @@ matplotlib.use('Agg')  # Use non-interactive backend
 import sys
 import os
 import numpy as np
-import xarray as xr
+import plot_profiling
+import plot_manifest
+from product_store import open_product
+import precision
 import matplotlib.pyplot as plt
 
 # Predefined pressure levels
@@ -27,7 +30,7 @@ def load_and_process(file_path, variable, convert_to_celsius=False):
     """
     Load data, remove time, average over lat/lon, and interpolate to predefined levels.
     """
-    ds = xr.open_dataset(file_path, decode_times=False)
+    ds = open_product(file_path)
     if variable not in ds:
         print(f"Error: Variable '{variable}' not found in {file_path}.")
         sys.exit(1)
@@ -41,13 +44,13 @@ def load_and_process(file_path, variable, convert_to_celsius=False):
         data = data.isel(valid_time=0).squeeze()
     # Average over latitude and longitude
     if "lat" in data.dims and "lon" in data.dims:
-        data = data.mean(dim=["lat", "lon"])
+        data = precision.mean(data, ["lat", "lon"])
     elif "latitude" in data.dims and "longitude" in data.dims:
-        data = data.mean(dim=["latitude", "longitude"])
+        data = precision.mean(data, ["latitude", "longitude"])
 
     # Convert from Kelvin to Celsius if required
     if convert_to_celsius:
-        data = data - 273.15
+        data = data - precision.storage_scalar(273.15)
 
     # Interpolate to predefined pressure levels with extrapolation
     pressure_dim = next((dim for dim in data.dims if "level" in dim or "pressure_level" in dim), None)
@@ -57,7 +60,7 @@ def load_and_process(file_path, variable, convert_to_celsius=False):
 
     print(f"Original Pressure Levels in {file_path}:", data[pressure_dim].values)
 
-    data = data.interp({pressure_dim: predefined_pressure_levels}, method="linear", kwargs={"fill_value": "extrapolate"})
+    data = precision.to_storage(data.interp({pressure_dim: predefined_pressure_levels}, method="linear", kwargs={"fill_value": "extrapolate"}))
 
     print(f"Interpolated Pressure Levels in {file_path}:", data[pressure_dim].values)
     return data, pressure_dim
@@ -91,9 +94,11 @@ def plot_profiles(profiles, labels, pressure_levels, output_path, xlabel, ylabel
     plt.legend(fontsize=12, loc="best", frameon=True)  # Adjust legend position and style
     plt.tight_layout()  # Ensure no overlap of labels and title
     plt.savefig(output_path, dpi=300)  # Save with high resolution
+    plot_manifest.register(output_path)
     plt.close()
 
 
+plot_profiling.phase_start("load")
 # Load datasets and process
 model1_profile, _ = load_and_process(sys.argv[1], "ta", convert_to_celsius=True)
 model2_profile, _ = load_and_process(sys.argv[2], "ta", convert_to_celsius=True) if len(sys.argv) > 2 and sys.argv[2] else (None, None)
@@ -103,6 +108,7 @@ bias1_profile, _ = load_and_process(sys.argv[4], "ta", convert_to_celsius=False)
 bias2_profile, _ = load_and_process(sys.argv[5], "ta", convert_to_celsius=False) if len(sys.argv) > 5 and sys.argv[5] else (None, None)
 bias3_profile, _ = load_and_process(sys.argv[6], "ta", convert_to_celsius=False) if len(sys.argv) > 6 and sys.argv[6] else (None, None)
 
+plot_profiling.phase_start("render")
 # Plot mean profiles
 # Call the updated plotting function
 plot_profiles(
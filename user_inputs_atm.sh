@@ -32,10 +32,43 @@ netcdf_dir_model2="/media/iitm/TOSHIBA_PRITAM/CMIP6/ATM"  # Directory containing
 start_year_model2=1990                  # Start year for Model 2 data (if using Model 2)
 end_year_model2=2014              # End year for Model 2 data (if using Model 2)
 output_prefix_model2="model2"         # Output file prefix for Model 2 (only if comparing)
+# Ensemble settings (optional): more models compared with Model 1 and Model 2
+ensemble_models=""                        # "name:dir:start_year:end_year,..." e.g. "expA:/data/expA/ATM:2391:2395,expB:/data/expB/ATM:2391:2395"
+ensemble_levels="850,200"                 # Pressure levels (hPa) of the ensemble maps of pressure-level variables
+ensemble_jobs=4                           # Models (and ensemble comparisons) processed in parallel
 # Observation data settings
 obs_data_dir="/media/iitm/TOSHIBA_PRITAM/OBS_1990_2020"  # Directory containing observational data files
 start_year_obs=1990                     # Start year for observational data
 end_year_obs=2020                   # End year for observational data
+obs_cache_dir=""                          # Shared cache of processed observation products, e.g. a group directory; "" (off)
+
+# Storage settings
+virtual_all_year=true                     # Keep *_all_year* series as a reference index over the monthly files instead of a merged copy
+product_store=""                          # Set to "zarr" to also keep products in a chunked Zarr store (dataset/variable/product/period)
+product_store_dir="./output_data/products.zarr"  # Location of the Zarr product store
+storage_profile_maps="cdo_default"        # Storage profile for mean/regridded fields (see: python storage_profiles.py list)
+storage_profile_series="cdo_default"      # Storage profile for time series (*_all_year*, *_mean_yearly*)
+precision_policy="float32"                # "float32": store and hold fields as float32, sum in float64; "native": keep input types
+reduction_engine="cdo"                    # "cdo": CDO steps per file; "python": single-pass reduce_atm.py (memory-mapped reads of NetCDF3 inputs)
+derived_variables=""                      # Derived variables reduced in the same pass as their sources, ";"-separated, e.g. "rnet;speed": names from derived_vars.py or "<name>=<expression>" (needs reduction_engine="python")
+plev_source="plev"                        # "plev": the model's *plev* files; "model_levels": interpolate model-level output (hybrid coefficients and ps) to pressure levels (needs reduction_engine="python")
+scratch_dir=""                            # Directory for intermediate files, e.g. a tmpfs ("/dev/shm/iitm_esm") or local SSD; "" for ./output_data/scratch
+retention_budget=""                       # Disk budget for output_data, e.g. "200G": least recently used products beyond it are evicted at the end of a run; "" keeps all
+
+# Sharded processing settings
+shard_mode=""                             # "local": split into variable x dataset x year-block shards run in a local process pool; "batch": only plan them for a batch system; "" (off)
+shard_years=10                            # Years per shard
+shard_workers=""                          # Shards run in parallel with shard_mode="local" ("" for the number of CPUs)
+
+# Tracing settings
+trace=false                               # Record every stage and cdo/ncl/python call (wall, CPU, peak RSS, I/O) as a Chrome trace
+trace_file=""                             # Trace events file (default: ./output_data/trace_<timestamp>.jsonl; <name>.json is the Chrome trace)
+plot_profile=""                           # Profile the Python plotting/HTML scripts: "cprofile", "sample" or "" (off)
+
+# Plotting settings
+plot_jobs=""                              # Plot tasks (regrid, bias, NCL, Python renders) run at the same time ("" for the number of CPUs)
+plot_incremental=true                     # Only render the figures whose input products, plot scripts or parameters changed since their last render
+significance_alpha=0.05                   # Bias points stippled where Welch's t-test of the yearly means gives p below this (needs reduction_engine="python")
 
 # Seasonal settings
 season="JJAS"                             # Season to analyze (e.g., "DJF", "MAM", "JJA", "SON", "JJAS")
@@ -58,6 +91,15 @@ else
     exit 1
 fi
 
+# Domain push-down settings
+domain_pushdown=false                     # Cut every input to lat_range/lon_range (plus a margin) and the needed levels at its first read
+domain_margin=5                           # Margin (degrees) kept around the domain for regridding and contouring
+plev_levels=""                            # Pressure levels (hPa) to keep, e.g. "850,500,200"; "" for the levels the plots use
+
+# HTML report settings
+thumbnail_width=480                       # Width (pixels) of the report thumbnails; the full plots are linked
+pdf_image_width=""                        # Embed plots in the PDF report downscaled to this width (pixels); "" for full resolution
+
 if [ "$debug" = true ]; then
     set -x  # Enable verbose output
 fi
@@ -0,0 +1,186 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Hybrid sigma-pressure to pressure-level interpolation of model-level output.
+#
+# With plev_source="model_levels" in user_inputs_atm.sh, the pressure-level
+# variables are read from the model-level monthly files (the files without
+# "plev" in their name) and reduce_atm.py interpolates each field to the
+# standard 19 pressure levels (or plev_levels) as it is read, so no separate
+# interpolation run is needed first.
+#
+# The pressure of each model level is p = a * p0 + b * ps (or ap + b * ps),
+# from the hybrid coefficients of the file: the formula_terms of the level
+# coordinate when present (CF atmosphere_hybrid_sigma_pressure_coordinate),
+# otherwise hyam/hybm, ap/b or a/b/p0. Fields are interpolated linearly in
+# log(p). Target levels below the lowest model level (below ground) are
+# extrapolated linearly in log(p) from the two lowest levels; levels above the
+# model top are missing.
+#
+# All columns of a file (every time step and grid point) are interpolated at
+# once: the log-pressure columns are offset into one increasing array, so a
+# single np.searchsorted finds the bracketing model levels of every target
+# level in every column.
+#
+# Usage:
+#   python vertical_interp.py levels
+#   python vertical_interp.py check <model_level_file.nc> <variable>
+#
+# ==============================================================================
+
+import sys
+import os
+import re
+import numpy as np
+
+# Standard pressure levels (Pa), as the CMIP plev19 axis
+STANDARD_LEVELS = (100000.0, 92500.0, 85000.0, 70000.0, 60000.0, 50000.0, 40000.0, 30000.0, 25000.0,
+                   20000.0, 15000.0, 10000.0, 7000.0, 5000.0, 3000.0, 2000.0, 1000.0, 500.0, 100.0)
+PS_NAMES = ("ps", "PS", "aps", "psfc")
+# Hybrid coefficient names, tried in order: (a, b, reference pressure or None)
+COEFFICIENT_NAMES = (("hyam", "hybm", None), ("ap", "b", None), ("a", "b", "p0"))
+
+
+def enabled():
+    return os.environ.get("plev_source", "plev") == "model_levels"
+
+
+def target_levels(levels_hpa=None):
+    """Target pressure levels (Pa): the requested levels (hPa), or the standard ones."""
+    if levels_hpa:
+        return np.asarray(levels_hpa, dtype=np.float64) * 100.0
+    return np.asarray(STANDARD_LEVELS)
+
+
+def level_dim(nc, dims):
+    """The model-level dimension of a variable's dimensions."""
+    for dim in dims[1:]:
+        if dim in nc.variables and "formula_terms" in nc.variables[dim].ncattrs():
+            return dim
+    for dim in dims[1:]:
+        if any(a in nc.variables and nc.variables[a].dimensions == (dim,) for a, _, _ in COEFFICIENT_NAMES):
+            return dim
+    raise ValueError(f"No hybrid level dimension among {', '.join(dims)}")
+
+
+def coefficients(nc, dim):
+    """(A, B) of the levels of dim, in Pa and 1: p = A + B * ps."""
+    def values(name):
+        return np.asarray(nc.variables[name][:], dtype=np.float64)
+
+    if dim in nc.variables and "formula_terms" in nc.variables[dim].ncattrs():
+        terms = dict(re.findall(r"(\w+):\s*(\w+)", nc.variables[dim].formula_terms))
+        if "ap" in terms and "b" in terms:
+            return values(terms["ap"]), values(terms["b"])
+        if "a" in terms and "b" in terms and "p0" in terms:
+            return values(terms["a"]) * float(values(terms["p0"])), values(terms["b"])
+    for a, b, p0 in COEFFICIENT_NAMES:
+        if a in nc.variables and b in nc.variables and (p0 is None or p0 in nc.variables):
+            scale = float(values(p0)) if p0 else 1.0
+            return values(a) * scale, values(b)
+    raise ValueError(f"No hybrid coefficients for the levels '{dim}'")
+
+
+def surface_pressure_name(nc, dim):
+    if dim in nc.variables and "formula_terms" in nc.variables[dim].ncattrs():
+        terms = dict(re.findall(r"(\w+):\s*(\w+)", nc.variables[dim].formula_terms))
+        if terms.get("ps") in nc.variables:
+            return terms["ps"]
+    for name in PS_NAMES:
+        if name in nc.variables:
+            return name
+    raise ValueError("No surface pressure (ps) in the model-level file")
+
+
+def interpolate(data, a, b, ps, targets, axis=1):
+    """
+    data (..., level, ...) on hybrid levels to the target pressures (Pa).
+
+    ps has the shape of data without the level axis; NaN marks missing values.
+    Returns float64 data with the level axis replaced by the targets.
+    """
+    data = np.moveaxis(np.asarray(data, dtype=np.float64), axis, -1)
+    shape = data.shape[:-1]
+    levels = data.shape[-1]
+    ps = np.asarray(ps, dtype=np.float64)
+    if ps.size and np.nanmax(ps) < 2000.0:
+        ps = ps * 100.0  # hPa
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_p = np.log(a + b * ps[..., np.newaxis]).reshape(-1, levels)
+    values = data.reshape(-1, levels)
+    if log_p.shape[0] and log_p[0, 0] > log_p[0, -1]:
+        # Model levels top-down in the file: make pressure increase along the column
+        log_p, values = log_p[:, ::-1], values[:, ::-1]
+    columns = log_p.shape[0]
+    log_t = np.log(np.asarray(targets, dtype=np.float64))
+
+    # Offset every column into its own range, so one searchsorted on the
+    # flattened, increasing array brackets all columns at once
+    finite = np.isfinite(log_p)
+    low = np.min(log_p, where=finite, initial=np.inf)
+    high = np.max(log_p, where=finite, initial=-np.inf)
+    low, high = min(low, log_t.min()), max(high, log_t.max())
+    span = (high - low) + 1.0
+    offset = np.arange(columns, dtype=np.float64)[:, np.newaxis] * span
+    flat = (np.where(finite, log_p, high) - low + offset).ravel()
+    queries = (log_t[np.newaxis, :] - low + offset).ravel()
+    upper = np.searchsorted(flat, queries, side="right").reshape(columns, -1)
+    upper -= np.arange(columns)[:, np.newaxis] * levels
+
+    above_top = upper == 0
+    upper = np.clip(upper, 1, levels - 1)
+    lower = upper - 1
+    p0, p1 = np.take_along_axis(log_p, lower, axis=1), np.take_along_axis(log_p, upper, axis=1)
+    v0, v1 = np.take_along_axis(values, lower, axis=1), np.take_along_axis(values, upper, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Below the lowest level the weight exceeds 1: linear extrapolation in log(p)
+        weight = (log_t[np.newaxis, :] - p0) / (p1 - p0)
+        result = v0 + weight * (v1 - v0)
+    result[above_top] = np.nan
+    return np.moveaxis(result.reshape(shape + (len(log_t),)), -1, axis)
+
+
+def check(path, variable):
+    """Print the level layout of a model-level file and a sample interpolated column."""
+    from netCDF4 import Dataset
+    with Dataset(path) as nc:
+        dims = nc.variables[variable].dimensions
+        dim = level_dim(nc, dims)
+        a, b = coefficients(nc, dim)
+        ps_name = surface_pressure_name(nc, dim)
+        ps = np.ma.filled(np.ma.asarray(nc.variables[ps_name][:], dtype=np.float64), np.nan)
+        data = np.ma.filled(np.ma.asarray(nc.variables[variable][:], dtype=np.float64), np.nan)
+    axis = dims.index(dim)
+    result = interpolate(data, a, b, ps, target_levels(), axis)
+    column = np.moveaxis(result, axis, -1).reshape(-1, len(STANDARD_LEVELS))[0]
+    print(f"{variable}: {len(a)} hybrid levels along '{dim}', surface pressure '{ps_name}'")
+    for level, value in zip(STANDARD_LEVELS, column):
+        print(f"  {level / 100.0:7g} hPa  {value:.6g}")
+
+
+def main(argv):
+    if len(argv) == 2 and argv[1] == "levels":
+        print(",".join(f"{level / 100.0:g}" for level in STANDARD_LEVELS))
+        return 0
+    if len(argv) == 4 and argv[1] == "check":
+        try:
+            check(argv[2], argv[3])
+        except (OSError, KeyError, ValueError) as exc:
+            print(f"Error: {exc}")
+            return 1
+        return 0
+    print("Usage: python vertical_interp.py levels\n"
+          "       python vertical_interp.py check <model_level_file.nc> <variable>")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
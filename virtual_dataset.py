@@ -0,0 +1,194 @@
+# ==============================================================================
+#  Copyright (C) 2025 Centre for Climate Change Research (CCCR), IITM
+#
+#  This script is part of the CCCR IITM_ESM diagnostics system.
+#
+#  Author: Pritam Das Mahapatra
+#  Date: January 2025
+#  Version: 1.0
+#
+# ==============================================================================
+#
+# Virtual all-year time series.
+#
+# Instead of physically merging every monthly input into one large
+# "*_all_year*" NetCDF file, the processing scripts persist a small JSON
+# reference index listing the monthly files that make up the series.
+# Python consumers open the index lazily as one time series with xarray;
+# shell consumers expand it into a chained CDO input ("-selvar,VAR -mergetime
+# FILES...") so only the requested variable is streamed from the originals.
+# An index can also carry the domain selection of the run (see domain.py),
+# applied to every source as it is read.
+#
+# Usage:
+#   python virtual_dataset.py build <index.json> <variable> [--select=<cdo_op> ...] <file1> [<file2> ...]
+#   python virtual_dataset.py files <index.json>
+#   python virtual_dataset.py cdo-args <index.json>
+#   python virtual_dataset.py check <index.json>
+#
+# ==============================================================================
+
+import sys
+import os
+import json
+import time
+
+import domain
+
+INDEX_FORMAT = "atm-virtual-index"
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".vds.json"
+TIME_DIMS = ("time", "valid_time")
+
+
+def index_path_for(nc_path):
+    """Return the reference index path that stands in for an all-year NetCDF file."""
+    root, ext = os.path.splitext(nc_path)
+    return (root if ext == ".nc" else nc_path) + INDEX_SUFFIX
+
+
+def file_signature(path):
+    """Describe a source file so later readers can detect it has changed."""
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime": st.st_mtime}
+
+
+def build_index(variable, files, select=()):
+    """
+    Build a reference index for a variable spread over time-ordered files.
+
+    select lists the CDO operators of the domain selection (see domain.py).
+    """
+    if not files:
+        raise ValueError(f"No input files given for variable '{variable}'.")
+    index = {
+        "format": INDEX_FORMAT,
+        "version": INDEX_VERSION,
+        "variable": variable,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "files": [file_signature(f) for f in files],
+    }
+    if select:
+        index["select"] = list(select)
+    return index
+
+
+def write_index(index, index_path):
+    """Write the index next to the other products, replacing it atomically."""
+    tmp_path = f"{index_path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w") as fh:
+        json.dump(index, fh, indent=1)
+    os.replace(tmp_path, index_path)
+
+
+def read_index(index_path):
+    """Read and validate a reference index."""
+    with open(index_path, "r") as fh:
+        index = json.load(fh)
+    if index.get("format") != INDEX_FORMAT:
+        raise ValueError(f"{index_path} is not a virtual dataset index.")
+    if index.get("version", 0) > INDEX_VERSION:
+        raise ValueError(f"{index_path} was written by a newer version ({index['version']}).")
+    return index
+
+
+def source_paths(index):
+    """Return the time-ordered list of source files."""
+    return [entry["path"] for entry in index["files"]]
+
+
+def stale_files(index):
+    """Return source files that are missing or changed since the index was built."""
+    stale = []
+    for entry in index["files"]:
+        try:
+            st = os.stat(entry["path"])
+        except FileNotFoundError:
+            stale.append(entry["path"])
+            continue
+        if st.st_size != entry["size"] or st.st_mtime != entry["mtime"]:
+            stale.append(entry["path"])
+    return stale
+
+
+def cdo_args(index):
+    """Return CDO chained-input arguments that stream the series from its sources."""
+    return [f"-selvar,{index['variable']}"] + index.get("select", []) + ["-mergetime"] + source_paths(index)
+
+
+def open_virtual(index_path, chunks=None):
+    """
+    Open a reference index lazily as a single xarray Dataset.
+
+    Only the indexed variable is kept from each source file, and data are not
+    read until a slice of it is computed.
+    """
+    import xarray as xr
+
+    index = read_index(index_path)
+    variable = index["variable"]
+    paths = source_paths(index)
+
+    with xr.open_dataset(paths[0], decode_times=False) as first:
+        time_dim = next((dim for dim in first[variable].dims if dim in TIME_DIMS), None)
+    if time_dim is None:
+        raise ValueError(f"No time dimension found for '{variable}' in {paths[0]}.")
+
+    box, levels = domain.parse_cdo_ops(index.get("select", []))
+
+    def select_variable(ds):
+        ds = ds[[variable]]
+        if box is None and levels is None:
+            return ds
+        coords = {dim: ds[dim].values for dim in ds[variable].dims if dim in ds.coords}
+        return ds.isel(domain.selection(ds[variable].dims, coords, box, levels))
+
+    return xr.open_mfdataset(
+        paths,
+        combine="nested",
+        concat_dim=time_dim,
+        preprocess=select_variable,
+        data_vars="minimal",
+        coords="minimal",
+        compat="override",
+        decode_times=False,
+        chunks=chunks if chunks is not None else {},
+    )
+
+
+def main(argv):
+    if len(argv) < 3:
+        print("Usage: python virtual_dataset.py <build|files|cdo-args|check> <index.json> [args...]")
+        return 1
+
+    command, index_path = argv[1], argv[2]
+
+    if command == "build":
+        select = [arg.split("=", 1)[1] for arg in argv[4:] if arg.startswith("--select=")]
+        files = [arg for arg in argv[4:] if not arg.startswith("--select=")]
+        if not files:
+            print("Usage: python virtual_dataset.py build <index.json> <variable> [--select=<cdo_op> ...] "
+                  "<file1> [<file2> ...]")
+            return 1
+        write_index(build_index(argv[3], files, select), index_path)
+        print(f"Virtual dataset index written: {index_path} ({len(files)} files)")
+        return 0
+
+    index = read_index(index_path)
+    if command == "files":
+        print("\n".join(source_paths(index)))
+    elif command == "cdo-args":
+        print("\n".join(cdo_args(index)))
+    elif command == "check":
+        stale = stale_files(index)
+        for path in stale:
+            print(f"Stale source: {path}")
+        return 1 if stale else 0
+    else:
+        print(f"Error: Unknown command '{command}'.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))